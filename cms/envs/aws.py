@@ -161,6 +161,8 @@ ALLOWED_HOSTS = [
 LOG_DIR = ENV_TOKENS['LOG_DIR']
 DATA_DIR = path(ENV_TOKENS.get('DATA_DIR', DATA_DIR))
 
+COURSE_ASSETS_DISK_CACHE = ENV_TOKENS.get('COURSE_ASSETS_DISK_CACHE', COURSE_ASSETS_DISK_CACHE)
+
 CACHES = ENV_TOKENS['CACHES']
 # Cache used for location mapping -- called many times with the same key/value
 # in a given request.
@@ -141,7 +141,7 @@ from lms.envs.common import (
     RETIRED_USER_SALTS,
     RETIREMENT_SERVICE_WORKER_USERNAME,
     RETIREMENT_STATES,
-    PROGRESS_DETACHED_VERTICAL_CATEGORIES, PROGRESS_DETACHED_CATEGORIES,
+    PROGRESS_DETACHED_VERTICAL_CATEGORIES, PROGRESS_DETACHED_CATEGORIES, PROGRESS_COMPLETION_PIPELINE,
 
     # Methods to derive settings
     _make_mako_template_dirs,
@@ -511,6 +511,7 @@ MIDDLEWARE_CLASSES = [
     'django.middleware.locale.LocaleMiddleware',
 
     'codejail.django_integration.ConfigureCodeJailMiddleware',
+    'util.sandboxing.ConfigureSandboxWorkerPoolMiddleware',
 
     # catches any uncaught RateLimitExceptions and returns a 403 instead of a 500
     'ratelimitbackend.middleware.RateLimitMiddleware',
@@ -611,6 +612,17 @@ CODE_JAIL = {
         # How many CPU seconds can jailed code use?
         'CPU': 1,
     },
+
+    # Pool of sandboxed Python processes started ahead of time, with the
+    # modules assumed by capa's code already imported.  Only used by the web
+    # server processes, as it's configured by a middleware.
+    'worker_pool': {
+        # How many warm processes does each server process keep?  0 disables the pool.
+        'size': 0,
+        # How many executions can a process run before it's replaced?  Only
+        # raise it for trusted code, as executions then share the process.
+        'max_jobs': 1,
+    },
 }
 
 ############################ DJANGO_BUILTINS ################################
@@ -681,6 +693,13 @@ COURSE_IMPORT_EXPORT_STORAGE = 'django.core.files.storage.FileSystemStorage'
 ##### EMBARGO #####
 EMBARGO_SITE_REDIRECT_URL = None
 
+# Local on-disk cache of the course assets too large for the course_assets cache, served by the
+# StaticContentServer from there instead of from the contentstore. Disabled when ROOT is None.
+COURSE_ASSETS_DISK_CACHE = {
+    'ROOT': None,
+    'MAX_SIZE': 2 * 1024 * 1024 * 1024,
+}
+
 ############################### PIPELINE #######################################
 
 PIPELINE_ENABLED = True
@@ -932,6 +951,11 @@ CELERY_QUEUES = {
 # Queue to use for updating persistent social engagements
 RECALCULATE_SOCIAL_ENGAGEMENT_ROUTING_KEY = LOW_PRIORITY_QUEUE
 
+####################### Persistent Progress ##############################
+
+# Queue to use for applying batched completions to persistent progress
+RECALCULATE_PROGRESS_ROUTING_KEY = DEFAULT_PRIORITY_QUEUE
+
 ############################## Video ##########################################
 
 YOUTUBE = {
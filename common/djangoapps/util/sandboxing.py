@@ -1,6 +1,8 @@
 import re
 
+from capa.safe_exec import configure_worker_pool
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from lms.djangoapps.dashboard.git_import import DEFAULT_PYTHON_LIB_FILENAME
 
 
@@ -38,3 +40,20 @@ def get_python_lib_zip(contentstore, course_id):
         return zip_lib.data
     else:
         return None
+
+
+class ConfigureSandboxWorkerPoolMiddleware(object):
+    """
+    Configures the pool of warm sandbox workers of capa's safe_exec from the
+    "worker_pool" of the CODE_JAIL setting.
+
+    Must come after codejail's ConfigureCodeJailMiddleware, whose sandbox
+    configuration the workers use. Like codejail's configuration, the pool is
+    only set up in the web server processes: Celery workers execute the code
+    of the problems without it. A process forked after the pool is filled
+    starts its own workers on its first execution.
+    """
+    def __init__(self):
+        pool_settings = settings.CODE_JAIL.get('worker_pool', {})
+        configure_worker_pool(pool_settings.get('size', 0), pool_settings.get('max_jobs', 1))
+        raise MiddlewareNotUsed()
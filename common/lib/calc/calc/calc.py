@@ -2,11 +2,17 @@
 Parser and evaluator for FormulaResponse and NumericalResponse
 
 Uses pyparsing to parse. Main function as of now is evaluator().
+
+Expressions are parsed once into a CompiledExpression, which is kept in a
+bounded cache by compile_expression() and can evaluate a whole list of
+samples of its variables at once, over NumPy arrays.
 """
 
 import math
 import numbers
 import operator
+import threading
+from collections import OrderedDict
 
 import numpy
 import scipy.constants
@@ -81,6 +87,9 @@ SUFFIXES = {
     '%': 0.01,
 }
 
+# Number of compiled expressions kept by compile_expression.
+COMPILED_EXPRESSIONS_CACHE_SIZE = 1000
+
 
 class UndefinedVariable(Exception):
     """
@@ -244,35 +253,241 @@ def evaluator(variables, functions, math_expr, case_sensitive=False):
     if math_expr.strip() == "":
         return float('nan')
 
-    # Parse the tree.
-    check_parens(math_expr)
-    math_interpreter = ParseAugmenter(math_expr, case_sensitive)
-    math_interpreter.parse_algebra()
+    return compile_expression(math_expr, case_sensitive).evaluate(variables, functions)
 
-    # Get our variables together.
-    all_variables, all_functions = add_defaults(variables, functions, case_sensitive)
 
-    # ...and check them
-    math_interpreter.check_variables(all_variables, all_functions)
+_compiled_expressions = OrderedDict()
+_compiled_expressions_lock = threading.Lock()
 
-    # Create a recursion to evaluate the tree.
-    if case_sensitive:
-        casify = lambda x: x
-    else:
-        casify = lambda x: x.lower()  # Lowercase for case insens.
-
-    evaluate_actions = {
-        'number': eval_number,
-        'variable': lambda x: all_variables[casify(x[0])],
-        'function': lambda x: all_functions[casify(x[0])](x[1]),
-        'atom': eval_atom,
-        'power': eval_power,
-        'parallel': eval_parallel,
-        'product': eval_product,
-        'sum': eval_sum
-    }
 
-    return math_interpreter.reduce_tree(evaluate_actions)
+def compile_expression(math_expr, case_sensitive=False):
+    """
+    Return the CompiledExpression of a (non-blank) expression.
+
+    The most recently used compiled expressions are kept, so that grading
+    the same answers again doesn't parse them again.
+    """
+    key = (math_expr, case_sensitive)
+    with _compiled_expressions_lock:
+        compiled = _compiled_expressions.pop(key, None)
+        if compiled is not None:
+            _compiled_expressions[key] = compiled
+            return compiled
+
+    # Parse outside of the lock; errors are raised and not cached.
+    compiled = CompiledExpression(math_expr, case_sensitive)
+
+    with _compiled_expressions_lock:
+        _compiled_expressions[key] = compiled
+        while len(_compiled_expressions) > COMPILED_EXPRESSIONS_CACHE_SIZE:
+            _compiled_expressions.popitem(last=False)
+    return compiled
+
+
+class CompiledExpression(object):
+    """
+    An expression parsed once, to be evaluated with any values of its
+    variables.
+
+    The parse tree is kept as nested `(node_name, children)` tuples, with
+    its numbers already converted to floats.
+    """
+    def __init__(self, math_expr, case_sensitive=False):
+        """
+        Parse the given math expression.
+
+        Raise UnmatchedParenthesis or a pyparsing.ParseException if it
+        isn't a valid expression.
+        """
+        check_parens(math_expr)
+        self._parse = ParseAugmenter(math_expr, case_sensitive)
+        self._parse.parse_algebra()
+        self.case_sensitive = case_sensitive
+        self.plan = self._compile_node(self._parse.tree)
+
+        if case_sensitive:
+            self._casify = lambda x: x
+        else:
+            self._casify = lambda x: x.lower()  # Lowercase for case insens.
+
+    def _compile_node(self, node):
+        """
+        Return the plan of the given node of the parse tree.
+        """
+        if not isinstance(node, ParseResults):
+            return node
+
+        node_name = node.getName()
+        if node_name == 'number':
+            return eval_number(node)
+        return (node_name, tuple(self._compile_node(child) for child in node))
+
+    def _get_evaluate_actions(self, variables, functions):
+        """
+        Check the variables and functions used by the expression, and return
+        the actions to evaluate its variables and functions with.
+        """
+        all_variables, all_functions = add_defaults(variables, functions, self.case_sensitive)
+        self._parse.check_variables(all_variables, all_functions)
+
+        casify = self._casify
+        return {
+            'variable': lambda x: all_variables[casify(x[0])],
+            'function': lambda x: all_functions[casify(x[0])](x[1]),
+        }
+
+    def _reduce(self, evaluate_actions):
+        """
+        Evaluate the plan with the given actions.
+        """
+        def handle_node(node):
+            """
+            Return the value of the node, from the values of its children.
+            """
+            if not isinstance(node, tuple):
+                return node
+            node_name, children = node
+            return evaluate_actions[node_name]([handle_node(child) for child in children])
+        return handle_node(self.plan)
+
+    def evaluate(self, variables, functions):
+        """
+        Evaluate the expression with the given variables and functions, like
+        `evaluator`.
+        """
+        evaluate_actions = self._get_evaluate_actions(variables, functions)
+        evaluate_actions.update({
+            'atom': eval_atom,
+            'power': eval_power,
+            'parallel': eval_parallel,
+            'product': eval_product,
+            'sum': eval_sum,
+        })
+        return self._reduce(evaluate_actions)
+
+    def evaluate_samples(self, samples, functions):
+        """
+        Evaluate the expression for each of the given dictionaries of
+        variables, and return the list of results.
+
+        When the samples are floats or complex numbers and only default
+        functions are used, all the samples are evaluated at once over
+        NumPy arrays. Samples for which this would raise an error or give
+        a non-finite value are evaluated one by one instead, so that the
+        results and errors are the same as `evaluate`'s.
+        """
+        samples = list(samples)
+        if len(samples) > 1:
+            results = self._evaluate_vectorized(samples, functions)
+            if results is not None:
+                return results
+        return [self.evaluate(variables, functions) for variables in samples]
+
+    def _evaluate_vectorized(self, samples, functions):
+        """
+        Evaluate the expression over arrays of the values of the variables
+        of the samples, or return None if it can't be done exactly.
+        """
+        names = set(samples[0])
+        if any(set(variables) != names for variables in samples):
+            return None
+        arrays = {}
+        for name in names:
+            array = numpy.array([variables[name] for variables in samples])
+            if array.dtype.kind not in 'fc':
+                return None
+            arrays[name] = array
+
+        # Other functions may not handle arrays as they handle numbers.
+        custom_functions = set(self._casify(name) for name in functions)
+        if any(self._casify(name) in custom_functions for name in self._parse.functions_used):
+            return None
+
+        evaluate_actions = self._get_evaluate_actions(arrays, functions)
+        evaluate_actions.update({
+            'atom': vectorized_eval_atom,
+            'power': vectorized_eval_power,
+            'parallel': vectorized_eval_parallel,
+            'product': vectorized_eval_product,
+            'sum': vectorized_eval_sum,
+        })
+        # pylint: disable=broad-except
+        try:
+            with numpy.errstate(all='raise'):
+                results = numpy.asarray(self._reduce(evaluate_actions))
+        except Exception:
+            return None
+
+        if results.shape == ():
+            results = numpy.repeat(results, len(samples))
+        if results.shape != (len(samples),) or not numpy.all(numpy.isfinite(results)):
+            return None
+        return results.tolist()
+
+
+# The following evaluation actions are the counterparts of the ones above for
+# arrays of numbers, which aren't `numbers.Number`s and can't be compared to
+# strings.
+
+def _values(parse_result):
+    """
+    Return the values among the given results, ignoring the operators.
+    """
+    return [k for k in parse_result if not isinstance(k, basestring)]
+
+
+def vectorized_eval_atom(parse_result):
+    """
+    Return the value wrapped by the atom.
+    """
+    return _values(parse_result)[0]
+
+
+def vectorized_eval_power(parse_result):
+    """
+    Exponentiate the values, right to left.
+    """
+    return reduce(lambda a, b: b ** a, reversed(_values(parse_result)))
+
+
+def vectorized_eval_parallel(parse_result):
+    """
+    Compute the values according to the parallel resistors operator.
+
+    Zero values divide by zero, which is left to the caller to handle.
+    """
+    values = _values(parse_result)
+    if len(values) == 1:
+        return values[0]
+    return 1. / sum(1. / e for e in values)
+
+
+def vectorized_eval_sum(parse_result):
+    """
+    Add the values, keeping in mind their sign.
+    """
+    total = 0.0
+    current_op = operator.add
+    for token in parse_result:
+        if isinstance(token, basestring):
+            current_op = operator.sub if token == '-' else operator.add
+        else:
+            total = current_op(total, token)
+    return total
+
+
+def vectorized_eval_product(parse_result):
+    """
+    Multiply and divide the values.
+    """
+    prod = 1.0
+    current_op = operator.mul
+    for token in parse_result:
+        if isinstance(token, basestring):
+            current_op = operator.truediv if token == '/' else operator.mul
+        else:
+            prod = current_op(prod, token)
+    return prod
 
 
 def check_parens(formula):
@@ -552,3 +552,69 @@ class EvaluatorTest(unittest.TestCase):
             calc.evaluator({}, {}, "(1+2")
         with self.assertRaisesRegexp(calc.UnmatchedParenthesis, 'no matching opening parenthesis'):
             calc.evaluator({}, {}, "(1+2))")
+
+
+class CompiledExpressionTest(unittest.TestCase):
+    """
+    Run tests for calc.compile_expression and the evaluation of samples
+    """
+    SAMPLES = [{'x': 1.5, 'y': -2.0}, {'x': 0.25, 'y': 3.0}, {'x': 4.0, 'y': 0.5}]
+
+    def assert_samples_evaluated(self, math_expr, samples=None, functions=None, case_sensitive=False):
+        """
+        Check that evaluating the samples at once gives the same results as
+        evaluating them one by one with `evaluator`.
+        """
+        samples = self.SAMPLES if samples is None else samples
+        functions = {} if functions is None else functions
+        compiled = calc.compile_expression(math_expr, case_sensitive)
+        results = compiled.evaluate_samples(samples, functions)
+        self.assertEqual(len(results), len(samples))
+        for variables, result in zip(samples, results):
+            expected = calc.evaluator(variables, functions, math_expr, case_sensitive)
+            if numpy.isnan(expected):
+                self.assertTrue(numpy.isnan(result))
+            else:
+                self.assertAlmostEqual(result, expected, delta=1e-9 * max(1, abs(expected)))
+
+    def test_compiled_once(self):
+        compiled = calc.compile_expression('x^2 + 1')
+        self.assertIs(calc.compile_expression('x^2 + 1'), compiled)
+        self.assertIsNot(calc.compile_expression('x^2 + 1', case_sensitive=True), compiled)
+        self.assertEqual(compiled.evaluate({'x': 3.0}, {}), 10.0)
+
+    def test_cache_size(self):
+        compiled = calc.compile_expression('x + 1')
+        for index in range(calc.COMPILED_EXPRESSIONS_CACHE_SIZE):
+            calc.compile_expression('x + {}'.format(index + 2))
+        self.assertIsNot(calc.compile_expression('x + 1'), compiled)
+
+    def test_evaluate_samples(self):
+        for math_expr in [
+                'x^2 + 3*y - 1/x',
+                '-x^y^2',
+                'sin(x)*cos(y) + sqrt(y) + ln(x)',
+                'x || y || 2',
+                '2.5%*pi + e^x',
+                'X/Y',
+                '(x+j)*y',
+                '7',
+        ]:
+            self.assert_samples_evaluated(math_expr)
+
+    def test_evaluate_samples_fallback(self):
+        # Division by zero, non-finite values, factorials and custom
+        # functions are evaluated sample by sample.
+        self.assert_samples_evaluated('x || y', [{'x': 1.0, 'y': 0.0}, {'x': 1.0, 'y': 1.0}])
+        self.assert_samples_evaluated('exp(x)', [{'x': 1000.0}, {'x': 1.0}])
+        self.assert_samples_evaluated('fact(x)', [{'x': 3.0}, {'x': 4.0}])
+        self.assert_samples_evaluated('arccot(x)', [{'x': -1.0}, {'x': 1.0}])
+        self.assert_samples_evaluated('f(x)', functions={'f': lambda x: x if x > 1 else -x})
+        self.assert_samples_evaluated('x + 1', [{'x': 1}, {'x': 2}])
+
+        with self.assertRaises(ZeroDivisionError):
+            calc.compile_expression('1/x').evaluate_samples([{'x': 1.0}, {'x': 0.0}], {})
+
+    def test_evaluate_samples_undefined_variable(self):
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'z'):
+            calc.compile_expression('x + z').evaluate_samples(self.SAMPLES, {})
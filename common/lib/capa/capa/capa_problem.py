@@ -13,9 +13,11 @@ Main module which shows problems (of "capa" type).
 This is used by capa_module.
 """
 
+import hashlib
 import logging
 import os.path
 import re
+import threading
 from collections import OrderedDict
 from copy import deepcopy
 from datetime import datetime
@@ -29,7 +31,7 @@ import capa.inputtypes as inputtypes
 import capa.responsetypes as responsetypes
 import capa.xqueue_interface as xqueue_interface
 from capa.correctmap import CorrectMap
-from capa.safe_exec import safe_exec
+from capa.safe_exec import SafeExecResultCache, safe_exec
 from capa.util import contextualize_text, convert_files_to_filenames
 from openedx.core.djangolib.markup import HTML
 from xmodule.stringify import stringify_children
@@ -71,6 +73,63 @@ html_problem_semantics = [
 
 log = logging.getLogger(__name__)
 
+# Number of parsed problem trees and of script contexts kept by each process.
+PROBLEM_TREE_CACHE_SIZE = 500
+SCRIPT_CONTEXT_CACHE_SIZE = 5000
+
+# The problem trees are keyed by the hash of the problem text, and the script
+# contexts by the hash of the script code, the python path, the hash of the
+# course's python_lib.zip, whether the code runs unsafely, the seed and the
+# anonymous student id. Both are kept unchanged, and copied on every use.
+_problem_trees = OrderedDict()
+_script_contexts = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(cache, key):
+    """
+    Returns a copy of the value of the key in the given process cache, or
+    None.
+    """
+    with _cache_lock:
+        value = cache.pop(key, None)
+        if value is not None:
+            cache[key] = value
+    if value is not None:
+        return deepcopy(value)
+    return None
+
+
+def _cache_set(cache, key, value, size):
+    """
+    Sets a copy of the value of the key in the given process cache, evicting
+    the least recently used ones beyond its size.
+    """
+    value = deepcopy(value)
+    with _cache_lock:
+        cache.pop(key, None)
+        cache[key] = value
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+
+def clear_process_caches():
+    """
+    Clears the problem trees and script contexts kept in the current process.
+    """
+    with _cache_lock:
+        _problem_trees.clear()
+        _script_contexts.clear()
+
+
+def _hash_text(text):
+    """
+    Returns the md5 hex digest of the given str or unicode.
+    """
+    if isinstance(text, unicode):
+        text = text.encode('utf-8')
+    return hashlib.md5(text).hexdigest()
+
 #-----------------------------------------------------------------------------
 # main class for this module
 
@@ -158,6 +217,11 @@ class LoncapaProblem(object):
         self.capa_system = capa_system
         self.capa_module = capa_module
 
+        # Keep the results of the problem's code in the process as well as in
+        # the cache of the system, for all its responses.
+        if capa_system.cache is not None and not isinstance(capa_system.cache, SafeExecResultCache):
+            capa_system.cache = SafeExecResultCache(capa_system.cache)
+
         state = state or {}
 
         # Set seed according to the following priority:
@@ -179,9 +243,7 @@ class LoncapaProblem(object):
         self.problem_text = problem_text
 
         # parse problem XML file into an element tree
-        self.tree = etree.XML(problem_text)
-
-        self.make_xml_compatible(self.tree)
+        self.tree = self._parse_problem_text(problem_text)
 
         # handle any <include file="foo"> tags
         self._process_includes()
@@ -217,6 +279,21 @@ class LoncapaProblem(object):
             if extract_tree:
                 self.extracted_tree = self._extract_html(self.tree)
 
+    def _parse_problem_text(self, problem_text):
+        """
+        Returns a new element tree of the problem text, made compatible.
+
+        The text is only parsed the first time it's seen by the process; the
+        tree is then copied from the one kept for it, which is much faster.
+        """
+        key = _hash_text(problem_text)
+        tree = _cache_get(_problem_trees, key)
+        if tree is None:
+            tree = etree.XML(problem_text)
+            self.make_xml_compatible(tree)
+            _cache_set(_problem_trees, key, tree, PROBLEM_TREE_CACHE_SIZE)
+        return tree
+
     def make_xml_compatible(self, tree):
         """
         Adjust tree xml in-place for compatibility before creating
@@ -867,10 +944,28 @@ class LoncapaProblem(object):
         if all_code:
             # An asset named python_lib.zip can be imported by Python code.
             zip_lib = self.capa_system.get_python_lib_zip()
+            unsafely = self.capa_system.can_execute_unsafe_code()
+
+            # The same code with the same seed and python_lib.zip always
+            # results in the same context.
+            context_key = (
+                _hash_text(all_code),
+                tuple(python_path),
+                _hash_text(zip_lib) if zip_lib is not None else None,
+                unsafely,
+                self.seed,
+                context['anonymous_student_id'],
+            )
             if zip_lib is not None:
                 extra_files.append(("python_lib.zip", zip_lib))
                 python_path.append("python_lib.zip")
 
+            cached_context = _cache_get(_script_contexts, context_key)
+            if cached_context is not None:
+                # The zip isn't kept with the context, as it's fetched anyway.
+                cached_context['extra_files'] = extra_files or None
+                return cached_context
+
             try:
                 safe_exec(
                     all_code,
@@ -880,7 +975,7 @@ class LoncapaProblem(object):
                     extra_files=extra_files,
                     cache=self.capa_system.cache,
                     slug=self.problem_id,
-                    unsafely=self.capa_system.can_execute_unsafe_code(),
+                    unsafely=unsafely,
                 )
             except Exception as err:
                 log.exception("Error while execing script code: " + all_code)
@@ -890,6 +985,9 @@ class LoncapaProblem(object):
         # Store code source in context, along with the Python path needed to run it correctly.
         context['script_code'] = all_code
         context['python_path'] = python_path
+        if all_code:
+            context['extra_files'] = None
+            _cache_set(_script_contexts, context_key, context, SCRIPT_CONTEXT_CACHE_SIZE)
         context['extra_files'] = extra_files or None
         return context
 
@@ -40,7 +40,7 @@ import capa.safe_exec as safe_exec
 import capa.xqueue_interface as xqueue_interface
 import dogstats_wrapper as dog_stats_api
 # specific library imports
-from calc import UndefinedVariable, UnmatchedParenthesis, evaluator
+from calc import UndefinedVariable, UnmatchedParenthesis, compile_expression, evaluator
 from cmath import isnan
 from openedx.core.djangolib.markup import HTML, Text
 
@@ -3095,63 +3095,64 @@ class FormulaResponse(LoncapaResponse):
         """
         _ = self.capa_system.i18n.ugettext
 
-        out = []
-        for var_dict in var_dict_list:
-            try:
-                out.append(evaluator(
-                    var_dict,
-                    dict(),
-                    answer,
-                    case_sensitive=self.case_sensitive,
-                ))
-            except UndefinedVariable as err:
-                log.debug(
-                    'formularesponse: undefined variable in formula=%s',
-                    cgi.escape(answer)
-                )
-                raise StudentInputError(
-                    _("Invalid input: {bad_input} not permitted in answer.").format(bad_input=text_type(err))
-                )
-            except UnmatchedParenthesis as err:
+        # No need to go further.
+        if answer.strip() == "":
+            return [float('nan')] * len(var_dict_list)
+
+        try:
+            # The answer is parsed once and evaluated for all the samples.
+            out = compile_expression(answer, case_sensitive=self.case_sensitive).evaluate_samples(
+                var_dict_list,
+                dict(),
+            )
+        except UndefinedVariable as err:
+            log.debug(
+                'formularesponse: undefined variable in formula=%s',
+                cgi.escape(answer)
+            )
+            raise StudentInputError(
+                _("Invalid input: {bad_input} not permitted in answer.").format(bad_input=text_type(err))
+            )
+        except UnmatchedParenthesis as err:
+            log.debug(
+                'formularesponse: unmatched parenthesis in formula=%s',
+                cgi.escape(answer)
+            )
+            raise StudentInputError(
+                err.args[0]
+            )
+        except ValueError as err:
+            if 'factorial' in text_type(err):
+                # This is thrown when fact() or factorial() is used in a formularesponse answer
+                #   that tests on negative and/or non-integer inputs
+                # text_type(err) will be: `factorial() only accepts integral values` or
+                # `factorial() not defined for negative values`
                 log.debug(
-                    'formularesponse: unmatched parenthesis in formula=%s',
+                    ('formularesponse: factorial function used in response '
+                     'that tests negative and/or non-integer inputs. '
+                     'Provided answer was: %s'),
                     cgi.escape(answer)
                 )
                 raise StudentInputError(
-                    err.args[0]
+                    _("Factorial function not permitted in answer "
+                      "for this problem. Provided answer was: "
+                      "{bad_input}").format(bad_input=cgi.escape(answer))
                 )
-            except ValueError as err:
-                if 'factorial' in text_type(err):
-                    # This is thrown when fact() or factorial() is used in a formularesponse answer
-                    #   that tests on negative and/or non-integer inputs
-                    # text_type(err) will be: `factorial() only accepts integral values` or
-                    # `factorial() not defined for negative values`
-                    log.debug(
-                        ('formularesponse: factorial function used in response '
-                         'that tests negative and/or non-integer inputs. '
-                         'Provided answer was: %s'),
-                        cgi.escape(answer)
-                    )
-                    raise StudentInputError(
-                        _("Factorial function not permitted in answer "
-                          "for this problem. Provided answer was: "
-                          "{bad_input}").format(bad_input=cgi.escape(answer))
-                    )
-                # If non-factorial related ValueError thrown, handle it the same as any other Exception
-                log.debug('formularesponse: error %s in formula', err)
-                raise StudentInputError(
-                    _("Invalid input: Could not parse '{bad_input}' as a formula.").format(
-                        bad_input=cgi.escape(answer)
-                    )
+            # If non-factorial related ValueError thrown, handle it the same as any other Exception
+            log.debug('formularesponse: error %s in formula', err)
+            raise StudentInputError(
+                _("Invalid input: Could not parse '{bad_input}' as a formula.").format(
+                    bad_input=cgi.escape(answer)
                 )
-            except Exception as err:
-                # traceback.print_exc()
-                log.debug('formularesponse: error %s in formula', err)
-                raise StudentInputError(
-                    _("Invalid input: Could not parse '{bad_input}' as a formula").format(
-                        bad_input=cgi.escape(answer)
-                    )
+            )
+        except Exception as err:
+            # traceback.print_exc()
+            log.debug('formularesponse: error %s in formula', err)
+            raise StudentInputError(
+                _("Invalid input: Could not parse '{bad_input}' as a formula").format(
+                    bad_input=cgi.escape(answer)
                 )
+            )
         return out
 
     def randomize_variables(self, samples):
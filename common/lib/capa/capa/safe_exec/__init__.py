@@ -1,3 +1,5 @@
 """Capa's specialized use of codejail.safe_exec."""
 
+from .result_cache import SafeExecResultCache
 from .safe_exec import safe_exec, update_hash
+from .worker_pool import configure_worker_pool
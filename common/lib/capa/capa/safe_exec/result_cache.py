@@ -0,0 +1,81 @@
+"""
+Two-tier cache of the results of safe_exec.
+
+The results are kept in a bounded, per-process LRU in front of a shared
+cache, such as the Django cache, so that the code of the problems rendered
+and graded again by a process isn't even looked up in the shared cache.
+"""
+import copy
+import threading
+from collections import OrderedDict
+
+from dogapi import dog_stats_api
+
+# Number of results kept by each process.
+PROCESS_CACHE_SIZE = 500
+
+_process_cache = OrderedDict()
+_process_cache_lock = threading.Lock()
+
+
+class SafeExecResultCache(object):
+    """
+    A cache with .get(key) and .set(key, value) methods, as expected by
+    safe_exec, which keeps the results in the process in front of the given
+    shared cache, if any.
+    """
+    def __init__(self, shared_cache=None):
+        self.shared_cache = shared_cache
+
+    def get(self, key):
+        """
+        Returns the result of the given key, or None.
+        """
+        with _process_cache_lock:
+            value = _process_cache.pop(key, None)
+            if value is not None:
+                _process_cache[key] = value
+        if value is not None:
+            dog_stats_api.increment('capa.safe_exec.cache', tags=['result:hit', 'tier:process'])
+            # The results are updated into the globals of the callers,
+            # which mustn't share them.
+            return copy.deepcopy(value)
+
+        if self.shared_cache:
+            value = self.shared_cache.get(key)
+        if value is not None:
+            dog_stats_api.increment('capa.safe_exec.cache', tags=['result:hit', 'tier:shared'])
+            self._set_in_process(key, value)
+            return copy.deepcopy(value)
+
+        dog_stats_api.increment('capa.safe_exec.cache', tags=['result:miss'])
+        return None
+
+    def set(self, key, value):
+        """
+        Sets the result of the given key in both tiers.
+        """
+        self._set_in_process(key, value)
+        if self.shared_cache:
+            self.shared_cache.set(key, value)
+
+    @staticmethod
+    def _set_in_process(key, value):
+        """
+        Sets the result of the given key in the process, evicting the least
+        recently used ones.
+        """
+        value = copy.deepcopy(value)
+        with _process_cache_lock:
+            _process_cache.pop(key, None)
+            _process_cache[key] = value
+            while len(_process_cache) > PROCESS_CACHE_SIZE:
+                _process_cache.popitem(last=False)
+
+
+def clear_process_cache():
+    """
+    Clears the results kept in the current process.
+    """
+    with _process_cache_lock:
+        _process_cache.clear()
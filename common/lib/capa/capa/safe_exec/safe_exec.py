@@ -4,10 +4,12 @@ from codejail.safe_exec import safe_exec as codejail_safe_exec
 from codejail.safe_exec import not_safe_exec as codejail_not_safe_exec
 from codejail.safe_exec import json_safe, SafeExecException
 from . import lazymod
+from .worker_pool import get_worker_pool
 from dogapi import dog_stats_api
 from six import text_type
 
 import hashlib
+import time
 
 # Establish the Python environment for Capa.
 # Capa assumes float-friendly division always.
@@ -103,13 +105,16 @@ def safe_exec(
 
     `cache` is an object with .get(key) and .set(key, value) methods.  It will be used
     to cache the execution, taking into account the code, the values of the globals,
-    and the random seed.
+    the random seed, and the files of the Python path.
 
     `slug` is an arbitrary string, a description that's meaningful to the
     caller, that will be used in log messages.
 
     If `unsafely` is true, then the code will actually be executed without sandboxing.
 
+    Sandboxed code is executed by a warm worker of the configured worker pool, if
+    any is available, and by a new codejail process otherwise.
+
     """
     # Check the cache for a previous result.
     if cache:
@@ -117,6 +122,10 @@ def safe_exec(
         md5er = hashlib.md5()
         md5er.update(repr(code))
         update_hash(md5er, safe_globals)
+        update_hash(md5er, list(python_path or ()))
+        for filename, contents in extra_files or ():
+            update_hash(md5er, filename)
+            md5er.update(hashlib.md5(contents).hexdigest())
         key = "safe_exec.%r.%s" % (random_seed, md5er.hexdigest())
         cached = cache.get(key)
         if cached is not None:
@@ -132,21 +141,40 @@ def safe_exec(
     code_prolog = CODE_PROLOG % random_seed
 
     # Decide which code executor to use.
+    worker_pool = get_worker_pool()
     if unsafely:
         exec_fn = codejail_not_safe_exec
+        executor = 'unsafe'
+    elif worker_pool:
+        exec_fn = worker_pool.execute
+        executor = 'pool'
     else:
         exec_fn = codejail_safe_exec
+        executor = 'codejail'
 
     # Run the code!  Results are side effects in globals_dict.
+    start_time = time.time()
     try:
-        exec_fn(
+        executed = exec_fn(
             code_prolog + LAZY_IMPORTS + code, globals_dict,
             python_path=python_path, extra_files=extra_files, slug=slug,
         )
+        if executed is False:
+            # No worker of the pool was available.
+            executor = 'codejail'
+            codejail_safe_exec(
+                code_prolog + LAZY_IMPORTS + code, globals_dict,
+                python_path=python_path, extra_files=extra_files, slug=slug,
+            )
     except SafeExecException as e:
         emsg = text_type(e)
     else:
         emsg = None
+    dog_stats_api.histogram(
+        'capa.safe_exec.sandbox.time',
+        time.time() - start_time,
+        tags=['executor:{}'.format(executor)],
+    )
 
     # Put the result back in the cache.  This is complicated by the fact that
     # the globals dict might not be entirely serializable.
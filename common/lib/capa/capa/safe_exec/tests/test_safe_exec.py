@@ -4,13 +4,19 @@ import hashlib
 import os
 import os.path
 import random
+import shutil
+import sys
 import textwrap
 import unittest
+import zipfile
+from cStringIO import StringIO
 
 from nose.plugins.skip import SkipTest
 from six import text_type
 
-from capa.safe_exec import safe_exec, update_hash
+from capa.safe_exec import SafeExecResultCache, configure_worker_pool, safe_exec, update_hash
+from capa.safe_exec.worker_pool import get_worker_pool
+from capa.tests.helpers import ProcessCacheIsolationTestCase
 from codejail.safe_exec import SafeExecException
 from codejail.jail_code import is_configured
 
@@ -178,6 +184,131 @@ class TestSafeExecCaching(unittest.TestCase):
                 self.fail("Tried executing code with non-ASCII unicode: {0}".format(code))
 
 
+class TestSafeExecResultCache(ProcessCacheIsolationTestCase):
+    """Test the two tiers of SafeExecResultCache."""
+
+    def test_process_tier(self):
+        shared = {}
+        cache = SafeExecResultCache(DictCache(shared))
+        safe_exec("a = [int(math.pi)]", {}, cache=cache)
+        self.assertEqual(shared.values()[0], (None, {'a': [3]}))
+
+        # The result is kept in the process, even without the shared cache.
+        shared.clear()
+        g = {}
+        safe_exec("a = [int(math.pi)]", g, cache=SafeExecResultCache())
+        self.assertEqual(g['a'], [3])
+
+        # The cached result isn't shared with the globals.
+        g['a'].append(4)
+        g = {}
+        safe_exec("a = [int(math.pi)]", g, cache=SafeExecResultCache())
+        self.assertEqual(g['a'], [3])
+
+    def test_shared_tier(self):
+        shared = {}
+        safe_exec("a = int(math.pi)", {}, cache=DictCache(shared))
+        shared[shared.keys()[0]] = (None, {'a': 17})
+
+        g = {}
+        safe_exec("a = int(math.pi)", g, cache=SafeExecResultCache(DictCache(shared)))
+        self.assertEqual(g['a'], 17)
+
+    def test_extra_files_in_key(self):
+        cache = {}
+        for contents in ["THE_CONST = 1", "THE_CONST = 2"]:
+            safe_exec("a = 1", {}, extra_files=[("constant.py", contents)], cache=DictCache(cache))
+        self.assertEqual(len(cache), 2)
+
+
+class TestSafeExecWorkerPool(unittest.TestCase):
+    """Test safe_exec with a pool of workers running the local Python."""
+
+    def configure(self, max_jobs=1):
+        """Configures a pool of unsandboxed workers."""
+        configure_worker_pool(1, max_jobs, cmdline=[sys.executable, "-E", "-B"], user=None, limits={})
+        self.addCleanup(configure_worker_pool, 0)
+
+    def test_set_values(self):
+        self.configure()
+        g = {'b': 2}
+        safe_exec("a = b * math.pi", g)
+        self.assertAlmostEqual(g['a'], 6.283, places=3)
+
+    def test_random_seeding(self):
+        self.configure()
+        r = random.Random(17)
+        rnums = [r.randint(0, 999) for _ in xrange(100)]
+        g = {}
+        safe_exec("rnums = [random.randint(0, 999) for _ in xrange(100)]", g, random_seed=17)
+        self.assertEqual(g['rnums'], rnums)
+
+    def test_raising_exceptions(self):
+        self.configure()
+        with self.assertRaises(SafeExecException) as cm:
+            safe_exec("1/0", {})
+        self.assertIn("ZeroDivisionError", text_type(cm.exception))
+
+    def test_python_lib(self):
+        self.configure()
+        pylib = os.path.dirname(__file__) + "/test_files/pylib"
+        g = {}
+        safe_exec("import constant; a = constant.THE_CONST", g, python_path=[pylib])
+        self.assertEqual(g['a'], 23)
+
+    def test_python_lib_zip(self):
+        self.configure(max_jobs=2)
+        for num in (17, 23):
+            zipstring = StringIO()
+            zipf = zipfile.ZipFile(zipstring, "w")
+            zipf.writestr("my_helper.py", "NUM = {}\n".format(num))
+            zipf.close()
+            g = {}
+            safe_exec(
+                "import my_helper; a = my_helper.NUM", g,
+                python_path=["python_lib.zip"], extra_files=[("python_lib.zip", zipstring.getvalue())],
+            )
+            self.assertEqual(g['a'], num)
+
+    def test_missing_python_lib(self):
+        self.configure()
+        with self.assertRaises(SafeExecException):
+            safe_exec("a = 1", {}, python_path=["not_a_lib.zip"])
+
+    def test_workers_replaced(self):
+        self.configure()
+        pool = get_worker_pool()
+        safe_exec("a = 1", {})
+        worker = pool._idle_workers[0]  # pylint: disable=protected-access
+        safe_exec("a = 1", {})
+        self.assertNotIn(worker, pool._idle_workers)  # pylint: disable=protected-access
+        self.assertEqual(len(pool._idle_workers), 1)  # pylint: disable=protected-access
+
+    def test_workers_started_after_fork(self):
+        self.configure()
+        pool = get_worker_pool()
+        inherited_worker = pool._idle_workers[0]  # pylint: disable=protected-access
+        self.addCleanup(shutil.rmtree, inherited_worker.home, ignore_errors=True)
+        self.addCleanup(inherited_worker.process.kill)
+
+        # As if the process was forked after the pool was filled.
+        pool._pid = -1  # pylint: disable=protected-access
+        g = {}
+        safe_exec("a = 17", g)
+        self.assertEqual(g['a'], 17)
+        self.assertEqual(pool._pid, os.getpid())  # pylint: disable=protected-access
+        self.assertNotIn(inherited_worker, pool._idle_workers)  # pylint: disable=protected-access
+        self.assertEqual(len(pool._idle_workers), 1)  # pylint: disable=protected-access
+
+    def test_modules_reset_between_jobs(self):
+        self.configure(max_jobs=2)
+        pylib = os.path.dirname(__file__) + "/test_files/pylib"
+        g = {}
+        safe_exec("import constant; constant.THE_CONST = 17", g, python_path=[pylib])
+        safe_exec("import constant; a = constant.THE_CONST", g, python_path=[pylib])
+        self.assertEqual(g['a'], 23)
+
+
 class TestUpdateHash(unittest.TestCase):
     """Test the safe_exec.update_hash function to be sure it canonicalizes properly."""
 
@@ -0,0 +1,450 @@
+"""
+Pool of warm sandboxed Python processes to execute capa's code in.
+
+Most of the time of a sandboxed execution goes into starting the Python
+interpreter and importing the modules assumed by capa's code (numpy, scipy,
+...). The pool starts its workers ahead of time, with the same command and
+limits as codejail, and has them import those modules before they're handed
+any code. A job is then sent to a worker over its stdin, and its resulting
+globals are read back from its stdout.
+
+A worker executes at most `max_jobs` jobs before it's replaced. With the
+default of 1, each execution still gets a process of its own, as with
+codejail. Workers reused for more jobs reset their modules and path between
+jobs, but code can still leave state behind in the modules imported
+beforehand, so only raise it for trusted code.
+"""
+import json
+import logging
+import os
+import resource
+import select
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+
+from codejail import jail_code
+from codejail.safe_exec import SafeExecException, json_safe
+
+log = logging.getLogger(__name__)
+
+# The code run by the workers, with the modules to import before any job
+# and the maximum number of jobs to run.
+WORKER_CODE = """\
+import json
+import os
+import resource
+import sys
+import traceback
+import zipimport
+
+
+class DevNull(object):
+    def write(self, *args, **kwargs):
+        pass
+
+# Keep the code from writing to the pipe of the results.
+results = sys.stdout
+sys.stdout = DevNull()
+
+for modname in %(preload)r:
+    try:
+        __import__(modname)
+    except Exception:
+        pass
+
+home = os.getcwd()
+base_path = list(sys.path)
+base_modules = dict(sys.modules)
+ok_types = (type(None), int, long, float, str, unicode, list, tuple, dict)
+
+
+def jsonable(value):
+    if not isinstance(value, ok_types):
+        return False
+    try:
+        json.dumps(value)
+    except Exception:
+        return False
+    return True
+
+for _ in range(%(max_jobs)d):
+    line = sys.stdin.readline()
+    if not line:
+        break
+    job = json.loads(line)
+
+    cpu_limit = %(cpu_limit)d
+    if cpu_limit:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        __, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(usage.ru_utime + usage.ru_stime) + 1 + cpu_limit
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+    os.chdir(job['dir'])
+    sys.path[:] = base_path + job['python_path']
+    g_dict = job['globals']
+    emsg = None
+    try:
+        exec job['code'] in g_dict
+    except BaseException:
+        emsg = "Couldn't execute jailed code: " + traceback.format_exc()
+
+    g_dict = {
+        k: v
+        for k, v in g_dict.iteritems()
+        if jsonable(v) and k != '__builtins__'
+    }
+    results.write(json.dumps({'emsg': emsg, 'globals': g_dict}) + '\\n')
+    results.flush()
+
+    sys.modules.clear()
+    sys.modules.update(base_modules)
+    # The jobs' python_path entries are relative to their own directories.
+    sys.path_importer_cache.clear()
+    zipimport._zip_directory_cache.clear()
+    os.chdir(home)
+"""
+
+# Seconds of CPU time a worker may use to import the preloaded modules.
+PRELOAD_CPU_SECONDS = 10
+
+
+class _Worker(object):
+    """
+    A sandboxed Python process running WORKER_CODE in a temporary home
+    directory.
+    """
+    def __init__(self, cmdline, user, limits, preload, max_jobs):
+        self.user = user
+        self.jobs_left = max_jobs
+        # Whether a new worker was started in place of this one.
+        self.replaced = False
+        self._closed = False
+
+        self.home = tempfile.mkdtemp(prefix='codejail-')
+        # Make the home readable by the sandbox user, and its tmp writable.
+        os.chmod(self.home, 0o755)
+        os.mkdir(os.path.join(self.home, 'tmp'))
+        os.chmod(os.path.join(self.home, 'tmp'), 0o777)
+        with open(os.path.join(self.home, 'worker.py'), 'w') as worker_file:
+            worker_file.write(WORKER_CODE % {
+                'preload': preload,
+                'max_jobs': max_jobs,
+                'cpu_limit': limits.get('CPU', 0),
+            })
+        self._stderr = open(os.path.join(self.home, 'stderr'), 'w+')
+
+        cmd = []
+        if user:
+            cmd.extend(['sudo', '-u', user])
+        cmd.extend(cmdline)
+        cmd.append('worker.py')
+
+        def set_process_limits():
+            """
+            Set the limits of the worker, as codejail does, allowing for the
+            modules imported before its jobs.
+            """
+            os.setsid()
+            cpu = limits.get('CPU', 0)
+            if cpu:
+                cpu = cpu * max_jobs + PRELOAD_CPU_SECONDS
+                resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+            resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+            if limits.get('FSIZE'):
+                resource.setrlimit(resource.RLIMIT_FSIZE, (limits['FSIZE'], limits['FSIZE']))
+            if limits.get('VMEM'):
+                resource.setrlimit(resource.RLIMIT_AS, (limits['VMEM'], limits['VMEM']))
+
+        self.process = subprocess.Popen(
+            cmd,
+            cwd=self.home,
+            env={'TMPDIR': os.path.join(self.home, 'tmp')},
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self._stderr,
+            preexec_fn=set_process_limits,
+        )
+
+    def is_alive(self):
+        """
+        Returns whether the worker can still execute code.
+        """
+        return self.jobs_left > 0 and self.process.poll() is None
+
+    def execute(self, code, globals_dict, python_path, extra_files, realtime):
+        """
+        Executes the code with the globals in the worker, and updates them
+        with the resulting globals, or raises a SafeExecException.
+        """
+        self.jobs_left -= 1
+        job_dir = tempfile.mkdtemp(dir=self.home)
+        os.chmod(job_dir, 0o755)
+        try:
+            self._write_files(job_dir, python_path, extra_files)
+            job = {
+                'code': code,
+                'globals': json_safe(globals_dict),
+                'dir': job_dir,
+                'python_path': [os.path.basename(path) for path in python_path or ()],
+            }
+            line = self._run_job(job, realtime)
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+        result = json.loads(line)
+        globals_dict.update(result['globals'])
+        if result['emsg']:
+            raise SafeExecException(result['emsg'])
+
+    def _write_files(self, job_dir, python_path, extra_files):
+        """
+        Writes the files of a job to its directory: the `python_path` entries
+        not in `extra_files` are copied from the host, as codejail does, and
+        the `extra_files` are written from their contents.
+        """
+        extra_names = set(filename for filename, __ in extra_files or ())
+        try:
+            for path in python_path or ():
+                filename = os.path.basename(path)
+                if filename in extra_names:
+                    continue
+                destination = os.path.join(job_dir, filename)
+                if os.path.isdir(path):
+                    shutil.copytree(path, destination)
+                else:
+                    shutil.copyfile(path, destination)
+            for filename, contents in extra_files or ():
+                with open(os.path.join(job_dir, filename), 'wb') as extra_file:
+                    extra_file.write(contents)
+        except (OSError, IOError, shutil.Error) as exc:
+            raise SafeExecException("Couldn't write the files of jailed code: {}".format(exc))
+
+    def _run_job(self, job, realtime):
+        """
+        Sends the job to the worker and returns the line of its results.
+        """
+        try:
+            self.process.stdin.write(json.dumps(job) + '\n')
+            self.process.stdin.flush()
+        except IOError:
+            raise SafeExecException("Couldn't execute jailed code: {}".format(self._read_stderr()))
+
+        ready, __, __ = select.select([self.process.stdout], [], [], realtime or None)
+        if not ready:
+            self.close()
+            raise SafeExecException("Couldn't execute jailed code: ran longer than {} seconds".format(realtime))
+        line = self.process.stdout.readline()
+        if not line:
+            raise SafeExecException("Couldn't execute jailed code: {}".format(self._read_stderr()))
+        return line
+
+    def close(self):
+        """
+        Stops the worker and removes its home directory.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.process.poll() is None:
+            pgid = os.getpgid(self.process.pid)
+            if self.user:
+                # Can't signal the process of another user, so kill it the
+                # way codejail does, with the pkill its sudoers allows.
+                subprocess.call(['sudo', 'pkill', '-9', '-g', str(pgid)])
+            else:
+                os.killpg(pgid, signal.SIGKILL)
+            self.process.wait()
+        self._stderr.close()
+        if self.user:
+            # The files written by the sandboxed code belong to its user, who
+            # may only run the find of codejail's sudoers to remove them.
+            subprocess.call([
+                'sudo', '-u', self.user, '/usr/bin/find', os.path.join(self.home, 'tmp'),
+                '-mindepth', '1', '-maxdepth', '1', '-exec', 'rm', '-rf', '{}', ';',
+            ])
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def forget(self):
+        """
+        Closes the pipes to the worker inherited by a forked process, leaving
+        the worker to the process that started it.
+        """
+        self._closed = True
+        for pipe in (self.process.stdin, self.process.stdout, self._stderr):
+            pipe.close()
+
+    def _read_stderr(self):
+        """
+        Returns the output of the worker to its stderr.
+        """
+        self._stderr.seek(0)
+        return self._stderr.read()
+
+
+class SandboxWorkerPool(object):
+    """
+    Keeps `size` warm workers ready to execute code, each of which is
+    replaced after `max_jobs` jobs.
+
+    The workers are started with the given command line, user and limits,
+    which default to the ones codejail is configured with.
+    """
+    def __init__(self, size, max_jobs=1, preload=(), cmdline=None, user=None, limits=None):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.preload = list(preload)
+        if cmdline is None:
+            command = jail_code.COMMANDS['python']
+            cmdline, user = command['cmdline_start'], command['user']
+        self.cmdline = cmdline
+        self.user = user
+        self.limits = jail_code.LIMITS if limits is None else limits
+
+        # Number of the workers that are idle or will be once done.
+        self._worker_count = 0
+        self._idle_workers = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def execute(self, code, globals_dict, python_path=None, extra_files=None, slug=None):
+        """
+        Executes the code with the globals in a warm worker, like
+        codejail.safe_exec.safe_exec.
+
+        Returns False, without executing it, if no worker is available.
+        """
+        worker = self._take_worker()
+        if worker is None:
+            return False
+
+        log.debug("Executing jailed code %s in worker %s", slug, worker.process.pid)
+        try:
+            worker.execute(code, globals_dict, python_path, extra_files, self.limits.get('REALTIME', 0))
+        finally:
+            self._release_worker(worker)
+        return True
+
+    def fill(self):
+        """
+        Starts workers until there are `size` of them.
+        """
+        with self._lock:
+            missing = self.size - self._worker_count
+            self._worker_count += max(missing, 0)
+
+        for _ in range(missing):
+            try:
+                worker = _Worker(self.cmdline, self.user, self.limits, self.preload, self.max_jobs)
+            except (OSError, IOError):
+                log.exception("Couldn't start a sandbox worker")
+                with self._lock:
+                    self._worker_count -= 1
+            else:
+                with self._lock:
+                    self._idle_workers.append(worker)
+
+    def close(self):
+        """
+        Stops all the idle workers.
+        """
+        with self._lock:
+            idle_workers, self._idle_workers = self._idle_workers, []
+            self._worker_count -= len(idle_workers)
+        for worker in idle_workers:
+            worker.close()
+
+    def _take_worker(self):
+        """
+        Returns an idle worker, or None if there aren't any, and starts new
+        workers to make up for the ones gone.
+        """
+        if os.getpid() != self._pid:
+            self._reset_after_fork()
+            self.fill()
+
+        worker = None
+        dead_workers = []
+        with self._lock:
+            while self._idle_workers and worker is None:
+                candidate = self._idle_workers.pop(0)
+                if candidate.is_alive():
+                    worker = candidate
+                else:
+                    dead_workers.append(candidate)
+            self._worker_count -= len(dead_workers)
+            if worker is not None and worker.jobs_left == 1:
+                # Start its replacement right away.
+                worker.replaced = True
+                self._worker_count -= 1
+
+        for dead_worker in dead_workers:
+            dead_worker.close()
+        self.fill()
+        return worker
+
+    def _reset_after_fork(self):
+        """
+        Starts the pool over in a process forked from the one that filled
+        it, since the workers belong to the process that started them.
+        """
+        inherited_workers = self._idle_workers
+        self._lock = threading.Lock()
+        self._idle_workers = []
+        self._worker_count = 0
+        self._pid = os.getpid()
+        for worker in inherited_workers:
+            worker.forget()
+
+    def _release_worker(self, worker):
+        """
+        Returns the worker to the idle workers if it can execute more jobs.
+        """
+        if worker.is_alive():
+            with self._lock:
+                self._idle_workers.append(worker)
+            return
+
+        worker.close()
+        if not worker.replaced:
+            with self._lock:
+                self._worker_count -= 1
+            self.fill()
+
+
+_worker_pool = None
+
+
+def configure_worker_pool(size, max_jobs=1, **kwargs):
+    """
+    Configures the pool of workers used by capa.safe_exec.safe_exec for the
+    current process. A size of 0 disables it.
+    """
+    global _worker_pool  # pylint: disable=global-statement
+    # Imported here, since safe_exec imports this module.
+    from .safe_exec import ASSUMED_IMPORTS
+
+    if _worker_pool is not None:
+        _worker_pool.close()
+    if size and (kwargs.get('cmdline') or jail_code.is_configured('python')):
+        _worker_pool = SandboxWorkerPool(
+            size,
+            max_jobs,
+            preload=['random'] + [modname for __, modname in ASSUMED_IMPORTS],
+            **kwargs
+        )
+        _worker_pool.fill()
+    else:
+        _worker_pool = None
+
+
+def get_worker_pool():
+    """
+    Returns the configured pool of workers, or None.
+    """
+    return _worker_pool
@@ -0,0 +1,89 @@
+"""
+Benchmark of the grading of typical FormulaResponse and NumericalResponse
+problems.
+
+Compares the grading of the answers with their expressions compiled once and
+their samples evaluated at once, with their grading with the expressions
+parsed on every grade and the samples evaluated one by one.
+
+Usage:
+    python -m capa.tests.benchmark_formula_grading [--iterations N]
+"""
+import argparse
+from timeit import timeit
+
+from mock import patch
+
+from calc import calc
+from capa.tests.helpers import new_loncapa_problem
+from capa.tests.response_xml_factory import FormulaResponseXMLFactory, NumericalResponseXMLFactory
+
+# Problems as (name, xml factory, build_xml kwargs, submitted answers).
+PROBLEMS = [
+    (
+        'formula, 2 variables, 20 samples',
+        FormulaResponseXMLFactory,
+        dict(sample_dict={'x': (-10, 10), 'y': (-10, 10)}, num_samples=20, tolerance=0.01, answer='x+2*y'),
+        ['2*x - x + y + y', 'x + y', 'x+2*y'],
+    ),
+    (
+        'formula, functions, 50 samples',
+        FormulaResponseXMLFactory,
+        dict(
+            sample_dict={'m': (1, 10), 'v': (1, 10), 'theta': (0, 1.5)},
+            num_samples=50,
+            tolerance='0.1%',
+            answer='1/2*m*v^2*sin(theta)^2 + sqrt(m*v)',
+        ),
+        ['m*v^2*sin(theta)^2/2 + (m*v)^0.5', 'm*v^2*cos(theta)^2/2 + sqrt(m*v)'],
+    ),
+    (
+        'numerical',
+        NumericalResponseXMLFactory,
+        dict(answer='4*pi/3', tolerance='1%'),
+        ['4.18', '4*3.1416/3', '5'],
+    ),
+]
+
+
+def _grade(problem, submissions):
+    """
+    Grades all the given submissions to the problem.
+    """
+    for submission in submissions:
+        problem.grade_answers({'1_2_1': submission})
+
+
+def _grade_uncompiled(problem, submissions):
+    """
+    Grades all the given submissions to the problem, parsing their
+    expressions on every grade and evaluating their samples one by one.
+    """
+    with patch.object(calc.CompiledExpression, '_evaluate_vectorized', return_value=None):
+        for submission in submissions:
+            calc._compiled_expressions.clear()  # pylint: disable=protected-access
+            problem.grade_answers({'1_2_1': submission})
+
+
+def main():
+    """
+    Writes the mean grading time of the submissions to each problem.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50, help='Number of times each problem is graded.')
+    iterations = parser.parse_args().iterations
+
+    print 'problem, uncompiled ms, compiled ms'
+    for name, factory_class, xml_kwargs, submissions in PROBLEMS:
+        problem = new_loncapa_problem(factory_class().build_xml(**xml_kwargs))
+        uncompiled_time = timeit(lambda: _grade_uncompiled(problem, submissions), number=iterations)
+        compiled_time = timeit(lambda: _grade(problem, submissions), number=iterations)
+        print '{}, {:.3f}, {:.3f}'.format(
+            name,
+            uncompiled_time * 1000 / iterations,
+            compiled_time * 1000 / iterations,
+        )
+
+
+if __name__ == '__main__':
+    main()
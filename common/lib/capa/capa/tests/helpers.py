@@ -4,12 +4,15 @@ import gettext
 from path import Path
 import os
 import os.path
+import unittest
 
 import fs.osfs
 import six
 
+from capa import capa_problem
 from capa.capa_problem import LoncapaProblem, LoncapaSystem
 from capa.inputtypes import Status
+from capa.safe_exec.result_cache import clear_process_cache
 from mock import Mock, MagicMock
 from mako.lookup import TemplateLookup
 
@@ -118,3 +121,22 @@ def load_fixture(relpath):
     with open(abspath) as fixture_file:
         contents = fixture_file.read()
     return contents.decode('utf8')
+
+
+class ProcessCacheIsolationTestCase(unittest.TestCase):
+    """
+    Clears the problem trees, script contexts and sandboxed results kept by
+    the process before and after each test.
+    """
+    def setUp(self):
+        super(ProcessCacheIsolationTestCase, self).setUp()
+        self.clear_process_caches()
+        self.addCleanup(self.clear_process_caches)
+
+    @staticmethod
+    def clear_process_caches():
+        """
+        Clears the caches kept by the process.
+        """
+        capa_problem.clear_process_caches()
+        clear_process_cache()
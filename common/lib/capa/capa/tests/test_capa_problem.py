@@ -5,14 +5,14 @@ import ddt
 import textwrap
 from lxml import etree
 from mock import patch
-import unittest
 
-from capa.tests.helpers import new_loncapa_problem
+from capa import capa_problem
+from capa.tests.helpers import ProcessCacheIsolationTestCase, new_loncapa_problem, test_capa_system
 from openedx.core.djangolib.markup import HTML
 
 
 @ddt.ddt
-class CAPAProblemTest(unittest.TestCase):
+class CAPAProblemTest(ProcessCacheIsolationTestCase):
     """ CAPA problem related tests"""
 
     @ddt.unpack
@@ -458,7 +458,7 @@ class CAPAProblemTest(unittest.TestCase):
 
 
 @ddt.ddt
-class CAPAMultiInputProblemTest(unittest.TestCase):
+class CAPAMultiInputProblemTest(ProcessCacheIsolationTestCase):
     """ TestCase for CAPA problems with multiple inputtypes """
 
     def capa_problem(self, xml):
@@ -595,7 +595,7 @@ class CAPAMultiInputProblemTest(unittest.TestCase):
 
 
 @ddt.ddt
-class CAPAProblemReportHelpersTest(unittest.TestCase):
+class CAPAProblemReportHelpersTest(ProcessCacheIsolationTestCase):
     """ TestCase for CAPA methods for finding question labels and answer text """
 
     @ddt.data(
@@ -708,3 +708,71 @@ class CAPAProblemReportHelpersTest(unittest.TestCase):
             """
         )
         self.assertEquals(problem.find_answer_text('1_2_1', 'hide'), 'hide')
+
+
+class CAPAProblemCacheTest(ProcessCacheIsolationTestCase):
+    """
+    Tests of the problem trees and script contexts kept by the process.
+    """
+    xml = textwrap.dedent("""
+        <problem>
+            <script type="loncapa/python">
+            import random
+            x = random.randint(0, 1000)
+            </script>
+            <stringresponse answer="$x">
+                <additional_answer>second</additional_answer>
+                <textline size="40"/>
+            </stringresponse>
+        </problem>
+    """)
+
+    def test_tree_parsed_once(self):
+        with patch('capa.capa_problem.etree.XML', wraps=etree.XML) as mock_xml:
+            problem = new_loncapa_problem(self.xml)
+            other_problem = new_loncapa_problem(self.xml)
+        self.assertEqual(mock_xml.call_count, 1)
+
+        # Each problem has its own, compatible, tree.
+        self.assertIsNot(problem.tree, other_problem.tree)
+        self.assertEqual(problem.tree.xpath('//additional_answer/@answer'), ['second'])
+        self.assertEqual(etree.tostring(problem.tree), etree.tostring(other_problem.tree))
+
+    def test_context_per_seed(self):
+        with patch('capa.capa_problem.safe_exec', wraps=capa_problem.safe_exec) as mock_safe_exec:
+            problem = new_loncapa_problem(self.xml, seed=1)
+            same_seed_problem = new_loncapa_problem(self.xml, seed=1)
+            other_seed_problem = new_loncapa_problem(self.xml, seed=2)
+        self.assertEqual(mock_safe_exec.call_count, 2)
+        self.assertEqual(problem.context, same_seed_problem.context)
+        self.assertIsNot(problem.context, same_seed_problem.context)
+        self.assertNotEqual(problem.context['x'], other_seed_problem.context['x'])
+
+    def test_no_cache_without_system_cache(self):
+        problem = new_loncapa_problem(self.xml)
+        self.assertIsNone(problem.capa_system.cache)
+
+    def test_context_per_python_lib(self):
+        capa_system = test_capa_system()
+        with patch('capa.capa_problem.safe_exec') as mock_safe_exec:
+            capa_system.get_python_lib_zip = lambda: 'zip'
+            problem = new_loncapa_problem(self.xml, capa_system=capa_system)
+            same_zip_problem = new_loncapa_problem(self.xml, capa_system=capa_system)
+            capa_system.get_python_lib_zip = lambda: 'other zip'
+            other_zip_problem = new_loncapa_problem(self.xml, capa_system=capa_system)
+            capa_system.get_python_lib_zip = lambda: None
+            new_loncapa_problem(self.xml, capa_system=capa_system)
+        self.assertEqual(mock_safe_exec.call_count, 3)
+        self.assertEqual(problem.context['extra_files'], [('python_lib.zip', 'zip')])
+        self.assertEqual(same_zip_problem.context['extra_files'], [('python_lib.zip', 'zip')])
+        self.assertEqual(other_zip_problem.context['extra_files'], [('python_lib.zip', 'other zip')])
+
+    def test_context_per_unsafely(self):
+        capa_system = test_capa_system()
+        with patch('capa.capa_problem.safe_exec') as mock_safe_exec:
+            new_loncapa_problem(self.xml, capa_system=capa_system)
+            capa_system.can_execute_unsafe_code = lambda: True
+            new_loncapa_problem(self.xml, capa_system=capa_system)
+            new_loncapa_problem(self.xml, capa_system=capa_system)
+        self.assertEqual(mock_safe_exec.call_count, 2)
+        self.assertTrue(mock_safe_exec.call_args[1]['unsafely'])
@@ -10,7 +10,6 @@ import os
 import pyparsing
 import random
 import textwrap
-import unittest
 import zipfile
 
 import mock
@@ -18,7 +17,7 @@ from pytz import UTC
 from six import text_type
 import requests
 
-from capa.tests.helpers import new_loncapa_problem, test_capa_system, load_fixture
+from capa.tests.helpers import ProcessCacheIsolationTestCase, new_loncapa_problem, test_capa_system, load_fixture
 import calc
 
 from capa.responsetypes import LoncapaProblemError, \
@@ -44,7 +43,7 @@ from capa.util import convert_files_to_filenames
 from capa.xqueue_interface import dateformat
 
 
-class ResponseTest(unittest.TestCase):
+class ResponseTest(ProcessCacheIsolationTestCase):
     """Base class for tests of capa responses."""
 
     xml_factory_class = None
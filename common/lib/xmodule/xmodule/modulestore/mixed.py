@@ -626,6 +626,16 @@ class MixedModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase):
         store = self._get_modulestore_for_courselike(course_key)
         return store.get_orphans(course_key, **kwargs)
 
+    def get_block_versions(self, course_key, **kwargs):
+        """
+        Get a map of the BlockKey of each block in the given course to a tuple of the version of the
+        block's last edit and the BlockKeys of its children.
+
+        Raises NotImplementedError if the modulestore of the course does not version its blocks.
+        """
+        store = self._verify_modulestore_support(course_key, 'get_block_versions')
+        return store.get_block_versions(course_key, **kwargs)
+
     def get_errored_courses(self):
         """
         Return a dictionary of course_dir -> [(msg, exception_str)], for each
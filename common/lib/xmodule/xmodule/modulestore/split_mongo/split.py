@@ -1439,6 +1439,24 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
             for block_id in items
         ]
 
+    def get_block_versions(self, course_key, **kwargs):
+        """
+        Return a map of the BlockKey of each block in the course to a tuple of the structure version of the
+        block's last edit and the BlockKeys of its children, without loading any of the blocks.
+        """
+        if not isinstance(course_key, CourseLocator) or course_key.deprecated:
+            # The supplied CourseKey is of the wrong type, so it can't possibly be stored in this modulestore.
+            raise ItemNotFoundError(course_key)
+
+        course = self._lookup_course(course_key)
+        return {
+            block_key: (
+                block_data.edit_info.update_version,
+                [BlockKey(*child) for child in block_data.fields.get('children', [])],
+            )
+            for block_key, block_data in course.structure['blocks'].iteritems()
+        }
+
     def get_course_index_info(self, course_key):
         """
         The index records the initial creation of the indexed course and tracks the current version
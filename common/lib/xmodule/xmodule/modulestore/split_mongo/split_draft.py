@@ -317,6 +317,10 @@ class DraftVersioningModuleStore(SplitMongoModuleStore, ModuleStoreDraftAndPubli
         course_key = self._map_revision_to_branch(course_key)
         return super(DraftVersioningModuleStore, self).get_orphans(course_key, **kwargs)
 
+    def get_block_versions(self, course_key, revision=None, **kwargs):
+        course_key = self._map_revision_to_branch(course_key, revision=revision)
+        return super(DraftVersioningModuleStore, self).get_block_versions(course_key, **kwargs)
+
     def fix_not_found(self, course_key, user_id):
         """
         Fix any children which point to non-existent blocks in the course's published and draft branches
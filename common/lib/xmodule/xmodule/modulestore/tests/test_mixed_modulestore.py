@@ -48,6 +48,7 @@ from xmodule.modulestore.draft_and_published import UnsupportedRevisionError, DI
 from xmodule.modulestore.exceptions import ItemNotFoundError, DuplicateCourseError, ReferentialIntegrityError, NoPathToItem
 from xmodule.modulestore.mixed import MixedModuleStore
 from xmodule.modulestore.search import path_to_location, navigation_index
+from xmodule.modulestore.split_mongo import BlockKey
 from xmodule.modulestore.store_utilities import DETACHED_XBLOCK_TYPES
 from xmodule.modulestore.tests.factories import check_mongo_calls, check_exact_number_of_calls, \
     mongo_uses_error_check
@@ -563,6 +564,34 @@ class TestMixedModuleStore(CommonMixedModuleStoreSetup):
         self.assertFalse(self.store.has_changes(test_course))
         self.assertFalse(self.store.has_changes(chapter))
 
+    @ddt.data(ModuleStoreEnum.Type.mongo, ModuleStoreEnum.Type.split)
+    def test_get_block_versions(self, default_ms):
+        """
+        Tests that get_block_versions() tracks the version of the last edit of each block
+        """
+        self.initdb(default_ms)
+        test_course = self.store.create_course('testx', 'GreekHero', 'test_run', self.user_id)
+        if default_ms == ModuleStoreEnum.Type.mongo:
+            with self.assertRaises(NotImplementedError):
+                self.store.get_block_versions(test_course.id)
+            return
+
+        chapter = self.store.create_child(self.user_id, test_course.location, 'chapter', block_id='test_chapter')
+        course_block_key = BlockKey.from_usage_key(test_course.location)
+        chapter_block_key = BlockKey.from_usage_key(chapter.location)
+
+        draft_only = ModuleStoreEnum.RevisionOption.draft_only
+        versions = self.store.get_block_versions(test_course.id, revision=draft_only)
+        self.assertEqual(versions[course_block_key][1], [chapter_block_key])
+        self.assertEqual(versions[chapter_block_key][1], [])
+
+        # Only the version of the changed block is updated
+        chapter.display_name = 'Changed Display Name'
+        self.store.update_item(chapter, self.user_id)
+        new_versions = self.store.get_block_versions(test_course.id, revision=draft_only)
+        self.assertEqual(new_versions[course_block_key][0], versions[course_block_key][0])
+        self.assertNotEqual(new_versions[chapter_block_key][0], versions[chapter_block_key][0])
+
     @ddt.data(ModuleStoreEnum.Type.mongo, ModuleStoreEnum.Type.split)
     def test_has_changes(self, default_ms):
         """
@@ -42,15 +42,7 @@ class BlockDepthTransformer(BlockStructureTransformer):
         """
         Mutates block_structure based on the given usage_info.
         """
-        for block_key in block_structure.topological_traversal():
-            parents = block_structure.get_parents(block_key)
-            if parents:
-                block_depth = min(
-                    self.get_block_depth(block_structure, parent_key)
-                    for parent_key in parents
-                ) + 1
-            else:
-                block_depth = 0
+        for block_key, block_depth in block_structure.get_block_depths():
             block_structure.set_transformer_block_field(
                 block_key,
                 self,
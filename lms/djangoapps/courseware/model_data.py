@@ -368,6 +368,21 @@ class UserStateCache(object):
         for user_state in block_field_state:
             self._cache[user_state.block_key] = user_state.state
 
+    def cache_student_modules(self, student_modules):
+        """
+        Load the user state of the supplied StudentModules of this cache's user
+        into this cache, without querying them again.
+
+        Arguments:
+            student_modules (list of :class:`StudentModule`): The rows to cache the state of.
+        """
+        for student_module in student_modules:
+            state = json.loads(student_module.state) if student_module.state else {}
+            # An empty state has been deleted, as for DjangoXBlockUserStateClient.get_many.
+            if state:
+                usage_key = student_module.module_state_key.map_into_course(student_module.course_id)
+                self._cache[usage_key] = state
+
     @contract(kvs_key=DjangoKeyValueStore.Key)
     def set(self, kvs_key, value):
         """
@@ -793,6 +808,27 @@ class FieldDataCache(object):
         cache.add_descriptor_descendents(descriptor, depth, descriptor_filter)
         return cache
 
+    @classmethod
+    def cache_for_student_module(cls, student_module, descriptor):
+        """
+        Returns a FieldDataCache of the descriptor, without its descendents, for
+        the student of the StudentModule of the descriptor, whose user state is
+        taken from the StudentModule rather than queried again.
+
+        student_module: the StudentModule of the descriptor, with its student.
+        descriptor: An XModuleDescriptor
+        """
+        cache = FieldDataCache([], student_module.course_id, student_module.student)
+        if cache.user.is_authenticated:
+            if descriptor.has_score:
+                cache.scorable_locations.add(descriptor.location)
+            for scope, fields in cache._fields_to_cache([descriptor]).items():
+                if scope == Scope.user_state:
+                    cache.cache[scope].cache_student_modules([student_module])
+                elif scope in cache.cache:
+                    cache.cache[scope].cache_fields(fields, [descriptor], cache.asides)
+        return cache
+
     def _fields_to_cache(self, descriptors):
         """
         Returns a map of scopes to fields in that scope that should be cached
@@ -988,6 +1024,33 @@ class ScoresClient(object):
         client.fetch_scores(scorable_locations)
         return client
 
+    @classmethod
+    def create_for_users(cls, course_id, user_ids, scorable_locations):
+        """
+        Create a ScoresClient for each of the given users, with data pre-fetched
+        for the given locations in a single query.
+
+        Returns a dict of user ids to their ScoresClient.
+        """
+        locations_to_scores = {user_id: {} for user_id in user_ids}
+        scores_qset = StudentModule.objects.filter(
+            student_id__in=list(locations_to_scores),
+            course_id=course_id,
+            module_state_key__in=set(scorable_locations),
+        )
+        for user_id, location, correct, total, created in scores_qset.values_list(
+                'student_id', 'module_state_key', 'grade', 'max_grade', 'created',
+        ):
+            locations_to_scores[user_id][location.map_into_course(course_id)] = cls.Score(correct, total, created)
+
+        clients = {}
+        for user_id, user_scores in locations_to_scores.iteritems():
+            client = cls(course_id, user_id)
+            client._locations_to_scores = user_scores  # pylint: disable=protected-access
+            client._has_fetched = True  # pylint: disable=protected-access
+            clients[user_id] = client
+        return clients
+
 
 # @contract(user_id=int, usage_key=UsageKey, score="number|None", max_score="number|None")
 def set_score(user_id, usage_key, score, max_score):
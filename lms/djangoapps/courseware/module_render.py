@@ -52,7 +52,7 @@ from openedx.core.djangoapps.crawlers.models import CrawlersConfig
 from openedx.core.djangoapps.credit.services import CreditService
 from openedx.core.djangoapps.monitoring_utils import set_custom_metrics_for_course_key, set_monitoring_transaction_name
 from openedx.core.djangoapps.util.user_utils import SystemUser
-from openedx.core.djangoapps.youngsphere.progress.models import CourseModuleCompletion
+from openedx.core.djangoapps.youngsphere.progress.signals import record_completion
 from openedx.core.lib.gating.services import GatingService
 from openedx.core.lib.license import wrap_with_license
 from openedx.core.lib.url_utils import quote_slashes, unquote_slashes
@@ -528,11 +528,7 @@ def get_module_system_for_user(
                 completion=event['completion'],
             )
 
-            CourseModuleCompletion.objects.get_or_create(
-                user_id=user.id,
-                course_id=course_id,
-                content_id=unicode(block.scope_ids.usage_id),
-            )
+            record_completion(user.id, unicode(course_id), unicode(block.scope_ids.usage_id))
 
     def handle_grade_event(block, event):
         """
@@ -565,11 +561,7 @@ def get_module_system_for_user(
             if requested_user_id != user.id:
                 log.warning("{} tried to submit a completion on behalf of {}".format(user, requested_user_id))
                 return
-            CourseModuleCompletion.objects.get_or_create(
-                user_id=user.id,
-                course_id=course_id,
-                content_id=unicode(descriptor.location)
-            )
+            record_completion(user.id, unicode(course_id), unicode(descriptor.location))
             # If blocks explicitly declare support for the new completion API,
             # we expect them to emit 'completion' events,
             # and we ignore the deprecated 'progress' events
@@ -274,7 +274,7 @@ class PartialDictMatcher(object):
         ])
 
 
-@patch('requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class SingleThreadTestCase(ForumsEnableMixin, ModuleStoreTestCase):
     shard = 4
 
@@ -389,7 +389,7 @@ class SingleThreadTestCase(ForumsEnableMixin, ModuleStoreTestCase):
 
 
 @ddt.ddt
-@patch('requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class SingleThreadQueryCountTestCase(ForumsEnableMixin, ModuleStoreTestCase):
     """
     Ensures the number of modulestore queries and number of sql queries are
@@ -474,7 +474,7 @@ class SingleThreadQueryCountTestCase(ForumsEnableMixin, ModuleStoreTestCase):
                     call_single_thread()
 
 
-@patch('requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class SingleCohortedThreadTestCase(CohortedTestCase):
     shard = 4
 
@@ -539,7 +539,7 @@ class SingleCohortedThreadTestCase(CohortedTestCase):
         self.assertRegexpMatches(html, r'"group_name": "student_cohort"')
 
 
-@patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class SingleThreadAccessTestCase(CohortedTestCase):
     shard = 4
 
@@ -628,7 +628,7 @@ class SingleThreadAccessTestCase(CohortedTestCase):
         self.assertEqual(resp.status_code, 200)
 
 
-@patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class SingleThreadGroupIdTestCase(CohortedTestCase, GroupIdAssertionMixin):
     shard = 4
     cs_endpoint = "/threads/dummy_thread_id"
@@ -676,7 +676,7 @@ class SingleThreadGroupIdTestCase(CohortedTestCase, GroupIdAssertionMixin):
         )
 
 
-@patch('requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class SingleThreadContentGroupTestCase(ForumsEnableMixin, UrlResetMixin, ContentGroupTestCase):
     shard = 4
 
@@ -787,7 +787,7 @@ class SingleThreadContentGroupTestCase(ForumsEnableMixin, UrlResetMixin, Content
         self.assert_can_access(self.beta_user, self.alpha_module.discussion_id, thread_id, True)
 
 
-@patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class InlineDiscussionContextTestCase(ForumsEnableMixin, ModuleStoreTestCase):
     shard = 4
 
@@ -825,7 +825,7 @@ class InlineDiscussionContextTestCase(ForumsEnableMixin, ModuleStoreTestCase):
         self.assertEqual(json_response['discussion_data'][0]['context'], ThreadContext.STANDALONE)
 
 
-@patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class InlineDiscussionGroupIdTestCase(
         CohortedTestCase,
         CohortedTopicGroupIdTestMixin,
@@ -877,7 +877,7 @@ class InlineDiscussionGroupIdTestCase(
         )
 
 
-@patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class ForumFormDiscussionGroupIdTestCase(CohortedTestCase, CohortedTopicGroupIdTestMixin):
     shard = 4
     cs_endpoint = "/threads"
@@ -924,7 +924,7 @@ class ForumFormDiscussionGroupIdTestCase(CohortedTestCase, CohortedTopicGroupIdT
         )
 
 
-@patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class UserProfileDiscussionGroupIdTestCase(CohortedTestCase, CohortedTopicGroupIdTestMixin):
     shard = 4
     cs_endpoint = "/active_threads"
@@ -1086,7 +1086,7 @@ class UserProfileDiscussionGroupIdTestCase(CohortedTestCase, CohortedTopicGroupI
         verify_group_id_not_present(profiled_user=self.moderator, pass_group_id=False)
 
 
-@patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class FollowedThreadsDiscussionGroupIdTestCase(CohortedTestCase, CohortedTopicGroupIdTestMixin):
     shard = 4
     cs_endpoint = "/subscribed_threads"
@@ -1124,7 +1124,7 @@ class FollowedThreadsDiscussionGroupIdTestCase(CohortedTestCase, CohortedTopicGr
         )
 
 
-@patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class InlineDiscussionTestCase(ForumsEnableMixin, ModuleStoreTestCase):
     shard = 4
 
@@ -1171,7 +1171,7 @@ class InlineDiscussionTestCase(ForumsEnableMixin, ModuleStoreTestCase):
         self.assertEqual(mock_request.call_args[1]['params']['context'], ThreadContext.STANDALONE)
 
 
-@patch('requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class UserProfileTestCase(ForumsEnableMixin, UrlResetMixin, ModuleStoreTestCase):
     shard = 4
 
@@ -1301,7 +1301,7 @@ class UserProfileTestCase(ForumsEnableMixin, UrlResetMixin, ModuleStoreTestCase)
         self.assertEqual(response.status_code, 405)
 
 
-@patch('requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class CommentsServiceRequestHeadersTestCase(ForumsEnableMixin, UrlResetMixin, ModuleStoreTestCase):
     shard = 4
 
@@ -1388,7 +1388,7 @@ class InlineDiscussionUnicodeTestCase(ForumsEnableMixin, SharedModuleStoreTestCa
     def setUp(self):
         super(InlineDiscussionUnicodeTestCase, self).setUp()
 
-    @patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+    @patch('lms.lib.comment_client.utils.send_request', autospec=True)
     def _test_unicode_data(self, text, mock_request):
         mock_request.side_effect = make_mock_request_impl(course=self.course, text=text)
         request = RequestFactory().get("dummy_url")
@@ -1422,7 +1422,7 @@ class ForumFormDiscussionUnicodeTestCase(ForumsEnableMixin, SharedModuleStoreTes
     def setUp(self):
         super(ForumFormDiscussionUnicodeTestCase, self).setUp()
 
-    @patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+    @patch('lms.lib.comment_client.utils.send_request', autospec=True)
     def _test_unicode_data(self, text, mock_request):
         mock_request.side_effect = make_mock_request_impl(course=self.course, text=text)
         request = RequestFactory().get("dummy_url")
@@ -1437,7 +1437,7 @@ class ForumFormDiscussionUnicodeTestCase(ForumsEnableMixin, SharedModuleStoreTes
 
 
 @ddt.ddt
-@patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class ForumDiscussionXSSTestCase(ForumsEnableMixin, UrlResetMixin, ModuleStoreTestCase):
     shard = 4
 
@@ -1512,7 +1512,7 @@ class ForumDiscussionSearchUnicodeTestCase(ForumsEnableMixin, SharedModuleStoreT
     def setUp(self):
         super(ForumDiscussionSearchUnicodeTestCase, self).setUp()
 
-    @patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+    @patch('lms.lib.comment_client.utils.send_request', autospec=True)
     def _test_unicode_data(self, text, mock_request):
         mock_request.side_effect = make_mock_request_impl(course=self.course, text=text)
         data = {
@@ -1549,7 +1549,7 @@ class SingleThreadUnicodeTestCase(ForumsEnableMixin, SharedModuleStoreTestCase,
     def setUp(self):
         super(SingleThreadUnicodeTestCase, self).setUp()
 
-    @patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+    @patch('lms.lib.comment_client.utils.send_request', autospec=True)
     def _test_unicode_data(self, text, mock_request):
         thread_id = "test_thread_id"
         mock_request.side_effect = make_mock_request_impl(course=self.course, text=text, thread_id=thread_id)
@@ -1583,7 +1583,7 @@ class UserProfileUnicodeTestCase(ForumsEnableMixin, SharedModuleStoreTestCase, U
     def setUp(self):
         super(UserProfileUnicodeTestCase, self).setUp()
 
-    @patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+    @patch('lms.lib.comment_client.utils.send_request', autospec=True)
     def _test_unicode_data(self, text, mock_request):
         mock_request.side_effect = make_mock_request_impl(course=self.course, text=text)
         request = RequestFactory().get("dummy_url")
@@ -1616,7 +1616,7 @@ class FollowedThreadsUnicodeTestCase(ForumsEnableMixin, SharedModuleStoreTestCas
     def setUp(self):
         super(FollowedThreadsUnicodeTestCase, self).setUp()
 
-    @patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+    @patch('lms.lib.comment_client.utils.send_request', autospec=True)
     def _test_unicode_data(self, text, mock_request):
         mock_request.side_effect = make_mock_request_impl(course=self.course, text=text)
         request = RequestFactory().get("dummy_url")
@@ -1644,7 +1644,7 @@ class EnrollmentTestCase(ForumsEnableMixin, ModuleStoreTestCase):
         self.student = UserFactory.create()
 
     @patch.dict("django.conf.settings.FEATURES", {"ENABLE_DISCUSSION_SERVICE": True})
-    @patch('lms.lib.comment_client.utils.requests.request', autospec=True)
+    @patch('lms.lib.comment_client.utils.send_request', autospec=True)
     def test_unenrolled(self, mock_request):
         mock_request.side_effect = make_mock_request_impl(course=self.course, text='dummy')
         request = RequestFactory().get('dummy_url')
@@ -1653,7 +1653,7 @@ class EnrollmentTestCase(ForumsEnableMixin, ModuleStoreTestCase):
             views.forum_form_discussion(request, course_id=text_type(self.course.id))
 
 
-@patch('requests.request', autospec=True)
+@patch('lms.lib.comment_client.utils.send_request', autospec=True)
 class EnterpriseConsentTestCase(EnterpriseTestConsentRequired, ForumsEnableMixin, UrlResetMixin, ModuleStoreTestCase):
     """
     Ensure that the Enterprise Data Consent redirects are in place only when consent is required.
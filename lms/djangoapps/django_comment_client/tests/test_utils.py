@@ -1823,7 +1823,7 @@ class ClientConfigurationTestCase(TestCase):
         with self.assertRaises(CommentClientMaintenanceError):
             perform_request('GET', 'http://www.google.com')
 
-    @patch('requests.request')
+    @patch('lms.lib.comment_client.utils.send_request')
     def test_enabled(self, mock_request):
         """Ensures that requests proceed normally when forums are enabled."""
         config = ForumsConfig.current()
@@ -0,0 +1,207 @@
+"""
+Bulk Course Grade Factory Class
+"""
+from collections import OrderedDict
+from logging import getLogger
+
+from six import text_type
+
+from courseware.model_data import ScoresClient
+from openedx.core.djangoapps.signals.signals import COURSE_GRADE_CHANGED, COURSE_GRADE_NOW_PASSED
+from student.models import anonymous_id_for_user
+from submissions.models import ScoreSummary
+
+from .config import should_persist_grades
+from .course_data import CourseData
+from .course_grade import CourseGrade
+from .course_grade_factory import CourseGradeFactory
+from .models import PersistentCourseGrade
+from .scores import possibly_scored
+from .subsection_grade import CreateSubsectionGrade
+from .subsection_grade_factory import SubsectionGradeFactory
+
+log = getLogger(__name__)
+
+
+class BulkCourseGradeFactory(object):
+    """
+    Factory class to compute and save the Course Grades of a batch of users.
+
+    Unlike CourseGradeFactory, which queries the scores of each user on its
+    own, the scores of all the users of the batch are read in a few
+    set-based queries, the grades of all the users are computed against the
+    same collected course structure, and the subsection and course grades
+    of the batch are saved in bulk.
+    """
+    def update(self, users, course=None, collected_block_structure=None, course_key=None):
+        """
+        Computes and saves the course grades of the given users, along with
+        all of their subsection grades, and yields a
+        CourseGradeFactory.GradeResult for every user.
+
+        At least one of course, collected_block_structure, or course_key
+        should be provided.
+        """
+        users = list(users)
+        course_data = CourseData(
+            user=None, course=course, collected_block_structure=collected_block_structure, course_key=course_key,
+        )
+        scorable_locations = [
+            block_key for block_key in course_data.collected_structure if possibly_scored(block_key)
+        ]
+        csm_scores = ScoresClient.create_for_users(
+            course_data.course_key, [user.id for user in users], scorable_locations,
+        )
+        submissions_scores = _get_submissions_scores(course_data.course_key, users)
+
+        results = [
+            self._compute(user, course_data, csm_scores[user.id], submissions_scores[user.id])
+            for user in users
+        ]
+        course_grades = [result.course_grade for result in results if result.error is None]
+        self._save(course_data, course_grades)
+        for course_grade in course_grades:
+            self._send_signals(course_grade)
+        for result in results:
+            yield result
+
+    @staticmethod
+    def _compute(user, course_data, csm_scores, submissions_scores):
+        """
+        Computes the CourseGrade of the given user from the given scores,
+        without saving it, and returns a CourseGradeFactory.GradeResult.
+        """
+        try:
+            user_course_data = CourseData(
+                user,
+                course=course_data.course,
+                collected_block_structure=course_data.collected_structure,
+                course_key=course_data.course_key,
+            )
+            course_grade = CourseGrade(
+                user,
+                user_course_data,
+                force_update_subsections=True,
+                subsection_grade_factory=_BulkSubsectionGradeFactory(
+                    user, user_course_data, csm_scores, submissions_scores,
+                ),
+            )
+            return CourseGradeFactory.GradeResult(user, course_grade.update(), None)
+        except Exception as exc:  # pylint: disable=broad-except
+            # Keep marching on even if this student couldn't be graded for
+            # some reason, but log it for future reference.
+            log.exception(
+                'Cannot grade student %s in course %s because of exception: %s',
+                user.id,
+                course_data.course_key,
+                text_type(exc)
+            )
+            return CourseGradeFactory.GradeResult(user, None, exc)
+
+    @staticmethod
+    def _save(course_data, course_grades):
+        """
+        Saves the given course grades, along with their subsection grades,
+        in bulk.
+        """
+        if not should_persist_grades(course_data.course_key):
+            return
+
+        CreateSubsectionGrade.bulk_update_or_create_models(
+            [
+                (course_grade.user, course_grade._subsection_grade_factory.subsection_grades.values())  # pylint: disable=protected-access
+                for course_grade in course_grades
+            ],
+            course_data.course_key,
+            force_update_subsections=True,
+        )
+        PersistentCourseGrade.bulk_update_or_create(
+            course_data.course_key,
+            [
+                dict(
+                    user_id=course_grade.user.id,
+                    course_version=course_grade.course_data.version,
+                    course_edited_timestamp=course_grade.course_data.edited_on,
+                    grading_policy_hash=course_grade.course_data.grading_policy_hash,
+                    percent_grade=course_grade.percent,
+                    letter_grade=course_grade.letter_grade or "",
+                    passed=course_grade.passed,
+                )
+                for course_grade in course_grades
+                if course_grade.attempted
+            ],
+        )
+
+    @staticmethod
+    def _send_signals(course_grade):
+        """
+        Sends a COURSE_GRADE_CHANGED signal to listeners for the given
+        course grade, and a COURSE_GRADE_NOW_PASSED if the learner has
+        passed the course.
+        """
+        course_data = course_grade.course_data
+        COURSE_GRADE_CHANGED.send_robust(
+            sender=None,
+            user=course_grade.user,
+            course_grade=course_grade,
+            course_key=course_data.course_key,
+            deadline=course_data.course.end,
+        )
+        if course_grade.passed:
+            COURSE_GRADE_NOW_PASSED.send(
+                sender=CourseGradeFactory,
+                user=course_grade.user,
+                course_id=course_data.course_key,
+            )
+
+        log.info(
+            u'Grades: Bulk Update, %s, User: %s, %s',
+            course_data.full_string(), course_grade.user.id, course_grade,
+        )
+
+
+class _BulkSubsectionGradeFactory(SubsectionGradeFactory):
+    """
+    Factory for the Subsection Grades of a student, computed from the
+    scores prefetched for a batch of students and left unsaved, to be
+    saved in bulk.
+    """
+    def __init__(self, student, course_data, csm_scores, submissions_scores):
+        super(_BulkSubsectionGradeFactory, self).__init__(student, course_data=course_data)
+        self._csm_scores = csm_scores
+        self._submissions_scores = submissions_scores
+        self.subsection_grades = OrderedDict()
+
+    def update(self, subsection, only_if_higher=None, score_deleted=False, force_update_subsections=False, persist_grade=True):  # pylint: disable=unused-argument
+        """
+        Computes and returns the SubsectionGrade object for the student
+        and subsection, without saving it.
+        """
+        subsection_grade = super(_BulkSubsectionGradeFactory, self).update(subsection, persist_grade=False)
+        self.subsection_grades[subsection_grade.location] = subsection_grade
+        return subsection_grade
+
+
+def _get_submissions_scores(course_key, users):
+    """
+    Returns a dict of the ids of the given users to their scores stored by
+    the Submissions API for the course, in the format returned by
+    submissions.api.get_scores, read in a single query.
+    """
+    user_ids = {anonymous_id_for_user(user, course_key, save=False): user.id for user in users}
+    scores = {user.id: {} for user in users}
+    score_summaries = ScoreSummary.objects.filter(
+        student_item__course_id=text_type(course_key),
+        student_item__student_id__in=list(user_ids),
+    ).select_related('latest', 'student_item')
+    for score_summary in score_summaries:
+        score = score_summary.latest
+        # Hidden scores are the ones reset by the Submissions API.
+        if not score.is_hidden():
+            student_item = score_summary.student_item
+            scores[user_ids[student_item.student_id]][student_item.item_id] = {
+                'points_earned': score.points_earned,
+                'points_possible': score.points_possible,
+                'created_at': score.created_at,
+            }
+    return scores
@@ -242,8 +242,11 @@ class CourseGrade(CourseGradeBase):
     Course Grade class when grades are updated or read from storage.
     """
     def __init__(self, user, course_data, *args, **kwargs):
+        subsection_grade_factory = kwargs.pop('subsection_grade_factory', None)
         super(CourseGrade, self).__init__(user, course_data, *args, **kwargs)
-        self._subsection_grade_factory = SubsectionGradeFactory(user, course_data=course_data)
+        self._subsection_grade_factory = (
+            subsection_grade_factory or SubsectionGradeFactory(user, course_data=course_data)
+        )
 
     def update(self):
         """
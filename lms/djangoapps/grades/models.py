@@ -11,10 +11,10 @@ persisted, course grades are also immune to changes in course content.
 import json
 import logging
 from base64 import b64encode
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 from hashlib import sha1
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.utils.timezone import now
 from lazy import lazy
 from model_utils.models import TimeStampedModel
@@ -37,6 +37,29 @@ BLOCK_RECORD_LIST_VERSION = 1
 BlockRecord = namedtuple('BlockRecord', ['locator', 'weight', 'raw_possible', 'graded'])
 
 
+def _bulk_create_new(model_class, objects):
+    """
+    Bulk creates the given objects and returns the ones created, leaving out
+    the ones which rows were created concurrently by another process.
+
+    Django 1.11 has no bulk_create(ignore_conflicts=True). When the batch
+    conflicts with existing rows, the objects are created one at a time,
+    each in its own savepoint.
+    """
+    try:
+        with transaction.atomic():
+            return model_class.objects.bulk_create(objects)
+    except IntegrityError:
+        created = []
+        for obj in objects:
+            try:
+                with transaction.atomic():
+                    created.extend(model_class.objects.bulk_create([obj]))
+            except IntegrityError:
+                pass
+        return created
+
+
 class BlockRecordList(tuple):
     """
     An immutable ordered list of BlockRecord objects.
@@ -220,8 +243,45 @@ class VisibleBlocks(models.Model):
         only for those that aren't already created.
         """
         cached_records = cls.bulk_read(user_id, course_key)
-        non_existent_brls = {brl.hash_value for brl in block_record_lists if brl.hash_value not in cached_records}
-        cls.bulk_create(user_id, course_key, non_existent_brls)
+        non_existent_brls = {
+            brl.hash_value: brl for brl in block_record_lists if brl.hash_value not in cached_records
+        }
+        cls.bulk_create(user_id, course_key, non_existent_brls.values())
+
+    @classmethod
+    def bulk_get_or_create_for_users(cls, user_ids, course_key, block_record_lists):
+        """
+        Bulk creates VisibleBlocks for the given iterator of
+        BlockRecordList objects for the given course_key, but only for
+        those that aren't already created by any user, and initializes
+        the VisibleBlocks cache of each of the given users with them.
+        """
+        block_record_lists = {brl.hash_value: brl for brl in block_record_lists}
+        visible_blocks = {
+            visible_block.hashed: visible_block
+            for visible_block in cls.objects.filter(hashed__in=list(block_record_lists))
+        }
+        created = _bulk_create_new(cls, [
+            VisibleBlocks(
+                blocks_json=brl.json_value,
+                hashed=hash_value,
+                course_id=course_key,
+            )
+            for hash_value, brl in block_record_lists.iteritems()
+            if hash_value not in visible_blocks
+        ])
+        visible_blocks.update({visible_block.hashed: visible_block for visible_block in created})
+        # the ones created meanwhile by other processes
+        missing_hashes = [hash_value for hash_value in block_record_lists if hash_value not in visible_blocks]
+        if missing_hashes:
+            visible_blocks.update({
+                visible_block.hashed: visible_block
+                for visible_block in cls.objects.filter(hashed__in=missing_hashes)
+            })
+
+        cache = get_cache(cls._CACHE_NAMESPACE)
+        for user_id in user_ids:
+            cache[cls._cache_key(user_id, course_key)] = dict(visible_blocks)
 
     @classmethod
     def _initialize_cache(cls, user_id, course_key):
@@ -420,6 +480,97 @@ class PersistentSubsectionGrade(TimeStampedModel):
             cls._emit_grade_calculated_event(grade)
         return grades
 
+    @classmethod
+    def bulk_update_or_create_grades(cls, grade_params_iter, course_key):
+        """
+        Bulk creation or update of grades of any number of users in the
+        given course. Grades that are saved with the same values are left
+        untouched.
+        """
+        grade_params_by_user = defaultdict(list)
+        for params in grade_params_iter:
+            grade_params_by_user[params['user_id']].append(params)
+        if not grade_params_by_user:
+            return
+
+        saved_grades = {
+            (grade.user_id, grade.full_usage_key): grade
+            for grade in cls.objects.select_related('override').filter(
+                user_id__in=list(grade_params_by_user),
+                course_id=course_key,
+            )
+        }
+        VisibleBlocks.bulk_get_or_create_for_users(
+            grade_params_by_user.keys(),
+            course_key,
+            [
+                BlockRecordList.from_list(params['visible_blocks'], course_key)
+                for user_grade_params in grade_params_by_user.itervalues()
+                for params in user_grade_params
+            ],
+        )
+
+        for user_id, user_grade_params in grade_params_by_user.iteritems():
+            new_grade_params = []
+            for params in user_grade_params:
+                saved_grade = saved_grades.get((user_id, params['usage_key']))
+                if saved_grade is None:
+                    new_grade_params.append(params)
+                else:
+                    cls._update_saved_grade(saved_grade, params)
+            if new_grade_params:
+                cls._bulk_create_new_grades(new_grade_params, user_id, course_key)
+
+    @classmethod
+    def _bulk_create_new_grades(cls, grade_params_iter, user_id, course_key):
+        """
+        Bulk creates the given grades of a user, updating the ones created
+        meanwhile by another process instead.
+        """
+        grade_params_by_usage_key = {params['usage_key']: dict(params) for params in grade_params_iter}
+
+        # the visible blocks were created for all the users by bulk_update_or_create_grades
+        PersistentSubsectionGradeOverride.prefetch(user_id, course_key)
+        map(cls._prepare_params, grade_params_iter)
+        map(cls._prepare_params_visible_blocks_id, grade_params_iter)
+        map(cls._prepare_params_override, grade_params_iter)
+
+        created = _bulk_create_new(cls, [PersistentSubsectionGrade(**params) for params in grade_params_iter])
+        for grade in created:
+            cls._emit_grade_calculated_event(grade)
+            del grade_params_by_usage_key[grade.usage_key]
+
+        if grade_params_by_usage_key:
+            saved_grades = cls.objects.select_related('override').filter(
+                user_id=user_id,
+                course_id=course_key,
+                usage_key__in=list(grade_params_by_usage_key),
+            )
+            for saved_grade in saved_grades:
+                cls._update_saved_grade(saved_grade, grade_params_by_usage_key[saved_grade.full_usage_key])
+
+    @classmethod
+    def _update_saved_grade(cls, grade, params):
+        """
+        Updates the given saved grade with the given parameters, if any
+        of its values changed.
+        """
+        cls._prepare_params(params)
+        cls._prepare_params_visible_blocks_id(params)
+        cls._apply_override(params, grade.override if hasattr(grade, 'override') else None)
+
+        first_attempted = params.pop('first_attempted')
+        for field_name in ('user_id', 'usage_key', 'course_id'):
+            params.pop(field_name)
+        if first_attempted is not None and grade.first_attempted is None:
+            params['first_attempted'] = first_attempted
+
+        if any(getattr(grade, field_name) != value for field_name, value in params.iteritems()):
+            for field_name, value in params.iteritems():
+                setattr(grade, field_name, value)
+            grade.save()
+            cls._emit_grade_calculated_event(grade)
+
     @classmethod
     def _prepare_params(cls, params):
         """
@@ -446,6 +597,14 @@ class PersistentSubsectionGrade(TimeStampedModel):
     @classmethod
     def _prepare_params_override(cls, params):
         override = PersistentSubsectionGradeOverride.get_override(params['user_id'], params['usage_key'])
+        cls._apply_override(params, override)
+
+    @staticmethod
+    def _apply_override(params, override):
+        """
+        Applies the values of the given override, if any, to the fields
+        of the grade record.
+        """
         if override:
             if override.earned_all_override is not None:
                 params['earned_all'] = override.earned_all_override
@@ -573,6 +732,66 @@ class PersistentCourseGrade(TimeStampedModel):
         cls._update_cache(course_id, user_id, grade)
         return grade
 
+    @classmethod
+    def bulk_update_or_create(cls, course_id, grade_params_iter):
+        """
+        Creates or updates the course grades of any number of users in
+        the given course, given their parameters (with user_id). Grades
+        that are saved with the same values are left untouched.
+        """
+        grade_params_by_user = {params['user_id']: params for params in grade_params_iter}
+        if not grade_params_by_user:
+            return
+
+        saved_grades = {
+            grade.user_id: grade
+            for grade in cls.objects.filter(user_id__in=list(grade_params_by_user), course_id=course_id)
+        }
+
+        new_grades = {}
+        prepared_params = {}
+        for user_id, params in grade_params_by_user.iteritems():
+            params = dict(params)
+            passed = params.pop('passed')
+            params.pop('user_id')
+            if params.get('course_version', None) is None:
+                params['course_version'] = ""
+            prepared_params[user_id] = (params, passed)
+
+            grade = saved_grades.get(user_id)
+            if grade is None:
+                grade = cls(user_id=user_id, course_id=course_id, **params)
+                if passed:
+                    grade.passed_timestamp = now()
+                new_grades[user_id] = grade
+            else:
+                cls._update_saved_grade(grade, params, passed)
+
+        for grade in _bulk_create_new(cls, new_grades.values()):
+            cls._emit_grade_calculated_event(grade)
+            cls._update_cache(course_id, grade.user_id, grade)
+            del new_grades[grade.user_id]
+
+        # the grades created meanwhile by other processes
+        if new_grades:
+            for grade in cls.objects.filter(user_id__in=list(new_grades), course_id=course_id):
+                cls._update_saved_grade(grade, *prepared_params[grade.user_id])
+
+    @classmethod
+    def _update_saved_grade(cls, grade, params, passed):
+        """
+        Updates the given saved grade with the given parameters, if any
+        of its values changed.
+        """
+        if passed and not grade.passed_timestamp:
+            params['passed_timestamp'] = now()
+        if any(getattr(grade, field_name) != value for field_name, value in params.iteritems()):
+            for field_name, value in params.iteritems():
+                setattr(grade, field_name, value)
+            grade.save()
+            cls._emit_grade_calculated_event(grade)
+        cls._update_cache(grade.course_id, grade.user_id, grade)
+
     @classmethod
     def _update_cache(cls, course_id, user_id, grade):
         course_cache = get_cache(cls._CACHE_NAMESPACE).get(cls._cache_key(course_id))
@@ -1,6 +1,7 @@
 """
 Grades related signals.
 """
+import threading
 from contextlib import contextmanager
 from logging import getLogger
 
@@ -25,16 +26,22 @@ from .signals import (
 )
 from .. import events
 from ..constants import ScoreDatabaseTableEnum
+from ..config.waffle import COALESCE_SUBSECTION_GRADE_RECALCULATIONS, waffle
 from ..course_grade_factory import CourseGradeFactory
 from ..scores import weighted_score
 from ..tasks import (
+    COALESCED_RECALCULATE_GRADE_DELAY_SECONDS,
     RECALCULATE_GRADE_DELAY_SECONDS,
+    coalesce_subsection_grade_recalculation,
     recalculate_subsection_grade_v3,
     recalculate_course_and_subsection_grades_for_user
 )
 
 log = getLogger(__name__)
 
+# Subsection updates collected by defer_subsection_updates in the current thread
+_deferred_subsection_updates = threading.local()
+
 
 @receiver(score_set)
 def submissions_score_set_handler(sender, **kwargs):  # pylint: disable=unused-argument
@@ -129,6 +136,22 @@ def disconnect_submissions_signal_receiver(signal):
         signal.connect(handler)
 
 
+@contextmanager
+def defer_subsection_updates():
+    """
+    Context manager within which the subsection updates of changed scores
+    aren't enqueued, but appended to the yielded list as the kwargs of their
+    recalculate_subsection_grade_v3 tasks, for the caller to recalculate the
+    grades of many users at once.
+    """
+    deferred_updates = []
+    _deferred_subsection_updates.task_kwargs = deferred_updates
+    try:
+        yield deferred_updates
+    finally:
+        _deferred_subsection_updates.task_kwargs = None
+
+
 @receiver(SCORE_PUBLISHED)
 def score_published_handler(sender, block, user, raw_earned, raw_possible, only_if_higher, **kwargs):  # pylint: disable=unused-argument
     """
@@ -213,21 +236,34 @@ def enqueue_subsection_update(sender, **kwargs):  # pylint: disable=unused-argum
     enqueueing a subsection update operation to occur asynchronously.
     """
     events.grade_updated(**kwargs)
-    recalculate_subsection_grade_v3.apply_async(
-        kwargs=dict(
-            user_id=kwargs['user_id'],
-            anonymous_user_id=kwargs.get('anonymous_user_id'),
-            course_id=kwargs['course_id'],
-            usage_id=kwargs['usage_id'],
-            only_if_higher=kwargs.get('only_if_higher'),
-            expected_modified_time=to_timestamp(kwargs['modified']),
-            score_deleted=kwargs.get('score_deleted', False),
-            event_transaction_id=unicode(get_event_transaction_id()),
-            event_transaction_type=unicode(get_event_transaction_type()),
-            score_db_table=kwargs['score_db_table'],
-        ),
-        countdown=RECALCULATE_GRADE_DELAY_SECONDS,
+    task_kwargs = dict(
+        user_id=kwargs['user_id'],
+        anonymous_user_id=kwargs.get('anonymous_user_id'),
+        course_id=kwargs['course_id'],
+        usage_id=kwargs['usage_id'],
+        only_if_higher=kwargs.get('only_if_higher'),
+        expected_modified_time=to_timestamp(kwargs['modified']),
+        score_deleted=kwargs.get('score_deleted', False),
+        event_transaction_id=unicode(get_event_transaction_id()),
+        event_transaction_type=unicode(get_event_transaction_type()),
+        score_db_table=kwargs['score_db_table'],
     )
+    deferred_updates = getattr(_deferred_subsection_updates, 'task_kwargs', None)
+    if deferred_updates is not None:
+        deferred_updates.append(task_kwargs)
+        return
+
+    countdown = RECALCULATE_GRADE_DELAY_SECONDS
+    if waffle().is_enabled(COALESCE_SUBSECTION_GRADE_RECALCULATIONS):
+        # Debounce the recalculations of the same user and subsections, so that
+        # only the last one enqueued within the window is executed.
+        try:
+            task_kwargs = coalesce_subsection_grade_recalculation(dict(task_kwargs))
+            countdown = COALESCED_RECALCULATE_GRADE_DELAY_SECONDS
+        except Exception:  # pylint: disable=broad-except
+            # The recalculation is enqueued on its own rather than failing the score change.
+            log.exception(u"Grades: couldn't coalesce the subsection grade recalculation {}".format(task_kwargs))
+    recalculate_subsection_grade_v3.apply_async(kwargs=task_kwargs, countdown=countdown)
 
 
 @receiver(SUBSECTION_SCORE_CHANGED)
@@ -2,7 +2,10 @@
 This module contains tasks for asynchronous execution of grade updates.
 """
 
+import hashlib
+from collections import OrderedDict
 from logging import getLogger
+from uuid import uuid4
 
 import six
 from celery import task
@@ -10,6 +13,7 @@ from celery_utils.persist_on_failure import LoggedPersistOnFailureTask
 from courseware.model_data import get_score
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db.utils import DatabaseError
 from lms.djangoapps.course_blocks.api import get_course_blocks
@@ -23,6 +27,7 @@ from track.event_transaction_utils import set_event_transaction_id, set_event_tr
 from util.date_utils import from_timestamp
 from xmodule.modulestore.django import modulestore
 
+from .bulk_course_grade_factory import BulkCourseGradeFactory
 from .config.waffle import DISABLE_REGRADE_ON_POLICY_CHANGE, waffle
 from .constants import ScoreDatabaseTableEnum
 from .course_grade_factory import CourseGradeFactory
@@ -41,6 +46,8 @@ KNOWN_RETRY_ERRORS = (  # Errors we expect occasionally, should be resolved on r
     DatabaseNotReadyError,
 )
 RECALCULATE_GRADE_DELAY_SECONDS = 2  # to prevent excessive _has_db_updated failures. See TNL-6424.
+COALESCED_RECALCULATE_GRADE_DELAY_SECONDS = 10  # quiet window during which pending recalculations are coalesced
+COALESCING_TIMEOUT_SECONDS = 60 * 60
 RETRY_DELAY_SECONDS = 40
 SUBSECTION_GRADE_TIMEOUT_SECONDS = 300
 
@@ -108,9 +115,9 @@ def compute_grades_for_course(course_key, offset, batch_size, **kwargs):  # pyli
     offset.
     """
     course_key = CourseKey.from_string(course_key)
-    enrollments = CourseEnrollment.objects.filter(course_id=course_key).order_by('created')
-    student_iter = (enrollment.user for enrollment in enrollments[offset:offset + batch_size])
-    for result in CourseGradeFactory().iter(users=student_iter, course_key=course_key, force_update=True):
+    enrollments = CourseEnrollment.objects.filter(course_id=course_key).order_by('created').select_related('user')
+    students = [enrollment.user for enrollment in enrollments[offset:offset + batch_size]]
+    for result in BulkCourseGradeFactory().update(users=students, course_key=course_key):
         if result.error is not None:
             raise result.error
 
@@ -185,6 +192,15 @@ def _recalculate_subsection_grade(self, **kwargs):
             event at the root of the current event transaction.
         score_db_table (ScoreDatabaseTableEnum): database table that houses
             the changed score. Used in conjunction with expected_modified_time.
+        coalescing_key (string, OPTIONAL): cache key of the pending
+            recalculations for the same user and subsections. See
+            coalesce_subsection_grade_recalculation.
+        coalescing_id (string, OPTIONAL): uuid identifying the task among the
+            pending recalculations of its coalescing_key.
+        coalesced_score_deleted (boolean, OPTIONAL): whether the score of
+            any of the coalesced recalculations was deleted, which the
+            grades are persisted as. score_deleted still only applies to
+            the score of the task's own block.
     """
     try:
         course_key = CourseLocator.from_string(kwargs['course_id'])
@@ -193,6 +209,11 @@ def _recalculate_subsection_grade(self, **kwargs):
         set_custom_metrics_for_course_key(course_key)
         set_custom_metric('usage_id', unicode(scored_block_usage_key))
 
+        if 'coalescing_key' in kwargs and _is_recalculation_superseded(**kwargs):
+            set_custom_metric('recalculate_subsection_grade_coalesced', True)
+            log.debug(u"Grades: recalculation superseded by a more recent one. Kwargs: {}".format(kwargs))
+            return
+
         # The request cache is not maintained on celery workers,
         # where this code runs. So we take the values from the
         # main request cache and store them in the local request
@@ -205,7 +226,7 @@ def _recalculate_subsection_grade(self, **kwargs):
         # created. This race condition occurs if the transaction in the task
         # creator's process hasn't committed before the task initiates in the worker
         # process.
-        has_database_updated = _has_db_updated_with_new_score(self, scored_block_usage_key, **kwargs)
+        has_database_updated = _has_db_updated_with_new_score(self.request.id, scored_block_usage_key, **kwargs)
 
         if not has_database_updated:
             raise DatabaseNotReadyError
@@ -215,7 +236,7 @@ def _recalculate_subsection_grade(self, **kwargs):
             scored_block_usage_key,
             kwargs['only_if_higher'],
             kwargs['user_id'],
-            kwargs['score_deleted'],
+            kwargs.get('coalesced_score_deleted', kwargs['score_deleted']),
         )
     except Exception as exc:
         if not isinstance(exc, KNOWN_RETRY_ERRORS):
@@ -227,7 +248,103 @@ def _recalculate_subsection_grade(self, **kwargs):
         raise self.retry(kwargs=kwargs, exc=exc)
 
 
-def _has_db_updated_with_new_score(self, scored_block_usage_key, **kwargs):
+def coalesce_subsection_grade_recalculation(task_kwargs):
+    """
+    Registers the given kwargs of a recalculate_subsection_grade_v3 task as
+    the latest pending recalculation for its user and the subsections of its
+    scored block, and updates them with the key and the id that identify the
+    task as such.
+
+    Pending recalculations for the same user and subsections that were
+    enqueued before the task are superseded by it, and skipped when they
+    execute. Since the task recalculates the grades of the subsections from
+    the latest scores, it covers the score changes of the superseded ones,
+    and its only_if_higher and coalesced_score_deleted kwargs are merged
+    with theirs.
+    """
+    cache_key = _coalescing_cache_key(task_kwargs['user_id'], task_kwargs['course_id'], task_kwargs['usage_id'])
+    task_kwargs['coalesced_score_deleted'] = task_kwargs['score_deleted']
+    pending_recalculation = cache.get(cache_key)
+    if pending_recalculation is not None:
+        set_custom_metric('recalculate_subsection_grade_superseded_pending', True)
+        # Only update the grades if higher when all of the coalesced
+        # score changes did, and persist them as for a deleted score
+        # when any of them was.
+        if not pending_recalculation['only_if_higher']:
+            task_kwargs['only_if_higher'] = pending_recalculation['only_if_higher']
+        if pending_recalculation['score_deleted']:
+            task_kwargs['coalesced_score_deleted'] = True
+
+    task_kwargs['coalescing_key'] = cache_key
+    task_kwargs['coalescing_id'] = unicode(uuid4())
+    cache.set(
+        cache_key,
+        {
+            'coalescing_id': task_kwargs['coalescing_id'],
+            'only_if_higher': task_kwargs['only_if_higher'],
+            'score_deleted': task_kwargs['coalesced_score_deleted'],
+        },
+        COALESCING_TIMEOUT_SECONDS,
+    )
+    return task_kwargs
+
+
+def _is_recalculation_superseded(**kwargs):
+    """
+    Returns whether the recalculation of the given kwargs was superseded by
+    a more recently enqueued one, for the same user and subsections.
+    Otherwise, the recalculation is no longer pending.
+    """
+    cache_key = kwargs['coalescing_key']
+    pending_recalculation = cache.get(cache_key)
+    if pending_recalculation is not None and pending_recalculation['coalescing_id'] != kwargs['coalescing_id']:
+        return True
+
+    # A recalculation enqueued concurrently with this deletion is not
+    # coalesced with this one, and executes on its own.
+    cache.delete(cache_key)
+    return False
+
+
+def _coalescing_cache_key(user_id, course_id, usage_id):
+    """
+    Returns the cache key of the pending recalculation for the given user
+    and the subsection of the given block, as found from the parents of the
+    block in the modulestore, so that the structure of the course isn't
+    loaded in the request.
+
+    A block outside of any subsection, or whose subsection can't be found,
+    is only coalesced with itself.
+    """
+    course_key = CourseKey.from_string(course_id)
+    usage_key = UsageKey.from_string(usage_id).replace(course_key=course_key)
+    try:
+        subsection_key = _get_subsection_key(usage_key)
+    except Exception:  # pylint: disable=broad-except
+        log.exception(u"Grades: couldn't find the subsection of block {} to coalesce its recalculations".format(
+            usage_key
+        ))
+        subsection_key = None
+    return u'grades.recalculate_subsection_grade.{}.{}.{}'.format(
+        user_id, course_id, hashlib.sha1(unicode(subsection_key or usage_key).encode('utf-8')).hexdigest(),
+    )
+
+
+def _get_subsection_key(usage_key):
+    """
+    Returns the key of the subsection (sequential) containing the given
+    block, walking up its parents in the modulestore, or None.
+    """
+    store = modulestore()
+    location = usage_key
+    while location is not None:
+        if location.block_type == 'sequential':
+            return location
+        location = store.get_parent_location(location)
+    return None
+
+
+def _has_db_updated_with_new_score(task_id, scored_block_usage_key, **kwargs):
     """
     Returns whether the database has been updated with the
     expected new score values for the given problem and user.
@@ -266,7 +383,7 @@ def _has_db_updated_with_new_score(self, scored_block_usage_key, **kwargs):
         log.info(
             u"Grades: tasks._has_database_updated_with_new_score is False. Task ID: {}. Kwargs: {}. Found "
             u"modified time: {}".format(
-                self.request.id,
+                task_id,
                 kwargs,
                 found_modified_time,
             )
@@ -275,6 +392,59 @@ def _has_db_updated_with_new_score(self, scored_block_usage_key, **kwargs):
     return db_is_updated
 
 
+def recalculate_subsection_grades(course_key, task_kwargs_list):
+    """
+    Recalculates in the current process the subsection grades of the given
+    kwargs of recalculate_subsection_grade_v3 tasks of the course, as
+    collected by defer_subsection_updates.
+
+    The kwargs are grouped by user, and each subsection of a user is
+    recalculated once for all of the user's changed scores in it. The
+    recalculations of a user whose scores aren't saved yet, or that fail,
+    are enqueued as recalculate_subsection_grade_v3 tasks instead, to be
+    retried.
+
+    Returns the number of users whose recalculations were enqueued.
+    """
+    task_kwargs_by_user = OrderedDict()
+    for task_kwargs in task_kwargs_list:
+        task_kwargs_by_user.setdefault(task_kwargs['user_id'], []).append(task_kwargs)
+    students = User.objects.in_bulk(task_kwargs_by_user.keys())
+
+    enqueued_count = 0
+    store = modulestore()
+    with store.bulk_operations(course_key):
+        course = store.get_course(course_key, depth=0)
+        for user_id, user_task_kwargs in task_kwargs_by_user.iteritems():
+            try:
+                scored_blocks = []
+                for task_kwargs in user_task_kwargs:
+                    scored_block_usage_key = UsageKey.from_string(task_kwargs['usage_id']).replace(
+                        course_key=course_key
+                    )
+                    if not _has_db_updated_with_new_score(None, scored_block_usage_key, **task_kwargs):
+                        raise DatabaseNotReadyError
+                    scored_blocks.append(
+                        (scored_block_usage_key, task_kwargs['only_if_higher'], task_kwargs['score_deleted'])
+                    )
+
+                set_event_transaction_id(user_task_kwargs[-1].get('event_transaction_id'))
+                set_event_transaction_type(user_task_kwargs[-1].get('event_transaction_type'))
+                _update_user_subsection_grades(students[user_id], course, scored_blocks)
+            except Exception:  # pylint: disable=broad-except
+                log.exception(
+                    u"Grades: failed to recalculate the subsection grades of user {} in course {}, "
+                    u"enqueueing them instead".format(user_id, course_key)
+                )
+                for task_kwargs in user_task_kwargs:
+                    recalculate_subsection_grade_v3.apply_async(
+                        kwargs=task_kwargs,
+                        countdown=RECALCULATE_GRADE_DELAY_SECONDS,
+                    )
+                enqueued_count += 1
+    return enqueued_count
+
+
 def _update_subsection_grades(course_key, scored_block_usage_key, only_if_higher, user_id, score_deleted):
     """
     A helper function to update subsection grades in the database
@@ -284,31 +454,54 @@ def _update_subsection_grades(course_key, scored_block_usage_key, only_if_higher
     student = User.objects.get(id=user_id)
     store = modulestore()
     with store.bulk_operations(course_key):
-        course_structure = get_course_blocks(student, store.make_course_usage_key(course_key))
-        subsections_to_update = course_structure.get_transformer_block_field(
+        course = store.get_course(course_key, depth=0)
+        _update_user_subsection_grades(student, course, [(scored_block_usage_key, only_if_higher, score_deleted)])
+
+
+def _update_user_subsection_grades(student, course, scored_blocks):
+    """
+    Updates the subsection grades of the student in the database for each
+    subsection containing the given (scored_block_usage_key, only_if_higher,
+    score_deleted) blocks, and signals that those subsection grades were
+    updated.
+
+    A subsection containing several of the blocks is updated once, only if
+    higher if all of their scores were, and as for a deleted score if any of
+    them was.
+    """
+    course_structure = get_course_blocks(student, modulestore().make_course_usage_key(course.id))
+    subsection_updates = OrderedDict()
+    for scored_block_usage_key, only_if_higher, score_deleted in scored_blocks:
+        subsections = course_structure.get_transformer_block_field(
             scored_block_usage_key,
             GradesTransformer,
             'subsections',
             set(),
         )
+        for subsection_usage_key in subsections:
+            subsection_only_if_higher, subsection_score_deleted = subsection_updates.get(
+                subsection_usage_key, (True, False)
+            )
+            subsection_updates[subsection_usage_key] = (
+                subsection_only_if_higher and only_if_higher,
+                subsection_score_deleted or score_deleted,
+            )
 
-        course = store.get_course(course_key, depth=0)
-        subsection_grade_factory = SubsectionGradeFactory(student, course, course_structure)
-
-        for subsection_usage_key in subsections_to_update:
-            if subsection_usage_key in course_structure:
-                subsection_grade = subsection_grade_factory.update(
-                    course_structure[subsection_usage_key],
-                    only_if_higher,
-                    score_deleted
-                )
-                SUBSECTION_SCORE_CHANGED.send(
-                    sender=None,
-                    course=course,
-                    course_structure=course_structure,
-                    user=student,
-                    subsection_grade=subsection_grade,
-                )
+    subsection_grade_factory = SubsectionGradeFactory(student, course, course_structure)
+    for subsection_usage_key, (only_if_higher, score_deleted) in subsection_updates.iteritems():
+        if subsection_usage_key in course_structure:
+            subsection_grade = subsection_grade_factory.update(
+                course_structure[subsection_usage_key],
+                only_if_higher,
+                score_deleted
+            )
+            SUBSECTION_SCORE_CHANGED.send(
+                sender=None,
+                course=course,
+                course_structure=course_structure,
+                user=student,
+                subsection_grade=subsection_grade,
+            )
 
 
 def _course_task_args(course_key, **kwargs):
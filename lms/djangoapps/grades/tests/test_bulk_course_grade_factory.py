@@ -0,0 +1,136 @@
+"""
+Tests for the BulkCourseGradeFactory
+"""
+import json
+
+from mock import patch
+from six import text_type
+from submissions import api as sub_api
+
+from courseware.models import StudentModule
+from student.models import CourseEnrollment, anonymous_id_for_user
+from student.tests.factories import UserFactory
+
+from ..bulk_course_grade_factory import BulkCourseGradeFactory
+from ..course_grade_factory import CourseGradeFactory
+from ..models import PersistentCourseGrade, PersistentSubsectionGrade, VisibleBlocks
+from .base import GradeTestBase
+from .utils import mock_get_score
+
+
+class TestBulkCourseGradeFactory(GradeTestBase):
+    """
+    Test that the CourseGrades of batches of users are calculated and saved properly
+    """
+    def setUp(self):
+        super(TestBulkCourseGradeFactory, self).setUp()
+        self.users = [self.request.user] + [UserFactory.create() for _ in range(2)]
+        for user in self.users[1:]:
+            CourseEnrollment.enroll(user, self.course.id)
+
+    def _update(self):
+        """
+        Updates the grades of the users in bulk and returns the resulting course grades.
+        """
+        results = list(BulkCourseGradeFactory().update(self.users, self.course))
+        self.assertEqual([result.student for result in results], self.users)
+        self.assertEqual([result.error for result in results], [None] * len(self.users))
+        return [result.course_grade for result in results]
+
+    def _assert_saved_grades(self, expected_percent, expected_earned):
+        """
+        Asserts the saved course and subsection grades of the users.
+        """
+        for user in self.users:
+            self.assertEqual(PersistentCourseGrade.read(user.id, self.course.id).percent_grade, expected_percent)
+            subsection_grades = PersistentSubsectionGrade.bulk_read_grades(user.id, self.course.id)
+            self.assertEqual(
+                {grade.full_usage_key: grade.earned_graded for grade in subsection_grades},
+                {self.sequence.location: expected_earned, self.sequence2.location: expected_earned},
+            )
+
+    def test_update(self):
+        with mock_get_score(1, 2):
+            course_grades = self._update()
+        self.assertEqual([course_grade.percent for course_grade in course_grades], [0.5] * len(self.users))
+        self._assert_saved_grades(expected_percent=0.5, expected_earned=1)
+
+        # the saved grades are updated
+        with mock_get_score(2, 2):
+            course_grades = self._update()
+        self.assertEqual([course_grade.percent for course_grade in course_grades], [1.0] * len(self.users))
+        self._assert_saved_grades(expected_percent=1.0, expected_earned=2)
+
+    def test_update_matches_course_grade_factory(self):
+        with mock_get_score(1, 2):
+            course_grade = CourseGradeFactory().update(self.request.user, self.course, force_update_subsections=True)
+            bulk_course_grades = self._update()
+        self.assertEqual(bulk_course_grades[0].percent, course_grade.percent)
+        self.assertEqual(bulk_course_grades[0].letter_grade, course_grade.letter_grade)
+        self.assertEqual(
+            {
+                location: (subsection_grade.graded_total.earned, subsection_grade.graded_total.possible)
+                for location, subsection_grade in bulk_course_grades[0].subsection_grades.iteritems()
+            },
+            {
+                location: (subsection_grade.graded_total.earned, subsection_grade.graded_total.possible)
+                for location, subsection_grade in course_grade.subsection_grades.iteritems()
+            },
+        )
+
+    def test_unchanged_grades_not_saved(self):
+        with mock_get_score(1, 2):
+            self._update()
+            with patch('lms.djangoapps.grades.models.PersistentSubsectionGrade.save') as mock_save:
+                self._update()
+        self.assertFalse(mock_save.called)
+
+    def _score_problems(self):
+        """
+        Scores the first problem of the users in the courseware, and the second one through the Submissions API.
+        """
+        for user in self.users:
+            StudentModule.objects.create(
+                student=user,
+                course_id=self.course.id,
+                module_state_key=self.problem.location,
+                module_type='problem',
+                grade=1,
+                max_grade=1,
+                state=json.dumps({}),
+            )
+            submission = sub_api.create_submission(
+                {
+                    'student_id': anonymous_id_for_user(user, self.course.id),
+                    'course_id': text_type(self.course.id),
+                    'item_id': text_type(self.problem2.location),
+                    'item_type': 'problem',
+                },
+                'any answer',
+            )
+            sub_api.set_score(submission['uuid'], 1, 1)
+
+    def test_update_from_stored_scores(self):
+        self._score_problems()
+        bulk_course_grades = self._update()
+        self.assertEqual([course_grade.percent for course_grade in bulk_course_grades], [1.0] * len(self.users))
+        self._assert_saved_grades(expected_percent=1.0, expected_earned=1)
+
+        for user, bulk_course_grade in zip(self.users, bulk_course_grades):
+            course_grade = CourseGradeFactory().update(user, self.course, force_update_subsections=True)
+            self.assertEqual(bulk_course_grade.percent, course_grade.percent)
+
+    def test_grades_saved_concurrently(self):
+        """
+        The grades saved by another process while the batch is graded are updated, rather than failing the batch.
+        """
+        self._score_problems()
+        bulk_get_or_create_for_users = VisibleBlocks.bulk_get_or_create_for_users
+
+        def grade_concurrently(*args, **kwargs):
+            CourseGradeFactory().update(self.users[0], self.course, force_update_subsections=True)
+            return bulk_get_or_create_for_users(*args, **kwargs)
+
+        with patch.object(VisibleBlocks, 'bulk_get_or_create_for_users', side_effect=grade_concurrently):
+            self._update()
+        self._assert_saved_grades(expected_percent=1.0, expected_earned=1)
@@ -14,7 +14,9 @@ from util.date_utils import to_timestamp
 
 from ..constants import ScoreDatabaseTableEnum
 from ..signals.handlers import (
+    defer_subsection_updates,
     disconnect_submissions_signal_receiver,
+    enqueue_subsection_update,
     problem_raw_score_changed_handler,
     submissions_score_reset_handler,
     submissions_score_set_handler,
@@ -251,3 +253,28 @@ class ScoreChangedSignalRelayTest(TestCase):
         with self.assertRaises(ValueError):
             with disconnect_submissions_signal_receiver(PROBLEM_RAW_SCORE_CHANGED):
                 pass
+
+
+class DeferSubsectionUpdatesTest(TestCase):
+    """
+    Tests of the subsection updates deferred by defer_subsection_updates.
+    """
+    shard = 4
+
+    @patch('lms.djangoapps.grades.signals.handlers.events.grade_updated')
+    @patch('lms.djangoapps.grades.signals.handlers.recalculate_subsection_grade_v3.apply_async')
+    def test_defer_subsection_updates(self, mock_apply_async, _mock_grade_updated):
+        kwargs = dict(PROBLEM_WEIGHTED_SCORE_CHANGED_KWARGS, modified=FROZEN_NOW_DATETIME)
+        del kwargs['sender']
+
+        with defer_subsection_updates() as deferred_updates:
+            enqueue_subsection_update(None, **kwargs)
+        mock_apply_async.assert_not_called()
+        self.assertEqual(
+            [(task_kwargs['user_id'], task_kwargs['usage_id']) for task_kwargs in deferred_updates],
+            [(kwargs['user_id'], kwargs['usage_id'])],
+        )
+
+        # updates are enqueued again afterwards
+        enqueue_subsection_update(None, **kwargs)
+        mock_apply_async.assert_called_once()
@@ -16,11 +16,13 @@ from mock import MagicMock, patch
 
 from lms.djangoapps.grades import tasks
 from lms.djangoapps.grades.config.models import PersistentGradesEnabledFlag
+from lms.djangoapps.grades.config.waffle import COALESCE_SUBSECTION_GRADE_RECALCULATIONS, waffle
 from lms.djangoapps.grades.constants import ScoreDatabaseTableEnum
 from lms.djangoapps.grades.models import PersistentCourseGrade, PersistentSubsectionGrade
 from lms.djangoapps.grades.services import GradesService
 from lms.djangoapps.grades.signals.signals import PROBLEM_WEIGHTED_SCORE_CHANGED
 from lms.djangoapps.grades.tasks import (
+    COALESCED_RECALCULATE_GRADE_DELAY_SECONDS,
     RECALCULATE_GRADE_DELAY_SECONDS,
     _course_task_args,
     compute_grades_for_course_v2,
@@ -148,6 +150,115 @@ class RecalculateSubsectionGradeTest(HasCourseWithProblemsMixin, ModuleStoreTest
             PROBLEM_WEIGHTED_SCORE_CHANGED.send(sender=None, **send_args)
             mock_task_apply.assert_called_once_with(countdown=RECALCULATE_GRADE_DELAY_SECONDS, kwargs=local_task_args)
 
+    def _enqueue_coalesced_recalculations(self, signals_kwargs):
+        """
+        Sends a PROBLEM_WEIGHTED_SCORE_CHANGED signal updated with each of the
+        given kwargs, with coalescing enabled, and returns the kwargs of the
+        enqueued tasks.
+        """
+        with waffle().override(COALESCE_SUBSECTION_GRADE_RECALCULATIONS, active=True):
+            with patch(
+                'lms.djangoapps.grades.tasks.recalculate_subsection_grade_v3.apply_async',
+                return_value=None
+            ) as mock_task_apply:
+                for signal_kwargs in signals_kwargs:
+                    self.problem_weighted_score_changed_kwargs.update(signal_kwargs)
+                    PROBLEM_WEIGHTED_SCORE_CHANGED.send(sender=None, **self.problem_weighted_score_changed_kwargs)
+        for call in mock_task_apply.call_args_list:
+            self.assertEqual(call[1]['countdown'], COALESCED_RECALCULATE_GRADE_DELAY_SECONDS)
+        return [call[1]['kwargs'] for call in mock_task_apply.call_args_list]
+
+    @patch('lms.djangoapps.grades.tasks._update_subsection_grades')
+    def test_coalesced_recalculations(self, mock_update):
+        self.set_up_course()
+        tasks_kwargs = self._enqueue_coalesced_recalculations([{}, {}, {}])
+        self.assertEqual(len({task_kwargs['coalescing_id'] for task_kwargs in tasks_kwargs}), 3)
+
+        # only the last enqueued recalculation is executed
+        with self.mock_csm_get_score(MagicMock(modified=self.frozen_now_datetime + timedelta(days=1))):
+            for task_kwargs in tasks_kwargs:
+                recalculate_subsection_grade_v3.apply(kwargs=task_kwargs)
+        self.assertEqual(mock_update.call_count, 1)
+
+        # once executed, the recalculation is no longer pending
+        with self.mock_csm_get_score(MagicMock(modified=self.frozen_now_datetime + timedelta(days=1))):
+            recalculate_subsection_grade_v3.apply(kwargs=tasks_kwargs[0])
+        self.assertEqual(mock_update.call_count, 2)
+
+    @ddt.data(
+        ([True, True], True),
+        ([False, True], False),
+        ([True, False], False),
+    )
+    @ddt.unpack
+    def test_coalesced_only_if_higher(self, only_if_higher_values, expected_only_if_higher):
+        self.set_up_course()
+        tasks_kwargs = self._enqueue_coalesced_recalculations(
+            [{'only_if_higher': only_if_higher} for only_if_higher in only_if_higher_values]
+        )
+        self.assertEqual(tasks_kwargs[-1]['only_if_higher'], expected_only_if_higher)
+
+    @ddt.data(
+        ([False, False], False),
+        ([True, False], True),
+        ([False, True], True),
+    )
+    @ddt.unpack
+    def test_coalesced_score_deleted(self, score_deleted_values, expected_score_deleted):
+        self.set_up_course()
+        tasks_kwargs = self._enqueue_coalesced_recalculations(
+            [{'score_deleted': score_deleted} for score_deleted in score_deleted_values]
+        )
+        self.assertEqual(tasks_kwargs[-1]['coalesced_score_deleted'], expected_score_deleted)
+        # the database is still checked for the score of the task's own block
+        self.assertEqual(tasks_kwargs[-1]['score_deleted'], score_deleted_values[-1])
+
+    @patch('lms.djangoapps.grades.tasks._update_subsection_grades')
+    def test_coalesced_by_subsection(self, mock_update):
+        self.set_up_course()
+        problem2 = ItemFactory.create(parent=self.sequential, category='problem', display_name='Problem 2')
+        other_sequential = ItemFactory.create(parent=self.chapter, category='sequential', display_name='Sequential2')
+        other_subsection_problem = ItemFactory.create(parent=other_sequential, category='problem')
+        tasks_kwargs = self._enqueue_coalesced_recalculations([
+            {'usage_id': unicode(self.problem.location)},
+            {'usage_id': unicode(other_subsection_problem.location)},
+            {'usage_id': unicode(problem2.location)},
+        ])
+        self.assertEqual(tasks_kwargs[0]['coalescing_key'], tasks_kwargs[2]['coalescing_key'])
+        self.assertNotEqual(tasks_kwargs[0]['coalescing_key'], tasks_kwargs[1]['coalescing_key'])
+
+        # the recalculation of the other subsection is not superseded
+        with self.mock_csm_get_score(MagicMock(modified=self.frozen_now_datetime + timedelta(days=1))):
+            for task_kwargs in tasks_kwargs:
+                recalculate_subsection_grade_v3.apply(kwargs=task_kwargs)
+        self.assertEqual(
+            [call[0][1] for call in mock_update.call_args_list],
+            [other_subsection_problem.location, problem2.location],
+        )
+
+    def test_coalescing_without_block_structure(self):
+        self.set_up_course()
+        with patch(
+            'openedx.core.djangoapps.content.block_structure.manager.BlockStructureManager.get_collected',
+            side_effect=BlockStructureNotFound(self.course.location),
+        ) as mock_get_collected:
+            tasks_kwargs = self._enqueue_coalesced_recalculations([{}])
+        self.assertFalse(mock_get_collected.called)
+        self.assertIn('coalescing_key', tasks_kwargs[0])
+
+    def test_coalescing_failure_enqueues_recalculation(self):
+        self.set_up_course()
+        with waffle().override(COALESCE_SUBSECTION_GRADE_RECALCULATIONS, active=True), patch(
+            'lms.djangoapps.grades.tasks.cache.get', side_effect=Exception,
+        ), patch(
+            'lms.djangoapps.grades.tasks.recalculate_subsection_grade_v3.apply_async',
+            return_value=None
+        ) as mock_task_apply:
+            PROBLEM_WEIGHTED_SCORE_CHANGED.send(sender=None, **self.problem_weighted_score_changed_kwargs)
+        mock_task_apply.assert_called_once_with(
+            countdown=RECALCULATE_GRADE_DELAY_SECONDS, kwargs=self.recalculate_subsection_grade_kwargs
+        )
+
     @patch('lms.djangoapps.grades.signals.signals.SUBSECTION_SCORE_CHANGED.send')
     def test_triggers_subsection_score_signal(self, mock_subsection_signal):
         """
@@ -5,13 +5,14 @@ Serve miscellaneous course and student data
 """
 import datetime
 import json
+from itertools import groupby
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.serializers.json import DjangoJSONEncoder
 from django.urls import reverse
-from django.db.models import Count, Q
+from django.db.models import Case, Count, IntegerField, Q, Value, When
 from edx_proctoring.api import get_exam_violation_report
 from opaque_keys.edx.keys import UsageKey
 from six import text_type
@@ -53,6 +54,9 @@ CERTIFICATE_FEATURES = ('course_id', 'mode', 'status', 'grade', 'created_date',
 
 UNAVAILABLE = "[unavailable]"
 
+# Number of problems which responses are fetched by each query of iter_problem_responses_by_block
+PROBLEM_RESPONSES_BATCH_SIZE = 100
+
 
 def sale_order_record_features(course_id, features):
     """
@@ -446,6 +450,63 @@ def list_problem_responses(course_key, problem_location, limit_responses=None):
     ]
 
 
+def iter_problem_responses_by_block(course_key, problem_locations, max_count=None):
+    """
+    Return an iterator of `(problem_key, responses)` for each of the given
+    problems of a course, in their order.
+
+    Like `list_problem_responses`, the responses of a problem are ordered by
+    student, and each holds the student's 'username', 'state' and the
+    'modified' date of the state.
+
+    The responses of PROBLEM_RESPONSES_BATCH_SIZE problems are streamed at a
+    time from a single query, ordered by problem, and only the responses of
+    one problem are held at once. If `max_count` is given, no more than
+    `max_count` responses are fetched in all, and the iterator stops once
+    they have been.
+    """
+    problem_keys = [
+        UsageKey.from_string(text_type(problem_location)).map_into_course(course_key)
+        for problem_location in problem_locations
+    ]
+    for index in range(0, len(problem_keys), PROBLEM_RESPONSES_BATCH_SIZE):
+        batch_keys = problem_keys[index:index + PROBLEM_RESPONSES_BATCH_SIZE]
+        # Order the rows by the position of their problem in the batch, so the
+        # problems can be yielded in their order as their rows arrive.
+        problem_position = Case(
+            *[
+                When(module_state_key=problem_key, then=Value(position))
+                for position, problem_key in enumerate(batch_keys)
+            ],
+            output_field=IntegerField()
+        )
+        smdat = StudentModule.objects.filter(
+            course_id=course_key,
+            module_state_key__in=batch_keys,
+        ).annotate(problem_position=problem_position).order_by('problem_position', 'student').values_list(
+            'module_state_key', 'student__username', 'state', 'modified'
+        )
+        if max_count is not None:
+            smdat = smdat[:max_count]
+
+        rows_by_key = groupby(smdat.iterator(), key=lambda row: row[0].map_into_course(course_key))
+        rows_key, rows = next(rows_by_key, (None, None))
+        for problem_key in batch_keys:
+            responses = []
+            if rows_key == problem_key:
+                responses = [
+                    {'username': username, 'state': state, 'modified': modified}
+                    for __, username, state, modified in rows
+                ]
+                rows_key, rows = next(rows_by_key, (None, None))
+            yield problem_key, responses
+
+            if max_count is not None:
+                max_count -= len(responses)
+                if max_count <= 0:
+                    return
+
+
 def course_registration_features(features, registration_codes, csv_type):
     """
     Return list of Course Registration Codes as dictionaries.
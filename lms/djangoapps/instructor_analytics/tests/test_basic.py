@@ -17,7 +17,7 @@ from six import text_type
 
 from course_modes.models import CourseMode
 from course_modes.tests.factories import CourseModeFactory
-from courseware.tests.factories import InstructorFactory
+from courseware.tests.factories import InstructorFactory, StudentModuleFactory
 from instructor_analytics.basic import (
     AVAILABLE_FEATURES,
     PROFILE_FEATURES,
@@ -27,6 +27,7 @@ from instructor_analytics.basic import (
     course_registration_features,
     enrolled_students_features,
     get_proctored_exam_results,
+    iter_problem_responses_by_block,
     list_may_enroll,
     list_problem_responses,
     sale_order_record_features,
@@ -115,6 +116,43 @@ class TestAnalyticsBasic(ModuleStoreTestCase):
                         problem_responses
                     )
 
+    def test_iter_problem_responses_by_block(self):
+        problem_keys = [self.course_key.make_usage_key('problem', 'problem{}'.format(n)) for n in range(3)]
+        for user in self.users[:2]:
+            for problem_key in problem_keys[:2]:
+                StudentModuleFactory.create(
+                    student=user,
+                    course_id=self.course_key,
+                    module_state_key=problem_key,
+                    state=json.dumps({'user': user.username}),
+                )
+
+        with self.assertNumQueries(1):
+            problem_responses = list(iter_problem_responses_by_block(self.course_key, problem_keys))
+
+        self.assertEqual([problem_key for problem_key, _ in problem_responses], problem_keys)
+        for _, responses in problem_responses[:2]:
+            self.assertEqual(
+                [(response['username'], response['state']) for response in responses],
+                [(user.username, json.dumps({'user': user.username})) for user in self.users[:2]]
+            )
+        self.assertEqual(problem_responses[2][1], [])
+
+    def test_iter_problem_responses_by_block_max_count(self):
+        problem_keys = [self.course_key.make_usage_key('problem', 'problem{}'.format(n)) for n in range(3)]
+        for problem_key in reversed(problem_keys):
+            for user in self.users[:2]:
+                StudentModuleFactory.create(student=user, course_id=self.course_key, module_state_key=problem_key)
+
+        with self.assertNumQueries(1):
+            problem_responses = list(iter_problem_responses_by_block(self.course_key, problem_keys, max_count=3))
+
+        self.assertEqual([problem_key for problem_key, _ in problem_responses], problem_keys[:2])
+        self.assertEqual(
+            [[response['username'] for response in responses] for _, responses in problem_responses],
+            [[user.username for user in self.users[:2]], [self.users[0].username]]
+        )
+
     def test_enrolled_students_features_username(self):
         self.assertIn('username', AVAILABLE_FEATURES)
         userreports = enrolled_students_features(self.course_key, ['username'])
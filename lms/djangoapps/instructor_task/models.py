@@ -14,16 +14,19 @@ ASSUMPTIONS: modules have unique IDs, even across different module_types
 """
 import codecs
 import csv
+import gzip
 import hashlib
 import json
 import logging
 import os.path
+from tempfile import SpooledTemporaryFile
 from uuid import uuid4
 
 from boto.exception import BotoServerError
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.files.base import ContentFile
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import File
 from django.db import models, transaction
 from opaque_keys.edx.django.models import CourseKeyField
 from six import text_type
@@ -36,6 +39,9 @@ logger = logging.getLogger(__name__)
 QUEUING = 'QUEUING'
 PROGRESS = 'PROGRESS'
 
+# Reports are kept in memory up to this size while they are written, and spooled to disk beyond it
+REPORT_SPOOL_MAX_SIZE = 5 * 1024 * 1024
+
 
 class InstructorTask(models.Model):
     """
@@ -180,13 +186,125 @@ class InstructorTask(models.Model):
         return json.dumps({'message': 'Task revoked before running'})
 
 
+def _get_utf8_encoded_rows(rows):
+    """
+    Given a list of `rows` containing unicode strings, return a
+    new list of rows with those strings encoded as utf-8 for CSV
+    compatibility.
+    """
+    for row in rows:
+        yield [unicode(item).encode('utf-8') for item in row]
+
+
+class CSVReportWriter(object):
+    """
+    Writes the rows of a report to `output` as UTF-8 CSV.
+    """
+    extension = 'csv'
+
+    def __init__(self, output):
+        # Adding unicode signature (BOM) for MS Excel 2013 compatibility
+        output.write(codecs.BOM_UTF8)
+        self._csvwriter = csv.writer(output)
+
+    def writerows(self, rows):
+        self._csvwriter.writerows(_get_utf8_encoded_rows(rows))
+
+    def close(self):
+        pass
+
+
+class GzipCSVReportWriter(CSVReportWriter):
+    """
+    Writes the rows of a report to `output` as gzip-compressed UTF-8 CSV.
+    """
+    extension = 'csv.gz'
+
+    def __init__(self, output):
+        self._gzip_file = gzip.GzipFile(filename='', mode='wb', fileobj=output)
+        super(GzipCSVReportWriter, self).__init__(self._gzip_file)
+
+    def close(self):
+        # only flushes the compressed stream, `output` is left open
+        self._gzip_file.close()
+
+
+# Writer of each output format of the reports, by the extension of their files
+REPORT_WRITERS = {
+    writer.extension: writer
+    for writer in (CSVReportWriter, GzipCSVReportWriter)
+}
+
+
+def get_report_writer_class(filename):
+    """
+    Returns the writer of the format of the report `filename`, CSV by default.
+    """
+    for extension, writer in REPORT_WRITERS.items():
+        if filename.endswith('.' + extension):
+            return writer
+    return CSVReportWriter
+
+
+class ReportFile(object):
+    """
+    A report which rows are appended as they are generated, so that the whole
+    dataset never has to be held in memory, and which is stored in its
+    ReportStore once complete. The format of the report is the one of the
+    extension of its filename.
+    """
+    def __init__(self, report_store, course_id, filename):
+        self.report_store = report_store
+        self.course_id = course_id
+        self.filename = filename
+        self.rows_written = 0
+        self._buffer = SpooledTemporaryFile(max_size=REPORT_SPOOL_MAX_SIZE)
+        self._writer = get_report_writer_class(filename)(self._buffer)
+
+    def writerow(self, row):
+        """
+        Appends a single row (an iterable of strings) to the report.
+        """
+        self.writerows([row])
+
+    def writerows(self, rows):
+        """
+        Appends the given rows to the report.
+        """
+        for row in rows:
+            self._writer.writerows([row])
+            self.rows_written += 1
+
+    def store(self):
+        """
+        Completes the report and stores it in its ReportStore.
+        """
+        self._writer.close()
+        self._buffer.seek(0)
+        self.report_store.store(self.course_id, self.filename, File(self._buffer))
+
+    def close(self):
+        """
+        Discards the local copy of the report.
+        """
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 class ReportStore(object):
     """
-    Simple abstraction layer that can fetch and store CSV files for reports
-    download. Should probably refactor later to create a ReportFile object that
-    can simply be appended to for the sake of memory efficiency, rather than
-    passing in the whole dataset. Doing that for now just because it's simpler.
+    Simple abstraction layer that can fetch and store report files for
+    download. Large reports should be written incrementally to the ReportFile
+    returned by `open_rows`, rather than passing in the whole dataset.
     """
+    # output format of the reports, see `get_report_extension`
+    report_formats = {}
+
     @classmethod
     def from_config(cls, config_name):
         """
@@ -198,7 +316,7 @@ class ReportStore(object):
         config = getattr(settings, config_name, {})
         storage_type = config.get('STORAGE_TYPE', '').lower()
         if storage_type == 's3':
-            return DjangoStorageReportStore(
+            report_store = DjangoStorageReportStore(
                 storage_class='openedx.core.storage.S3ReportStorage',
                 storage_kwargs={
                     'bucket': config['BUCKET'],
@@ -209,22 +327,34 @@ class ReportStore(object):
                 },
             )
         elif storage_type == 'localfs':
-            return DjangoStorageReportStore(
+            report_store = DjangoStorageReportStore(
                 storage_class='django.core.files.storage.FileSystemStorage',
                 storage_kwargs={
                     'location': config['ROOT_PATH'],
                 },
             )
-        return DjangoStorageReportStore.from_config(config_name)
+        else:
+            report_store = DjangoStorageReportStore.from_config(config_name)
+        report_store.report_formats = config.get('REPORT_FORMATS', {})
+        return report_store
 
-    def _get_utf8_encoded_rows(self, rows):
+    def get_report_extension(self, report_name):
         """
-        Given a list of `rows` containing unicode strings, return a
-        new list of rows with those strings encoded as utf-8 for CSV
-        compatibility.
+        Returns the file extension of the output format of the report `report_name`,
+        as set by the REPORT_FORMATS of the configuration of this store, keyed by
+        report name or 'default': 'csv' (the default) or 'csv.gz'.
         """
-        for row in rows:
-            yield [unicode(item).encode('utf-8') for item in row]
+        extension = self.report_formats.get(report_name, self.report_formats.get('default', CSVReportWriter.extension))
+        if extension not in REPORT_WRITERS:
+            raise ImproperlyConfigured(u'Unknown report format: {}'.format(extension))
+        return extension
+
+    def open_rows(self, course_id, filename):
+        """
+        Returns a ReportFile to which the rows of the report `filename` can be
+        appended, before storing it.
+        """
+        return ReportFile(self, course_id, filename)
 
 
 class DjangoStorageReportStore(ReportStore):
@@ -268,15 +398,12 @@ class DjangoStorageReportStore(ReportStore):
     def store_rows(self, course_id, filename, rows):
         """
         Given a course_id, filename, and rows (each row is an iterable of
-        strings), write the rows to the storage backend in csv format.
+        strings), write the rows to the storage backend in the format of the
+        extension of filename, csv by default.
         """
-        output_buffer = ContentFile('')
-        # Adding unicode signature (BOM) for MS Excel 2013 compatibility
-        output_buffer.write(codecs.BOM_UTF8)
-        csvwriter = csv.writer(output_buffer)
-        csvwriter.writerows(self._get_utf8_encoded_rows(rows))
-        output_buffer.seek(0)
-        self.store(course_id, filename, output_buffer)
+        with self.open_rows(course_id, filename) as report_file:
+            report_file.writerows(rows)
+            report_file.store()
 
     def links_for(self, course_id):
         """
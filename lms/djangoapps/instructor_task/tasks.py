@@ -44,6 +44,7 @@ from lms.djangoapps.instructor_task.tasks_helper.misc import (
 )
 from lms.djangoapps.instructor_task.tasks_helper.module_state import (
     delete_problem_module_state,
+    perform_bulk_rescore,
     perform_module_state_update,
     override_score_module_state,
     rescore_problem_module_state,
@@ -72,12 +73,17 @@ def rescore_problem(entry_id, xmodule_instance_args):
 
     `xmodule_instance_args` provides information needed by _get_module_instance_for_task()
     to instantiate an xmodule instance.
+
+    When BULK_RESCORE_CHUNK_SIZE is set, the submissions are rescored in chunks by
+    perform_bulk_rescore.
     """
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('rescored')
-    update_fcn = partial(rescore_problem_module_state, xmodule_instance_args)
-
-    visit_fcn = partial(perform_module_state_update, update_fcn, None)
+    if getattr(settings, 'BULK_RESCORE_CHUNK_SIZE', 0):
+        visit_fcn = partial(perform_bulk_rescore, xmodule_instance_args)
+    else:
+        update_fcn = partial(rescore_problem_module_state, xmodule_instance_args)
+        visit_fcn = partial(perform_module_state_update, update_fcn, None)
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
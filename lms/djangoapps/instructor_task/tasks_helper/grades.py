@@ -1,6 +1,7 @@
 """
 Functionality for generating grade reports.
 """
+import json
 import logging
 import re
 from collections import OrderedDict
@@ -8,17 +9,22 @@ from datetime import datetime
 from itertools import chain, izip, izip_longest
 from time import time
 
+from billiard import Pool
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.db import connections
+from edx_user_state_client.interface import XBlockUserState
 from lazy import lazy
 from opaque_keys.edx.keys import UsageKey
 from pytz import UTC
 from six import text_type
+from xblock.core import XBlock
+from xblock.fields import Scope
+from xblock.plugin import PluginMissingError
 
 from course_blocks.api import get_course_blocks
 from courseware.courses import get_course_by_id
-from courseware.user_state_client import DjangoXBlockUserStateClient
-from instructor_analytics.basic import list_problem_responses
+from instructor_analytics.basic import iter_problem_responses_by_block
 from instructor_analytics.csvs import format_dictlist
 from lms.djangoapps.certificates.models import CertificateWhitelist, GeneratedCertificate, certificate_info_for_user
 from lms.djangoapps.grades.context import grading_context, grading_context_for_course
@@ -31,12 +37,13 @@ from openedx.core.djangoapps.course_groups.cohorts import bulk_cache_cohorts, ge
 from openedx.core.djangoapps.user_api.course_tag.api import BulkCourseTags
 from student.models import CourseEnrollment
 from student.roles import BulkRoleCache
+from xmodule.modulestore import prefer_xmodules
 from xmodule.modulestore.django import modulestore
 from xmodule.partitions.partitions_service import PartitionService
 from xmodule.split_test_module import get_split_user_partitions
 
 from .runner import TaskProgress
-from .utils import upload_csv_to_report_store
+from .utils import open_csv_in_report_store, upload_csv_to_report_store, upload_report_file
 
 TASK_LOG = logging.getLogger('edx.celery.task')
 
@@ -216,10 +223,19 @@ class CourseGradeReport(object):
         batched_rows = self._batched_rows(context)
 
         context.update_status(u'Compiling grades')
-        success_rows, error_rows = self._compile(context, batched_rows)
-
-        context.update_status(u'Uploading grades')
-        self._upload(context, success_headers, success_rows, error_headers, error_rows)
+        date = datetime.now(UTC)
+        success_file = open_csv_in_report_store('grade_report', context.course_id, date)
+        error_file = open_csv_in_report_store('grade_report_err', context.course_id, date)
+        try:
+            success_file.writerow(success_headers)
+            error_file.writerow(error_headers)
+            self._compile(context, batched_rows, success_file, error_file)
+
+            context.update_status(u'Uploading grades')
+            self._upload(success_file, error_file)
+        finally:
+            success_file.close()
+            error_file.close()
 
         return context.update_status(u'Completed grades')
 
@@ -247,37 +263,57 @@ class CourseGradeReport(object):
     def _batched_rows(self, context):
         """
         A generator of batches of (success_rows, error_rows) for this report.
-        """
-        for users in self._batch_users(context):
-            users = filter(lambda u: u is not None, users)
-            yield self._rows_for_users(context, users)
 
-    def _compile(self, context, batched_rows):
+        When GRADE_REPORT_WORKER_PROCESSES is more than one, the batches are
+        graded by a pool of processes, and still yielded in enrollment order.
+        """
+        processes = getattr(settings, 'GRADE_REPORT_WORKER_PROCESSES', 1)
+        if processes <= 1:
+            for users in self._batch_users(context):
+                users = filter(lambda u: u is not None, users)
+                yield self._rows_for_users(context, users)
+            return
+
+        batched_user_ids = self._batch_user_ids(context)
+        # child processes must not share the parent's database connections
+        connections.close_all()
+        pool = Pool(
+            processes=min(processes, len(batched_user_ids) or 1),
+            initializer=_init_grade_report_worker,
+            initargs=(context.course_id, context.action_name),
+        )
+        try:
+            for rows in pool.imap(_grade_report_rows_for_user_ids, batched_user_ids):
+                yield rows
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _compile(self, context, batched_rows, success_file, error_file):
         """
-        Compiles and returns the complete list of (success_rows, error_rows) for
-        the given batched_rows and context.
+        Appends the given batched_rows to the success and error report files
+        as they are generated, updating the task status after each batch.
         """
-        # partition and chain successes and errors
-        success_rows, error_rows = izip(*batched_rows)
-        success_rows = list(chain(*success_rows))
-        error_rows = list(chain(*error_rows))
+        task_progress = context.task_progress
+        for success_rows, error_rows in batched_rows:
+            success_file.writerows(success_rows)
+            error_file.writerows(error_rows)
 
-        # update metrics on task status
-        context.task_progress.succeeded = len(success_rows)
-        context.task_progress.failed = len(error_rows)
-        context.task_progress.attempted = context.task_progress.succeeded + context.task_progress.failed
-        context.task_progress.total = context.task_progress.attempted
-        return success_rows, error_rows
+            # update metrics on task status
+            task_progress.succeeded += len(success_rows)
+            task_progress.failed += len(error_rows)
+            task_progress.attempted = task_progress.succeeded + task_progress.failed
+            task_progress.total = task_progress.attempted
+            task_progress.update_task_state(extra_meta={'step': u'Compiling grades'})
 
-    def _upload(self, context, success_headers, success_rows, error_headers, error_rows):
+    def _upload(self, success_file, error_file):
         """
-        Creates and uploads a CSV for the given headers and rows.
+        Uploads the report files, the error report only if any user failed to be graded.
         """
-        date = datetime.now(UTC)
-        upload_csv_to_report_store([success_headers] + success_rows, 'grade_report', context.course_id, date)
-        if len(error_rows) > 0:
-            error_rows = [error_headers] + error_rows
-            upload_csv_to_report_store(error_rows, 'grade_report_err', context.course_id, date)
+        upload_report_file(success_file, 'grade_report')
+        if error_file.rows_written > 1:
+            upload_report_file(error_file, 'grade_report_err')
 
     def _grades_header(self, context):
         """
@@ -303,6 +339,20 @@ class CourseGradeReport(object):
         users = users.select_related('profile')
         return grouper(users)
 
+    def _batch_user_ids(self, context):
+        """
+        Returns the list of batches of ids of the users, to be graded in worker processes.
+        """
+        user_ids = list(
+            CourseEnrollment.objects.users_enrolled_in(context.course_id, include_inactive=True).values_list(
+                'id', flat=True
+            )
+        )
+        return [
+            user_ids[index:index + self.USER_BATCH_SIZE]
+            for index in range(0, len(user_ids), self.USER_BATCH_SIZE)
+        ]
+
     def _user_grades(self, course_grade, context):
         """
         Returns a list of grade results for the given course_grade corresponding
@@ -455,6 +505,30 @@ class CourseGradeReport(object):
             return success_rows, error_rows
 
 
+# Context of the course grade report graded by a worker process
+_worker_context = None
+
+
+def _init_grade_report_worker(course_id, action_name):
+    """
+    Initializes a process grading batches of users of a course grade report.
+    """
+    global _worker_context  # pylint: disable=global-statement
+    _worker_context = _CourseGradeReportContext(None, None, course_id, None, action_name)
+
+
+def _grade_report_rows_for_user_ids(user_ids):
+    """
+    Returns the (success_rows, error_rows) of the given users, in a worker process.
+    """
+    users_by_id = {
+        user.id: user
+        for user in get_user_model().objects.filter(id__in=user_ids).select_related('profile')
+    }
+    users = [users_by_id[user_id] for user_id in user_ids if user_id in users_by_id]
+    return CourseGradeReport()._rows_for_users(_worker_context, users)  # pylint: disable=protected-access
+
+
 class ProblemGradeReport(object):
     @classmethod
     def generate(cls, _xmodule_instance_args, _entry_id, course_id, _task_input, action_name):
@@ -607,44 +681,58 @@ class ProblemResponses(object):
         max_count = settings.FEATURES.get('MAX_PROBLEM_RESPONSES_COUNT')
 
         store = modulestore()
-        user_state_client = DjangoXBlockUserStateClient()
+        has_report_data_generator = {}
 
         student_data_keys = set()
 
         with store.bulk_operations(course_key):
-            for title, path, block_key in cls._build_problem_list(course_blocks, usage_key):
-                # Chapter and sequential blocks are filtered out since they include state
-                # which isn't useful for this report.
-                if block_key.block_type in ('sequential', 'chapter'):
-                    continue
+            # Chapter and sequential blocks are filtered out since they include state
+            # which isn't useful for this report.
+            problems = [
+                (title, path, block_key)
+                for title, path, block_key in cls._build_problem_list(course_blocks, usage_key)
+                if block_key.block_type not in ('sequential', 'chapter')
+            ]
+            # The responses of all the problems are streamed in batches, instead of
+            # one query per problem, up to max_count responses in all.
+            responses_by_block = iter_problem_responses_by_block(
+                course_key, [block_key for _, _, block_key in problems], max_count
+            )
 
-                block = store.get_item(block_key)
+            for (title, path, block_key), (_, all_responses) in izip(problems, responses_by_block):
                 generated_report_data = {}
 
                 # Blocks can implement the generate_report_data method to provide their own
-                # human-readable formatting for user state.
-                if hasattr(block, 'generate_report_data'):
+                # human-readable formatting for user state. Only those blocks are loaded from
+                # the modulestore.
+                block_type = block_key.block_type
+                if block_type not in has_report_data_generator:
+                    has_report_data_generator[block_type] = cls._has_report_data_generator(block_type)
+                if has_report_data_generator[block_type]:
+                    block = store.get_item(block_key)
                     try:
-                        user_state_iterator = user_state_client.iter_all_for_block(block_key)
                         generated_report_data = {
                             username: state
                             for username, state in
-                            block.generate_report_data(user_state_iterator, max_count)
+                            block.generate_report_data(cls._iter_user_states(block_key, all_responses), max_count)
                         }
                     except NotImplementedError:
                         pass
 
-                responses = list_problem_responses(course_key, block_key, max_count)
+                responses = all_responses[:max_count] if max_count is not None else all_responses
 
-                student_data += responses
                 for response in responses:
-                    response['title'] = title
-                    # A human-readable location for the current block
-                    response['location'] = ' > '.join(path)
-                    # A machine-friendly location for the current block
-                    response['block_key'] = str(block_key)
+                    student_data.append({
+                        'username': response['username'],
+                        'state': response['state'],
+                        'title': title,
+                        # A human-readable location for the current block
+                        'location': ' > '.join(path),
+                        # A machine-friendly location for the current block
+                        'block_key': str(block_key),
+                    })
                     user_data = generated_report_data.get(response['username'], {})
-                    response.update(user_data)
+                    student_data[-1].update(user_data)
                     student_data_keys = student_data_keys.union(user_data.keys())
                 if max_count is not None:
                     max_count -= len(responses)
@@ -662,6 +750,28 @@ class ProblemResponses(object):
 
         return student_data, student_data_keys_list
 
+    @staticmethod
+    def _has_report_data_generator(block_type):
+        """
+        Returns whether the blocks of `block_type` implement the generate_report_data method.
+        """
+        try:
+            return hasattr(XBlock.load_class(block_type, select=prefer_xmodules), 'generate_report_data')
+        except PluginMissingError:
+            return False
+
+    @staticmethod
+    def _iter_user_states(block_key, responses):
+        """
+        Generates the XBlockUserState of the given responses to the block, as
+        `DjangoXBlockUserStateClient.iter_all_for_block` would.
+        """
+        for response in responses:
+            state = json.loads(response['state'] or '{}')
+            if state == {}:
+                continue
+            yield XBlockUserState(response['username'], block_key, state, response['modified'], Scope.user_state)
+
     @classmethod
     def generate(cls, _xmodule_instance_args, _entry_id, course_id, task_input, action_name):
         """
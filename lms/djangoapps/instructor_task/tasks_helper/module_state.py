@@ -5,7 +5,10 @@ import json
 import logging
 from time import time
 
+from billiard import Pool
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import connections
 from django.utils.translation import ugettext_noop
 from opaque_keys.edx.keys import UsageKey
 
@@ -16,6 +19,8 @@ from courseware.model_data import DjangoKeyValueStore, FieldDataCache
 from courseware.models import StudentModule
 from courseware.module_render import get_module_for_descriptor_internal
 from lms.djangoapps.grades.events import GRADES_OVERRIDE_EVENT_TYPE, GRADES_RESCORE_EVENT_TYPE
+from lms.djangoapps.grades.signals.handlers import defer_subsection_updates
+from lms.djangoapps.grades.tasks import recalculate_subsection_grades
 from track.event_transaction_utils import create_new_event_transaction_id, set_event_transaction_type
 from track.views import task_track
 from util.db import outer_atomic
@@ -59,26 +64,9 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
 
     """
     start_time = time()
-    usage_keys = []
-    problem_url = task_input.get('problem_url')
-    entrance_exam_url = task_input.get('entrance_exam_url')
     student_identifier = task_input.get('student')
     override_score_task = action_name == ugettext_noop('overridden')
-    problems = {}
-
-    # if problem_url is present make a usage key from it
-    if problem_url:
-        usage_key = UsageKey.from_string(problem_url).map_into_course(course_id)
-        usage_keys.append(usage_key)
-
-        # find the problem descriptor:
-        problem_descriptor = modulestore().get_item(usage_key)
-        problems[unicode(usage_key)] = problem_descriptor
-
-    # if entrance_exam is present grab all problems in it
-    if entrance_exam_url:
-        problems = get_problems_in_section(entrance_exam_url)
-        usage_keys = [UsageKey.from_string(location) for location in problems.keys()]
+    usage_keys, problems = _get_problems(course_id, task_input)
 
     modules_to_update = _get_modules_to_update(
         course_id, usage_keys, student_identifier, filter_fcn, override_score_task
@@ -108,6 +96,159 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
     return task_progress.update_task_state()
 
 
+def perform_bulk_rescore(xmodule_instance_args, _entry_id, course_id, task_input, action_name):
+    """
+    Rescores the StudentModules of the problems of the task, as
+    perform_module_state_update does with rescore_problem_module_state, in
+    chunks of BULK_RESCORE_CHUNK_SIZE StudentModules.
+
+    The course and its problems are loaded once, and the states of the
+    StudentModules of a chunk are read along with them. Each chunk is saved
+    in a single transaction, after which the subsection grades of its
+    students are recalculated by recalculate_subsection_grades, instead of
+    by a recalculate_subsection_grade_v3 task per StudentModule.
+
+    As with perform_module_state_update, an UpdateProblemModuleStateError
+    or any other unexpected error fails the task. Since a chunk is saved in
+    a single transaction, the rescoring of the whole chunk it's raised in is
+    rolled back, along with its grade recalculations, while the chunks
+    rescored before are kept.
+
+    When BULK_RESCORE_WORKER_PROCESSES is more than one, the chunks are
+    rescored by a pool of processes.
+
+    Returns the task's results, as perform_module_state_update.
+    """
+    start_time = time()
+    usage_keys, problems = _get_problems(course_id, task_input)
+    module_ids = list(
+        _get_modules_to_update(course_id, usage_keys, task_input.get('student'), None)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    chunk_size = settings.BULK_RESCORE_CHUNK_SIZE
+    chunks = [module_ids[index:index + chunk_size] for index in range(0, len(module_ids), chunk_size)]
+
+    task_progress = TaskProgress(action_name, len(module_ids), start_time)
+    task_progress.update_task_state()
+
+    processes = getattr(settings, 'BULK_RESCORE_WORKER_PROCESSES', 1)
+    if processes <= 1 or len(chunks) <= 1:
+        rescorer = _BulkRescorer(course_id, problems, xmodule_instance_args, task_input)
+        chunk_results = (rescorer.rescore(module_ids) for module_ids in chunks)
+        _update_bulk_rescore_progress(task_progress, chunk_results)
+    else:
+        # child processes must not share the parent's database connections
+        connections.close_all()
+        pool = Pool(
+            processes=min(processes, len(chunks)),
+            initializer=_init_bulk_rescore_worker,
+            initargs=(course_id, xmodule_instance_args, task_input),
+        )
+        try:
+            _update_bulk_rescore_progress(task_progress, pool.imap_unordered(_bulk_rescore_chunk, chunks))
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    return task_progress.update_task_state()
+
+
+def _update_bulk_rescore_progress(task_progress, chunk_results):
+    """
+    Adds the (succeeded, failed, skipped) numbers of each rescored chunk to
+    the task progress, updating the task state after each chunk.
+    """
+    for succeeded, failed, skipped in chunk_results:
+        task_progress.succeeded += succeeded
+        task_progress.failed += failed
+        task_progress.skipped += skipped
+        task_progress.attempted += succeeded + failed + skipped
+        task_progress.update_task_state()
+
+
+class _BulkRescorer(object):
+    """
+    Rescores chunks of the StudentModules of the given problems of a course.
+    """
+    def __init__(self, course_id, problems, xmodule_instance_args, task_input):
+        self.course_id = course_id
+        self.problems = problems
+        self.xmodule_instance_args = xmodule_instance_args
+        self.task_input = task_input
+        self.course = get_course_by_id(course_id)
+
+    def rescore(self, module_ids):
+        """
+        Rescores the StudentModules with the given ids in a single
+        transaction, recalculates the subsection grades of the students
+        whose scores changed, and returns the numbers of the StudentModules
+        whose rescoring succeeded, failed and was skipped.
+        """
+        student_modules = list(StudentModule.objects.filter(id__in=module_ids).select_related('student'))
+        update_statuses = []
+        with defer_subsection_updates() as subsection_updates:
+            with modulestore().bulk_operations(self.course_id):
+                with outer_atomic():
+                    for student_module in student_modules:
+                        update_statuses.append(self._rescore_student_module(student_module))
+
+        if subsection_updates:
+            enqueued_count = recalculate_subsection_grades(self.course_id, subsection_updates)
+            if enqueued_count:
+                TASK_LOG.warning(
+                    u"Enqueued the grade recalculations of %d students of course %s that failed while rescoring",
+                    enqueued_count,
+                    self.course_id,
+                )
+        return (
+            update_statuses.count(UPDATE_STATUS_SUCCEEDED),
+            update_statuses.count(UPDATE_STATUS_FAILED),
+            update_statuses.count(UPDATE_STATUS_SKIPPED),
+        )
+
+    def _rescore_student_module(self, student_module):
+        """
+        Rescores the given StudentModule, and returns the update status.
+        """
+        module_descriptor = self.problems[unicode(student_module.module_state_key)]
+        with dog_stats_api.timer('instructor_tasks.module.time.step', tags=[u'action:rescored']):
+            field_data_cache = None
+            if not module_descriptor.has_children:
+                field_data_cache = FieldDataCache.cache_for_student_module(student_module, module_descriptor)
+            instance = _get_module_instance_for_task(
+                self.course_id,
+                student_module.student,
+                module_descriptor,
+                self.xmodule_instance_args,
+                grade_bucket_type='rescore',
+                course=self.course,
+                field_data_cache=field_data_cache,
+            )
+            return _rescore_module_instance(instance, student_module, self.task_input)
+
+
+# Rescorer of the chunks rescored by a worker process
+_worker_rescorer = None
+
+
+def _init_bulk_rescore_worker(course_id, xmodule_instance_args, task_input):
+    """
+    Initializes a process rescoring chunks of the StudentModules of a task.
+    """
+    global _worker_rescorer  # pylint: disable=global-statement
+    __, problems = _get_problems(course_id, task_input)
+    _worker_rescorer = _BulkRescorer(course_id, problems, xmodule_instance_args, task_input)
+
+
+def _bulk_rescore_chunk(module_ids):
+    """
+    Rescores the StudentModules with the given ids, in a worker process.
+    """
+    return _worker_rescorer.rescore(module_ids)
+
+
 @outer_atomic
 def rescore_problem_module_state(xmodule_instance_args, module_descriptor, student_module, task_input):
     '''
@@ -124,7 +265,6 @@ def rescore_problem_module_state(xmodule_instance_args, module_descriptor, stude
     # unpack the StudentModule:
     course_id = student_module.course_id
     student = student_module.student
-    usage_key = student_module.module_state_key
 
     with modulestore().bulk_operations(course_id):
         course = get_course_by_id(course_id)
@@ -139,51 +279,52 @@ def rescore_problem_module_state(xmodule_instance_args, module_descriptor, stude
             grade_bucket_type='rescore',
             course=course
         )
+        return _rescore_module_instance(instance, student_module, task_input)
 
-        if instance is None:
-            # Either permissions just changed, or someone is trying to be clever
-            # and load something they shouldn't have access to.
-            msg = "No module {location} for student {student}--access denied?".format(
-                location=usage_key,
-                student=student
-            )
-            TASK_LOG.warning(msg)
-            return UPDATE_STATUS_FAILED
-
-        if not hasattr(instance, 'rescore'):
-            # This should not happen, since it should be already checked in the
-            # caller, but check here to be sure.
-            msg = "Specified module {0} of type {1} does not support rescoring.".format(usage_key, instance.__class__)
-            raise UpdateProblemModuleStateError(msg)
-
-        # We check here to see if the problem has any submissions. If it does not, we don't want to rescore it
-        if not instance.has_submitted_answer():
-            return UPDATE_STATUS_SKIPPED
-
-        # Set the tracking info before this call, because it makes downstream
-        # calls that create events.  We retrieve and store the id here because
-        # the request cache will be erased during downstream calls.
-        create_new_event_transaction_id()
-        set_event_transaction_type(GRADES_RESCORE_EVENT_TYPE)
 
-        # specific events from CAPA are not propagated up the stack. Do we want this?
-        try:
-            instance.rescore(only_if_higher=task_input['only_if_higher'])
-        except (LoncapaProblemError, StudentInputError, ResponseError):
-            TASK_LOG.warning(
-                u"error processing rescore call for course %(course)s, problem %(loc)s "
-                u"and student %(student)s",
-                dict(
-                    course=course_id,
-                    loc=usage_key,
-                    student=student
-                )
-            )
-            return UPDATE_STATUS_FAILED
+def _rescore_module_instance(instance, student_module, task_input):
+    '''
+    Performs rescoring on the student's problem submission with the given
+    XModule instance of the StudentModule, or None if it couldn't be
+    instantiated, and returns the update status, as
+    rescore_problem_module_state.
+    '''
+    course_id = student_module.course_id
+    student = student_module.student
+    usage_key = student_module.module_state_key
 
-        instance.save()
-        TASK_LOG.debug(
-            u"successfully processed rescore call for course %(course)s, problem %(loc)s "
+    if instance is None:
+        # Either permissions just changed, or someone is trying to be clever
+        # and load something they shouldn't have access to.
+        msg = "No module {location} for student {student}--access denied?".format(
+            location=usage_key,
+            student=student
+        )
+        TASK_LOG.warning(msg)
+        return UPDATE_STATUS_FAILED
+
+    if not hasattr(instance, 'rescore'):
+        # This should not happen, since it should be already checked in the
+        # caller, but check here to be sure.
+        msg = "Specified module {0} of type {1} does not support rescoring.".format(usage_key, instance.__class__)
+        raise UpdateProblemModuleStateError(msg)
+
+    # We check here to see if the problem has any submissions. If it does not, we don't want to rescore it
+    if not instance.has_submitted_answer():
+        return UPDATE_STATUS_SKIPPED
+
+    # Set the tracking info before this call, because it makes downstream
+    # calls that create events.  We retrieve and store the id here because
+    # the request cache will be erased during downstream calls.
+    create_new_event_transaction_id()
+    set_event_transaction_type(GRADES_RESCORE_EVENT_TYPE)
+
+    # specific events from CAPA are not propagated up the stack. Do we want this?
+    try:
+        instance.rescore(only_if_higher=task_input['only_if_higher'])
+    except (LoncapaProblemError, StudentInputError, ResponseError):
+        TASK_LOG.warning(
+            u"error processing rescore call for course %(course)s, problem %(loc)s "
             u"and student %(student)s",
             dict(
                 course=course_id,
@@ -191,8 +332,20 @@ def rescore_problem_module_state(xmodule_instance_args, module_descriptor, stude
                 student=student
             )
         )
+        return UPDATE_STATUS_FAILED
+
+    instance.save()
+    TASK_LOG.debug(
+        u"successfully processed rescore call for course %(course)s, problem %(loc)s "
+        u"and student %(student)s",
+        dict(
+            course=course_id,
+            loc=usage_key,
+            student=student
+        )
+    )
 
-        return UPDATE_STATUS_SUCCEEDED
+    return UPDATE_STATUS_SUCCEEDED
 
 
 @outer_atomic
@@ -318,16 +471,20 @@ def delete_problem_module_state(xmodule_instance_args, _module_descriptor, stude
 
 
 def _get_module_instance_for_task(course_id, student, module_descriptor, xmodule_instance_args=None,
-                                  grade_bucket_type=None, course=None):
+                                  grade_bucket_type=None, course=None, field_data_cache=None):
     """
     Fetches a StudentModule instance for a given `course_id`, `student` object, and `module_descriptor`.
 
     `xmodule_instance_args` is used to provide information for creating a track function and an XQueue callback.
     These are passed, along with `grade_bucket_type`, to get_module_for_descriptor_internal, which sidesteps
     the need for a Request object when instantiating an xmodule instance.
+
+    The student's data is read from the given `field_data_cache`, or from one loaded for the descriptor
+    and its descendents.
     """
     # reconstitute the problem's corresponding XModule:
-    field_data_cache = FieldDataCache.cache_for_descriptor_descendents(course_id, student, module_descriptor)
+    if field_data_cache is None:
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(course_id, student, module_descriptor)
     student_data = KvsFieldData(DjangoKeyValueStore(field_data_cache))
 
     # get request-related tracking information from args passthrough, and supplement with task-specific
@@ -387,6 +544,36 @@ def _get_task_id_from_xmodule_args(xmodule_instance_args):
         return xmodule_instance_args.get('task_id', UNKNOWN_TASK_ID)
 
 
+def _get_problems(course_id, task_input):
+    """
+    Returns the list of the usage keys of the problems of the task, and the
+    dict of their descriptors by their locations.
+
+    The problems are the one of the 'problem_url' of the `task_input`, or the
+    ones in the section of its 'entrance_exam_url'.
+    """
+    usage_keys = []
+    problems = {}
+    problem_url = task_input.get('problem_url')
+    entrance_exam_url = task_input.get('entrance_exam_url')
+
+    # if problem_url is present make a usage key from it
+    if problem_url:
+        usage_key = UsageKey.from_string(problem_url).map_into_course(course_id)
+        usage_keys.append(usage_key)
+
+        # find the problem descriptor:
+        problem_descriptor = modulestore().get_item(usage_key)
+        problems[unicode(usage_key)] = problem_descriptor
+
+    # if entrance_exam is present grab all problems in it
+    if entrance_exam_url:
+        problems = get_problems_in_section(entrance_exam_url)
+        usage_keys = [UsageKey.from_string(location) for location in problems.keys()]
+
+    return usage_keys, problems
+
+
 def _get_modules_to_update(course_id, usage_keys, student_identifier, filter_fcn, override_score_task=False):
     """
     Fetches a StudentModule instances for a given `course_id`, `student` object, and `usage_keys`.
@@ -15,7 +15,8 @@ UPDATE_STATUS_SKIPPED = 'skipped'
 
 def upload_csv_to_report_store(rows, csv_name, course_id, timestamp, config_name='GRADES_DOWNLOAD'):
     """
-    Upload data as a CSV using ReportStore.
+    Upload data as a CSV using ReportStore, or in the output format
+    configured for `csv_name` in the REPORT_FORMATS of `config_name`.
 
     Arguments:
         rows: CSV data in the following format (first column may be a
@@ -31,17 +32,50 @@ def upload_csv_to_report_store(rows, csv_name, course_id, timestamp, config_name
         report_name: string - Name of the generated report
     """
     report_store = ReportStore.from_config(config_name)
-    report_name = u"{course_prefix}_{csv_name}_{timestamp_str}.csv".format(
-        course_prefix=course_filename_prefix_generator(course_id),
-        csv_name=csv_name,
-        timestamp_str=timestamp.strftime("%Y-%m-%d-%H%M")
-    )
+    report_name = _get_report_name(report_store, csv_name, course_id, timestamp)
 
     report_store.store_rows(course_id, report_name, rows)
     tracker_emit(csv_name)
     return report_name
 
 
+def open_csv_in_report_store(csv_name, course_id, timestamp, config_name='GRADES_DOWNLOAD'):
+    """
+    Open a CSV report in the ReportStore, to which rows can be appended as
+    they are generated instead of building the whole report in memory.
+
+    Returns:
+        ReportFile to upload with `upload_report_file`, and close once done.
+    """
+    report_store = ReportStore.from_config(config_name)
+    return report_store.open_rows(course_id, _get_report_name(report_store, csv_name, course_id, timestamp))
+
+
+def upload_report_file(report_file, csv_name):
+    """
+    Upload the rows written to a ReportFile opened with `open_csv_in_report_store`.
+
+    Returns:
+        report_name: string - Name of the generated report
+    """
+    report_file.store()
+    tracker_emit(csv_name)
+    return report_file.filename
+
+
+def _get_report_name(report_store, csv_name, course_id, timestamp):
+    """
+    Returns the name of the report `csv_name` generated at `timestamp`, with
+    the extension of its output format in `report_store`.
+    """
+    return u"{course_prefix}_{csv_name}_{timestamp_str}.{extension}".format(
+        course_prefix=course_filename_prefix_generator(course_id),
+        csv_name=csv_name,
+        timestamp_str=timestamp.strftime("%Y-%m-%d-%H%M"),
+        extension=report_store.get_report_extension(csv_name),
+    )
+
+
 def tracker_emit(report_name):
     """
     Emits a 'report.requested' event for the given report.
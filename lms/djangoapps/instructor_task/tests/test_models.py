@@ -1,12 +1,15 @@
 """
 Tests for instructor_task/models.py.
 """
+import codecs
 import copy
+import gzip
 import time
 from cStringIO import StringIO
 
 import boto
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.test import SimpleTestCase, TestCase, override_settings
 from mock import patch
 from opaque_keys.edx.locator import CourseLocator
@@ -51,6 +54,50 @@ class ReportStoreTestMixin(object):
             ['new_file', 'middle_file', 'old_file']
         )
 
+    def test_open_rows(self):
+        """
+        Test that rows appended to a ReportFile are stored as a CSV.
+        """
+        report_store = self.create_report_store()
+        with report_store.open_rows(self.course_id, 'report.csv') as report_file:
+            report_file.writerow(['Student ID', u'Usern\xe4me'])
+            report_file.writerows([[1, u'\xe4'], [2, 'b']])
+            self.assertEqual(report_file.rows_written, 3)
+            report_file.store()
+
+        with report_store.storage.open(report_store.path_to(self.course_id, 'report.csv')) as stored_file:
+            self.assertEqual(
+                stored_file.read(),
+                codecs.BOM_UTF8 + u'Student ID,Usern\xe4me\r\n1,\xe4\r\n2,b\r\n'.encode('utf-8')
+            )
+
+    def test_open_rows_gzip(self):
+        """
+        Test that rows appended to a ReportFile named .csv.gz are stored as a compressed CSV.
+        """
+        report_store = self.create_report_store()
+        with report_store.open_rows(self.course_id, 'report.csv.gz') as report_file:
+            report_file.writerows([['Student ID', 'Grade'], [1, 0.5]])
+            report_file.store()
+
+        with report_store.storage.open(report_store.path_to(self.course_id, 'report.csv.gz')) as stored_file:
+            self.assertEqual(
+                gzip.GzipFile(fileobj=StringIO(stored_file.read())).read(),
+                codecs.BOM_UTF8 + 'Student ID,Grade\r\n1,0.5\r\n'
+            )
+
+    def test_report_extension(self):
+        report_store = self.create_report_store()
+        self.assertEqual(report_store.get_report_extension('grade_report'), 'csv')
+
+        report_store.report_formats = {'default': 'csv.gz', 'ORA_data': 'csv'}
+        self.assertEqual(report_store.get_report_extension('grade_report'), 'csv.gz')
+        self.assertEqual(report_store.get_report_extension('ORA_data'), 'csv')
+
+        report_store.report_formats = {'default': 'xlsx'}
+        with self.assertRaises(ImproperlyConfigured):
+            report_store.get_report_extension('grade_report')
+
 
 class LocalFSReportStoreTestCase(ReportStoreTestMixin, TestReportMixin, SimpleTestCase):
     """
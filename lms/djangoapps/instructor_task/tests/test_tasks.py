@@ -6,19 +6,27 @@ paths actually work.
 """
 
 import json
+from datetime import datetime, timedelta
 from functools import partial
 from uuid import uuid4
 
 import ddt
 from celery.states import FAILURE, SUCCESS
+from django.test.utils import override_settings
 from django.utils.translation import ugettext_noop
 from mock import MagicMock, Mock, patch
 from nose.plugins.attrib import attr
 from opaque_keys.edx.locations import i4xEncoder
+from pytz import UTC
 
 from course_modes.models import CourseMode
 from courseware.models import StudentModule
 from courseware.tests.factories import StudentModuleFactory
+from lms.djangoapps.grades.config.models import PersistentGradesEnabledFlag
+from lms.djangoapps.grades.constants import ScoreDatabaseTableEnum
+from lms.djangoapps.grades.models import PersistentSubsectionGrade
+from lms.djangoapps.grades.signals.handlers import enqueue_subsection_update
+from lms.djangoapps.grades.tasks import recalculate_subsection_grades
 from lms.djangoapps.instructor_task.exceptions import UpdateProblemModuleStateError
 from lms.djangoapps.instructor_task.models import InstructorTask
 from lms.djangoapps.instructor_task.tasks import (
@@ -489,6 +497,131 @@ class TestRescoreInstructorTask(TestInstructorTasks):
             action_name='rescored'
         )
 
+    @override_settings(BULK_RESCORE_CHUNK_SIZE=3)
+    def test_bulk_rescoring(self):
+        """
+        Tests rescores a problem in a course, for all students, in chunks.
+        """
+        mock_instance = MagicMock()
+        getattr(mock_instance, 'rescore').return_value = None
+        mock_instance.has_submitted_answer.side_effect = [True] * 9 + [False]
+
+        num_students = 10
+        self._create_students_with_state(num_students)
+        task_entry = self._create_input_entry()
+        with patch(
+                'lms.djangoapps.instructor_task.tasks_helper.module_state.get_module_for_descriptor_internal'
+        ) as mock_get_module:
+            mock_get_module.return_value = mock_instance
+            with patch(
+                    'lms.djangoapps.instructor_task.tasks_helper.module_state.FieldDataCache.cache_for_descriptor_descendents'
+            ) as mock_cache_for_descriptor:
+                self._run_task_with_mock_celery(rescore_problem, task_entry.id, task_entry.task_id)
+
+        # the states of the students were read along with their modules
+        mock_cache_for_descriptor.assert_not_called()
+        self.assertEqual(mock_get_module.call_count, num_students)
+        self.assert_task_output(
+            output=self.get_task_output(task_entry.id),
+            total=num_students,
+            attempted=num_students,
+            succeeded=num_students - 1,
+            skipped=1,
+            failed=0,
+            action_name='rescored'
+        )
+
+    def _run_bulk_rescoring_with_score_changes(self, modified=None):
+        """
+        Runs a bulk rescoring task in which each student's score changes to
+        1, and returns the mocks of recalculate_subsection_grades and of
+        the enqueued recalculate_subsection_grade_v3 tasks.
+
+        The changed scores are published with the given modified time, or
+        once saved.
+        """
+        task_entry = self._create_input_entry()
+        mock_instance = MagicMock()
+        mock_instance.has_submitted_answer.return_value = True
+
+        def get_module(user, **kwargs):  # pylint: disable=unused-argument
+            """
+            Returns the mock instance, as the module of the given student.
+            """
+            mock_instance.student = user
+            return mock_instance
+
+        def rescore(**kwargs):  # pylint: disable=unused-argument
+            """
+            Changes the score of the student, and publishes it.
+            """
+            student_module = StudentModule.objects.get(student=mock_instance.student, module_state_key=self.location)
+            if modified is None:
+                student_module.grade = 1
+                student_module.save()
+            enqueue_subsection_update(
+                None,
+                weighted_earned=1,
+                weighted_possible=1,
+                user_id=mock_instance.student.id,
+                course_id=unicode(self.course.id),
+                usage_id=unicode(self.location),
+                only_if_higher=False,
+                modified=modified or student_module.modified,
+                score_db_table=ScoreDatabaseTableEnum.courseware_student_module,
+            )
+
+        mock_instance.rescore.side_effect = rescore
+        module_state = 'lms.djangoapps.instructor_task.tasks_helper.module_state'
+        with patch(module_state + '.get_module_for_descriptor_internal', side_effect=get_module):
+            with patch(
+                module_state + '.recalculate_subsection_grades', wraps=recalculate_subsection_grades
+            ) as mock_recalculate:
+                with patch('lms.djangoapps.grades.tasks.recalculate_subsection_grade_v3.apply_async') as mock_apply:
+                    with patch('lms.djangoapps.grades.signals.handlers.recalculate_subsection_grade_v3') as mock_task:
+                        self._run_task_with_mock_celery(rescore_problem, task_entry.id, task_entry.task_id)
+
+        mock_task.apply_async.assert_not_called()
+        return mock_recalculate, mock_apply
+
+    @override_settings(BULK_RESCORE_CHUNK_SIZE=3)
+    def test_bulk_rescoring_recalculates_subsection_grades(self):
+        """
+        Tests the subsection grades of the students whose scores changed are recalculated once per chunk.
+        """
+        PersistentGradesEnabledFlag.objects.create(enabled_for_all_courses=True, enabled=True)
+        students = self._create_students_with_state(4)
+        mock_recalculate, mock_apply = self._run_bulk_rescoring_with_score_changes()
+
+        chunk_user_ids = [
+            sorted(task_kwargs['user_id'] for task_kwargs in call[0][1])
+            for call in mock_recalculate.call_args_list
+        ]
+        self.assertEqual(
+            sorted(chunk_user_ids),
+            sorted([sorted(student.id for student in students[:3]), [students[3].id]]),
+        )
+        mock_apply.assert_not_called()
+        for student in students:
+            subsection_grade = PersistentSubsectionGrade.read_grade(student.id, self.problem_section.location)
+            self.assertEqual(subsection_grade.earned_all, 1)
+
+    @override_settings(BULK_RESCORE_CHUNK_SIZE=3)
+    def test_bulk_rescoring_enqueues_unsaved_recalculations(self):
+        """
+        Tests the recalculations of scores not saved yet are enqueued, to be retried.
+        """
+        students = self._create_students_with_state(4)
+        __, mock_apply = self._run_bulk_rescoring_with_score_changes(modified=datetime.now(UTC) + timedelta(days=1))
+
+        self.assertEqual(
+            sorted(call[1]['kwargs']['user_id'] for call in mock_apply.call_args_list),
+            sorted(student.id for student in students),
+        )
+        self.assertFalse(
+            PersistentSubsectionGrade.objects.filter(user_id__in=[student.id for student in students]).exists()
+        )
+
 
 @attr(shard=3)
 class TestResetAttemptsInstructorTask(TestInstructorTasks):
@@ -17,6 +17,7 @@ from datetime import datetime, timedelta
 
 import ddt
 import unicodecsv
+from billiard import Pool
 from capa.tests.response_xml_factory import MultipleChoiceResponseXMLFactory
 from course_modes.models import CourseMode
 from course_modes.tests.factories import CourseModeFactory
@@ -25,7 +26,7 @@ from django.conf import settings
 from django.urls import reverse
 from django.test.utils import override_settings
 from freezegun import freeze_time
-from instructor_analytics.basic import UNAVAILABLE, list_problem_responses
+from instructor_analytics.basic import UNAVAILABLE, iter_problem_responses_by_block
 from mock import MagicMock, Mock, patch, ANY
 from nose.plugins.attrib import attr
 from pytz import UTC
@@ -156,6 +157,37 @@ class TestInstructorGradeReport(InstructorGradeReportTestCase):
         report_store = ReportStore.from_config(config_name='GRADES_DOWNLOAD')
         self.assertTrue(any('grade_report_err' in item[0] for item in report_store.links_for(self.course.id)))
 
+    def _grade_report_rows(self):
+        """
+        Generates the grade report of the course and returns its rows, removing it from the report store.
+        """
+        with patch('lms.djangoapps.instructor_task.tasks_helper.runner._get_current_task'):
+            CourseGradeReport.generate(None, None, self.course.id, None, 'graded')
+        report_store = ReportStore.from_config(config_name='GRADES_DOWNLOAD')
+        report_path = report_store.path_to(self.course.id, report_store.links_for(self.course.id)[0][0])
+        with report_store.storage.open(report_path) as csv_file:
+            rows = list(unicodecsv.reader(csv_file, encoding='utf-8-sig'))
+        report_store.storage.delete(report_path)
+        return rows
+
+    def test_grading_in_worker_processes(self):
+        """
+        Test that the batches graded by a pool of processes make the same report as a single process.
+        """
+        self.create_student('student1', mode='verified')
+        self.create_student('student2', enrollment_active=False)
+        self.create_student('student3')
+        serial_rows = self._grade_report_rows()
+
+        with override_settings(GRADE_REPORT_WORKER_PROCESSES=2), \
+                patch.object(CourseGradeReport, 'USER_BATCH_SIZE', 1), \
+                patch('lms.djangoapps.instructor_task.tasks_helper.grades.Pool', wraps=Pool) as mock_pool:
+            pooled_rows = self._grade_report_rows()
+
+        self.assertEqual(mock_pool.call_args[1]['processes'], 2)
+        self.assertTrue({'student1', 'student2', 'student3'}.issubset(row[2] for row in serial_rows))
+        self.assertEqual(pooled_rows, serial_rows)
+
     def test_cohort_data_in_grading(self):
         """
         Test that cohort data is included in grades csv if cohort configuration is enabled for course.
@@ -525,10 +557,10 @@ class TestProblemResponsesReport(TestReportMixin, InstructorTaskModuleTestCase):
         self.assertEquals(len(student_data), 4)
 
     @patch(
-        'lms.djangoapps.instructor_task.tasks_helper.grades.list_problem_responses',
-        wraps=list_problem_responses
+        'lms.djangoapps.instructor_task.tasks_helper.grades.iter_problem_responses_by_block',
+        wraps=iter_problem_responses_by_block
     )
-    def test_build_student_data_for_block_without_generate_report_data(self, mock_list_problem_responses):
+    def test_build_student_data_for_block_without_generate_report_data(self, mock_iter_problem_responses):
         """
         Ensure that building student data for a block the doesn't have the
         ``generate_report_data`` method works as expected.
@@ -549,7 +581,7 @@ class TestProblemResponsesReport(TestReportMixin, InstructorTaskModuleTestCase):
             'title': 'Problem1',
         }, student_data[0])
         self.assertIn('state', student_data[0])
-        mock_list_problem_responses.assert_called_with(self.course.id, ANY, ANY)
+        mock_iter_problem_responses.assert_called_with(self.course.id, ANY, ANY)
 
     @patch('xmodule.capa_module.CapaDescriptor.generate_report_data', create=True)
     def test_build_student_data_for_block_with_mock_generate_report_data(self, mock_generate_report_data):
@@ -603,12 +635,15 @@ class TestProblemResponsesReport(TestReportMixin, InstructorTaskModuleTestCase):
         }, student_data[0])
         self.assertIn('state', student_data[0])
 
-    @patch('lms.djangoapps.instructor_task.tasks_helper.grades.list_problem_responses')
+    @patch(
+        'lms.djangoapps.instructor_task.tasks_helper.grades.iter_problem_responses_by_block',
+        wraps=iter_problem_responses_by_block
+    )
     @patch('xmodule.capa_module.CapaDescriptor.generate_report_data', create=True)
     def test_build_student_data_for_block_with_generate_report_data_not_implemented(
             self,
             mock_generate_report_data,
-            mock_list_problem_responses,
+            mock_iter_problem_responses,
     ):
         """
         Ensure that if ``generate_report_data`` raises a NotImplementedError,
@@ -622,7 +657,7 @@ class TestProblemResponsesReport(TestReportMixin, InstructorTaskModuleTestCase):
             usage_key_str=str(problem.location),
         )
         mock_generate_report_data.assert_called_with(ANY, ANY)
-        mock_list_problem_responses.assert_called_with(self.course.id, ANY, ANY)
+        mock_iter_problem_responses.assert_called_with(self.course.id, ANY, ANY)
 
     def test_success(self):
         task_input = {
@@ -195,6 +195,8 @@ if ENV_TOKENS.get('SESSION_COOKIE_NAME', None):
     # NOTE, there's a bug in Django (http://bugs.python.org/issue18012) which necessitates this being a str()
     SESSION_COOKIE_NAME = str(ENV_TOKENS.get('SESSION_COOKIE_NAME'))
 
+COURSE_ASSETS_DISK_CACHE = ENV_TOKENS.get('COURSE_ASSETS_DISK_CACHE', COURSE_ASSETS_DISK_CACHE)
+
 CACHES = ENV_TOKENS['CACHES']
 # Cache used for location mapping -- called many times with the same key/value
 # in a given request.
@@ -621,6 +623,20 @@ HEARTBEAT_CHECKS = ENV_TOKENS.get('HEARTBEAT_CHECKS', HEARTBEAT_CHECKS)
 HEARTBEAT_EXTENDED_CHECKS = ENV_TOKENS.get('HEARTBEAT_EXTENDED_CHECKS', HEARTBEAT_EXTENDED_CHECKS)
 HEARTBEAT_CELERY_TIMEOUT = ENV_TOKENS.get('HEARTBEAT_CELERY_TIMEOUT', HEARTBEAT_CELERY_TIMEOUT)
 
+# Progress
+PROGRESS_COMPLETION_PIPELINE = ENV_TOKENS.get('PROGRESS_COMPLETION_PIPELINE', PROGRESS_COMPLETION_PIPELINE)
+RECALCULATE_PROGRESS_ROUTING_KEY = ENV_TOKENS.get('RECALCULATE_PROGRESS_ROUTING_KEY', RECALCULATE_PROGRESS_ROUTING_KEY)
+
+# Social engagement
+SOCIAL_ENGAGEMENT_SCORE_UPDATES = ENV_TOKENS.get('SOCIAL_ENGAGEMENT_SCORE_UPDATES', SOCIAL_ENGAGEMENT_SCORE_UPDATES)
+SOCIAL_ENGAGEMENT_FLUSH_INTERVAL = ENV_TOKENS.get('SOCIAL_ENGAGEMENT_FLUSH_INTERVAL', SOCIAL_ENGAGEMENT_FLUSH_INTERVAL)
+SOCIAL_ENGAGEMENT_DECREMENT_ON_DELETION = ENV_TOKENS.get(
+    'SOCIAL_ENGAGEMENT_DECREMENT_ON_DELETION', SOCIAL_ENGAGEMENT_DECREMENT_ON_DELETION
+)
+
+# Site SASS
+COMPILE_SITE_SASS_ON_SAVE = ENV_TOKENS.get('COMPILE_SITE_SASS_ON_SAVE', COMPILE_SITE_SASS_ON_SAVE)
+
 # Student identity verification settings
 VERIFY_STUDENT = AUTH_TOKENS.get("VERIFY_STUDENT", VERIFY_STUDENT)
 DISABLE_ACCOUNT_ACTIVATION_REQUIREMENT_SWITCH = ENV_TOKENS.get(
@@ -632,6 +648,9 @@ DISABLE_ACCOUNT_ACTIVATION_REQUIREMENT_SWITCH = ENV_TOKENS.get(
 GRADES_DOWNLOAD_ROUTING_KEY = ENV_TOKENS.get('GRADES_DOWNLOAD_ROUTING_KEY', HIGH_MEM_QUEUE)
 
 GRADES_DOWNLOAD = ENV_TOKENS.get("GRADES_DOWNLOAD", GRADES_DOWNLOAD)
+GRADE_REPORT_WORKER_PROCESSES = ENV_TOKENS.get('GRADE_REPORT_WORKER_PROCESSES', GRADE_REPORT_WORKER_PROCESSES)
+BULK_RESCORE_CHUNK_SIZE = ENV_TOKENS.get('BULK_RESCORE_CHUNK_SIZE', BULK_RESCORE_CHUNK_SIZE)
+BULK_RESCORE_WORKER_PROCESSES = ENV_TOKENS.get('BULK_RESCORE_WORKER_PROCESSES', BULK_RESCORE_WORKER_PROCESSES)
 
 # Rate limit for regrading tasks that a grading policy change can kick off
 POLICY_CHANGE_TASK_RATE_LIMIT = ENV_TOKENS.get('POLICY_CHANGE_TASK_RATE_LIMIT', POLICY_CHANGE_TASK_RATE_LIMIT)
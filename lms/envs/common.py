@@ -723,6 +723,10 @@ HEARTBEAT_CELERY_TIMEOUT = 5
 PROGRESS_DETACHED_VERTICAL_CATEGORIES = ['discussion-course', 'group-project', 'gp-v2-project', 'eoc-journal']
 # Modules having these categories would be excluded from progress calculations
 PROGRESS_DETACHED_CATEGORIES = PROGRESS_DETACHED_VERTICAL_CATEGORIES + ['discussion-forum']
+# How block completions are turned into progress: 'sync' applies each completion inside the
+# request that saved it, 'batched' hands them to a celery worker which applies them in bulk,
+# once per request through the progress CompletionEventsMiddleware
+PROGRESS_COMPLETION_PIPELINE = 'sync'
 
 ############################## EVENT TRACKING #################################
 LMS_SEGMENT_KEY = None
@@ -897,6 +901,17 @@ CODE_JAIL = {
         # How many CPU seconds can jailed code use?
         'CPU': 1,
     },
+
+    # Pool of sandboxed Python processes started ahead of time, with the
+    # modules assumed by capa's code already imported.  Only used by the web
+    # server processes, as it's configured by a middleware.
+    'worker_pool': {
+        # How many warm processes does each server process keep?  0 disables the pool.
+        'size': 0,
+        # How many executions can a process run before it's replaced?  Only
+        # raise it for trusted code, as executions then share the process.
+        'max_jobs': 1,
+    },
 }
 
 # Some courses are allowed to run unsafe code. This is a list of regexes, one
@@ -1228,6 +1243,8 @@ MIDDLEWARE_CLASSES = [
     'crum.CurrentRequestUserMiddleware',
 
     'openedx.core.djangoapps.request_cache.middleware.RequestCache',
+    # Hands the completions buffered by the batched progress pipeline to one task per request
+    'openedx.core.djangoapps.youngsphere.progress.middleware.CompletionEventsMiddleware',
     'openedx.core.djangoapps.monitoring_utils.middleware.MonitoringCustomMetrics',
 
     'mobile_api.middleware.AppVersionUpgrade',
@@ -1283,6 +1300,7 @@ MIDDLEWARE_CLASSES = [
 
     'django_comment_client.utils.ViewNameMiddleware',
     'codejail.django_integration.ConfigureCodeJailMiddleware',
+    'util.sandboxing.ConfigureSandboxWorkerPoolMiddleware',
 
     # catches any uncaught RateLimitExceptions and returns a 403 instead of a 500
     'ratelimitbackend.middleware.RateLimitMiddleware',
@@ -1318,6 +1336,13 @@ X_FRAME_OPTIONS = 'ALLOW'
 # Platform for Privacy Preferences header
 P3P_HEADER = 'CP="Open EdX does not have a P3P policy."'
 
+# Local on-disk cache of the course assets too large for the course_assets cache, served by the
+# StaticContentServer from there instead of from the contentstore. Disabled when ROOT is None.
+COURSE_ASSETS_DISK_CACHE = {
+    'ROOT': None,
+    'MAX_SIZE': 2 * 1024 * 1024 * 1024,
+}
+
 ############################### PIPELINE #######################################
 
 PIPELINE_ENABLED = True
@@ -1953,6 +1978,11 @@ BLOCK_STRUCTURES_SETTINGS = dict(
 
     # Backend storage options
     PRUNING_ACTIVE=False,
+
+    # Maximum total size, in serialized bytes, of the collected block
+    # structures kept deserialized in the memory of each process.
+    # Set to 0 to disable this local cache.
+    LOCAL_CACHE_MAX_SIZE=25 * 1024 * 1024,
 )
 
 ################################ Bulk Email ###################################
@@ -2004,6 +2034,25 @@ BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS = 0.02
 # Queue to use for updating persistent social engagements
 RECALCULATE_SOCIAL_ENGAGEMENT_ROUTING_KEY = LOW_PRIORITY_QUEUE
 
+# How forum activity updates engagement scores: 'sync' writes each change as it happens,
+# 'coalesced' accumulates the changes in the cache and writes them in bulk every
+# SOCIAL_ENGAGEMENT_FLUSH_INTERVAL seconds
+SOCIAL_ENGAGEMENT_SCORE_UPDATES = 'sync'
+SOCIAL_ENGAGEMENT_FLUSH_INTERVAL = 60
+# Whether deleting a thread or a comment decrements the scores of the users involved in it, as
+# found in the participant index of the thread, when the deletion signal doesn't send them along
+SOCIAL_ENGAGEMENT_DECREMENT_ON_DELETION = False
+
+####################### Site SASS ##############################
+
+# Whether saving a SiteConfiguration queues the compilation of the site's SASS to the celery workers
+COMPILE_SITE_SASS_ON_SAVE = False
+
+####################### Persistent Progress ##############################
+
+# Queue to use for applying batched completions to persistent progress
+RECALCULATE_PROGRESS_ROUTING_KEY = DEFAULT_PRIORITY_QUEUE
+
 
 ############################# Email Opt In ####################################
 
@@ -2623,12 +2672,24 @@ BADGR_TIMEOUT = 10
 # the ones that contain information other than grades.
 GRADES_DOWNLOAD_ROUTING_KEY = HIGH_MEM_QUEUE
 
+# The output format of the reports can be set by report name, or 'default', in
+# REPORT_FORMATS: 'csv' (the default) or 'csv.gz', e.g. 'REPORT_FORMATS': {'grade_report': 'csv.gz'}.
 GRADES_DOWNLOAD = {
     'STORAGE_TYPE': 'localfs',
     'BUCKET': 'edx-grades',
     'ROOT_PATH': '/tmp/edx-s3/grades',
 }
 
+# Number of processes among which the batches of learners of a course grade report are sharded.
+GRADE_REPORT_WORKER_PROCESSES = 1
+
+# Number of submissions to a problem rescored together by a rescore task, in a single transaction
+# followed by a single grade recalculation. 0 rescores them one by one.
+BULK_RESCORE_CHUNK_SIZE = 0
+
+# Number of processes among which the chunks of submissions of a bulk rescore are spread.
+BULK_RESCORE_WORKER_PROCESSES = 1
+
 FINANCIAL_REPORTS = {
     'STORAGE_TYPE': 'localfs',
     'BUCKET': 'edx-financial-reports',
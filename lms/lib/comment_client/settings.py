@@ -1,4 +1,5 @@
 from django.conf import settings
+from requests.adapters import DEFAULT_POOLSIZE
 
 if hasattr(settings, "COMMENTS_SERVICE_URL"):
     SERVICE_HOST = settings.COMMENTS_SERVICE_URL
@@ -6,3 +7,11 @@ else:
     SERVICE_HOST = 'http://localhost:4567'
 
 PREFIX = SERVICE_HOST + '/api/v1'
+
+# Number of hosts whose connections are pooled, and number of keep-alive
+# connections kept open to each of them, by each process.
+POOL_CONNECTIONS = getattr(settings, "COMMENTS_SERVICE_POOL_CONNECTIONS", DEFAULT_POOLSIZE)
+POOL_MAXSIZE = getattr(settings, "COMMENTS_SERVICE_POOL_MAXSIZE", DEFAULT_POOLSIZE)
+
+# Number of requests performed at the same time by perform_requests_concurrently.
+MAX_CONCURRENT_REQUESTS = getattr(settings, "COMMENTS_SERVICE_MAX_CONCURRENT_REQUESTS", POOL_MAXSIZE)
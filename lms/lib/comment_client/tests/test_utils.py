@@ -0,0 +1,139 @@
+"""
+Tests for the requests of the comment client to the comments service.
+"""
+import json
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from django.test import TestCase
+from django.utils import translation
+from mock import patch
+
+from django_comment_common.models import ForumsConfig
+from lms.lib.comment_client import utils
+
+
+class StubCommentServiceHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the stub comments service, which responds to each request
+    with its path, or with a 404 to the requests of missing paths.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Records the request and responds to it.
+        """
+        self.server.record_request(self)
+        status_code = 404 if self.path.startswith('/missing') else 200
+        body = json.dumps({'path': self.path.split('?')[0]})
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class StubCommentServiceServer(ThreadingMixIn, HTTPServer):
+    """
+    Stub comments service on a local port, which records the connections
+    and the languages of the requests it serves, and how many of them are
+    served at the same time.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubCommentServiceHandler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server_address[1])
+        self.client_addresses = set()
+        self.languages = []
+        self.max_active_requests = 0
+        self._active_requests = 0
+        self._lock = threading.Lock()
+
+    def record_request(self, handler):
+        """
+        Records the given request, and keeps it active for a while.
+        """
+        with self._lock:
+            self.client_addresses.add(handler.client_address)
+            self.languages.append(handler.headers.get('Accept-Language'))
+            self._active_requests += 1
+            self.max_active_requests = max(self.max_active_requests, self._active_requests)
+        time.sleep(0.1)
+        with self._lock:
+            self._active_requests -= 1
+
+
+class PerformRequestTestCase(TestCase):
+    """
+    Tests for the requests to a stub comments service.
+    """
+    def setUp(self):
+        super(PerformRequestTestCase, self).setUp()
+        config = ForumsConfig.current()
+        config.enabled = True
+        config.save()
+
+        self.server = StubCommentServiceServer()
+        server_thread = threading.Thread(target=self.server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        # Use a new session and executor for each test.
+        process_state_patcher = patch.object(utils, '_process_state', None)
+        process_state_patcher.start()
+        self.addCleanup(process_state_patcher.stop)
+
+    def test_connections_reused(self):
+        for path in ['/a', '/b', '/c']:
+            self.assertEqual(utils.perform_request('get', self.server.url + path), {'path': path})
+        self.assertEqual(len(self.server.client_addresses), 1)
+
+    def test_session_per_process(self):
+        session = utils.get_session()
+        self.assertIs(utils.get_session(), session)
+        with patch('lms.lib.comment_client.utils.os.getpid', return_value=-1):
+            self.assertIsNot(utils.get_session(), session)
+
+    def test_perform_requests_concurrently(self):
+        paths = ['/a', '/b', '/c', '/d']
+        with translation.override('fr'):
+            results = utils.perform_requests_concurrently(
+                [{'method': 'get', 'url': self.server.url + path} for path in paths]
+            )
+        self.assertEqual(results, [{'path': path} for path in paths])
+        self.assertGreater(self.server.max_active_requests, 1)
+        self.assertEqual(self.server.languages, ['fr'] * len(paths))
+
+    def test_perform_requests_concurrently_error(self):
+        with self.assertRaises(utils.CommentClientRequestError):
+            utils.perform_requests_concurrently([
+                {'method': 'get', 'url': self.server.url + '/a'},
+                {'method': 'get', 'url': self.server.url + '/missing'},
+            ])
+
+    def test_perform_requests_concurrently_error_once_done(self):
+        with self.assertRaises(utils.CommentClientRequestError):
+            utils.perform_requests_concurrently([
+                {'method': 'get', 'url': self.server.url + '/missing'},
+                {'method': 'get', 'url': self.server.url + '/a'},
+                {'method': 'get', 'url': self.server.url + '/b'},
+            ])
+        # the error is raised once all of the requests are done
+        self.assertEqual(len(self.server.languages), 3)
+        self.assertEqual(self.server._active_requests, 0)  # pylint: disable=protected-access
+
+    def test_perform_requests_concurrently_disabled(self):
+        config = ForumsConfig.current()
+        config.enabled = False
+        config.save()
+        with self.assertRaises(utils.CommentClientMaintenanceError):
+            utils.perform_requests_concurrently([{'method': 'get', 'url': self.server.url + '/a'}])
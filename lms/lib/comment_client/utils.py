@@ -1,17 +1,27 @@
 """" Common utilities for comment client wrapper """
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from contextlib import contextmanager
 from time import time
 from uuid import uuid4
 
 import requests
+from requests.adapters import HTTPAdapter
 from django.utils.translation import get_language
 
 import dogstats_wrapper as dog_stats_api
-from .settings import SERVICE_HOST as COMMENTS_SERVICE
+from .settings import MAX_CONCURRENT_REQUESTS, POOL_CONNECTIONS, POOL_MAXSIZE, SERVICE_HOST as COMMENTS_SERVICE
 
 log = logging.getLogger(__name__)
 
+# The session and the executor of the requests to the comments service are
+# created on first use in each process, since the connections of a session
+# can't be shared with the processes forked from it.
+_process_state = None
+_process_state_lock = threading.Lock()
+
 
 def strip_none(dic):
     return dict([(k, v) for k, v in dic.iteritems() if v is not None])
@@ -49,15 +59,109 @@ def request_timer(request_id, method, url, tags=None):
     )
 
 
-def perform_request(method, url, data_or_params=None, raw=False,
-                    metric_action=None, metric_tags=None, paged_results=False):
+def _get_process_state():
+    """
+    Returns the dict of the session and executor of the current process.
+    """
+    global _process_state  # pylint: disable=global-statement
+    pid = os.getpid()
+    state = _process_state
+    if state is None or state['pid'] != pid:
+        with _process_state_lock:
+            state = _process_state
+            if state is None or state['pid'] != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _process_state = state = {
+                    'pid': pid,
+                    'session': session,
+                    'executor': ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS),
+                }
+    return state
+
+
+def get_session():
+    """
+    Returns the requests Session of the current process, which keeps its
+    connections to the comments service alive and reuses them across
+    requests.
+    """
+    return _get_process_state()['session']
+
+
+def send_request(method, url, **kwargs):
+    """
+    Sends an HTTP request to the comments service over the pooled
+    connections of the current process, with the arguments of
+    requests.request, and returns its response.
+    """
+    return get_session().request(method, url, **kwargs)
+
+
+def _get_forums_config():
+    """
+    Returns the current ForumsConfig, or raises a CommentClientMaintenanceError
+    if the forums are disabled.
+    """
     # To avoid dependency conflict
     from django_comment_common.models import ForumsConfig
     config = ForumsConfig.current()
 
     if not config.enabled:
         raise CommentClientMaintenanceError('service disabled')
+    return config
+
+
+def perform_request(method, url, data_or_params=None, raw=False,
+                    metric_action=None, metric_tags=None, paged_results=False):
+    return _perform_request(
+        _get_forums_config(),
+        get_language(),
+        method,
+        url,
+        data_or_params=data_or_params,
+        raw=raw,
+        metric_action=metric_action,
+        metric_tags=metric_tags,
+        paged_results=paged_results,
+    )
+
 
+def perform_requests_concurrently(requests_kwargs):
+    """
+    Performs the given independent requests to the comments service at the
+    same time and returns the list of their results, in order.
+
+    Arguments:
+        requests_kwargs (list [dict]) - The keyword arguments of
+            perform_request for each request.
+
+    Raises the error of the first failed request, once all of them are
+    done.
+    """
+    requests_kwargs = list(requests_kwargs)
+    # The config and the language are read once, from the thread of the
+    # caller, since the threads of the executor don't share its active
+    # language or database connection.
+    config = _get_forums_config()
+    language = get_language()
+    if len(requests_kwargs) <= 1:
+        return [_perform_request(config, language, **kwargs) for kwargs in requests_kwargs]
+
+    executor = _get_process_state()['executor']
+    futures = [executor.submit(_perform_request, config, language, **kwargs) for kwargs in requests_kwargs]
+    wait(futures)
+    return [future.result() for future in futures]
+
+
+def _perform_request(config, language, method, url, data_or_params=None, raw=False,
+                     metric_action=None, metric_tags=None, paged_results=False):
+    """
+    Performs the given request to the comments service with the given
+    ForumsConfig and language, and returns its result.
+    """
     if metric_tags is None:
         metric_tags = []
 
@@ -69,7 +173,7 @@ def perform_request(method, url, data_or_params=None, raw=False,
         data_or_params = {}
     headers = {
         'X-Edx-Api-Key': config.api_key,
-        'Accept-Language': get_language(),
+        'Accept-Language': language,
     }
     request_id = uuid4()
     request_id_dict = {'request_id': request_id}
@@ -82,7 +186,7 @@ def perform_request(method, url, data_or_params=None, raw=False,
         params = data_or_params.copy()
         params.update(request_id_dict)
     with request_timer(request_id, method, url, metric_tags):
-        response = requests.request(
+        response = send_request(
             method,
             url,
             data=data,
@@ -182,7 +286,7 @@ def check_forum_heartbeat():
         return 'forum', True, 'OK'
 
     try:
-        res = requests.get(
+        res = get_session().get(
             '%s/heartbeat' % COMMENTS_SERVICE,
             timeout=config.connection_timeout
         ).json()
@@ -15,6 +15,7 @@ from logging import getLogger
 from openedx.core.lib.graph_traversals import traverse_topologically, traverse_post_order
 
 from .exceptions import TransformerException
+from .graph import BlockGraph
 
 
 logger = getLogger(__name__)  # pylint: disable=invalid-name
@@ -76,6 +77,27 @@ class BlockStructure(object):
     def __len__(self):
         return len(self._block_relations)
 
+    @property
+    def _block_relations(self):
+        return self._relations
+
+    @_block_relations.setter
+    def _block_relations(self, block_relations):
+        self._relations = block_relations
+        self._graph = None
+
+    def get_graph(self):
+        """
+        Returns the array-backed BlockGraph of the current relations of
+        this block structure, see the graph module.
+
+        The graph is built on first use and rebuilt once the relations
+        are changed.
+        """
+        if self._graph is None:
+            self._graph = BlockGraph(self._block_relations)
+        return self._graph
+
     #--- Block structure relation methods ---#
 
     def get_parents(self, usage_key):
@@ -121,6 +143,7 @@ class BlockStructure(object):
         """
         self.root_block_usage_key = usage_key
         self._block_relations[usage_key].parents = []
+        self._graph = None
 
     def __contains__(self, usage_key):
         """
@@ -164,16 +187,58 @@ class BlockStructure(object):
             openedx.core.lib.graph_traversals.traverse_topologically.
 
         Returns:
-            generator - A generator object created from the
-                traverse_topologically method.
-        """
-        return traverse_topologically(
-            start_node=start_node or self.root_block_usage_key,
-            get_parents=self.get_parents,
-            get_children=self.get_children,
-            filter_func=filter_func,
-            yield_descendants_of_unyielded=yield_descendants_of_unyielded,
-        )
+            generator - A generator yielding the same usage keys as the
+                traverse_topologically method would.
+        """
+        start_node = start_node or self.root_block_usage_key
+        if start_node not in self:
+            return traverse_topologically(
+                start_node=start_node,
+                get_parents=self.get_parents,
+                get_children=self.get_children,
+                filter_func=filter_func,
+                yield_descendants_of_unyielded=yield_descendants_of_unyielded,
+            )
+        return self._traverse_graph_topologically(start_node, filter_func, yield_descendants_of_unyielded)
+
+    def _traverse_graph_topologically(self, start_node, filter_func, yield_descendants_of_unyielded):
+        """
+        Generator for the topological traversal of the blocks of this
+        structure over the ids of its BlockGraph.
+
+        Blocks may be removed from the structure while it is traversed,
+        as done by removal filters. Once the relations change, the
+        current parents of each remaining block are considered, as the
+        generic traversal does.
+        """
+        graph = self.get_graph()
+        keys = graph.keys
+        start_id = graph.ids[start_node]
+        visited = bytearray(len(graph))
+        yielded = bytearray(len(graph))
+
+        for block_id in graph.topological_order(start_id):
+            if block_id != start_id:
+                if self._graph is graph:
+                    parent_ids = graph.parents(block_id)
+                else:
+                    parent_ids = [graph.ids.get(parent_key) for parent_key in self.get_parents(keys[block_id])]
+                    if None in parent_ids:
+                        continue
+
+                # Visit the block only once all of its parents are visited,
+                # and at least one of them is yielded unless specified
+                # otherwise (via yield_descendants_of_unyielded).
+                if not all(visited[parent_id] for parent_id in parent_ids):
+                    continue
+                elif not yield_descendants_of_unyielded and not any(yielded[parent_id] for parent_id in parent_ids):
+                    continue
+
+            visited[block_id] = 1
+            block_key = keys[block_id]
+            if filter_func is None or filter_func(block_key):
+                yielded[block_id] = 1
+                yield block_key
 
     def post_order_traversal(
             self,
@@ -188,16 +253,49 @@ class BlockStructure(object):
             See the description in
             openedx.core.lib.graph_traversals.traverse_post_order.
 
+        Note: The relations of the blocks must not be changed during the
+        traversal.
+
         Returns:
-            generator - A generator object created from the
-                traverse_post_order method.
-        """
-        return traverse_post_order(
-            start_node=start_node or self.root_block_usage_key,
-            get_children=self.get_children,
-            filter_func=filter_func,
+            generator - A generator yielding the same usage keys as the
+                traverse_post_order method would.
+        """
+        start_node = start_node or self.root_block_usage_key
+        if start_node not in self:
+            return traverse_post_order(
+                start_node=start_node,
+                get_children=self.get_children,
+                filter_func=filter_func,
+            )
+
+        graph = self.get_graph()
+        keys = graph.keys
+        return (
+            keys[block_id]
+            for block_id in graph.post_order(
+                graph.ids[start_node],
+                filter_func=(lambda block_id: filter_func(keys[block_id])) if filter_func else None,
+            )
         )
 
+    def get_block_depths(self, start_node=None):
+        """
+        Returns an iterator of the (usage_key, depth) pairs of the blocks
+        in a topological traversal of the block structure, where the
+        depth of a block is the length of the shortest path to it from
+        start_node.
+
+        Arguments:
+            start_node (UsageKey) - The block from which depths are
+                computed. If None, root_block_usage_key is used.
+        """
+        graph = self.get_graph()
+        start_id = graph.ids[start_node or self.root_block_usage_key]
+        return ((graph.keys[block_id], depth) for block_id, depth in zip(
+            graph.topological_order(start_id),
+            graph.depths(start_id),
+        ))
+
     #--- Internal methods ---#
     # To be used within the block_structure framework or by tests.
 
@@ -206,25 +304,26 @@ class BlockStructure(object):
         Mutates this block structure by removing any unreachable blocks.
         """
 
-        # Create a new block relations map to store only those blocks
-        # that are still linked
-        pruned_block_relations = {}
-        old_block_relations = self._block_relations
+        if self.root_block_usage_key not in self:
+            self._block_relations = {}
+            return
+
+        graph = self.get_graph()
+        keys = graph.keys
 
         # Build the structure from the leaves up by doing a post-order
         # traversal of the old structure, thereby encountering only
-        # reachable blocks.
-        for block_key in self.post_order_traversal():
-            # If the block is in the old structure,
-            if block_key in old_block_relations:
-                # Add it to the new pruned structure
-                self._add_block(pruned_block_relations, block_key)
-
-                # Add a relationship to only those old children that
-                # were also added to the new pruned structure.
-                for child in old_block_relations[block_key].children:
-                    if child in pruned_block_relations:
-                        self._add_to_relations(pruned_block_relations, block_key, child)
+        # reachable blocks, whose children are all reachable as well.
+        reachable_ids = list(graph.post_order(graph.ids[self.root_block_usage_key]))
+        pruned_block_relations = {}
+        for block_id in reachable_ids:
+            relations = _BlockRelations()
+            relations.children = [keys[child_id] for child_id in graph.children(block_id)]
+            pruned_block_relations[keys[block_id]] = relations
+        for block_id in reachable_ids:
+            block_key = keys[block_id]
+            for child_id in graph.children(block_id):
+                pruned_block_relations[keys[child_id]].parents.append(block_key)
 
         # Replace this structure's relations with the newly pruned one.
         self._block_relations = pruned_block_relations
@@ -238,6 +337,7 @@ class BlockStructure(object):
             child_key (UsageKey) - Usage key of the child block.
         """
         self._add_to_relations(self._block_relations, parent_key, child_key)
+        self._graph = None
 
     @staticmethod
     def _add_to_relations(block_relations, parent_key, child_key):
@@ -281,6 +381,8 @@ class FieldData(object):
     """
     Data structure to encapsulate collected fields.
     """
+    __slots__ = ('fields',)
+
     def class_field_names(self):
         """
         Returns list of names of fields that are defined directly
@@ -321,12 +423,29 @@ class FieldData(object):
         """
         return field_name in self.class_field_names()
 
+    def __setstate__(self, state):
+        # The fields are pickled as slots, unless pickled before
+        # this class had slots, as its __dict__.
+        if isinstance(state, tuple):
+            _, state = state
+        for field_name, field_value in state.iteritems():
+            object.__setattr__(self, field_name, field_value)
+
+    def shallow_copy(self):
+        """
+        Returns a copy of this instance with its own map of fields,
+        sharing the values of the fields.
+        """
+        field_data = self.__class__.__new__(self.__class__)
+        object.__setattr__(field_data, 'fields', dict(self.fields))
+        return field_data
+
 
 class TransformerData(FieldData):
     """
     Data structure to encapsulate collected data for a transformer.
     """
-    pass
+    __slots__ = ()
 
 
 class TransformerDataMap(dict):
@@ -360,6 +479,16 @@ class TransformerDataMap(dict):
             self[key] = new_transformer_data
             return new_transformer_data
 
+    def shallow_copy(self):
+        """
+        Returns a copy of this map with shallow copies of its
+        TransformerData.
+        """
+        transformer_data_map = TransformerDataMap()
+        for transformer_name, transformer_data in self.iteritems():
+            dict.__setitem__(transformer_data_map, transformer_name, transformer_data.shallow_copy())
+        return transformer_data_map
+
     def _translate_key(self, key):
         """
         Allows the given key to be either the transformer's class or name,
@@ -379,6 +508,8 @@ class BlockData(FieldData):
     """
     Data structure to encapsulate collected data for a single block.
     """
+    __slots__ = ('location', 'transformer_data')
+
     def class_field_names(self):
         return super(BlockData, self).class_field_names() + ['location', 'transformer_data']
 
@@ -391,6 +522,12 @@ class BlockData(FieldData):
         # Map of transformer name to its block-specific data.
         self.transformer_data = TransformerDataMap()
 
+    def shallow_copy(self):
+        block_data = super(BlockData, self).shallow_copy()
+        object.__setattr__(block_data, 'location', self.location)
+        object.__setattr__(block_data, 'transformer_data', self.transformer_data.shallow_copy())
+        return block_data
+
 
 class BlockStructureBlockData(BlockStructure):
     """
@@ -401,7 +538,7 @@ class BlockStructureBlockData(BlockStructure):
     # update this value whenever the data structure changes. Dependent storage
     # layers can then use this value when serializing/deserializing block
     # structures, and invalidating any previously cached/stored data.
-    VERSION = 2
+    VERSION = 3
 
     def __init__(self, root_block_usage_key):
         super(BlockStructureBlockData, self).__init__(root_block_usage_key)
@@ -427,6 +564,30 @@ class BlockStructureBlockData(BlockStructure):
             deepcopy(self._block_data_map),
         )
 
+    def shallow_copy(self):
+        """
+        Returns a new instance of BlockStructureBlockData that can be
+        transformed without altering this instance, at a fraction of the
+        cost of copy.
+
+        Only the relations and the maps of fields of the blocks and
+        transformers are copied.  The values of the fields are shared with
+        this instance, so they must be replaced rather than mutated in place.
+        """
+        from .factory import BlockStructureFactory
+        block_relations = {}
+        for block_key, relations in self._block_relations.iteritems():
+            relations_copy = _BlockRelations.__new__(_BlockRelations)
+            relations_copy.parents = list(relations.parents)
+            relations_copy.children = list(relations.children)
+            block_relations[block_key] = relations_copy
+        return BlockStructureFactory.create_new(
+            self.root_block_usage_key,
+            block_relations,
+            self.transformer_data.shallow_copy(),
+            {block_key: block_data.shallow_copy() for block_key, block_data in self._block_data_map.iteritems()},
+        )
+
     def iteritems(self):
         """
         Returns iterator of (UsageKey, BlockData) pairs for all
@@ -632,6 +793,7 @@ class BlockStructureBlockData(BlockStructure):
         # Remove block.
         self._block_relations.pop(usage_key, None)
         self._block_data_map.pop(usage_key, None)
+        self._graph = None
 
         # Recreate the graph connections if descendants are to be kept.
         if keep_descendants:
@@ -0,0 +1,238 @@
+"""
+Incremental recollection of block structures.
+
+Modulestores that version their blocks (Split) report the version of the
+last edit of each block. These versions are stored along with the collected
+data of a block structure, so once the course is published again, only the
+blocks changed since the previous collect and their descendants have their
+data recollected. Their ancestors are collected along with them, since the
+data collected for a block may depend on the data of its ancestors, but the
+data of the ancestors is kept from the previous collect.
+
+Transformers declare whether their data can be collected this way with
+their SUPPORTS_INCREMENTAL_COLLECT attribute.
+"""
+# pylint: disable=protected-access
+from logging import getLogger
+
+from .block_structure import BlockStructureBlockData, BlockStructureModulestoreData, _BlockRelations
+from .transformer_registry import TransformerRegistry
+from .transformers import BlockStructureTransformers
+
+
+logger = getLogger(__name__)  # pylint: disable=C0103
+
+# Name of the data stored by the framework along with the data of the
+# transformers, with the version of each block.
+BLOCK_VERSIONS_DATA_NAME = u'block_structure.block_versions'
+BLOCK_VERSION_KEY = 'version'
+STRUCTURE_VERSION_KEY = 'structure_version'
+
+# Largest fraction of the blocks of a block structure to recollect
+# incrementally, past which a full collect is cheaper.
+MAX_RECOLLECTED_FRACTION = 0.5
+
+
+def get_block_versions(modulestore, root_block_usage_key):
+    """
+    Returns a map of the usage key of each block of the course of the given
+    root to a tuple of the version of the block's last edit and the usage
+    keys of its children, or None if the modulestore doesn't version its
+    blocks.
+    """
+    if not hasattr(modulestore, 'get_block_versions'):
+        return None
+
+    course_key = root_block_usage_key.course_key
+    try:
+        modulestore_versions = modulestore.get_block_versions(course_key)
+    except NotImplementedError:
+        return None
+
+    usage_keys = {block_key: course_key.make_usage_key(*block_key) for block_key in modulestore_versions}
+    return {
+        usage_keys[block_key]: (
+            version,
+            # Like the xBlocks' get_children, skip the children that are missing.
+            [usage_keys[child_key] for child_key in children if child_key in usage_keys],
+        )
+        for block_key, (version, children) in modulestore_versions.iteritems()
+    }
+
+
+def record_block_versions(block_structure, block_versions):
+    """
+    Stores the given versions of the blocks in the given block structure,
+    for its data to be recollected incrementally later on.
+    """
+    for block_key in block_structure:
+        version = block_versions[block_key][0] if block_key in block_versions else None
+        block_structure.set_transformer_block_field(block_key, BLOCK_VERSIONS_DATA_NAME, BLOCK_VERSION_KEY, version)
+    block_structure.set_transformer_data(
+        BLOCK_VERSIONS_DATA_NAME,
+        STRUCTURE_VERSION_KEY,
+        BlockStructureBlockData.VERSION,
+    )
+
+
+def collect_incrementally(previous_block_structure, modulestore, block_versions):
+    """
+    Returns the block structure of the given block versions, with the data
+    of its changed blocks and their descendants recollected from the given
+    modulestore, and the data of the other blocks kept from the given
+    previously collected block structure.
+
+    Returns None if the data of the block structure is to be fully
+    recollected instead.
+    """
+    root_block_usage_key = previous_block_structure.root_block_usage_key
+    if root_block_usage_key not in block_versions or not _can_collect_incrementally(previous_block_structure):
+        return None
+
+    block_structure = _create_block_structure(root_block_usage_key, block_versions)
+    traversal_order = list(block_structure.topological_traversal())
+
+    # Recollect the changed blocks along with all their descendants.
+    recollected_keys = set()
+    for block_key in traversal_order:
+        if (
+                _is_changed(previous_block_structure, block_structure, block_key, block_versions) or
+                any(parent_key in recollected_keys for parent_key in block_structure.get_parents(block_key))
+        ):
+            recollected_keys.add(block_key)
+
+    if len(recollected_keys) > MAX_RECOLLECTED_FRACTION * len(traversal_order):
+        return None
+
+    block_data_map = {}
+    if recollected_keys:
+        partial_block_structure = _collect_partial_block_structure(
+            block_structure,
+            traversal_order,
+            recollected_keys,
+            modulestore,
+        )
+        block_structure.transformer_data = partial_block_structure.transformer_data
+        for block_key in recollected_keys:
+            block_data_map[block_key] = partial_block_structure._get_or_create_block(block_key)
+    else:
+        block_structure.transformer_data = previous_block_structure.transformer_data
+
+    for block_key in traversal_order:
+        if block_key not in recollected_keys:
+            block_data_map[block_key] = previous_block_structure[block_key]
+    block_structure._block_data_map = block_data_map
+
+    logger.info(
+        "BlockStructure: Recollected %d of %d blocks incrementally; %s.",
+        len(recollected_keys),
+        len(traversal_order),
+        unicode(root_block_usage_key),
+    )
+    return block_structure
+
+
+class _PartialModulestoreData(BlockStructureModulestoreData):
+    """
+    Block structure of the blocks to recollect and their ancestors, in which
+    the xBlocks of other blocks accessed by the transformers are loaded on
+    demand.
+    """
+    def __init__(self, root_block_usage_key, modulestore):
+        super(_PartialModulestoreData, self).__init__(root_block_usage_key)
+        self._modulestore = modulestore
+
+    def get_xblock(self, usage_key):
+        if usage_key not in self._xblock_map:
+            self._add_xblock(usage_key, self._modulestore.get_item(usage_key, depth=0, lazy=False))
+        return super(_PartialModulestoreData, self).get_xblock(usage_key)
+
+
+def _can_collect_incrementally(previous_block_structure):
+    """
+    Returns whether the data of the registered transformers can be
+    collected incrementally, on top of the given previously collected
+    block structure.
+    """
+    if previous_block_structure.get_transformer_data(
+            BLOCK_VERSIONS_DATA_NAME,
+            STRUCTURE_VERSION_KEY,
+    ) != BlockStructureBlockData.VERSION:
+        return False
+
+    return all(
+        transformer.SUPPORTS_INCREMENTAL_COLLECT and
+        previous_block_structure._get_transformer_data_version(transformer) == transformer.WRITE_VERSION
+        for transformer in TransformerRegistry.get_registered_transformers()
+    )
+
+
+def _create_block_structure(root_block_usage_key, block_versions):
+    """
+    Returns a block structure with the relations of the given block
+    versions, as created by BlockStructureFactory.create_from_modulestore.
+    """
+    block_structure = BlockStructureBlockData(root_block_usage_key)
+    blocks_visited = set()
+
+    def build_block_structure(block_key):
+        """
+        Recursively update the block structure with the given block
+        and its descendants.
+        """
+        if block_key in blocks_visited:
+            return
+        blocks_visited.add(block_key)
+        for child_key in block_versions[block_key][1]:
+            block_structure._add_relation(block_key, child_key)
+            build_block_structure(child_key)
+
+    build_block_structure(root_block_usage_key)
+    return block_structure
+
+
+def _is_changed(previous_block_structure, block_structure, block_key, block_versions):
+    """
+    Returns whether the given block is new or changed since the previous
+    block structure was collected, including its parents.
+    """
+    if block_key not in previous_block_structure:
+        return True
+    previous_version = previous_block_structure.get_transformer_block_field(
+        block_key,
+        BLOCK_VERSIONS_DATA_NAME,
+        BLOCK_VERSION_KEY,
+    )
+    return (
+        previous_version is None or
+        previous_version != block_versions[block_key][0] or
+        set(previous_block_structure.get_parents(block_key)) != set(block_structure.get_parents(block_key))
+    )
+
+
+def _collect_partial_block_structure(block_structure, traversal_order, recollected_keys, modulestore):
+    """
+    Returns a block structure of the given blocks to recollect and their
+    ancestors, with their data collected from the given modulestore.
+    """
+    # Add the ancestors of the recollected blocks, from the leaves up.
+    collected_keys = set(recollected_keys)
+    for block_key in reversed(traversal_order):
+        if any(child_key in collected_keys for child_key in block_structure.get_children(block_key)):
+            collected_keys.add(block_key)
+
+    block_relations = {}
+    for block_key in collected_keys:
+        relations = _BlockRelations()
+        relations.parents = [key for key in block_structure.get_parents(block_key) if key in collected_keys]
+        relations.children = [key for key in block_structure.get_children(block_key) if key in collected_keys]
+        block_relations[block_key] = relations
+
+    partial_block_structure = _PartialModulestoreData(block_structure.root_block_usage_key, modulestore)
+    partial_block_structure._block_relations = block_relations
+    for block_key in traversal_order:
+        if block_key in collected_keys:
+            partial_block_structure.get_xblock(block_key)
+
+    BlockStructureTransformers.collect(partial_block_structure)
+    return partial_block_structure
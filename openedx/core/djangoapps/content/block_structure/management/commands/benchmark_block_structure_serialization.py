@@ -0,0 +1,85 @@
+"""
+Command to compare the serializations of course blocks.
+"""
+# pylint: disable=protected-access
+from timeit import timeit
+
+from django.core.management.base import BaseCommand
+from xmodule.modulestore.django import modulestore
+
+import openedx.core.djangoapps.content.block_structure.api as api
+from openedx.core.djangoapps.content.block_structure import serialization
+from openedx.core.lib.cache_utils import zpickle, zunpickle
+from openedx.core.lib.command_utils import get_mutually_exclusive_required_option, parse_course_keys
+
+
+class Command(BaseCommand):
+    """
+    Compares the size and load time of the compact serialization of the
+    collected course blocks with their former zpickled serialization.
+
+    Example usage:
+        $ ./manage.py lms benchmark_block_structure_serialization --all_courses --settings=devstack
+        $ ./manage.py lms benchmark_block_structure_serialization --courses 'edX/DemoX/Demo_Course' --settings=devstack
+    """
+    help = u'Compares the size and load time of the serializations of course blocks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--courses',
+            dest='courses',
+            nargs='+',
+            help=u'Compare the serializations of the list of courses provided.',
+        )
+        parser.add_argument(
+            '--all_courses',
+            help=u'Compare the serializations of all courses.',
+            action='store_true',
+            default=False,
+        )
+        parser.add_argument(
+            '--iterations',
+            help=u'Number of loads timed for each serialization.',
+            default=20,
+            type=int,
+        )
+
+    def handle(self, *args, **options):
+        courses_mode = get_mutually_exclusive_required_option(options, 'courses', 'all_courses')
+        if courses_mode == 'all_courses':
+            course_keys = [course.id for course in modulestore().get_course_summaries()]
+        else:
+            course_keys = parse_course_keys(options['courses'])
+
+        self.stdout.write(u'course, blocks, zpickle bytes, compact bytes, zpickle load ms, compact load ms')
+        for course_key in course_keys:
+            self._benchmark_course(course_key, options['iterations'])
+
+    def _benchmark_course(self, course_key, iterations):
+        """
+        Writes the sizes and mean load times of the serializations of the given course.
+        """
+        block_structure = api.get_course_in_cache(course_key)
+        root_block_usage_key = block_structure.root_block_usage_key
+
+        compact_data = serialization.serialize(block_structure)
+        zpickled_data = zpickle((
+            block_structure._block_relations,
+            block_structure.transformer_data,
+            block_structure._block_data_map,
+        ))
+
+        zpickle_load_time = timeit(lambda: zunpickle(zpickled_data), number=iterations)
+        compact_load_time = timeit(
+            lambda: serialization.deserialize(compact_data, root_block_usage_key),
+            number=iterations,
+        )
+
+        self.stdout.write(u'{}, {}, {}, {}, {:.2f}, {:.2f}'.format(
+            course_key,
+            len(block_structure),
+            len(zpickled_data),
+            len(compact_data),
+            zpickle_load_time * 1000 / iterations,
+            compact_load_time * 1000 / iterations,
+        ))
@@ -7,6 +7,7 @@ from contextlib import contextmanager
 from . import config
 from .exceptions import UsageKeyNotInBlockStructure, TransformerDataIncompatible, BlockStructureNotFound
 from .factory import BlockStructureFactory
+from .incremental import collect_incrementally, get_block_versions, record_block_versions
 from .store import BlockStructureStore
 from .transformers import BlockStructureTransformers
 
@@ -60,6 +61,9 @@ class BlockStructureManager(object):
             BlockStructureBlockData - A transformed block structure,
                 starting at starting_block_usage_key.
         """
+        # The structures of get_collected are shallow copies of the stored structure, whose field
+        # values transformers must replace rather than mutate. The callers' structures are deep
+        # copied, as they may be used again after the transformation.
         block_structure = collected_block_structure.copy() if collected_block_structure else self.get_collected()
 
         if starting_block_usage_key:
@@ -120,14 +124,36 @@ class BlockStructureManager(object):
         the modulestore.
         """
         with self._bulk_operations():
-            block_structure = BlockStructureFactory.create_from_modulestore(
-                self.root_block_usage_key,
-                self.modulestore,
-            )
-            BlockStructureTransformers.collect(block_structure)
+            block_versions = None
+            if config.waffle().is_enabled(config.INCREMENTAL_COLLECT):
+                block_versions = get_block_versions(self.modulestore, self.root_block_usage_key)
+
+            block_structure = self._collect_incrementally(block_versions) if block_versions else None
+            if block_structure is None:
+                block_structure = BlockStructureFactory.create_from_modulestore(
+                    self.root_block_usage_key,
+                    self.modulestore,
+                )
+                BlockStructureTransformers.collect(block_structure)
+
+            if block_versions:
+                record_block_versions(block_structure, block_versions)
             self.store.add(block_structure)
             return block_structure
 
+    def _collect_incrementally(self, block_versions):
+        """
+        Returns the block structure of the given block versions, with the
+        transformers data recollected only for the blocks changed since
+        the block structure in the store was collected, or None if the
+        transformers data is to be fully recollected.
+        """
+        try:
+            previous_block_structure = self.store.get(self.root_block_usage_key)
+        except BlockStructureNotFound:
+            return None
+        return collect_incrementally(previous_block_structure, self.modulestore, block_versions)
+
     def clear(self):
         """
         Removes data for the block structure associated with the given
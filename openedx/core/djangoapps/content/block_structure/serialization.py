@@ -0,0 +1,306 @@
+"""
+Compact serialization of block structures.
+
+The usage key of each block is serialized only once, and the relations of the
+blocks are serialized as arrays of indices into the list of block keys. The
+block-specific data of each transformer is serialized in a separate section,
+which is only decoded when the data of that transformer is first accessed.
+
+Data serialized before this format existed (zpickled tuples of the block
+structure's internal maps) can still be deserialized.
+"""
+# pylint: disable=protected-access
+import cPickle as pickle
+import threading
+import zlib
+from array import array
+from collections import defaultdict
+
+from openedx.core.lib.cache_utils import zunpickle
+
+from .block_structure import BlockData, TransformerData, TransformerDataMap, _BlockRelations
+from .exceptions import BlockStructureNotFound
+from .factory import BlockStructureFactory
+
+# Prefix of the data serialized by this module. Zpickled data starts with a
+# zlib header instead.
+SERIALIZATION_PREFIX = 'BSC:'
+
+# Version of the layout of the data following SERIALIZATION_PREFIX.
+# Incrementally update this value whenever the layout changes.
+SERIALIZATION_VERSION = 1
+
+# Type code of the arrays of block indices.
+INDEX_TYPECODE = 'i'
+
+
+def serialize(block_structure):
+    """
+    Returns the compact serialization of the given block structure.
+    """
+    block_relations = block_structure._block_relations
+    block_data_map = block_structure._block_data_map
+
+    # Blocks with relations come first, followed by the blocks only having data.
+    block_keys = list(block_relations)
+    block_keys.extend(block_key for block_key in block_data_map if block_key not in block_relations)
+    block_indices = {block_key: index for index, block_key in enumerate(block_keys)}
+
+    block_fields = []
+    block_transformer_fields = defaultdict(list)
+    for index, block_key in enumerate(block_keys):
+        block_data = block_data_map.get(block_key)
+        if block_data is None:
+            block_fields.append(None)
+            continue
+        block_fields.append(block_data.fields)
+        for transformer_name, transformer_data in block_data.transformer_data.iteritems():
+            block_transformer_fields[transformer_name].append((index, transformer_data.fields))
+
+    main_section = (
+        block_keys,
+        len(block_relations),
+        _encode_relations(block_keys, block_relations, block_indices, 'parents'),
+        _encode_relations(block_keys, block_relations, block_indices, 'children'),
+        block_fields,
+        {
+            transformer_name: transformer_data.fields
+            for transformer_name, transformer_data in block_structure.transformer_data.iteritems()
+        },
+    )
+    transformer_sections = {
+        transformer_name: _compress(fields)
+        for transformer_name, fields in block_transformer_fields.iteritems()
+    }
+    return SERIALIZATION_PREFIX + pickle.dumps(
+        (SERIALIZATION_VERSION, _compress(main_section), transformer_sections),
+        pickle.HIGHEST_PROTOCOL,
+    )
+
+
+def deserialize(serialized_data, root_block_usage_key):
+    """
+    Deserializes the given data and returns the parsed block structure.
+
+    Raises:
+        BlockStructureNotFound if the data was serialized in an unknown
+        version of the format.
+    """
+    if not serialized_data.startswith(SERIALIZATION_PREFIX):
+        block_relations, transformer_data, block_data_map = zunpickle(serialized_data)
+        return BlockStructureFactory.create_new(
+            root_block_usage_key,
+            block_relations,
+            transformer_data,
+            block_data_map,
+        )
+
+    version, main_section, transformer_sections = pickle.loads(serialized_data[len(SERIALIZATION_PREFIX):])
+    if version != SERIALIZATION_VERSION:
+        raise BlockStructureNotFound(root_block_usage_key)
+
+    block_keys, num_related_blocks, parents, children, block_fields, structure_fields = _decompress(main_section)
+
+    block_relations = {}
+    for block_key, block_parents, block_children in zip(
+            block_keys[:num_related_blocks],
+            _decode_relations(block_keys, parents),
+            _decode_relations(block_keys, children),
+    ):
+        relations = _BlockRelations()
+        relations.parents = block_parents
+        relations.children = block_children
+        block_relations[block_key] = relations
+
+    lazy_sections = _LazyTransformerSections(transformer_sections)
+    block_data_map = {}
+    for block_key, fields in zip(block_keys, block_fields):
+        if fields is None:
+            lazy_sections.blocks.append(None)
+            continue
+        # Bypass BlockData.__init__ and __setattr__, which are too slow for
+        # the number of blocks of a course.
+        block_data = BlockData.__new__(BlockData)
+        object.__setattr__(block_data, 'location', block_key)
+        object.__setattr__(block_data, 'fields', fields)
+        object.__setattr__(block_data, 'transformer_data', _LazyTransformerDataMap(lazy_sections))
+        block_data_map[block_key] = block_data
+        lazy_sections.blocks.append(block_data)
+
+    transformer_data = TransformerDataMap()
+    for transformer_name, fields in structure_fields.iteritems():
+        transformer_data[transformer_name] = _create_transformer_data(fields)
+
+    return BlockStructureFactory.create_new(
+        root_block_usage_key,
+        block_relations,
+        transformer_data,
+        block_data_map,
+    )
+
+
+class _LazyTransformerSections(object):
+    """
+    The serialized block-specific data of each transformer, decoded into the
+    transformer data maps of the blocks on first access.
+    """
+    def __init__(self, sections):
+        # Map of transformer name to its serialized data.
+        # dict {string: string}
+        self.sections = sections
+
+        # The data of each block, in the order of the serialized block indices.
+        # list [BlockData or None]
+        self.blocks = []
+
+        # Deserialized structures are shared by the threads of the process
+        # through the store's local cache.
+        self._lock = threading.Lock()
+
+    def decode(self, transformer_name):
+        """
+        Decodes the data of the given transformer, if not decoded yet.
+        Returns whether it was.
+        """
+        if transformer_name not in self.sections:
+            return False
+        with self._lock:
+            section = self.sections.get(transformer_name)
+            if section is None:
+                return False
+            for index, fields in _decompress(section):
+                block_transformer_data = self.blocks[index].transformer_data
+                if not dict.__contains__(block_transformer_data, transformer_name):
+                    dict.__setitem__(block_transformer_data, transformer_name, _create_transformer_data(fields))
+            # Removed only once decoded, so other threads wait for the data.
+            del self.sections[transformer_name]
+        return True
+
+    def decode_all(self):
+        """
+        Decodes the data of all the transformers not decoded yet.
+        """
+        for transformer_name in self.sections.keys():
+            self.decode(transformer_name)
+
+
+class _LazyTransformerDataMap(TransformerDataMap):
+    """
+    TransformerDataMap of a deserialized block, in which the data of each
+    transformer is decoded when first accessed.
+
+    The data is decoded into the maps of the deserialized structure. Shallow
+    copies of the structure share its sections, and take shallow copies of
+    the data decoded in its maps.
+    """
+    def __init__(self, lazy_sections, source=None):
+        super(_LazyTransformerDataMap, self).__init__()
+        self._lazy_sections = lazy_sections
+        # The map of the deserialized structure, when this map is a copy of it.
+        self._source = source
+
+    def __getitem__(self, key):
+        try:
+            return super(_LazyTransformerDataMap, self).__getitem__(key)
+        except KeyError:
+            self._decode(self._translate_key(key))
+        return super(_LazyTransformerDataMap, self).__getitem__(key)
+
+    def __contains__(self, key):
+        self._decode(self._translate_key(key))
+        return super(_LazyTransformerDataMap, self).__contains__(key)
+
+    def __reduce__(self):
+        # Copies and pickles are plain TransformerDataMaps, with all the data decoded.
+        self._decode_all()
+        return (TransformerDataMap, (), None, None, dict.iteritems(self))
+
+    def shallow_copy(self):
+        """
+        Returns a copy of this map sharing the data not decoded yet, with
+        shallow copies of the data already decoded.
+        """
+        source = self if self._source is None else self._source
+        transformer_data_map = _LazyTransformerDataMap(self._lazy_sections, source)
+        for transformer_name, transformer_data in dict.iteritems(self):
+            dict.__setitem__(transformer_data_map, transformer_name, transformer_data.shallow_copy())
+        return transformer_data_map
+
+    def _decode(self, transformer_name):
+        """
+        Decodes the data of the given transformer, copying it from the
+        source map when this map is a copy.
+        """
+        self._lazy_sections.decode(transformer_name)
+        if self._source is not None and not dict.__contains__(self, transformer_name):
+            transformer_data = dict.get(self._source, transformer_name)
+            if transformer_data is not None:
+                dict.__setitem__(self, transformer_name, transformer_data.shallow_copy())
+
+    def _decode_all(self):
+        self._lazy_sections.decode_all()
+        if self._source is not None:
+            for transformer_name in dict.iterkeys(self._source):
+                self._decode(transformer_name)
+
+    def _decoded(method_name):  # pylint: disable=no-self-argument
+        """
+        Returns the given dict method, run once all the data is decoded.
+        """
+        method = getattr(dict, method_name)
+
+        def decoded_method(self, *args, **kwargs):
+            self._decode_all()
+            return method(self, *args, **kwargs)
+        return decoded_method
+
+    __iter__ = _decoded('__iter__')
+    __len__ = _decoded('__len__')
+    iterkeys = _decoded('iterkeys')
+    itervalues = _decoded('itervalues')
+    iteritems = _decoded('iteritems')
+    keys = _decoded('keys')
+    values = _decoded('values')
+    items = _decoded('items')
+    del _decoded
+
+
+def _create_transformer_data(fields):
+    """
+    Returns a TransformerData holding the given fields.
+    """
+    transformer_data = TransformerData.__new__(TransformerData)
+    object.__setattr__(transformer_data, 'fields', fields)
+    return transformer_data
+
+
+def _encode_relations(block_keys, block_relations, block_indices, relation_name):
+    """
+    Returns the given relation of each of the blocks with relations, as
+    arrays of the offsets of each block's related indices and of the
+    concatenated related indices.
+    """
+    offsets = array(INDEX_TYPECODE, [0])
+    indices = array(INDEX_TYPECODE)
+    for block_key in block_keys[:len(block_relations)]:
+        indices.extend(block_indices[related_key] for related_key in getattr(block_relations[block_key], relation_name))
+        offsets.append(len(indices))
+    return offsets.tostring(), indices.tostring()
+
+
+def _decode_relations(block_keys, encoded_relations):
+    """
+    Generates the list of related block keys of each block with relations,
+    from the arrays returned by _encode_relations.
+    """
+    offsets, indices = (array(INDEX_TYPECODE, encoded) for encoded in encoded_relations)
+    for start, end in zip(offsets, offsets[1:]):
+        yield [block_keys[index] for index in indices[start:end]]
+
+
+def _compress(data):
+    return zlib.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+
+def _decompress(data):
+    return pickle.loads(zlib.decompress(data))
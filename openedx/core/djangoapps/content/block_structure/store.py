@@ -2,20 +2,104 @@
 Module for the Storage of BlockStructure objects.
 """
 # pylint: disable=protected-access
+import threading
+import zlib
+from collections import OrderedDict
 from logging import getLogger
 
-from openedx.core.lib.cache_utils import zpickle, zunpickle
+from django.conf import settings
 
-from . import config
+from openedx.core.djangoapps.monitoring_utils import set_custom_metric
+
+from . import config, serialization
 from .block_structure import BlockStructureBlockData
 from .exceptions import BlockStructureNotFound
-from .factory import BlockStructureFactory
 from .models import BlockStructureModel
 from .transformer_registry import TransformerRegistry
 
 
 logger = getLogger(__name__)  # pylint: disable=C0103
 
+# Default maximum total size, in serialized bytes, of the block structures
+# kept deserialized in the memory of each process.
+LOCAL_CACHE_DEFAULT_MAX_SIZE = 25 * 1024 * 1024
+
+
+class LocalBlockStructureCache(object):
+    """
+    Bounded, per-process LRU cache of deserialized block structures, keyed
+    by their root usage key and version.
+
+    The cached block structures are shared by the threads of the process,
+    so only shallow copies of them are to be handed out.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        """
+        Returns the maximum total size, in serialized bytes, of the cached
+        block structures. A size of 0 disables the cache.
+        """
+        return settings.BLOCK_STRUCTURES_SETTINGS.get('LOCAL_CACHE_MAX_SIZE', LOCAL_CACHE_DEFAULT_MAX_SIZE)
+
+    def get(self, key):
+        """
+        Returns the cached block structure for the key, or None if missing.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            # re-insert the entry as the most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, block_structure, size):
+        """
+        Caches the block structure for the key, evicting the least recently
+        used entries until the cached structures fit in max_size.
+        """
+        max_size = self.max_size
+        if size > max_size:
+            return
+        with self._lock:
+            self._pop(key)
+            while self._entries and self._size + size > max_size:
+                self._pop(next(iter(self._entries)))
+            self._entries[key] = (size, block_structure)
+            self._size += size
+
+    def delete_root(self, root_block_usage_key):
+        """
+        Evicts all the versions of the block structure at the given root.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == root_block_usage_key]:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[0]
+
+
+local_block_structure_cache = LocalBlockStructureCache()
+
 
 class StubModel(object):
     """
@@ -51,8 +135,8 @@ class BlockStructureStore(object):
 
     def add(self, block_structure):
         """
-        Stores and caches a compressed and pickled serialization of
-        the given block structure.
+        Stores and caches a compact serialization of the given block
+        structure, see the serialization module.
 
         The data stored includes the structure's
         block relations, transformer data, and block data.
@@ -68,8 +152,12 @@ class BlockStructureStore(object):
 
     def get(self, root_block_usage_key):
         """
-        Deserializes and returns the block structure starting at
-        root_block_usage_key, if found in the cache or storage.
+        Returns the block structure starting at root_block_usage_key,
+        if found in the local cache, the cache or storage.
+
+        Structures deserialized from the cache or storage are kept in the
+        local cache of the process, and each call returns a shallow copy
+        of the locally cached structure that can be transformed freely.
 
         The given root_block_usage_key must equate the
         root_block_usage_key previously passed to the `add` method.
@@ -89,13 +177,24 @@ class BlockStructureStore(object):
         """
         bs_model = self._get_model(root_block_usage_key)
 
-        try:
-            serialized_data = self._get_from_cache(bs_model)
-        except BlockStructureNotFound:
-            serialized_data = self._get_from_store(bs_model)
-            self._add_to_cache(serialized_data, bs_model)
+        serialized_data = None
+        if _is_storage_backing_enabled():
+            local_cache_key = self._encode_local_cache_key(bs_model)
+        else:
+            # Without storage, the version of the structure is only known
+            # from its serialized data.
+            serialized_data = self._get_serialized_data(bs_model)
+            local_cache_key = self._encode_local_cache_key(bs_model, serialized_data)
 
-        return self._deserialize(serialized_data, root_block_usage_key)
+        block_structure = local_block_structure_cache.get(local_cache_key)
+        set_custom_metric('block_structure_local_cache_hit', block_structure is not None)
+        if block_structure is None:
+            if serialized_data is None:
+                serialized_data = self._get_serialized_data(bs_model)
+            block_structure = self._deserialize(serialized_data, root_block_usage_key)
+            local_block_structure_cache.set(local_cache_key, block_structure, len(serialized_data))
+
+        return block_structure.shallow_copy()
 
     def delete(self, root_block_usage_key):
         """
@@ -107,6 +206,7 @@ class BlockStructureStore(object):
                 of the block structure that is to be removed.
         """
         bs_model = self._get_model(root_block_usage_key)
+        local_block_structure_cache.delete_root(root_block_usage_key)
         self._cache.delete(self._encode_root_cache_key(bs_model))
         bs_model.delete()
         logger.info("BlockStructure: Deleted from cache and store; %s.", bs_model)
@@ -160,6 +260,20 @@ class BlockStructureStore(object):
         self._cache.set(cache_key, serialized_data, timeout=config.cache_timeout_in_seconds())
         logger.info("BlockStructure: Added to cache; %s, size: %d", bs_model, len(serialized_data))
 
+    def _get_serialized_data(self, bs_model):
+        """
+        Returns the serialized data for the given BlockStructureModel
+        from the cache, or from storage, updating the cache.
+        Raises:
+             BlockStructureNotFound if not found.
+        """
+        try:
+            return self._get_from_cache(bs_model)
+        except BlockStructureNotFound:
+            serialized_data = self._get_from_store(bs_model)
+            self._add_to_cache(serialized_data, bs_model)
+            return serialized_data
+
     def _get_from_cache(self, bs_model):
         """
         Returns the serialized data for the given BlockStructureModel
@@ -193,24 +307,13 @@ class BlockStructureStore(object):
         """
         Serializes the data for the given block_structure.
         """
-        data_to_cache = (
-            block_structure._block_relations,
-            block_structure.transformer_data,
-            block_structure._block_data_map,
-        )
-        return zpickle(data_to_cache)
+        return serialization.serialize(block_structure)
 
     def _deserialize(self, serialized_data, root_block_usage_key):
         """
         Deserializes the given data and returns the parsed block_structure.
         """
-        block_relations, transformer_data, block_data_map = zunpickle(serialized_data)
-        return BlockStructureFactory.create_new(
-            root_block_usage_key,
-            block_relations,
-            transformer_data,
-            block_data_map,
-        )
+        return serialization.deserialize(serialized_data, root_block_usage_key)
 
     @staticmethod
     def _encode_root_cache_key(bs_model):
@@ -227,6 +330,20 @@ class BlockStructureStore(object):
                 root_usage_key=unicode(bs_model.data_usage_key),
             )
 
+    @classmethod
+    def _encode_local_cache_key(cls, bs_model, serialized_data=None):
+        """
+        Returns the key of the local cache to use for the given
+        BlockStructureModel, or for the given serialized data of
+        a StubModel.
+        """
+        if serialized_data is None:
+            version_data = cls._version_data_of_model(bs_model)
+            version = tuple(version_data[field_name] for field_name in BlockStructureModel.VERSION_FIELDS)
+        else:
+            version = (len(serialized_data), zlib.adler32(serialized_data))
+        return (bs_model.data_usage_key, version)
+
     @staticmethod
     def _version_data_of_block(root_block):
         """
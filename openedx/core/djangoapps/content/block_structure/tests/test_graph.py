@@ -0,0 +1,116 @@
+"""
+Tests for graph.py
+"""
+# pylint: disable=protected-access
+import ddt
+from nose.plugins.attrib import attr
+from unittest import TestCase
+
+from openedx.core.lib.graph_traversals import traverse_post_order, traverse_topologically
+
+from ..block_structure import BlockStructure
+from ..graph import BlockGraph
+from .helpers import ChildrenMapTestMixin
+
+
+@attr(shard=2)
+@ddt.ddt
+class TestBlockGraph(TestCase, ChildrenMapTestMixin):
+    """
+    Tests for BlockGraph and the traversals of block structures over it
+    """
+    CHILDREN_MAPS = (
+        ChildrenMapTestMixin.SIMPLE_CHILDREN_MAP,
+        ChildrenMapTestMixin.LINEAR_CHILDREN_MAP,
+        ChildrenMapTestMixin.DAG_CHILDREN_MAP,
+    )
+
+    def generic_traversal(self, block_structure, **kwargs):
+        """
+        Returns the result of the generic topological traversal
+        of the given block structure.
+        """
+        return list(traverse_topologically(
+            start_node=block_structure.root_block_usage_key,
+            get_parents=block_structure.get_parents,
+            get_children=block_structure.get_children,
+            **kwargs
+        ))
+
+    @ddt.data(*CHILDREN_MAPS)
+    def test_relations(self, children_map):
+        block_structure = self.create_block_structure(children_map, BlockStructure)
+        graph = BlockGraph(block_structure._block_relations)
+        parents_map = self.get_parents_map(children_map)
+        for block_key, block_id in graph.ids.iteritems():
+            self.assertEqual(graph.keys[block_id], block_key)
+            self.assertEqual([graph.keys[child_id] for child_id in graph.children(block_id)], children_map[block_key])
+            self.assertEqual([graph.keys[parent_id] for parent_id in graph.parents(block_id)], parents_map[block_key])
+
+    @ddt.data(*CHILDREN_MAPS)
+    def test_topological_traversal(self, children_map):
+        block_structure = self.create_block_structure(children_map, BlockStructure)
+        for kwargs in [
+                {},
+                {'filter_func': lambda block_key: block_key != 1},
+                {'filter_func': lambda block_key: block_key != 1, 'yield_descendants_of_unyielded': True},
+        ]:
+            self.assertEqual(
+                list(block_structure.topological_traversal(**kwargs)),
+                self.generic_traversal(block_structure, **kwargs),
+            )
+
+    @ddt.data(*CHILDREN_MAPS)
+    def test_post_order_traversal(self, children_map):
+        block_structure = self.create_block_structure(children_map, BlockStructure)
+        for filter_func in [None, lambda block_key: block_key != 1]:
+            self.assertEqual(
+                list(block_structure.post_order_traversal(filter_func=filter_func)),
+                list(traverse_post_order(
+                    start_node=block_structure.root_block_usage_key,
+                    get_children=block_structure.get_children,
+                    filter_func=filter_func,
+                )),
+            )
+
+    @ddt.data(True, False)
+    def test_traversal_with_removals(self, keep_descendants):
+        removal_condition = lambda block_key: block_key in (1, 3)
+        block_structure = self.create_block_structure(self.DAG_CHILDREN_MAP)
+        block_structure.remove_block_traversal(removal_condition, keep_descendants)
+
+        expected_structure = self.create_block_structure(self.DAG_CHILDREN_MAP)
+        self.generic_traversal(
+            expected_structure,
+            filter_func=expected_structure.create_removal_filter(removal_condition, keep_descendants),
+        )
+
+        self.assertEqual(
+            {block_key: block_structure.get_children(block_key) for block_key in block_structure},
+            {block_key: expected_structure.get_children(block_key) for block_key in expected_structure},
+        )
+        self.assertEqual(
+            list(block_structure.topological_traversal()),
+            self.generic_traversal(block_structure),
+        )
+
+    def test_graph_rebuilt(self):
+        block_structure = self.create_block_structure(self.LINEAR_CHILDREN_MAP, BlockStructure)
+        graph = block_structure.get_graph()
+        self.assertIs(block_structure.get_graph(), graph)
+
+        block_structure._add_relation(0, 3)
+        self.assertIsNot(block_structure.get_graph(), graph)
+        self.assertEqual(list(block_structure.topological_traversal()), [0, 1, 2, 3])
+
+    @ddt.data(
+        (ChildrenMapTestMixin.SIMPLE_CHILDREN_MAP, [0, 1, 1, 2, 2]),
+        (ChildrenMapTestMixin.LINEAR_CHILDREN_MAP, [0, 1, 2, 3]),
+        (ChildrenMapTestMixin.DAG_CHILDREN_MAP, [0, 1, 1, 2, 2, 3, 3]),
+    )
+    @ddt.unpack
+    def test_block_depths(self, children_map, expected_depths):
+        block_structure = self.create_block_structure(children_map, BlockStructure)
+        block_depths = list(block_structure.get_block_depths())
+        self.assertEqual([block_key for block_key, _ in block_depths], self.generic_traversal(block_structure))
+        self.assertEqual({block_key: depth for block_key, depth in block_depths}, dict(enumerate(expected_depths)))
@@ -3,12 +3,15 @@ Tests for manager.py
 """
 import ddt
 from django.test import TestCase
+from mock import patch
 from nose.plugins.attrib import attr
 
 from ..block_structure import BlockStructureBlockData
-from ..config import RAISE_ERROR_WHEN_NOT_FOUND, STORAGE_BACKING_FOR_CACHE, waffle
+from ..config import INCREMENTAL_COLLECT, RAISE_ERROR_WHEN_NOT_FOUND, STORAGE_BACKING_FOR_CACHE, waffle
 from ..exceptions import UsageKeyNotInBlockStructure, BlockStructureNotFound
+from ..incremental import BLOCK_VERSION_KEY, BLOCK_VERSIONS_DATA_NAME
 from ..manager import BlockStructureManager
+from ..store import local_block_structure_cache
 from ..transformers import BlockStructureTransformers
 from .helpers import (
     MockModulestoreFactory, MockCache, MockTransformer,
@@ -108,6 +111,9 @@ class TestBlockStructureManager(UsageKeyFactoryMixin, ChildrenMapTestMixin, Test
         self.cache = MockCache()
         self.bs_manager = BlockStructureManager(self.block_key_factory(0), self.modulestore, self.cache)
 
+        local_block_structure_cache.clear()
+        self.addCleanup(local_block_structure_cache.clear)
+
     def collect_and_verify(self, expect_modulestore_called, expect_cache_updated):
         """
         Calls the manager's get_collected method and verifies its result
@@ -191,6 +197,42 @@ class TestBlockStructureManager(UsageKeyFactoryMixin, ChildrenMapTestMixin, Test
 
                 self.collect_and_verify(expect_modulestore_called=False, expect_cache_updated=False)
 
+    @ddt.data(True, False)
+    def test_update_collected_incrementally(self, supports_incremental_collect):
+        block_versions = {block_id: 1 for block_id in range(len(self.children_map))}
+        self.modulestore.get_block_versions = lambda course_key: {
+            ('course', unicode(block_id)): (block_versions[block_id], [('course', unicode(child)) for child in children])
+            for block_id, children in enumerate(self.children_map)
+        }
+
+        with waffle().override(INCREMENTAL_COLLECT, active=True):
+            with patch.object(TestTransformer1, 'SUPPORTS_INCREMENTAL_COLLECT', supports_incremental_collect):
+                with mock_registered_transformers(self.registered_transformers):
+                    self.bs_manager.update_collected_if_needed()
+                    self.assertEquals(self.modulestore.get_items_call_count, len(self.children_map))
+
+                    # block 3 is changed; it is recollected along with its ancestors 0 and 1
+                    block_versions[3] = 2
+                    self.modulestore.get_items_call_count = 0
+                    self.bs_manager.update_collected_if_needed()
+                    self.assertEquals(
+                        self.modulestore.get_items_call_count,
+                        3 if supports_incremental_collect else len(self.children_map),
+                    )
+                    self.assertEquals(TestTransformer1.collect_call_count, 2)
+
+                    self.collect_and_verify(expect_modulestore_called=False, expect_cache_updated=False)
+                    block_structure = self.bs_manager.get_collected()
+                    for block_id, version in block_versions.iteritems():
+                        self.assertEquals(
+                            block_structure.get_transformer_block_field(
+                                self.block_key_factory(block_id),
+                                BLOCK_VERSIONS_DATA_NAME,
+                                BLOCK_VERSION_KEY,
+                            ),
+                            version,
+                        )
+
     def test_get_collected_transformer_version(self):
         self.collect_and_verify(expect_modulestore_called=True, expect_cache_updated=True)
 
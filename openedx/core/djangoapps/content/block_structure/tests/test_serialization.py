@@ -0,0 +1,96 @@
+"""
+Tests for serialization.py
+"""
+# pylint: disable=protected-access
+import ddt
+from mock import patch
+from nose.plugins.attrib import attr
+from unittest import TestCase
+
+from openedx.core.lib.cache_utils import zpickle
+
+from .. import serialization
+from ..exceptions import BlockStructureNotFound
+from ..serialization import SERIALIZATION_PREFIX, deserialize, serialize
+from .helpers import ChildrenMapTestMixin, MockTransformer, UsageKeyFactoryMixin
+
+
+@attr(shard=2)
+@ddt.ddt
+class TestSerialization(UsageKeyFactoryMixin, ChildrenMapTestMixin, TestCase):
+    """
+    Tests for the compact serialization of block structures
+    """
+    def create_collected_block_structure(self, children_map):
+        """
+        Returns a block structure for the given children_map, with
+        mimicked collected xBlock fields and transformer data.
+        """
+        block_structure = self.create_block_structure(children_map)
+        block_structure._add_transformer(MockTransformer)
+        for block_id in range(len(children_map)):
+            block_key = self.block_key_factory(block_id)
+            block_structure._get_or_create_block(block_key).display_name = u'Block {}'.format(block_id)
+            block_structure.set_transformer_block_field(block_key, MockTransformer, 'test', block_id)
+        return block_structure
+
+    def assert_collected_data(self, block_structure, children_map):
+        """
+        Verifies the data set by create_collected_block_structure.
+        """
+        self.assertEqual(block_structure._get_transformer_data_version(MockTransformer), 1)
+        for block_id in range(len(children_map)):
+            block_key = self.block_key_factory(block_id)
+            self.assertEqual(block_structure.get_xblock_field(block_key, 'display_name'), u'Block {}'.format(block_id))
+            self.assertEqual(block_structure.get_transformer_block_field(block_key, MockTransformer, 'test'), block_id)
+
+    @ddt.data(
+        ChildrenMapTestMixin.SIMPLE_CHILDREN_MAP,
+        ChildrenMapTestMixin.LINEAR_CHILDREN_MAP,
+        ChildrenMapTestMixin.DAG_CHILDREN_MAP,
+    )
+    def test_round_trip(self, children_map):
+        block_structure = self.create_collected_block_structure(children_map)
+        serialized_data = serialize(block_structure)
+        self.assertTrue(serialized_data.startswith(SERIALIZATION_PREFIX))
+
+        deserialized = deserialize(serialized_data, block_structure.root_block_usage_key)
+        self.assert_block_structure(deserialized, children_map)
+        self.assert_collected_data(deserialized, children_map)
+
+        # the deserialized structure can be copied and serialized again
+        self.assert_collected_data(deserialized.copy(), children_map)
+        self.assert_collected_data(
+            deserialize(serialize(deserialized), block_structure.root_block_usage_key),
+            children_map,
+        )
+
+    def test_transformer_data_decoded_lazily(self):
+        children_map = self.SIMPLE_CHILDREN_MAP
+        block_structure = self.create_collected_block_structure(children_map)
+        deserialized = deserialize(serialize(block_structure), block_structure.root_block_usage_key)
+
+        lazy_sections = deserialized[self.block_key_factory(0)].transformer_data._lazy_sections
+        self.assertIn(MockTransformer.name(), lazy_sections.sections)
+        self.assertEqual(deserialized.get_transformer_block_field(self.block_key_factory(3), MockTransformer, 'test'), 3)
+        self.assertNotIn(MockTransformer.name(), lazy_sections.sections)
+
+    def test_zpickled_data(self):
+        children_map = self.DAG_CHILDREN_MAP
+        block_structure = self.create_collected_block_structure(children_map)
+        zpickled_data = zpickle((
+            block_structure._block_relations,
+            block_structure.transformer_data,
+            block_structure._block_data_map,
+        ))
+
+        deserialized = deserialize(zpickled_data, block_structure.root_block_usage_key)
+        self.assert_block_structure(deserialized, children_map)
+        self.assert_collected_data(deserialized, children_map)
+
+    def test_unknown_version(self):
+        block_structure = self.create_collected_block_structure(self.SIMPLE_CHILDREN_MAP)
+        with patch.object(serialization, 'SERIALIZATION_VERSION', serialization.SERIALIZATION_VERSION + 1):
+            serialized_data = serialize(block_structure)
+        with self.assertRaises(BlockStructureNotFound):
+            deserialize(serialized_data, block_structure.root_block_usage_key)
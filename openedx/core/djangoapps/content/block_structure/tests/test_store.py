@@ -2,6 +2,8 @@
 Tests for block_structure/cache.py
 """
 import ddt
+from django.conf import settings
+from django.test import override_settings
 from nose.plugins.attrib import attr
 
 from openedx.core.djangolib.testing.utils import CacheIsolationTestCase
@@ -9,8 +11,10 @@ from openedx.core.djangolib.testing.utils import CacheIsolationTestCase
 from ..config import STORAGE_BACKING_FOR_CACHE, waffle
 from ..config.models import BlockStructureConfiguration
 from ..exceptions import BlockStructureNotFound
-from ..store import BlockStructureStore
-from .helpers import ChildrenMapTestMixin, UsageKeyFactoryMixin, MockCache, MockTransformer
+from ..store import BlockStructureStore, local_block_structure_cache
+from .helpers import (
+    ChildrenMapTestMixin, UsageKeyFactoryMixin, MockCache, MockFilteringTransformer, MockTransformer,
+)
 
 
 @attr(shard=2)
@@ -31,6 +35,9 @@ class TestBlockStructureStore(UsageKeyFactoryMixin, ChildrenMapTestMixin, CacheI
         self.mock_cache = MockCache()
         self.store = BlockStructureStore(self.mock_cache)
 
+        local_block_structure_cache.clear()
+        self.addCleanup(local_block_structure_cache.clear)
+
     def add_transformers(self):
         """
         Add each registered transformer to the block structure.
@@ -90,3 +97,73 @@ class TestBlockStructureStore(UsageKeyFactoryMixin, ChildrenMapTestMixin, CacheI
         self.assertEquals(self.mock_cache.timeout_from_last_call, 0)
         self.store.add(self.block_structure)
         self.assertEquals(self.mock_cache.timeout_from_last_call, timeout)
+
+    @ddt.data(True, False)
+    def test_get_from_local_cache(self, with_storage_backing):
+        with waffle().override(STORAGE_BACKING_FOR_CACHE, active=with_storage_backing):
+            self.store.add(self.block_structure)
+            for _ in range(3):
+                stored_value = self.store.get(self.block_structure.root_block_usage_key)
+                self.assert_block_structure(stored_value, self.children_map)
+            self.assertEquals(local_block_structure_cache.misses, 1)
+            self.assertEquals(local_block_structure_cache.hits, 2)
+
+    def test_local_cache_not_outdated(self):
+        with waffle().override(STORAGE_BACKING_FOR_CACHE, active=True):
+            self.store.add(self.block_structure)
+            self.store.get(self.block_structure.root_block_usage_key)
+
+            self.block_structure.remove_block(self.block_key_factory(4), keep_descendants=False)
+            self.block_structure[self.block_structure.root_block_usage_key].course_version = 'new version'
+            self.store.add(self.block_structure)
+            stored_value = self.store.get(self.block_structure.root_block_usage_key)
+            self.assertNotIn(self.block_key_factory(4), stored_value)
+            self.assertEquals(local_block_structure_cache.misses, 2)
+
+    def test_local_cache_copies(self):
+        self.store.add(self.block_structure)
+        stored_value = self.store.get(self.block_structure.root_block_usage_key)
+        stored_value.remove_block(self.block_key_factory(1), keep_descendants=False)
+        stored_value.set_transformer_block_field(self.block_key_factory(0), MockTransformer, 'test', 'changed')
+
+        stored_value = self.store.get(self.block_structure.root_block_usage_key)
+        self.assert_block_structure(stored_value, self.children_map)
+        self.assertEquals(
+            stored_value.get_transformer_block_field(self.block_key_factory(0), MockTransformer, 'test'),
+            '{} val'.format(MockTransformer.name()),
+        )
+
+    def test_local_cache_disabled(self):
+        block_structures_settings = dict(settings.BLOCK_STRUCTURES_SETTINGS, LOCAL_CACHE_MAX_SIZE=0)
+        with override_settings(BLOCK_STRUCTURES_SETTINGS=block_structures_settings):
+            self.store.add(self.block_structure)
+            self.store.get(self.block_structure.root_block_usage_key)
+            self.store.get(self.block_structure.root_block_usage_key)
+        self.assertEquals(local_block_structure_cache.hits, 0)
+
+    def test_local_cache_copies_decode_lazily(self):
+        self.block_structure._add_transformer(MockFilteringTransformer)  # pylint: disable=protected-access
+        self.block_structure.set_transformer_block_field(
+            self.block_key_factory(0), MockFilteringTransformer, 'test', 'filtering val',
+        )
+        self.store.add(self.block_structure)
+        stored_value = self.store.get(self.block_structure.root_block_usage_key)
+        self.assertEquals(
+            stored_value.get_transformer_block_field(self.block_key_factory(0), MockTransformer, 'test'),
+            '{} val'.format(MockTransformer.name()),
+        )
+
+        lazy_sections = stored_value[self.block_key_factory(0)].transformer_data._lazy_sections
+        self.assertNotIn(MockTransformer.name(), lazy_sections.sections)
+        self.assertIn(MockFilteringTransformer.name(), lazy_sections.sections)
+
+        # data decoded after a copy was taken is copied too
+        stored_value = self.store.get(self.block_structure.root_block_usage_key)
+        self.assertEquals(
+            stored_value.get_transformer_block_field(self.block_key_factory(0), MockFilteringTransformer, 'test'),
+            'filtering val',
+        )
+        self.assertEquals(
+            stored_value.get_transformer_block_field(self.block_key_factory(0), MockTransformer, 'test'),
+            '{} val'.format(MockTransformer.name()),
+        )
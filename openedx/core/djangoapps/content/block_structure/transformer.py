@@ -55,6 +55,16 @@ class BlockStructureTransformer(object):
     WRITE_VERSION = 0
     READ_VERSION = 0
 
+    # Whether the data collected by the Transformer for a block depends
+    # only on the block's xBlock and on the data collected for its
+    # ancestors. The data of such Transformers is recollected only for
+    # the blocks changed since the previous collect and their
+    # descendants, when the block structure's modulestore versions its
+    # blocks. Transformers that collect data from a block's descendants
+    # or from other blocks should leave it False.
+    #
+    SUPPORTS_INCREMENTAL_COLLECT = False
+
     @classmethod
     def name(cls):
         """
@@ -130,6 +140,11 @@ class BlockStructureTransformer(object):
         the transform method and may do so using the remove_block and
         filter_with_removal methods.
 
+        The values of the fields of the given block_structure may be
+        shared with the structures cached by the process, so they must be
+        replaced, using the set and override methods, rather than mutated
+        in place.
+
         Amongst the many methods available for a block_structure, the
         following methods are commonly used during transforms:
             get_xblock_field
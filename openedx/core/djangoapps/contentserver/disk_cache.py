@@ -0,0 +1,322 @@
+"""
+Local on-disk cache of the contents of course assets.
+
+Assets too large for the course_assets cache are written to the local disk, in
+files named after their content digest, in the background the first time
+they're served, and then streamed from there instead of from the contentstore.
+Only their attributes are kept in the course_assets cache, as a
+StaticContentFile. A single writer, in any process, writes the file of a
+digest at a time.
+
+The files are evicted, least recently served first, once their total size
+goes beyond the configured maximum. A changed asset gets a new digest, and so
+a new file, while its previous file is eventually evicted.
+"""
+import errno
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from xmodule.contentstore.content import STREAM_DATA_CHUNK_SIZE, StaticContent
+
+log = logging.getLogger(__name__)
+
+# Digests safe to name files after.
+CONTENT_DIGEST_RE = re.compile(r'^[0-9a-fA-F]{16,128}$')
+
+# Prefix of the files being written.
+TEMP_FILE_PREFIX = '.tmp'
+
+# Seconds after which a file being written that isn't written to anymore is
+# considered abandoned by its writer.
+STALE_TEMP_FILE_SECONDS = 60
+
+
+class StaticContentFile(StaticContent):
+    """
+    A StaticContent whose data is read from the given file of the disk cache.
+
+    Only its attributes are pickled, without its file.
+    """
+    def __init__(self, content, asset_file):
+        super(StaticContentFile, self).__init__(
+            content.location, content.name, content.content_type, None,
+            last_modified_at=content.last_modified_at, thumbnail_location=content.thumbnail_location,
+            import_path=content.import_path, length=content.length, locked=content.locked,
+            content_digest=content.content_digest,
+        )
+        self.file = asset_file
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('file', None)
+        return state
+
+    def stream_data(self):
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(STREAM_DATA_CHUNK_SIZE)
+            if len(chunk) == 0:
+                break
+            yield chunk
+
+    def stream_data_in_range(self, first_byte, last_byte):
+        """
+        Stream the data between first_byte and last_byte (included)
+        """
+        self.file.seek(first_byte)
+        remaining = last_byte - first_byte + 1
+        while remaining > 0:
+            chunk = self.file.read(min(remaining, STREAM_DATA_CHUNK_SIZE))
+            if len(chunk) == 0:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+
+class AssetDiskCache(object):
+    """
+    Files of the contents of assets, named after their content digests, in
+    the `root` directory, of at most `max_size` bytes in total.
+    """
+    def __init__(self, root, max_size):
+        self.root = root
+        self.max_size = max_size
+
+    def open(self, content):
+        """
+        Returns a StaticContentFile of the given content if its data is on the
+        disk, or None.
+        """
+        path = self._path(content.content_digest)
+        if path is None:
+            return None
+
+        try:
+            asset_file = open(path, 'rb')
+        except IOError as error:
+            if error.errno == errno.ENOENT:
+                return None
+            raise
+
+        # Keep the recently served files from being evicted.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return StaticContentFile(content, asset_file)
+
+    def store(self, content):
+        """
+        Writes the data of the given content to the disk, unless it's already
+        there, evicting the least recently served files as needed, and returns
+        a StaticContentFile of it, or None if it can't be stored or another
+        writer is storing it.
+
+        The data of the content may have been read even if it can't be stored.
+        """
+        path = self._path(content.content_digest)
+        if path is None or content.length is None or content.length > self.max_size:
+            return None
+
+        stored_content = self.open(content)
+        if stored_content is not None:
+            return stored_content
+
+        try:
+            lock_path = self._claim(path)
+            if lock_path is None:
+                return None
+            self._write(content, lock_path, path)
+        except (IOError, OSError):
+            log.exception(u"Couldn't store the content of %s in the disk cache", unicode(content.location))
+            return None
+        self.evict()
+        return self.open(content)
+
+    def store_in_background(self, content, fetch_content, on_stored=None):
+        """
+        Starts storing in a new thread the content returned by fetch_content,
+        which must be the given content, unless it can't be stored or is
+        already being stored. Once stored, its StaticContentFile is passed to
+        on_stored, if given.
+
+        Returns the thread, or None if none was started.
+        """
+        path = self._path(content.content_digest)
+        if path is None or content.length is None or content.length > self.max_size:
+            return None
+        if self._is_being_written(path):
+            return None
+
+        thread = threading.Thread(
+            target=self._store_fetched_content,
+            args=(fetch_content, on_stored),
+            name=u'asset-disk-cache-{}'.format(content.content_digest),
+        )
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _store_fetched_content(self, fetch_content, on_stored):
+        """
+        Stores the content returned by fetch_content, and passes it to
+        on_stored once stored.
+        """
+        try:
+            content = fetch_content()
+            try:
+                stored_content = self.store(content)
+            finally:
+                if hasattr(content, 'close'):
+                    content.close()
+            if stored_content is not None:
+                stored_content.close()
+                if on_stored is not None:
+                    on_stored(stored_content)
+        except Exception:  # pylint: disable=broad-except
+            log.exception(u"Couldn't store a content in the disk cache")
+
+    def evict(self):
+        """
+        Removes the least recently served files until the total size of the
+        files is at most max_size, along with the abandoned files being
+        written.
+        """
+        files = []
+        total_size = 0
+        for dirpath, __, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if filename.startswith(TEMP_FILE_PREFIX):
+                    if stat.st_mtime < time.time() - STALE_TEMP_FILE_SECONDS:
+                        self._remove(path)
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        files.sort()
+        for __, size, path in files:
+            if total_size <= self.max_size:
+                break
+            # The files still open are read until they're closed.
+            self._remove(path)
+            total_size -= size
+
+    def _path(self, content_digest):
+        """
+        Returns the path of the file of the given content digest, or None if
+        the digest can't name a file.
+        """
+        if not content_digest or not CONTENT_DIGEST_RE.match(content_digest):
+            return None
+        return os.path.join(self.root, content_digest[:2], content_digest)
+
+    @staticmethod
+    def _lock_path(path):
+        """
+        Returns the path of the file held by the writer of the file at the
+        given path.
+        """
+        return os.path.join(os.path.dirname(path), TEMP_FILE_PREFIX + os.path.basename(path) + '.lock')
+
+    def _is_being_written(self, path):
+        """
+        Returns whether a writer is writing the file at the given path.
+        """
+        try:
+            return os.stat(self._lock_path(path)).st_mtime >= time.time() - STALE_TEMP_FILE_SECONDS
+        except OSError:
+            return False
+
+    def _claim(self, path):
+        """
+        Creates the lock file of the writer of the file at the given path,
+        and returns its path, or None if another writer holds it. The lock
+        file of an abandoned writer is replaced.
+        """
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+
+        lock_path = self._lock_path(path)
+        if not self._is_being_written(path):
+            self._remove(lock_path)
+        try:
+            os.close(os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+        except OSError as error:
+            if error.errno == errno.EEXIST:
+                return None
+            raise
+        return lock_path
+
+    @staticmethod
+    def _write(content, lock_path, path):
+        """
+        Writes the data of the content to the file at the given path, through
+        a temporary file, so that the file is never read partially written,
+        and then releases the given lock file.
+
+        The lock file is touched as the data is written, to tell the writer
+        is still at work.
+        """
+        temp_fd, temp_path = tempfile.mkstemp(prefix=TEMP_FILE_PREFIX, dir=os.path.dirname(path))
+        try:
+            size = 0
+            with os.fdopen(temp_fd, 'wb') as temp_file:
+                for chunk in content.stream_data():
+                    temp_file.write(chunk)
+                    size += len(chunk)
+                    os.utime(lock_path, None)
+            if size != content.length:
+                raise IOError(u"Read {} bytes of {}".format(size, content.length))
+            os.rename(temp_path, path)
+        except BaseException:
+            AssetDiskCache._remove(temp_path)
+            raise
+        finally:
+            AssetDiskCache._remove(lock_path)
+
+    @staticmethod
+    def _remove(path):
+        """
+        Removes the file at the given path, if it's still there.
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_disk_cache = None
+
+
+def get_asset_disk_cache():
+    """
+    Returns the AssetDiskCache configured by COURSE_ASSETS_DISK_CACHE, or None
+    if it isn't.
+    """
+    global _disk_cache  # pylint: disable=global-statement
+    config = getattr(settings, 'COURSE_ASSETS_DISK_CACHE', None) or {}
+    root, max_size = config.get('ROOT'), config.get('MAX_SIZE', 0)
+    if not root or not max_size:
+        return None
+
+    if _disk_cache is None or (_disk_cache.root, _disk_cache.max_size) != (root, max_size):
+        _disk_cache = AssetDiskCache(root, max_size)
+    return _disk_cache
@@ -4,24 +4,27 @@ Middleware to serve assets.
 
 import logging
 import datetime
+from functools import partial
+from uuid import uuid4
 log = logging.getLogger(__name__)
 try:
     import newrelic.agent
 except ImportError:
     newrelic = None  # pylint: disable=invalid-name
 from django.http import (
-    HttpResponse, HttpResponseNotModified, HttpResponseForbidden,
-    HttpResponseBadRequest, HttpResponseNotFound, HttpResponsePermanentRedirect)
+    FileResponse, HttpResponse, HttpResponseNotModified, HttpResponseForbidden,
+    HttpResponseBadRequest, HttpResponseNotFound, HttpResponsePermanentRedirect, StreamingHttpResponse)
 from six import text_type
 from student.models import CourseEnrollment
 
 from xmodule.assetstore.assetmgr import AssetManager
-from xmodule.contentstore.content import StaticContent, XASSET_LOCATION_TAG
+from xmodule.contentstore.content import StaticContent, StaticContentStream, XASSET_LOCATION_TAG
 from xmodule.modulestore import InvalidLocationError
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.locator import AssetLocator
 from openedx.core.djangoapps.header_control import force_header_for_response
 from .caching import get_cached_content, set_cached_content
+from .disk_cache import StaticContentFile, get_asset_disk_cache
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.exceptions import NotFoundError
 
@@ -32,6 +35,14 @@ from .models import CourseAssetCacheTtlConfig, CdnUserAgentsConfig
 
 HTTP_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
 
+# Assets smaller than this are cached whole in the course_assets cache, the
+# others are cached on the local disk, if configured.
+MAX_CACHED_CONTENT_LENGTH = 1048576
+
+# Maximum number of ranges sent back in a multipart response, beyond which
+# the full content is sent back instead.
+MAX_BYTE_RANGES = 20
+
 
 class StaticContentServer(object):
     """
@@ -81,7 +92,7 @@ class StaticContentServer(object):
             # them to the actual version.
             if requested_digest is not None and actual_digest is not None and (actual_digest != requested_digest):
                 actual_asset_path = StaticContent.add_version_to_asset_path(asset_path, actual_digest)
-                return HttpResponsePermanentRedirect(actual_asset_path)
+                return close_with_response(content, HttpResponsePermanentRedirect(actual_asset_path))
 
             # Set the basics for this request. Make sure that the course key for this
             # asset has a run, which old-style courses do not.  Otherwise, this will
@@ -105,28 +116,33 @@ class StaticContentServer(object):
 
             # Check that user has access to the content.
             if not self.is_user_authorized(request, content, loc):
-                return HttpResponseForbidden('Unauthorized')
+                return close_with_response(content, HttpResponseForbidden('Unauthorized'))
 
             # Figure out if the client sent us a conditional request, and let them know
-            # if this asset has changed since then.
+            # if this asset has changed since then. The ETag, if any, takes precedence.
+            etag = get_etag(content)
             last_modified_at_str = content.last_modified_at.strftime(HTTP_DATE_FORMAT)
-            if 'HTTP_IF_MODIFIED_SINCE' in request.META:
+            if etag is not None and 'HTTP_IF_NONE_MATCH' in request.META:
+                if etag_matches(request.META['HTTP_IF_NONE_MATCH'], etag):
+                    response = HttpResponseNotModified()
+                    response['ETag'] = etag
+                    return close_with_response(content, response)
+            elif 'HTTP_IF_MODIFIED_SINCE' in request.META:
                 if_modified_since = request.META['HTTP_IF_MODIFIED_SINCE']
                 if if_modified_since == last_modified_at_str:
-                    return HttpResponseNotModified()
+                    return close_with_response(content, HttpResponseNotModified())
 
-            # *** File streaming within a byte range ***
+            # *** File streaming within byte ranges ***
             # If a Range is provided, parse Range attribute of the request
             # Add Content-Range in the response if Range is structurally correct
-            # Request -> Range attribute structure: "Range: bytes=first-[last]"
+            # Request -> Range attribute structure: "Range: bytes first-[last][, first-[last]...]"
             # Response -> Content-Range attribute structure: "Content-Range: bytes first-last/totalLength"
             # http://www.w3.org/Protocols/rfc2616/rfc2616-sec14.html#sec14.35
+            # A Range is ignored if an If-Range doesn't match the current version of the asset.
             response = None
-            if request.META.get('HTTP_RANGE'):
-                # If we have a StaticContent, get a StaticContentStream.  Can't manipulate the bytes otherwise.
-                if isinstance(content, StaticContent):
-                    content = AssetManager.find(loc, as_stream=True)
-
+            content_type = content.content_type
+            if_range = request.META.get('HTTP_IF_RANGE')
+            if request.META.get('HTTP_RANGE') and if_range in (None, etag, last_modified_at_str):
                 header_value = request.META['HTTP_RANGE']
                 try:
                     unit, ranges = parse_range_header(header_value, content.length)
@@ -136,40 +152,53 @@ class StaticContentServer(object):
                         u"%s in Range header: %s for content: %s", text_type(exception), header_value, unicode(loc)
                     )
                 else:
+                    satisfiable_ranges = [
+                        (first, last) for first, last in ranges if 0 <= first <= last < content.length
+                    ]
                     if unit != 'bytes':
                         # Only accept ranges in bytes
                         log.warning(u"Unknown unit in Range header: %s for content: %s", header_value, text_type(loc))
-                    elif len(ranges) > 1:
+                    elif not satisfiable_ranges:
+                        log.warning(
+                            u"Cannot satisfy ranges in Range header: %s for content: %s",
+                            header_value, text_type(loc)
+                        )
+                        # Requested Range Not Satisfiable
+                        return close_with_response(content, HttpResponse(status=416))
+                    elif len(satisfiable_ranges) > MAX_BYTE_RANGES:
+                        log.warning(
+                            u"Too many ranges in Range header: %s for content: %s", header_value, text_type(loc)
+                        )
+                    elif len(satisfiable_ranges) > 1:
                         # According to Http/1.1 spec content for multiple ranges should be sent as a multipart message.
                         # http://www.w3.org/Protocols/rfc2616/rfc2616-sec14.html#sec14.16
-                        # But we send back the full content.
-                        log.warning(
-                            u"More than 1 ranges in Range header: %s for content: %s", header_value, text_type(loc)
+                        boundary = uuid4().hex
+                        response = self._content_response(
+                            content, stream_multipart_byteranges(content, satisfiable_ranges, boundary)
+                        )
+                        response['Content-Length'] = str(
+                            get_multipart_byteranges_length(content, satisfiable_ranges, boundary)
                         )
+                        response.status_code = 206  # Partial Content
+                        content_type = 'multipart/byteranges; boundary={}'.format(boundary)
                     else:
-                        first, last = ranges[0]
-
-                        if 0 <= first <= last < content.length:
-                            # If the byte range is satisfiable
-                            response = HttpResponse(content.stream_data_in_range(first, last))
-                            response['Content-Range'] = 'bytes {first}-{last}/{length}'.format(
-                                first=first, last=last, length=content.length
-                            )
-                            response['Content-Length'] = str(last - first + 1)
-                            response.status_code = 206  # Partial Content
-
-                            if newrelic:
-                                newrelic.agent.add_custom_parameter('contentserver.ranged', True)
-                        else:
-                            log.warning(
-                                u"Cannot satisfy ranges in Range header: %s for content: %s",
-                                header_value, text_type(loc)
-                            )
-                            return HttpResponse(status=416)  # Requested Range Not Satisfiable
+                        first, last = satisfiable_ranges[0]
+                        response = self._content_response(content, content.stream_data_in_range(first, last))
+                        response['Content-Range'] = 'bytes {first}-{last}/{length}'.format(
+                            first=first, last=last, length=content.length
+                        )
+                        response['Content-Length'] = str(last - first + 1)
+                        response.status_code = 206  # Partial Content
+
+                    if response is not None and newrelic:
+                        newrelic.agent.add_custom_parameter('contentserver.ranged', True)
 
             # If Range header is absent or syntactically invalid return a full content response.
             if response is None:
-                response = HttpResponse(content.stream_data())
+                if isinstance(content, StaticContentFile):
+                    response = FileResponse(content.file)
+                else:
+                    response = self._content_response(content, content.stream_data())
                 response['Content-Length'] = content.length
 
             if newrelic:
@@ -178,7 +207,9 @@ class StaticContentServer(object):
 
             # "Accept-Ranges: bytes" tells the user that only "bytes" ranges are allowed
             response['Accept-Ranges'] = 'bytes'
-            response['Content-Type'] = content.content_type
+            response['Content-Type'] = content_type
+            if etag is not None:
+                response['ETag'] = etag
 
             # Set any caching headers, and do any response cleanup needed.  Based on how much
             # middleware we have in place, there's no easy way to use the built-in Django
@@ -186,7 +217,17 @@ class StaticContentServer(object):
             # cacheable as possible, which is why we do it ourselves.
             self.set_caching_headers(content, response)
 
-            return response
+            return close_with_response(content, response)
+
+    @staticmethod
+    def _content_response(content, data):
+        """
+        Returns a response of the given data of the content, streamed if the
+        content is read from the disk cache or the contentstore.
+        """
+        if isinstance(content, (StaticContentFile, StaticContentStream)):
+            return StreamingHttpResponse(data)
+        return HttpResponse(data)
 
     def set_caching_headers(self, content, response):
         """
@@ -271,10 +312,21 @@ class StaticContentServer(object):
         """
         Loads an asset based on its location, either retrieving it from a cache
         or loading it directly from the contentstore.
+
+        Assets too large to be cached whole are, if the disk cache is configured,
+        read from their file in the disk cache, as a StaticContentFile. Until
+        their file is stored, which is done in the background, they're
+        streamed from the contentstore.
         """
+        disk_cache = get_asset_disk_cache()
 
         # See if we can load this item from cache.
         content = get_cached_content(location)
+        if isinstance(content, StaticContentFile):
+            # Only the attributes of the content are cached, its data is on the disk, unless it was
+            # evicted or cached by another server.
+            content = disk_cache.open(content) if disk_cache is not None else None
+
         if content is None:
             # Not in cache, so just try and load it from the asset manager.
             try:
@@ -285,13 +337,98 @@ class StaticContentServer(object):
             # Now that we fetched it, let's go ahead and try to cache it. We cap this at 1MB
             # because it's the default for memcached and also we don't want to do too much
             # buffering in memory when we're serving an actual request.
-            if content.length is not None and content.length < 1048576:
+            if content.length is not None and content.length < MAX_CACHED_CONTENT_LENGTH:
                 content = content.copy_to_in_mem()
                 set_cached_content(content)
+            elif disk_cache is not None:
+                stored_content = disk_cache.open(content)
+                if stored_content is not None:
+                    content.close()
+                    set_cached_content(stored_content)
+                    content = stored_content
+                else:
+                    # The content is stored from a stream of its own, while this one is served.
+                    disk_cache.store_in_background(
+                        content, partial(AssetManager.find, location, as_stream=True), set_cached_content,
+                    )
+
+        if newrelic:
+            newrelic.agent.add_custom_parameter('contentserver.from_disk', isinstance(content, StaticContentFile))
 
         return content
 
 
+def close_with_response(content, response):
+    """
+    Registers the file or stream the given content is read from to be closed
+    along with the response, and returns the response.
+    """
+    if isinstance(content, (StaticContentFile, StaticContentStream)):
+        response._closable_objects.append(content)  # pylint: disable=protected-access
+    return response
+
+
+def get_etag(content):
+    """
+    Returns the ETag of the given content, from its content digest, or None.
+    """
+    content_digest = getattr(content, 'content_digest', None)
+    if not content_digest:
+        return None
+    return '"{}"'.format(content_digest)
+
+
+def etag_matches(header_value, etag):
+    """
+    Returns whether the given If-None-Match header value matches the ETag,
+    by weak comparison.
+    """
+    if header_value.strip() == '*':
+        return True
+    etags = [value.strip() for value in header_value.split(',')]
+    return etag in etags or 'W/' + etag in etags
+
+
+def _byterange_part_header(content, first, last, boundary):
+    """
+    Returns the header of the part of a multipart/byteranges message of the
+    given range of the content.
+    """
+    return (
+        u'--{boundary}\r\n'
+        u'Content-Type: {content_type}\r\n'
+        u'Content-Range: bytes {first}-{last}/{length}\r\n'
+        u'\r\n'
+    ).format(
+        boundary=boundary, content_type=content.content_type, first=first, last=last, length=content.length,
+    ).encode('utf-8')
+
+
+def stream_multipart_byteranges(content, ranges, boundary):
+    """
+    Streams a multipart/byteranges message of the given ranges of the content.
+
+    See spec for details: https://tools.ietf.org/html/rfc7233#appendix-A
+    """
+    for first, last in ranges:
+        yield _byterange_part_header(content, first, last, boundary)
+        for chunk in content.stream_data_in_range(first, last):
+            yield chunk
+        yield '\r\n'
+    yield '--{boundary}--\r\n'.format(boundary=boundary)
+
+
+def get_multipart_byteranges_length(content, ranges, boundary):
+    """
+    Returns the length of the multipart/byteranges message of the given
+    ranges of the content.
+    """
+    length = len('--{boundary}--\r\n'.format(boundary=boundary))
+    for first, last in ranges:
+        length += len(_byterange_part_header(content, first, last, boundary)) + (last - first + 1) + len('\r\n')
+    return length
+
+
 def parse_range_header(header_value, content_length):
     """
     Returns the unit and a list of (start, end) tuples of ranges.
@@ -6,6 +6,10 @@ import copy
 import datetime
 import ddt
 import logging
+import os
+import pickle
+import shutil
+import tempfile
 import unittest
 from uuid import uuid4
 
@@ -13,7 +17,7 @@ from django.conf import settings
 from django.test import RequestFactory
 from django.test.client import Client
 from django.test.utils import override_settings
-from mock import patch
+from mock import Mock, patch
 
 from xmodule.contentstore.django import contentstore
 from xmodule.contentstore.content import StaticContent, VERSIONED_ASSETS_PREFIX
@@ -27,6 +31,7 @@ from xmodule.modulestore.exceptions import ItemNotFoundError
 from student.models import CourseEnrollment
 from student.tests.factories import UserFactory, AdminFactory
 
+from ..disk_cache import TEMP_FILE_PREFIX, AssetDiskCache, StaticContentFile
 from ..middleware import parse_range_header, HTTP_DATE_FORMAT, StaticContentServer
 
 log = logging.getLogger(__name__)
@@ -38,6 +43,21 @@ TEST_DATA_DIR = settings.COMMON_TEST_DATA_ROOT
 FAKE_MD5_HASH = 'ffffffffffffffffffffffffffffffff'
 
 
+class FakeThread(object):
+    """
+    A thread running its target as soon as it's started.
+    """
+    def __init__(self, target, args=(), **kwargs):  # pylint: disable=unused-argument
+        self.target = target
+        self.args = args
+
+    def start(self):
+        """
+        Runs the target.
+        """
+        self.target(*self.args)
+
+
 def get_versioned_asset_url(asset_path):
     """
     Creates a versioned asset URL.
@@ -242,17 +262,142 @@ class ContentStoreToyCourseTest(SharedModuleStoreTestCase):
 
     def test_range_request_multiple_ranges(self):
         """
-        Test that multiple ranges in request outputs the full content.
+        Test that multiple ranges in request outputs a multipart message of the ranges.
         """
         first_byte = self.length_unlocked / 4
         last_byte = self.length_unlocked / 2
         resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes={first}-{last}, -100'.format(
             first=first_byte, last=last_byte))
 
-        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.status_code, 206)
         self.assertNotIn('Content-Range', resp)
+        content_type, boundary = resp['Content-Type'].split('; boundary=')
+        self.assertEqual(content_type, 'multipart/byteranges')
+        self.assertEqual(resp['Content-Length'], str(len(resp.content)))
+
+        data = self.contentstore.find(self.unlocked_asset).data
+        parts = resp.content.split('--' + boundary)
+        self.assertEqual(len(parts), 4)
+        self.assertEqual(parts[-1], '--\r\n')
+        for part, (first, last) in zip(parts[1:3], [
+                (first_byte, last_byte),
+                (max(0, self.length_unlocked - 100), self.length_unlocked - 1),
+        ]):
+            self.assertIn('Content-Range: bytes {}-{}/{}\r\n'.format(first, last, self.length_unlocked), part)
+            self.assertTrue(part.endswith('\r\n\r\n' + data[first:last + 1] + '\r\n'))
+
+    def test_etag(self):
+        """
+        Test that the ETag of an asset is its content digest, and that requests
+        with a matching If-None-Match are answered with 304 Not Modified.
+        """
+        resp = self.client.get(self.url_unlocked)
+        etag = resp['ETag']
+        self.assertEqual(etag, '"{}"'.format(self.contentstore.find(self.unlocked_asset).content_digest))
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='"{}", {}'.format(FAKE_MD5_HASH, etag))
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='"{}"'.format(FAKE_MD5_HASH))
+        self.assertEqual(resp.status_code, 200)
+
+    def test_range_request_if_range(self):
+        """
+        Test that a range request is only answered with the range if its If-Range matches.
+        """
+        etag = self.client.get(self.url_unlocked)['ETag']
+
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=0-0', HTTP_IF_RANGE=etag)
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp['Content-Length'], '1')
+
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=0-0', HTTP_IF_RANGE='"{}"'.format(FAKE_MD5_HASH))
+        self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp['Content-Length'], str(self.length_unlocked))
 
+    def _get_with_disk_cache(self, requests, max_size=1048576):
+        """
+        Serves the given (url, headers) requests with the disk cache configured,
+        storing the contents in the foreground, and returns the responses and the
+        mock of AssetManager.find.
+        """
+        disk_cache_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, disk_cache_root)
+        cached_contents = {}
+
+        def set_cached_content(content):
+            """
+            Caches the content pickled, as memcached.
+            """
+            cached_contents[unicode(content.location)] = pickle.dumps(content)
+
+        def get_cached_content(location):
+            """
+            Returns the cached content, if any.
+            """
+            cached_content = cached_contents.get(unicode(location))
+            return pickle.loads(cached_content) if cached_content is not None else None
+
+        middleware = 'openedx.core.djangoapps.contentserver.middleware'
+        with override_settings(COURSE_ASSETS_DISK_CACHE={'ROOT': disk_cache_root, 'MAX_SIZE': max_size}), \
+                patch(middleware + '.MAX_CACHED_CONTENT_LENGTH', 0), \
+                patch(middleware + '.set_cached_content', side_effect=set_cached_content), \
+                patch(middleware + '.get_cached_content', side_effect=get_cached_content), \
+                patch(middleware + '.AssetManager.find', wraps=AssetManager.find) as mock_find, \
+                patch('openedx.core.djangoapps.contentserver.disk_cache.threading.Thread', FakeThread):
+            responses = [self.client.get(url, **headers) for url, headers in requests]
+        return disk_cache_root, responses, mock_find
+
+    def test_disk_cache(self):
+        """
+        Test that the assets too large for the course_assets cache are served from the disk cache.
+        """
+        disk_cache_root, responses, mock_find = self._get_with_disk_cache([
+            (self.url_unlocked, {}),
+            (self.url_unlocked, {}),
+            (self.url_unlocked, {'HTTP_RANGE': 'bytes=1-2'}),
+        ])
+
+        # the asset was read from the contentstore for the first request, and stored from another stream
+        self.assertEqual(mock_find.call_count, 2)
+        content = self.contentstore.find(self.unlocked_asset)
+        disk_cache_path = os.path.join(disk_cache_root, content.content_digest[:2], content.content_digest)
+        self.assertTrue(os.path.isfile(disk_cache_path))
+        for resp in responses[:2]:
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(''.join(resp.streaming_content), content.data)
+            self.assertEqual(resp['Content-Type'], content.content_type)
+        self.assertEqual(responses[2].status_code, 206)
+        self.assertEqual(''.join(responses[2].streaming_content), content.data[1:3])
+
+    def test_disk_cache_too_large(self):
+        """
+        Test that the assets too large for the disk cache are read from the contentstore once per request.
+        """
+        disk_cache_root, responses, mock_find = self._get_with_disk_cache(
+            [(self.url_unlocked, {}), (self.url_unlocked, {})], max_size=1,
+        )
+        self.assertEqual(mock_find.call_count, 2)
+        self.assertEqual(os.listdir(disk_cache_root), [])
+        content = self.contentstore.find(self.unlocked_asset)
+        for resp in responses:
+            self.assertEqual(''.join(resp.streaming_content), content.data)
+
+    def test_disk_cache_closed(self):
+        """
+        Test that the files of the disk cache are closed along with responses not reading them.
+        """
+        etag = '"{}"'.format(self.contentstore.find(self.unlocked_asset).content_digest)
+        with patch.object(StaticContentFile, 'close', autospec=True) as mock_close:
+            __, responses, __ = self._get_with_disk_cache([
+                (self.url_unlocked, {}),
+                (self.url_unlocked, {'HTTP_IF_NONE_MATCH': etag}),
+            ])
+        self.assertEqual(responses[1].status_code, 304)
+        # the stored content is closed once stored, and the opened content with the response
+        self.assertEqual(mock_close.call_count, 2)
+
     @ddt.data(
         'bytes 0-',
         'bits=0-',
@@ -403,6 +548,90 @@ class ContentStoreToyCourseTest(SharedModuleStoreTestCase):
         self.assertEqual(is_from_cdn, True)
 
 
+class AssetDiskCacheTestCase(unittest.TestCase):
+    """
+    Tests for the AssetDiskCache.
+    """
+    def setUp(self):
+        super(AssetDiskCacheTestCase, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.disk_cache = AssetDiskCache(self.root, 25)
+        self.course_key = modulestore().make_course_key('edX', 'toy', '2012_Fall')
+
+    def _content(self, content_digest, data):
+        """
+        Returns a StaticContent of the given data.
+        """
+        location = self.course_key.make_asset_key('asset', 'asset.txt')
+        return StaticContent(
+            location, 'asset.txt', 'text/plain', data, length=len(data), content_digest=content_digest,
+        )
+
+    def _stored_digests(self):
+        """
+        Returns the sorted digests of the files in the disk cache.
+        """
+        return sorted(filename for __, __, filenames in os.walk(self.root) for filename in filenames)
+
+    def test_store_and_open(self):
+        content = self._content('a' * 32, 'hello world')
+        stored_content = self.disk_cache.store(content)
+        self.assertIsInstance(stored_content, StaticContentFile)
+        self.assertEqual(''.join(stored_content.stream_data()), 'hello world')
+        self.assertEqual(''.join(stored_content.stream_data_in_range(2, 8)), 'llo wor')
+        stored_content.close()
+
+        # only the attributes of the content are pickled
+        unpickled_content = pickle.loads(pickle.dumps(stored_content))
+        self.assertNotIn('file', unpickled_content.__dict__)
+        opened_content = self.disk_cache.open(unpickled_content)
+        self.assertEqual(''.join(opened_content.stream_data()), 'hello world')
+        opened_content.close()
+
+    def test_least_recently_served_evicted(self):
+        for content_digest in ('a' * 32, 'b' * 32):
+            self.disk_cache.store(self._content(content_digest, 'x' * 10)).close()
+        os.utime(os.path.join(self.root, 'aa', 'a' * 32), (0, 0))
+        os.utime(os.path.join(self.root, 'bb', 'b' * 32), (1, 1))
+        self.disk_cache.open(self._content('a' * 32, '')).close()
+
+        self.disk_cache.store(self._content('c' * 32, 'x' * 10)).close()
+        self.assertEqual(self._stored_digests(), ['a' * 32, 'c' * 32])
+
+    def test_single_writer(self):
+        content = self._content('a' * 32, 'hello world')
+        os.makedirs(os.path.join(self.root, 'aa'))
+        lock_path = os.path.join(self.root, 'aa', TEMP_FILE_PREFIX + 'a' * 32 + '.lock')
+        open(lock_path, 'w').close()
+        self.assertIsNone(self.disk_cache.store(content))
+        self.assertIsNone(self.disk_cache.store_in_background(content, lambda: content))
+
+        # the lock of an abandoned writer is taken over
+        os.utime(lock_path, (0, 0))
+        self.disk_cache.store(content).close()
+        self.assertEqual(self._stored_digests(), ['a' * 32])
+
+    def test_store_in_background(self):
+        content = self._content('a' * 32, 'hello world')
+        on_stored = Mock()
+        self.disk_cache.store_in_background(content, lambda: self._content('a' * 32, 'hello world'), on_stored).join()
+        self.assertEqual(self._stored_digests(), ['a' * 32])
+        stored_content = on_stored.call_args[0][0]
+        self.assertIsInstance(stored_content, StaticContentFile)
+        self.assertEqual(stored_content.content_digest, 'a' * 32)
+
+        self.assertIsNone(self.disk_cache.store_in_background(self._content('b' * 32, 'x' * 26), lambda: None))
+
+    def test_not_stored(self):
+        self.assertIsNone(self.disk_cache.store(self._content('../' + 'a' * 32, 'x')))
+        self.assertIsNone(self.disk_cache.store(self._content('a' * 32, 'x' * 26)))
+        truncated_content = self._content('b' * 32, 'x')
+        truncated_content.length = 2
+        self.assertIsNone(self.disk_cache.store(truncated_content))
+        self.assertEqual(self._stored_digests(), [])
+
+
 @ddt.ddt
 class ParseRangeHeaderTestCase(unittest.TestCase):
     """
@@ -2,10 +2,14 @@
 Django models for site configurations.
 """
 import collections
+import os
 from logging import getLogger
 
+from django.conf import settings
 from django.contrib.sites.models import Site
-from django.db import models
+from django.contrib.staticfiles.templatetags.staticfiles import static
+from django.core.files.storage import get_storage_class
+from django.db import models, transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from jsonfield.fields import JSONField
@@ -56,9 +60,10 @@ class SiteConfiguration(models.Model):
 
         super(SiteConfiguration, self).save(**kwargs)
 
-        # recompile SASS on every save
+        # recompile SASS on every save, in the background
+        if getattr(settings, 'COMPILE_SITE_SASS_ON_SAVE', False):
+            self.compile_microsite_sass_async()
         #YoungSphere Later Stages
-        #self.compile_microsite_sass()
         #self.collect_css_file()
         return self
 
@@ -140,8 +145,15 @@ class SiteConfiguration(models.Model):
         self.delete_css_override()
         super(SiteConfiguration, self).delete(using=using)
 
+    def compile_microsite_sass_async(self):
+        """
+        Queues the compilation of the site's SASS once the current transaction is committed.
+        """
+        from openedx.core.djangoapps.youngsphere.sites.tasks import task_compile_site_sass
+        transaction.on_commit(lambda: task_compile_site_sass.delay(self.id))
+
     def compile_microsite_sass(self):
-        css_output = compile_sass('main.scss', custom_branding=self._sass_var_override)
+        css_output = compile_sass('main.scss', custom_branding=self._formatted_sass_variables())
         file_name = self.get_value('css_overrides_file')
         if settings.USE_S3_FOR_CUSTOMER_THEMES:
             storage = S3BotoStorage(
@@ -191,12 +203,11 @@ class SiteConfiguration(models.Model):
                 logger.warning("Can't delete CSS file {}".format(css_file))
 
     def _formatted_sass_variables(self):
-        return " ".join(["{}: {};".format(var, val[0]) for var, val in self.sass_variables])
-
-    def _sass_var_override(self, path):
-        if 'branding-basics' in path:
-            return [(path, self._formatted_sass_variables())]
-        return None
+        # without the sass_variables field, sites are compiled with the branding of the theme
+        sass_variables = getattr(self, 'sass_variables', None)
+        if not sass_variables:
+            return None
+        return " ".join(["{}: {};".format(var, val[0]) for var, val in sass_variables])
 
     def _get_initial_microsite_values(self):
         domain_without_port_number = self.site.domain.split(':')[0]
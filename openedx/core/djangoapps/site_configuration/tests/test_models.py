@@ -3,7 +3,7 @@ Tests for site configuration's django models.
 """
 from mock import patch
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.db import IntegrityError, transaction
 from django.contrib.sites.models import Site
 
@@ -317,3 +317,24 @@ class SiteConfigurationTests(TestCase):
             list(SiteConfiguration.get_all_orgs()),
             expected_orgs,
         )
+
+    @override_settings(COMPILE_SITE_SASS_ON_SAVE=True)
+    @patch('openedx.core.djangoapps.youngsphere.sites.tasks.task_compile_site_sass.delay')
+    @patch('openedx.core.djangoapps.site_configuration.models.transaction.on_commit', side_effect=lambda func: func())
+    def test_save_compiles_sass(self, mock_on_commit, mock_compile_site_sass):
+        """
+        Test that saving a SiteConfiguration queues the compilation of its SASS once committed.
+        """
+        site_configuration = SiteConfigurationFactory.create(site=self.site)
+
+        self.assertTrue(mock_on_commit.called)
+        mock_compile_site_sass.assert_called_once_with(site_configuration.id)
+
+    @patch('openedx.core.djangoapps.youngsphere.sites.tasks.task_compile_site_sass.delay')
+    def test_save_compiles_no_sass_by_default(self, mock_compile_site_sass):
+        """
+        Test that the SASS is not compiled on save unless COMPILE_SITE_SASS_ON_SAVE is set.
+        """
+        SiteConfigurationFactory.create(site=self.site)
+
+        self.assertFalse(mock_compile_site_sass.called)
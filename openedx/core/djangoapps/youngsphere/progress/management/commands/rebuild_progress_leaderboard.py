@@ -0,0 +1,45 @@
+"""
+Rebuilds the progress leaderboard buckets of the specified course(s) from the StudentProgress entries
+./manage.py lms rebuild_progress_leaderboard -c {course_id} --settings=aws
+./manage.py lms rebuild_progress_leaderboard --settings=aws
+"""
+import logging
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from opaque_keys.edx.keys import CourseKey
+
+from progress.models import StudentProgress, CourseProgressBucket
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Rebuild progress leaderboard entries for the specified course(s)
+    """
+    help = 'Rebuild progress leaderboard per course, to backfill or repair the incrementally maintained data'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "-c",
+            "--course_ids",
+            dest="course_ids",
+            help="List of courses for which to rebuild the leaderboard, defaults to every course with progress",
+            metavar="first/course/id,second/course/id"
+        ),
+    )
+
+    def handle(self, *args, **options):
+        course_ids = options.get('course_ids')
+
+        if course_ids is not None:
+            course_keys = [CourseKey.from_string(course_id) for course_id in course_ids.split(',')]
+        else:
+            course_keys = StudentProgress.objects.values_list('course_id', flat=True).distinct()
+
+        total_courses_processed = 0
+        for course_key in course_keys:
+            num_users = CourseProgressBucket.rebuild(course_key)
+            total_courses_processed += 1
+            log.info('Progress leaderboard rebuilt -- Course: %s (users: %d)', course_key, num_users)
+        print "command completed. Total courses processed", total_courses_processed
@@ -2,20 +2,30 @@
 One-time data migration script -- should not need to run it again
 """
 import logging
+import time
+from multiprocessing import Pool
 from optparse import make_option
 
 from django.core.management.base import BaseCommand
-from django.conf import settings
-from django.db.models import Q
+from django.db import connections
+from django.db.models import Max, Min
 
-from progress.models import StudentProgress, CourseModuleCompletion
-from progress.signals import is_valid_progress_module
+from progress.models import CourseProgressBucket
+from progress.utils import get_valid_progress_blocks, recalculate_course_progress, RECALCULATION_CHUNK_SIZE
 from student.models import CourseEnrollment
 from xmodule.modulestore.django import modulestore
 
 log = logging.getLogger(__name__)
 
 
+def _recalculate_shard(shard):
+    """
+    Recalculates the progress of a range of users in a worker process
+    """
+    course_key, valid_blocks, user_ids, user_id_range, chunk_size = shard
+    return recalculate_course_progress(course_key, valid_blocks, user_ids, user_id_range, chunk_size)
+
+
 class Command(BaseCommand):
     """
     Recalculate progress entries for the specified course(s) and/or user(s)
@@ -36,17 +46,36 @@ class Command(BaseCommand):
             help="List of users for which to Recalculate progress",
             metavar="1234,2468,3579"
         ),
+        make_option(
+            "-w",
+            "--workers",
+            dest="workers",
+            type="int",
+            default=1,
+            help="Number of processes among which the users of a course are sharded by id range",
+            metavar="4"
+        ),
+        make_option(
+            "--chunk_size",
+            dest="chunk_size",
+            type="int",
+            default=RECALCULATION_CHUNK_SIZE,
+            help="Number of users whose progress entries are written together",
+            metavar="1000"
+        ),
     )
 
     def handle(self, *args, **options):
         course_ids = options.get('course_ids')
         user_ids = options.get('user_ids')
+        workers = options.get('workers') or 1
+        chunk_size = options.get('chunk_size') or RECALCULATION_CHUNK_SIZE
+
+        if user_ids is not None:
+            user_ids = [int(user_id) for user_id in user_ids.split(',')]
 
         status_summary = {'skipped': 0, 'updated': 0}
         total_users_processed = 0
-        detached_categories = getattr(settings, 'PROGRESS_DETACHED_CATEGORIES', [])
-        cat_list = [Q(content_id__contains=item.strip()) for item in detached_categories]
-        cat_list = reduce(lambda a, b: a | b, cat_list)
 
         # Get the list of courses from the system
         courses = modulestore().get_courses()
@@ -60,43 +89,62 @@ class Command(BaseCommand):
             courses = filtered_courses
 
         for course in courses:
-            users = CourseEnrollment.objects.users_enrolled_in(course.id)
-            # If one or more users were specified by the caller, just use those ones...
-            if user_ids is not None:
-                filtered_users = []
-                for user in users:
-                    if str(user.id) in user_ids.split(','):
-                        filtered_users.append(user)
-                users = filtered_users
-
-            # For each user...
-            for user in users:
-                total_users_processed += 1
-                status = 'skipped'
-                completions = CourseModuleCompletion.objects.filter(course_id=course.id, user_id=user.id)\
-                    .exclude(cat_list).values_list('content_id', flat=True).distinct()
-
-                num_completions = sum([is_valid_progress_module(content_id=content_id) for content_id in completions])
+            start_time = time.time()
+            shards = self._get_shards(course.id, user_ids, workers, chunk_size)
+            if len(shards) > 1:
+                # child processes must not share the parent's database connections
+                connections.close_all()
+                pool = Pool(processes=len(shards))
                 try:
-                    existing_record = StudentProgress.objects.get(user=user, course_id=course.id)
-
-                    if existing_record.completions != num_completions:
-                        existing_record.completions = num_completions
-                        status = 'updated'
-
-                    if status == 'updated':
-                        existing_record.save()
-
-                except StudentProgress.DoesNotExist:
-                    status = "skipped"
-
-                log_msg = 'Progress entry {} -- Course: {}, User: {}  (completions: {})'.format(
-                    status,
-                    course.id,
-                    user.id,
-                    num_completions
-                )
-
-                status_summary[status] += 1
-                log.info(log_msg)
+                    results = pool.map(_recalculate_shard, shards)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                results = [_recalculate_shard(shard) for shard in shards]
+
+            course_summary = {'processed': 0, 'updated': 0, 'skipped': 0, 'rows': 0}
+            for result in results:
+                for key in course_summary:
+                    course_summary[key] += result[key]
+            if course_summary['updated']:
+                CourseProgressBucket.rebuild(course.id)
+
+            elapsed = time.time() - start_time
+            log.info(
+                'Progress recalculated -- Course: %s, users processed: %d, updated: %d, skipped: %d '
+                '(%d completions in %.2fs, %.0f rows/s)',
+                course.id,
+                course_summary['processed'],
+                course_summary['updated'],
+                course_summary['skipped'],
+                course_summary['rows'],
+                elapsed,
+                course_summary['rows'] / elapsed if elapsed else 0,
+            )
+            total_users_processed += course_summary['processed']
+            status_summary['updated'] += course_summary['updated']
+            status_summary['skipped'] += course_summary['skipped']
         print "command completed. Total users processed", total_users_processed, status_summary
+
+    @staticmethod
+    def _get_shards(course_key, user_ids, workers, chunk_size):
+        """
+        Splits the users enrolled in the course into at most `workers` user id ranges
+        """
+        valid_blocks = get_valid_progress_blocks(course_key)
+        if workers <= 1:
+            return [(course_key, valid_blocks, user_ids, None, chunk_size)]
+
+        users = CourseEnrollment.objects.users_enrolled_in(course_key)
+        if user_ids is not None:
+            users = users.filter(id__in=user_ids)
+        bounds = users.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            return []
+
+        step = max((bounds['last'] - bounds['first'] + workers) // workers, 1)
+        return [
+            (course_key, valid_blocks, user_ids, (start, start + step), chunk_size)
+            for start in xrange(bounds['first'], bounds['last'] + 1, step)
+        ]
@@ -0,0 +1,111 @@
+"""
+Tests for rebuild_progress_leaderboard.py
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase
+from opaque_keys.edx.keys import CourseKey
+
+from progress.management.commands import rebuild_progress_leaderboard
+from progress.models import StudentProgress, CourseProgressBucket
+from progress.signals import (
+    handle_enrollment_post_save_signal, handle_enrollment_pre_save_signal, increment_progress
+)
+from student.models import CourseEnrollment
+from student.tests.factories import UserFactory, CourseEnrollmentFactory
+
+
+class RebuildProgressLeaderboardTests(TestCase):
+    """
+    Test suite for progress leaderboard rebuild script
+    """
+
+    def setUp(self):
+        super(RebuildProgressLeaderboardTests, self).setUp()
+        self.course_key = CourseKey.from_string('edX/Leaderboard/2019')
+        self.users = [UserFactory.create() for __ in xrange(4)]
+        for user, completions in zip(self.users, [5, 3, 3, 1]):
+            CourseEnrollmentFactory.create(user=user, course_id=self.course_key)
+            StudentProgress.objects.create(user=user, course_id=self.course_key, completions=completions)
+        CourseProgressBucket.objects.all().delete()
+
+    def test_rebuild_progress_leaderboard_command(self):
+        """
+        Test the leaderboard is rebuilt and used for ranks and aggregates
+        """
+        rebuild_progress_leaderboard.Command().handle(course_ids=unicode(self.course_key))
+
+        buckets = CourseProgressBucket.objects.filter(course_id=self.course_key)
+        self.assertEqual(
+            sorted((bucket.completions, bucket.num_users) for bucket in buckets),
+            [(1, 1), (3, 2), (5, 1)]
+        )
+        self.assertEqual(StudentProgress.get_total_completions(self.course_key), 12)
+        self.assertEqual(StudentProgress.get_total_completions(self.course_key, [self.users[0].id]), 7)
+        self.assertEqual(StudentProgress.get_num_users_started(self.course_key), 4)
+        self.assertEqual(StudentProgress.get_user_position(self.course_key, self.users[0].id)['position'], 1)
+        self.assertEqual(StudentProgress.get_user_position(self.course_key, self.users[2].id)['position'], 3)
+        self.assertEqual(
+            StudentProgress.get_user_position(self.course_key, self.users[3].id, [self.users[0].id])['position'],
+            3
+        )
+
+    def test_unenrolled_users_leave_leaderboard(self):
+        """
+        Test an unenrollment removes the user from the leaderboard
+        """
+        rebuild_progress_leaderboard.Command().handle(course_ids=unicode(self.course_key))
+        enrollment = self.users[0].courseenrollment_set.get(course_id=self.course_key)
+        enrollment.is_active = False
+        enrollment.save()
+
+        self.assertEqual(StudentProgress.get_total_completions(self.course_key), 7)
+        self.assertEqual(StudentProgress.get_num_users_started(self.course_key), 3)
+
+    def test_deactivated_users_leave_leaderboard(self):
+        """
+        Test a deactivated user leaves the leaderboard, and comes back once reactivated
+        """
+        rebuild_progress_leaderboard.Command().handle(course_ids=unicode(self.course_key))
+        user = User.objects.get(pk=self.users[0].pk)
+        user.is_active = False
+        user.save()
+
+        self.assertEqual(StudentProgress.get_total_completions(self.course_key), 7)
+        self.assertEqual(StudentProgress.get_num_users_started(self.course_key), 3)
+
+        user.is_active = True
+        user.save()
+        self.assertEqual(StudentProgress.get_total_completions(self.course_key), 12)
+        self.assertEqual(StudentProgress.get_num_users_started(self.course_key), 4)
+
+    def test_enrollment_save_reads_previous_state_only_if_needed(self):
+        """
+        Test the leaderboard only reads the stored state of enrollments back when is_active may be saved
+        """
+        enrollment = self.users[0].courseenrollment_set.get(course_id=self.course_key)
+        with self.assertNumQueries(0):
+            handle_enrollment_pre_save_signal(CourseEnrollment, enrollment, update_fields=['mode'])
+            handle_enrollment_post_save_signal(CourseEnrollment, enrollment, created=False)
+        with self.assertNumQueries(1):
+            handle_enrollment_pre_save_signal(CourseEnrollment, enrollment)
+
+    def test_increment_progress(self):
+        """
+        Test completions move the user between the leaderboard buckets
+        """
+        rebuild_progress_leaderboard.Command().handle(course_ids=unicode(self.course_key))
+        increment_progress(self.users[1], self.course_key)
+        increment_progress(self.users[1], self.course_key)
+
+        buckets = CourseProgressBucket.objects.filter(course_id=self.course_key, num_users__gt=0)
+        self.assertEqual(
+            sorted((bucket.completions, bucket.num_users) for bucket in buckets),
+            [(1, 1), (3, 1), (5, 2)]
+        )
+        self.assertEqual(StudentProgress.objects.get(user=self.users[1], course_id=self.course_key).completions, 5)
+
+        user = UserFactory.create()
+        CourseEnrollmentFactory.create(user=user, course_id=self.course_key)
+        increment_progress(user, self.course_key)
+        self.assertEqual(StudentProgress.get_num_users_started(self.course_key), 5)
+        self.assertEqual(StudentProgress.get_user_position(self.course_key, user.id)['position'], 5)
@@ -2,11 +2,14 @@
 Tests for recalculate_progress_for_users.py
 """
 from datetime import datetime
+from StringIO import StringIO
 import uuid
 
 from django.conf import settings
 from django.test.utils import override_settings
+from django.db import transaction
 from django.db.models.signals import post_save
+from mock import patch
 
 from capa.tests.response_xml_factory import StringResponseXMLFactory
 from progress.management.commands import recalculate_progress_for_users
@@ -211,3 +214,41 @@ class RecalculateProgressEntriesTests(ModuleStoreTestCase):
         self.assertEqual(len(current_entries), 11)
         user0_entry = StudentProgress.objects.get(user=self.users[0])
         self.assertEqual(user0_entry.completions, 3)
+
+    def test_recalculate_progress_in_chunks(self):
+        """
+        Test the progress entries are written back in chunks of users
+        """
+        recalculate_progress_for_users.Command().handle(course_ids=unicode(self.course.id), chunk_size=1)
+
+        self.assertEqual(StudentProgress.objects.get(user=self.users[0]).completions, 3)
+        self.assertEqual(StudentProgress.objects.get(user=self.users[2]).completions, 3)
+        self.assertFalse(StudentProgress.objects.filter(user=self.users[1]).exists())
+        self.assertEqual(StudentProgressHistory.objects.count(), 4)
+
+    def _recalculate_output(self, **options):
+        """
+        Returns the output of the command run with the given options
+        """
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            recalculate_progress_for_users.Command().handle(course_ids=unicode(self.course.id), **options)
+        return mock_stdout.getvalue()
+
+    def test_recalculate_progress_with_workers(self):
+        """
+        Test the users sharded across worker processes are recalculated as by a single process
+        """
+        # The worker processes may not share the writes of this test's transaction, so both
+        # runs start from the same entries.
+        with transaction.atomic():
+            serial_output = self._recalculate_output()
+            transaction.set_rollback(True)
+
+        with patch.object(
+            recalculate_progress_for_users, 'Pool', wraps=recalculate_progress_for_users.Pool
+        ) as mock_pool:
+            sharded_output = self._recalculate_output(workers=2)
+
+        mock_pool.assert_called_once_with(processes=2)
+        self.assertIn("'updated': 2", serial_output)
+        self.assertEqual(sharded_output, serial_output)
@@ -0,0 +1,24 @@
+"""
+Middleware of the progress app
+"""
+from django.db import transaction
+
+from openedx.core.djangoapps import request_cache
+
+from .signals import COMPLETION_EVENTS_CACHE, flush_completion_events
+
+
+class CompletionEventsMiddleware(object):
+    """
+    Hands the completion events buffered by the batched progress pipeline during a
+    request to a single celery task once the request is done.
+
+    Must come after the RequestCache middleware, which clears the buffered events.
+    """
+    def process_request(self, request):  # pylint: disable=unused-argument
+        request_cache.get_cache(COMPLETION_EVENTS_CACHE)['in_request'] = True
+
+    def process_response(self, request, response):  # pylint: disable=unused-argument
+        request_cache.get_cache(COMPLETION_EVENTS_CACHE).pop('in_request', None)
+        transaction.on_commit(flush_completion_events)
+        return response
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from openedx.core.djangoapps.xmodule_django.models import CourseKeyField
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('progress', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseProgressBucket',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('course_id', CourseKeyField(db_index=True, max_length=255, blank=True)),
+                ('completions', models.IntegerField()),
+                ('num_users', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='courseprogressbucket',
+            unique_together=set([('course_id', 'completions')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='studentprogress',
+            index_together=set([('course_id', 'completions', 'modified')]),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicate_completions(apps, schema_editor):
+    """
+    Keeps the first of the completions recorded more than once for a user and module
+    """
+    CourseModuleCompletion = apps.get_model('progress', 'CourseModuleCompletion')
+    duplicates = CourseModuleCompletion.objects.values('user_id', 'course_id', 'content_id')\
+        .annotate(first_id=Min('id'), count=Count('id'))\
+        .filter(count__gt=1)\
+        .order_by()
+    for duplicate in duplicates:
+        CourseModuleCompletion.objects.filter(
+            user_id=duplicate['user_id'],
+            course_id=duplicate['course_id'],
+            content_id=duplicate['content_id'],
+        ).exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('progress', '0002_courseprogressbucket'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_completions, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='coursemodulecompletion',
+            unique_together=set([('user', 'course_id', 'content_id')]),
+        ),
+    ]
@@ -1,16 +1,20 @@
 """
 Django database models supporting the progress app
 """
+import logging
 
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
 from django.utils.translation import ugettext_lazy as _
 from model_utils.fields import AutoCreatedField, AutoLastModifiedField
 
 from model_utils.models import TimeStampedModel
 from openedx.core.djangoapps.xmodule_django.models import CourseKeyField
+from student.models import CourseEnrollment
+
+log = logging.getLogger(__name__)
 
 
 class StudentProgress(models.Model):
@@ -29,21 +33,36 @@ class StudentProgress(models.Model):
         Meta information for this Django model
         """
         unique_together = (('user', 'course_id'),)
+        index_together = (('course_id', 'completions', 'modified'),)
 
     @classmethod
-    def get_total_completions(cls, course_key, exclude_users=None, org_ids=None, group_ids=None):
+    def _build_queryset(cls, course_key, exclude_users=None, org_ids=None, group_ids=None):
         """
-        Returns count of completions for a given course.
+        Helper method to return the progress entries of actively enrolled users in a course.
         """
         queryset = cls.objects.filter(course_id__exact=course_key, user__is_active=True,
                                       user__courseenrollment__is_active=True,
                                       user__courseenrollment__course_id__exact=course_key)\
-            .exclude(user__id__in=exclude_users)
+            .exclude(user__id__in=exclude_users or [])
         if org_ids:
             queryset = queryset.filter(user__organizations__in=org_ids)
         if group_ids:
             queryset = queryset.filter(user__groups__in=group_ids).distinct()
-        completions = sum([student_progress.completions for student_progress in queryset])
+        return queryset
+
+    @classmethod
+    def get_total_completions(cls, course_key, exclude_users=None, org_ids=None, group_ids=None):
+        """
+        Returns count of completions for a given course.
+        """
+        if org_ids or group_ids:
+            queryset = cls._build_queryset(course_key, exclude_users, org_ids, group_ids)
+            return queryset.aggregate(total=Sum('completions'))['total'] or 0
+
+        completions = CourseProgressBucket.get_course_totals(course_key)['completions']
+        if exclude_users:
+            excluded = cls._build_queryset(course_key).filter(user__id__in=exclude_users)
+            completions -= excluded.aggregate(total=Sum('completions'))['total'] or 0
         return completions
 
     @classmethod
@@ -51,21 +70,23 @@ class StudentProgress(models.Model):
         """
         Returns count of users who completed at least one module.
         """
-        queryset = cls.objects.filter(course_id__exact=course_key, user__is_active=True,
-                                      user__courseenrollment__is_active=True,
-                                      user__courseenrollment__course_id__exact=course_key)\
-            .exclude(user__id__in=exclude_users)
-        if org_ids:
-            queryset = queryset.filter(user__organizations__in=org_ids)
-        if group_ids:
-            queryset = queryset.filter(user__groups__in=group_ids)
-        return queryset.distinct().count()
+        if org_ids or group_ids:
+            queryset = cls._build_queryset(course_key, exclude_users, org_ids, group_ids)
+            return queryset.distinct().count()
+
+        num_users = CourseProgressBucket.get_course_totals(course_key)['users']
+        if exclude_users:
+            num_users -= cls._build_queryset(course_key).filter(user__id__in=exclude_users).count()
+        return num_users
 
     @classmethod
     def get_user_position(cls, course_key, user_id, exclude_users=None):
         """
         Returns user's progress position and completions for a given course.
         data = {"completions": 22, "position": 4}
+
+        Users with more completions are counted from the per-course leaderboard
+        buckets, so only users tied with the given user are read from this table.
         """
         data = {"completions": 0, "position": 0}
         try:
@@ -77,11 +98,14 @@ class StudentProgress(models.Model):
             user_completions = queryset.completions
             user_time_completed = queryset.modified
 
-            users_above = cls.objects.filter(Q(completions__gt=user_completions) | Q(completions=user_completions,
-                                                                                     modified__lt=user_time_completed),
-                                             course_id__exact=course_key, user__is_active=True)\
-                .exclude(user__id__in=exclude_users)\
+            users_above = CourseProgressBucket.get_users_above(course_key, user_completions)
+            users_above += cls._build_queryset(course_key, exclude_users)\
+                .filter(completions=user_completions, modified__lt=user_time_completed)\
                 .count()
+            if exclude_users:
+                users_above -= cls._build_queryset(course_key)\
+                    .filter(user__id__in=exclude_users, completions__gt=user_completions)\
+                    .count()
             data['position'] = users_above + 1
             data['completions'] = user_completions
         return data
@@ -123,14 +147,7 @@ class StudentProgress(models.Model):
         ]
 
         """
-        queryset = cls.objects\
-            .filter(course_id__exact=course_key, user__is_active=True, user__courseenrollment__is_active=True,
-                    user__courseenrollment__course_id__exact=course_key)\
-            .exclude(user__id__in=exclude_users)
-        if org_ids:
-            queryset = queryset.filter(user__organizations__in=org_ids)
-        if group_ids:
-            queryset = queryset.filter(user__groups__in=group_ids).distinct()
+        queryset = cls._build_queryset(course_key, exclude_users, org_ids, group_ids)
         queryset = queryset.values(
             'user__id',
             'user__username',
@@ -142,6 +159,103 @@ class StudentProgress(models.Model):
         return queryset
 
 
+class CourseProgressBucket(models.Model):
+    """
+    Denormalized leaderboard store for the progress app.  Holds, per course, the
+    number of actively enrolled users sitting at each completions value, so that
+    ranks and course-wide aggregates are answered from a handful of rows instead
+    of joining every progress entry against users and enrollments.
+    """
+    course_id = CourseKeyField(db_index=True, max_length=255, blank=True)
+    completions = models.IntegerField()
+    num_users = models.IntegerField(default=0)
+
+    class Meta(object):
+        """
+        Meta information for this Django model
+        """
+        unique_together = (('course_id', 'completions'),)
+
+    @classmethod
+    def move_user(cls, course_key, old_completions, new_completions):
+        """
+        Moves one user from the `old_completions` bucket to the `new_completions` one.
+        Either value may be None when the user enters or leaves the leaderboard.
+        """
+        if old_completions == new_completions:
+            return
+        if old_completions is not None:
+            updated = cls.objects.filter(course_id=course_key, completions=old_completions, num_users__gt=0)\
+                .update(num_users=F('num_users') - 1)
+            if not updated:
+                log.warning(
+                    u"Progress leaderboard of %s has no user with %s completions to move, "
+                    u"run rebuild_progress_leaderboard to repair it",
+                    course_key, old_completions
+                )
+        if new_completions is not None:
+            updated = cls.objects.filter(course_id=course_key, completions=new_completions)\
+                .update(num_users=F('num_users') + 1)
+            if not updated:
+                bucket, created = cls.objects.get_or_create(
+                    course_id=course_key, completions=new_completions, defaults={'num_users': 1}
+                )
+                if not created:
+                    bucket.num_users = F('num_users') + 1
+                    bucket.save()
+
+    @classmethod
+    def record_progress_change(cls, user, course_key, old_completions, new_completions):
+        """
+        Applies a change of a user's completions to the leaderboard.  Users without
+        an active enrollment are not ranked, matching `StudentProgress.generate_leaderboard`.
+        """
+        if user.is_active and CourseEnrollment.is_enrolled(user, course_key):
+            cls.move_user(course_key, old_completions, new_completions)
+
+    @classmethod
+    def get_course_totals(cls, course_key):
+        """
+        Returns the number of ranked users and their summed completions for a course.
+        data = {"users": 120, "completions": 3480}
+        """
+        aggregates = cls.objects.filter(course_id=course_key, num_users__gt=0).aggregate(
+            users=Sum('num_users'),
+            completions=Sum(F('completions') * F('num_users'), output_field=models.IntegerField()),
+        )
+        return {
+            'users': aggregates['users'] or 0,
+            'completions': aggregates['completions'] or 0,
+        }
+
+    @classmethod
+    def get_users_above(cls, course_key, completions):
+        """
+        Returns the number of ranked users having more than `completions` completions.
+        """
+        return cls.objects.filter(course_id=course_key, completions__gt=completions)\
+            .aggregate(users=Sum('num_users'))['users'] or 0
+
+    @classmethod
+    def rebuild(cls, course_key):
+        """
+        Recomputes the leaderboard buckets of a course from the progress entries.
+        Returns the number of users ranked.
+        """
+        buckets = StudentProgress._build_queryset(course_key)\
+            .values('completions')\
+            .annotate(num_users=Count('user', distinct=True))\
+            .order_by()
+        buckets = [
+            cls(course_id=course_key, completions=bucket['completions'], num_users=bucket['num_users'])
+            for bucket in buckets
+        ]
+        with transaction.atomic():
+            cls.objects.filter(course_id=course_key).delete()
+            cls.objects.bulk_create(buckets)
+        return sum(bucket.num_users for bucket in buckets)
+
+
 class StudentProgressHistory(TimeStampedModel):
     """
     A running audit trail for the StudentProgress model.  Listens for
@@ -163,6 +277,12 @@ class CourseModuleCompletion(TimeStampedModel):
     content_id = models.CharField(max_length=255, db_index=True)
     stage = models.CharField(max_length=255, null=True, blank=True)
 
+    class Meta(object):
+        """
+        Meta information for this Django model
+        """
+        unique_together = (('user', 'course_id', 'content_id'),)
+
     @classmethod
     def get_actual_completions(cls):
         """
@@ -6,12 +6,14 @@ import logging
 
 from completion.models import BlockCompletion
 from django.dispatch import receiver
+from django.contrib.auth.models import User
 from django.db.models.signals import post_save, pre_save
-from django.db.models import F
-from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
+from django.core.cache import cache
 from opaque_keys import InvalidKeyError
-from opaque_keys.edx.locator import BlockUsageLocator
+from opaque_keys.edx.keys import CourseKey
+from opaque_keys.edx.locator import BlockUsageLocator, LibraryLocator
+from student.models import CourseEnrollment
 from util.signals import course_deleted
 
 # from edx_notifications.lib.publisher import (
@@ -23,16 +25,27 @@ from util.signals import course_deleted
 #     get_aggregate_exclusion_user_ids,
 # )
 #from edx_notifications.data import NotificationMessage
-from .utils import is_progress_detached_vertical
+from .utils import get_cached_valid_progress_blocks, is_progress_detached_vertical
 
-from .models import StudentProgress, StudentProgressHistory, CourseModuleCompletion
+from .models import StudentProgress, StudentProgressHistory, CourseModuleCompletion, CourseProgressBucket
+from .tasks import task_apply_completion_events, task_update_valid_progress_blocks
 
-from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.django import SignalHandler, modulestore
 from xmodule.modulestore.exceptions import ItemNotFoundError
-from django.db import models
+from django.db import models, transaction
+from openedx.core.djangoapps import request_cache
 
 log = logging.getLogger(__name__)
 
+# Values of the PROGRESS_COMPLETION_PIPELINE setting
+PIPELINE_SYNC = 'sync'
+PIPELINE_BATCHED = 'batched'
+
+COMPLETION_EVENTS_CACHE = 'progress.completion_events'
+# Set while a task building the blocks valid for progress of a course is scheduled
+VALID_PROGRESS_BLOCKS_SCHEDULED_CACHE_KEY = u'progress.valid_blocks_scheduled.{course_key}'
+
+
 @receiver(models.signals.post_save, sender=BlockCompletion)
 def course_module_completion_increment(**kwargs):
     """
@@ -40,30 +53,63 @@ def course_module_completion_increment(**kwargs):
     evaluation of any milestone which can be completed.
     """
     instance = kwargs['instance']
-    course_id = unicode(instance.course_key)
-    block_id = unicode(instance.block_key)
-    user_id = instance.user_id
+    record_completion(instance.user_id, unicode(instance.course_key), unicode(instance.block_key))
+
+
+def record_completion(user_id, course_id, content_id):
+    """
+    Records the completion of a block as a CourseModuleCompletion, which counts towards
+    progress: right away with the 'sync' pipeline, or through `enqueue_completion_event`
+    with the 'batched' one.
+    """
+    if getattr(settings, 'PROGRESS_COMPLETION_PIPELINE', PIPELINE_SYNC) == PIPELINE_BATCHED:
+        enqueue_completion_event(user_id, course_id, content_id)
+        return
     CourseModuleCompletion.objects.get_or_create(
         user_id=user_id,
         course_id=course_id,
-        content_id=unicode(instance.block_key)
+        content_id=content_id
     )
 
+
+def enqueue_completion_event(user_id, course_id, content_id):
+    """
+    Buffers a completion event for the batched pipeline.  The events buffered during
+    a request are handed to a single celery task by `CompletionEventsMiddleware` once
+    the request is done; outside of requests, once the current transaction commits.
+    """
+    events_cache = request_cache.get_cache(COMPLETION_EVENTS_CACHE)
+    events_cache.setdefault('events', []).append((user_id, course_id, content_id))
+    if not events_cache.get('in_request'):
+        transaction.on_commit(flush_completion_events)
+
+
+def flush_completion_events():
+    """
+    Sends the buffered completion events, if any, to be applied by a celery worker
+    """
+    events = request_cache.get_cache(COMPLETION_EVENTS_CACHE).pop('events', None)
+    if events:
+        task_apply_completion_events.delay(events)
+
+
 def is_valid_progress_module(content_id):
     """
     Returns boolean indicating if given module is valid for marking progress
-    A valid module should be child of `vertical` and its category should be
+    A valid module should be child of `vertical` and its category should not be
     one of the PROGRESS_DETACHED_CATEGORIES
+
+    The check is a lookup in the cached set of valid blocks of the published version of
+    the module's course.  Until that set is cached, the module is checked in the
+    modulestore, and the set is built by a task.
     """
     try:
-        detached_categories = getattr(settings, 'PROGRESS_DETACHED_CATEGORIES', [])
         usage_id = BlockUsageLocator.from_string(content_id)
-        module = modulestore().get_item(usage_id)
-        if module and module.parent and module.parent.category == "vertical" and \
-                module.category not in detached_categories and not is_progress_detached_vertical(module.parent):
-            return True
-        else:
-            return False
+        valid_blocks = get_cached_valid_progress_blocks(usage_id.course_key)
+        if valid_blocks is not None:
+            return unicode(content_id) in valid_blocks
+        _schedule_valid_progress_blocks_update(usage_id.course_key)
+        return _is_valid_progress_module_in_modulestore(usage_id)
     except (InvalidKeyError, ItemNotFoundError) as exception:
         log.debug("Error getting module for content_id:%s %s", content_id, exception.message)
         return False
@@ -73,6 +119,31 @@ def is_valid_progress_module(content_id):
         return False
 
 
+def _is_valid_progress_module_in_modulestore(usage_id):
+    """
+    Returns whether the module is valid for marking progress, from its item and
+    parent in the modulestore
+    """
+    detached_categories = getattr(settings, 'PROGRESS_DETACHED_CATEGORIES', [])
+    module = modulestore().get_item(usage_id)
+    return bool(
+        module and module.parent and module.parent.category == "vertical" and
+        module.category not in detached_categories and not is_progress_detached_vertical(module.parent)
+    )
+
+
+def _schedule_valid_progress_blocks_update(course_key, countdown=0):
+    """
+    Has the set of blocks valid for progress of a course built by a task, unless one
+    was scheduled for the course recently
+    """
+    if cache.add(VALID_PROGRESS_BLOCKS_SCHEDULED_CACHE_KEY.format(course_key=course_key), True, countdown + 60):
+        task_update_valid_progress_blocks.apply_async(
+            kwargs=dict(course_id=unicode(course_key)),
+            countdown=countdown,
+        )
+
+
 @receiver(post_save, sender=CourseModuleCompletion, dispatch_uid='lms.progress.post_save_cms')
 def handle_cmc_post_save_signal(sender, instance, created, **kwargs):  # pylint: disable=unused-argument
     """
@@ -81,18 +152,33 @@ def handle_cmc_post_save_signal(sender, instance, created, **kwargs):  # pylint:
     content_id = unicode(instance.content_id)
     if is_valid_progress_module(content_id):
         try:
-            progress = StudentProgress.objects.get(user=instance.user, course_id=instance.course_id)
-            progress.completions = F('completions') + 1
-            progress.save()
+            increment_progress(instance.user, CourseKey.from_string(instance.course_id))
             #invalid_user_data_cache('progress', instance.course_id, instance.user.id)
-        except ObjectDoesNotExist:
-            progress = StudentProgress(user=instance.user, course_id=instance.course_id, completions=1)
-            progress.save()
         except Exception:  # pylint: disable=broad-except
             exc_type, exc_value, __ = sys.exc_info()
             logging.error("Exception type: %s with value: %s", exc_type, exc_value)
 
 
+def increment_progress(user, course_key):
+    """
+    Adds a completion to the user's progress in the course and moves the user to
+    the matching leaderboard bucket.  The progress row is locked while the buckets
+    are updated, so concurrent completions move the user from the value actually
+    stored rather than from a stale read.
+    """
+    with transaction.atomic():
+        progress, created = StudentProgress.objects.select_for_update().get_or_create(
+            user=user, course_id=course_key, defaults={'completions': 1}
+        )
+        if created:
+            previous_completions = None
+        else:
+            previous_completions = progress.completions
+            progress.completions = previous_completions + 1
+            progress.save()
+        CourseProgressBucket.record_progress_change(user, course_key, previous_completions, progress.completions)
+
+
 @receiver(post_save, sender=StudentProgress)
 def save_history(sender, instance, **kwargs):  # pylint: disable=no-self-argument, unused-argument
     """
@@ -108,6 +194,104 @@ def save_history(sender, instance, **kwargs):  # pylint: disable=no-self-argumen
     history_entry.save()
 
 
+@receiver(SignalHandler.course_published)
+def handle_course_published_signal(sender, course_key, **kwargs):  # pylint: disable=unused-argument
+    """
+    Has the set of blocks valid for progress of the published course built once the
+    block structure of the course has been updated.  The modules are checked in the
+    modulestore until then.  Ignores publish signals from content libraries.
+    """
+    if isinstance(course_key, LibraryLocator):
+        return
+
+    cache.delete(VALID_PROGRESS_BLOCKS_SCHEDULED_CACHE_KEY.format(course_key=course_key))
+    _schedule_valid_progress_blocks_update(
+        course_key, countdown=2 * settings.BLOCK_STRUCTURES_SETTINGS['COURSE_PUBLISH_TASK_DELAY']
+    )
+
+
+def _remember_is_active(sender, instance, update_fields):
+    """
+    Remembers the stored is_active value of a user or enrollment about to be saved,
+    so that the post-save handlers can tell activations and deactivations apart.
+    The stored value is only read back when the save may change it: not for new
+    rows, saves of other fields or instances without is_active loaded.
+    """
+    instance.progress_stored_is_active = None
+    if instance._state.adding or 'is_active' not in instance.__dict__:  # pylint: disable=protected-access
+        return
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    instance.progress_stored_is_active = sender.objects.filter(pk=instance.pk)\
+        .values_list('is_active', flat=True).first()
+
+
+def _is_active_changed(instance, created):
+    """
+    Returns whether the saved user or enrollment was activated or deactivated
+    """
+    was_active = False if created else getattr(instance, 'progress_stored_is_active', None)
+    instance.progress_stored_is_active = None
+    return was_active is not None and bool(was_active) != bool(instance.is_active)
+
+
+@receiver(pre_save, sender=CourseEnrollment)
+def handle_enrollment_pre_save_signal(sender, instance, update_fields=None,
+                                      **kwargs):  # pylint: disable=unused-argument
+    """
+    Remembers whether the enrollment is active before it's changed
+    """
+    _remember_is_active(sender, instance, update_fields)
+
+
+@receiver(post_save, sender=CourseEnrollment)
+def handle_enrollment_post_save_signal(sender, instance, created, **kwargs):  # pylint: disable=unused-argument
+    """
+    Keeps the progress leaderboard in step with enrollments, since only actively
+    enrolled users are ranked
+    """
+    if not _is_active_changed(instance, created):
+        return
+    try:
+        progress = StudentProgress.objects.get(user_id=instance.user_id, course_id=instance.course_id)
+    except StudentProgress.DoesNotExist:
+        return
+    if instance.is_active:
+        if instance.user.is_active:
+            CourseProgressBucket.move_user(instance.course_id, None, progress.completions)
+    else:
+        CourseProgressBucket.move_user(instance.course_id, progress.completions, None)
+
+
+@receiver(pre_save, sender=User)
+def handle_user_pre_save_signal(sender, instance, update_fields=None, **kwargs):  # pylint: disable=unused-argument
+    """
+    Remembers whether the user is active before it's changed
+    """
+    _remember_is_active(sender, instance, update_fields)
+
+
+@receiver(post_save, sender=User)
+def handle_user_post_save_signal(sender, instance, created, **kwargs):  # pylint: disable=unused-argument
+    """
+    Removes deactivated users from the progress leaderboards of their courses, and
+    puts reactivated users back, since only active users are ranked
+    """
+    is_active_changed = _is_active_changed(instance, created)
+    if created or not is_active_changed:
+        return
+    enrolled_course_ids = set(
+        CourseEnrollment.objects.filter(user_id=instance.id, is_active=True).values_list('course_id', flat=True)
+    )
+    for progress in StudentProgress.objects.filter(user_id=instance.id):
+        if progress.course_id not in enrolled_course_ids:
+            continue
+        if instance.is_active:
+            CourseProgressBucket.move_user(progress.course_id, None, progress.completions)
+        else:
+            CourseProgressBucket.move_user(progress.course_id, progress.completions, None)
+
+
 #
 # Support for Notifications, these two receivers should actually be migrated into a new Leaderboard django app.
 # For now, put the business logic here, but it is pretty decoupled through event signaling
@@ -194,3 +378,4 @@ def on_course_deleted(sender, **kwargs):  # pylint: disable=W0613
     CourseModuleCompletion.objects.filter(course_id=unicode(course_key)).delete()
     StudentProgress.objects.filter(course_id=course_key).delete()
     StudentProgressHistory.objects.filter(course_id=course_key).delete()
+    CourseProgressBucket.objects.filter(course_id=course_key).delete()
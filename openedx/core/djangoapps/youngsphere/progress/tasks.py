@@ -0,0 +1,140 @@
+"""
+This module has implementation of celery tasks for the progress use cases
+"""
+import logging
+from collections import Counter
+
+from celery.task import task
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from opaque_keys.edx.keys import CourseKey
+
+from .models import StudentProgress, StudentProgressHistory, CourseModuleCompletion, CourseProgressBucket
+from .utils import get_valid_progress_blocks, update_valid_progress_blocks
+
+log = logging.getLogger('edx.celery.task')
+
+
+@task(
+    name=u'openedx.core.djangoapps.youngsphere.progress.tasks.task_apply_completion_events',
+    routing_key=settings.RECALCULATE_PROGRESS_ROUTING_KEY,
+)
+def task_apply_completion_events(events):
+    """
+    Task to apply a batch of block completion events to the progress of users
+    """
+    applied = apply_completion_events(events)
+    log.info("Applied %d new completions out of %d completion events", applied, len(events))
+
+
+@task(
+    name=u'openedx.core.djangoapps.youngsphere.progress.tasks.task_update_valid_progress_blocks',
+    routing_key=settings.RECALCULATE_PROGRESS_ROUTING_KEY,
+)
+def task_update_valid_progress_blocks(course_id):
+    """
+    Task to rebuild the cached set of blocks valid for progress in a course
+    """
+    valid_blocks = update_valid_progress_blocks(CourseKey.from_string(course_id))
+    log.info("Progress valid blocks updated for course %s (%d blocks)", course_id, len(valid_blocks))
+
+
+def apply_completion_events(events):
+    """
+    Records a batch of `(user_id, course_id, content_id)` completion events in bulk: one
+    query to find the completions already recorded, one insert for the new ones and a
+    single update per user and course for the progress entries, followed by one insert
+    for the progress history.
+
+    Only the completions actually inserted count towards progress, so overlapping
+    batches applied concurrently don't count a completion twice.
+
+    Returns the number of completions which were not recorded before.
+    """
+    events = set(tuple(event) for event in events)
+    if not events:
+        return 0
+
+    user_ids, course_ids, content_ids = [set(values) for values in zip(*events)]
+    recorded = set(
+        CourseModuleCompletion.objects.filter(
+            user_id__in=user_ids, course_id__in=course_ids, content_id__in=content_ids
+        ).values_list('user_id', 'course_id', 'content_id')
+    )
+    new_events = _insert_completions(sorted(events - recorded))
+
+    course_keys = {course_id: CourseKey.from_string(course_id) for course_id in course_ids}
+    valid_blocks = {course_id: get_valid_progress_blocks(course_key) for course_id, course_key in course_keys.items()}
+    increments = Counter(
+        (user_id, course_keys[course_id])
+        for user_id, course_id, content_id in new_events
+        if content_id in valid_blocks[course_id]
+    )
+    if increments:
+        _apply_progress_increments(increments)
+    return len(new_events)
+
+
+def _insert_completions(events):
+    """
+    Inserts the completions of the given events, skipping the ones another worker
+    inserted in the meantime, and returns the events actually inserted.
+
+    bulk_create doesn't send post_save, so the completions aren't counted again by
+    `handle_cmc_post_save_signal`.
+    """
+    def _completion(user_id, course_id, content_id):
+        return CourseModuleCompletion(user_id=user_id, course_id=course_id, content_id=content_id)
+
+    try:
+        with transaction.atomic():
+            CourseModuleCompletion.objects.bulk_create([_completion(*event) for event in events])
+        return events
+    except IntegrityError:
+        # Some of the completions were inserted by another worker, fall back to one at a time
+        inserted = []
+        for event in events:
+            try:
+                with transaction.atomic():
+                    CourseModuleCompletion.objects.bulk_create([_completion(*event)])
+            except IntegrityError:
+                continue
+            inserted.append(event)
+        return inserted
+
+
+def _apply_progress_increments(increments):
+    """
+    Adds the `(user_id, course_key): completions` increments to the progress entries,
+    creating the missing ones, and records the resulting values in the history.
+
+    Each progress entry is locked while its increment is applied, so the leaderboard
+    buckets are moved from the value actually stored.
+    """
+    users = User.objects.in_bulk(set(user_id for user_id, __ in increments))
+
+    now = timezone.now()
+    changes = []
+    for (user_id, course_key), count in increments.items():
+        with transaction.atomic():
+            progress, created = StudentProgress.objects.select_for_update().get_or_create(
+                user_id=user_id, course_id=course_key, defaults={'completions': count}
+            )
+            if created:
+                # the history entry was already written by the post_save handler
+                CourseProgressBucket.record_progress_change(users[user_id], course_key, None, count)
+                continue
+            previous_completions = progress.completions
+            StudentProgress.objects.filter(pk=progress.pk)\
+                .update(completions=previous_completions + count, modified=now)
+            CourseProgressBucket.record_progress_change(
+                users[user_id], course_key, previous_completions, previous_completions + count
+            )
+        changes.append((user_id, course_key, previous_completions + count))
+
+    StudentProgressHistory.objects.bulk_create([
+        StudentProgressHistory(user_id=user_id, course_id=course_key, completions=completions)
+        for user_id, course_key, completions in changes
+    ])
@@ -10,7 +10,10 @@ import ddt
 from mock import MagicMock, patch
 from datetime import datetime
 from django.utils.timezone import UTC
+from django.http import HttpResponse
+from django.test import RequestFactory
 from django.test.utils import override_settings
+from completion.models import BlockCompletion
 from django.conf import settings
 from capa.tests.response_xml_factory import StringResponseXMLFactory
 from student.tests.factories import UserFactory, AdminFactory
@@ -23,7 +26,12 @@ from xmodule.modulestore.tests.django_utils import (
 )
 from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 from progress.models import CourseModuleCompletion, StudentProgress, StudentProgressHistory
+from openedx.core.djangoapps.youngsphere.progress.middleware import CompletionEventsMiddleware
+from progress.tasks import _insert_completions, apply_completion_events, task_update_valid_progress_blocks
+from progress.utils import get_cached_valid_progress_blocks, get_valid_progress_blocks
+from openedx.core.djangoapps.youngsphere.progress.signals import handle_course_published_signal, is_valid_progress_module
 from courseware.model_data import FieldDataCache
+from openedx.core.djangoapps.content.block_structure.manager import BlockStructureManager
 from courseware import module_render
 from util.signals import course_deleted
 from edx_solutions_api_integration.test_utils import SignalDisconnectTestMixin
@@ -178,6 +186,25 @@ class CourseModuleCompletionTests(SignalDisconnectTestMixin, ModuleStoreTestCase
         )
         self.assertIsNotNone(completion_fetch)
 
+    @override_settings(PROGRESS_COMPLETION_PIPELINE='batched')
+    def test_progress_event_batched(self):
+        """
+        Tests the completions of progress events are left to the batched pipeline
+        """
+        module = self.get_module_for_user(self.user, self.course, self.problem4)
+        # the test transaction is never committed, so the commit callbacks are run right away
+        with patch('django.db.transaction.on_commit', side_effect=lambda func: func()), patch(
+            'openedx.core.djangoapps.youngsphere.progress.signals.task_apply_completion_events.delay'
+        ) as mock_delay:
+            module.system.publish(module, 'progress', {})
+
+        self.assertFalse(CourseModuleCompletion.objects.filter(user=self.user).exists())
+        self.assertFalse(StudentProgress.objects.filter(user=self.user).exists())
+        self.assertIn(
+            (self.user.id, unicode(self.course.id), unicode(self.problem4.location)),
+            mock_delay.call_args[0][0]
+        )
+
     def test_check_notifications(self):
         """
         Save a CourseModuleCompletion and fetch it again
@@ -402,6 +429,127 @@ class CourseModuleCompletionTests(SignalDisconnectTestMixin, ModuleStoreTestCase
         # assert there is no progress entry for a module whose category is in detached categories
         self.assertEqual(len(progress), 0)
 
+    @override_settings(
+        PROGRESS_DETACHED_CATEGORIES=["discussion-forum"],
+        PROGRESS_DETACHED_VERTICAL_CATEGORIES=["discussion-forum"],
+    )
+    def test_valid_progress_blocks(self):
+        """
+        Tests only children of verticals without detached categories are valid for progress
+        """
+        valid_blocks = get_valid_progress_blocks(self.course.id)
+        self.assertIn(unicode(self.problem.location), valid_blocks)
+        self.assertIn(unicode(self.problem5.location), valid_blocks)
+        self.assertNotIn(unicode(self.problem6.location), valid_blocks)
+        self.assertNotIn(unicode(self.vertical.location), valid_blocks)
+
+    def test_published_blocks_valid_before_updated(self):
+        """
+        Tests the blocks of a newly published version of a course are valid for progress
+        before the task enqueued on publish caches them, and afterwards
+        """
+        get_valid_progress_blocks(self.course.id)
+        problem = ItemFactory.create(
+            parent_location=self.vertical.location,
+            category='problem',
+            data=StringResponseXMLFactory().build_xml(answer='bar'),
+            display_name="new problem",
+        )
+        with patch(
+            'openedx.core.djangoapps.youngsphere.progress.signals.task_update_valid_progress_blocks.apply_async'
+        ) as mock_apply_async:
+            handle_course_published_signal(sender=None, course_key=self.course.id)
+            # the set of the previous version is not used for the new one
+            self.assertIsNone(get_cached_valid_progress_blocks(self.course.id))
+            CourseModuleCompletion.objects.create(
+                user=self.user, course_id=unicode(self.course.id), content_id=unicode(problem.location)
+            )
+        progress = StudentProgress.objects.get(user=self.user, course_id=self.course.id)
+        self.assertEqual(progress.completions, 1)
+        # the lookup doesn't schedule a task again
+        self.assertEqual(mock_apply_async.call_count, 1)
+
+        task_update_valid_progress_blocks(**mock_apply_async.call_args[1]['kwargs'])
+        self.assertIn(unicode(problem.location), get_cached_valid_progress_blocks(self.course.id))
+
+    def test_valid_progress_blocks_miss(self):
+        """
+        Tests a lookup missing the blocks valid for progress checks the module in the
+        modulestore and has the blocks built by a task, without building them itself
+        """
+        with patch(
+            'openedx.core.djangoapps.youngsphere.progress.signals.task_update_valid_progress_blocks.apply_async'
+        ) as mock_apply_async, patch.object(BlockStructureManager, 'get_collected') as mock_get_collected:
+            self.assertTrue(is_valid_progress_module(unicode(self.problem.location)))
+            self.assertTrue(is_valid_progress_module(unicode(self.problem5.location)))
+        self.assertFalse(mock_get_collected.called)
+        mock_apply_async.assert_called_once_with(kwargs={'course_id': unicode(self.course.id)}, countdown=0)
+
+        task_update_valid_progress_blocks(course_id=unicode(self.course.id))
+        self.assertIn(unicode(self.problem.location), get_cached_valid_progress_blocks(self.course.id))
+
+    def test_apply_completion_events(self):
+        """
+        Tests the batched pipeline records new completions and progress in bulk
+        """
+        course_id = unicode(self.course.id)
+        events = [
+            (self.user.id, course_id, unicode(self.problem.location)),
+            (self.user.id, course_id, unicode(self.problem2.location)),
+            (self.user.id, course_id, unicode(self.problem2.location)),
+        ]
+        self.assertEqual(apply_completion_events(events), 2)
+        # already recorded completions are not counted twice
+        self.assertEqual(apply_completion_events(events), 0)
+
+        self.assertEqual(CourseModuleCompletion.objects.filter(user=self.user).count(), 2)
+        progress = StudentProgress.objects.get(user=self.user, course_id=self.course.id)
+        self.assertEqual(progress.completions, 2)
+        self.assertEqual(StudentProgressHistory.objects.filter(user=self.user).count(), 1)
+
+    def test_apply_completion_events_inserted_concurrently(self):
+        """
+        Tests completions inserted by another worker in the meantime are not counted again
+        """
+        course_id = unicode(self.course.id)
+        events = [
+            (self.user.id, course_id, unicode(self.problem.location)),
+            (self.user.id, course_id, unicode(self.problem2.location)),
+        ]
+        CourseModuleCompletion.objects.bulk_create([
+            CourseModuleCompletion(user=self.user, course_id=course_id, content_id=unicode(self.problem.location))
+        ])
+        self.assertEqual(_insert_completions(events), events[1:])
+        self.assertEqual(_insert_completions(events), [])
+        self.assertEqual(CourseModuleCompletion.objects.filter(user=self.user).count(), 2)
+
+    @override_settings(PROGRESS_COMPLETION_PIPELINE='batched')
+    def test_completion_events_batched_per_request(self):
+        """
+        Tests the completions of a request are applied by a single task once the request is done
+        """
+        middleware = CompletionEventsMiddleware()
+        request = RequestFactory().get('/')
+        # the test transaction is never committed, so the commit callbacks are run right away
+        with patch('django.db.transaction.on_commit', side_effect=lambda func: func()), patch(
+            'openedx.core.djangoapps.youngsphere.progress.signals.task_apply_completion_events.delay'
+        ) as mock_delay:
+            middleware.process_request(request)
+            for problem in (self.problem, self.problem2):
+                BlockCompletion.objects.submit_completion(
+                    user=self.user, course_key=self.course.id, block_key=problem.location, completion=1.0
+                )
+            self.assertFalse(mock_delay.called)
+            middleware.process_response(request, HttpResponse())
+
+        mock_delay.assert_called_once_with([
+            (self.user.id, unicode(self.course.id), unicode(self.problem.location)),
+            (self.user.id, unicode(self.course.id), unicode(self.problem2.location)),
+        ])
+        self.assertEqual(apply_completion_events(*mock_delay.call_args[0]), 2)
+        progress = StudentProgress.objects.get(user=self.user, course_id=self.course.id)
+        self.assertEqual(progress.completions, 2)
+
     @ddt.data(ModuleStoreEnum.Type.split, ModuleStoreEnum.Type.mongo)
     def test_receiver_on_course_deleted(self, store):
         self._create_course(
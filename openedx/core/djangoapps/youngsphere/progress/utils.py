@@ -1,42 +1,122 @@
 """
 Utility methods for course metadata app
 """
+import logging
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+
 from django.conf import settings
-from django.db.models import Q
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 
+from openedx.core.djangoapps.content.block_structure.api import get_block_structure_manager
 from xmodule.modulestore.django import modulestore
-from .models import StudentProgress, CourseModuleCompletion
+from .models import StudentProgress, StudentProgressHistory, CourseModuleCompletion, CourseProgressBucket
 from student.models import CourseEnrollment
 
+log = logging.getLogger(__name__)
+
+VALID_PROGRESS_BLOCKS_CACHE_KEY = u'progress.valid_blocks.{course_key}.{version}'
+VALID_PROGRESS_BLOCKS_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# Number of users whose progress entries are written together when recalculating
+RECALCULATION_CHUNK_SIZE = 1000
+
 
-def remove_orphans_and_recalculate_progress(course_key, detached_categories):
+def remove_orphans_and_recalculate_progress(course_key):
     from contentstore.views.item import _delete_orphans
     from xmodule.modulestore import ModuleStoreEnum
-    from .signals import is_valid_progress_module
 
     _delete_orphans(
         course_key, ModuleStoreEnum.UserID.mgmt_command, True
     )
+    recalculate_course_progress(course_key, get_valid_progress_blocks(course_key))
+    CourseProgressBucket.rebuild(course_key)
+
+
+def recalculate_course_progress(course_key, valid_blocks, user_ids=None, user_id_range=None,
+                                chunk_size=RECALCULATION_CHUNK_SIZE):
+    """
+    Recalculates the existing progress entries of the users enrolled in a course.
 
+    The completions of the whole course (optionally restricted to `user_ids` and to the
+    `[start, end)` `user_id_range`) are streamed in a single cursor ordered by user and
+    checked against `valid_blocks`, and the changed progress entries are written back
+    in chunks of `chunk_size` users with one UPDATE per distinct completions value.
+    Users without a progress entry are skipped.
+
+    Returns data = {"processed": 120, "updated": 12, "skipped": 108, "rows": 3480}
+    """
     users = CourseEnrollment.objects.users_enrolled_in(course_key)
+    completions = CourseModuleCompletion.objects.filter(course_id=unicode(course_key))
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+        completions = completions.filter(user_id__in=user_ids)
+    if user_id_range is not None:
+        users = users.filter(id__gte=user_id_range[0], id__lt=user_id_range[1])
+        completions = completions.filter(user_id__gte=user_id_range[0], user_id__lt=user_id_range[1])
 
-    detached_categories_list = [Q(content_id__contains=item.strip()) for item in detached_categories]
-    detached_categories_list = reduce(lambda a, b: a | b, detached_categories_list)
+    existing = dict(
+        StudentProgress.objects.filter(course_id=course_key, user__in=users).values_list('user_id', 'completions')
+    )
+    status_summary = {'processed': users.count(), 'updated': 0, 'skipped': 0, 'rows': 0}
 
-    for user in users:
-        completions = CourseModuleCompletion.objects.filter(course_id=course_key, user_id=user.id)\
-            .exclude(detached_categories_list).values_list('content_id', flat=True).distinct()
+    pending = {}
+    rows = completions.order_by('user_id').values_list('user_id', 'content_id').iterator()
+    for user_id, user_rows in groupby(rows, key=itemgetter(0)):
+        content_ids = set()
+        for __, content_id in user_rows:
+            status_summary['rows'] += 1
+            if content_id in valid_blocks:
+                content_ids.add(content_id)
+        previous_completions = existing.pop(user_id, None)
+        if previous_completions is not None and previous_completions != len(content_ids):
+            pending[user_id] = len(content_ids)
+            if len(pending) >= chunk_size:
+                _write_progress_chunk(course_key, pending)
+                status_summary['updated'] += len(pending)
+                pending = {}
 
-        num_completions = sum([is_valid_progress_module(content_id=content_id) for content_id in completions])
-        try:
-            progress_record = StudentProgress.objects.get(user=user, course_id=course_key)
+    # entries of users left without any completion
+    for user_id, previous_completions in existing.items():
+        if previous_completions != 0:
+            pending[user_id] = 0
+    for user_id_chunk in _chunks(pending.keys(), chunk_size):
+        _write_progress_chunk(course_key, {user_id: pending[user_id] for user_id in user_id_chunk})
+    status_summary['updated'] += len(pending)
 
-            if progress_record.completions != num_completions:
-                progress_record.completions = num_completions
-                progress_record.save()
+    status_summary['skipped'] = status_summary['processed'] - status_summary['updated']
+    return status_summary
 
-        except StudentProgress.DoesNotExist:
-            pass
+
+def _write_progress_chunk(course_key, completions_by_user):
+    """
+    Stores the `user_id: completions` values of a chunk of users with one UPDATE per
+    distinct value, and records them in the progress history.
+    """
+    users_by_completions = defaultdict(list)
+    for user_id, completions in completions_by_user.items():
+        users_by_completions[completions].append(user_id)
+
+    now = timezone.now()
+    with transaction.atomic():
+        for completions, user_ids in users_by_completions.items():
+            StudentProgress.objects.filter(course_id=course_key, user_id__in=user_ids)\
+                .update(completions=completions, modified=now)
+        StudentProgressHistory.objects.bulk_create([
+            StudentProgressHistory(user_id=user_id, course_id=course_key, completions=completions)
+            for user_id, completions in completions_by_user.items()
+        ])
+
+
+def _chunks(items, chunk_size):
+    """
+    Yields successive lists of at most `chunk_size` items.
+    """
+    items = list(items)
+    for index in xrange(0, len(items), chunk_size):
+        yield items[index:index + chunk_size]
 
 
 def get_course_leaf_nodes(course_key):
@@ -48,7 +128,7 @@ def get_course_leaf_nodes(course_key):
     store = modulestore()
     orphans = store.get_orphans(course_key)
     if orphans:
-        remove_orphans_and_recalculate_progress(course_key, detached_categories)
+        remove_orphans_and_recalculate_progress(course_key)
     verticals = store.get_items(course_key, qualifiers={'category': 'vertical'})
     for vertical in verticals:
         if hasattr(vertical, 'children') and not is_progress_detached_vertical(vertical) and \
@@ -70,4 +150,83 @@ def is_progress_detached_vertical(vertical):
     for unit in vertical.children:
         if getattr(unit, 'category') in detached_vertical_categories:
             return True
-    return False
\ No newline at end of file
+    return False
+
+
+def get_valid_progress_blocks(course_key):
+    """
+    Returns the set of block keys (as unicode) which count towards progress in the
+    published version of a course, from the cache, or built and cached when missing.
+
+    Builds the set from the block structure brought up to date with the modulestore,
+    which can collect the whole course, so it's only meant for tasks and commands;
+    requests use `get_cached_valid_progress_blocks`.
+    """
+    valid_blocks = get_cached_valid_progress_blocks(course_key)
+    if valid_blocks is None:
+        valid_blocks = update_valid_progress_blocks(course_key)
+    return valid_blocks
+
+
+def get_cached_valid_progress_blocks(course_key):
+    """
+    Returns the cached set of block keys which count towards progress in the
+    published version of a course, or None if it's not cached yet.
+
+    The sets are cached by course version, so the set of a version published since
+    is a miss rather than a stale hit.
+    """
+    version = get_course_version(course_key)
+    if version is None:
+        return None
+    return cache.get(VALID_PROGRESS_BLOCKS_CACHE_KEY.format(course_key=course_key, version=version))
+
+
+def update_valid_progress_blocks(course_key):
+    """
+    Rebuilds the set of block keys which count towards progress in a course, from its
+    block structure brought up to date with the modulestore, and caches it for the
+    published version of the course
+    """
+    version = get_course_version(course_key)
+    manager = get_block_structure_manager(course_key)
+    manager.update_collected_if_needed()
+    valid_blocks = collect_valid_progress_blocks(manager.get_collected())
+    if version is not None:
+        cache.set(
+            VALID_PROGRESS_BLOCKS_CACHE_KEY.format(course_key=course_key, version=version),
+            valid_blocks,
+            VALID_PROGRESS_BLOCKS_CACHE_TIMEOUT,
+        )
+    return valid_blocks
+
+
+def get_course_version(course_key):
+    """
+    Returns the version of the published content of a course, as the block structures
+    tell them apart: its course_version, or the time its content was last edited in
+    modulestores without versions.  None if the course doesn't exist or has neither.
+    """
+    course = modulestore().get_course(course_key, depth=0)
+    version = course and (getattr(course, 'course_version', None) or getattr(course, 'subtree_edited_on', None))
+    return unicode(version) if version else None
+
+
+def collect_valid_progress_blocks(block_structure):
+    """
+    Returns the keys of the blocks in the given block structure which are valid for marking progress:
+    children of a vertical which is not progress detached, excluding PROGRESS_DETACHED_CATEGORIES
+    """
+    detached_categories = getattr(settings, 'PROGRESS_DETACHED_CATEGORIES', [])
+    detached_vertical_categories = getattr(settings, 'PROGRESS_DETACHED_VERTICAL_CATEGORIES', [])
+    valid_blocks = set()
+    for block_key in block_structure:
+        if block_key.block_type != 'vertical':
+            continue
+        children = block_structure.get_children(block_key)
+        if any(child.block_type in detached_vertical_categories for child in children):
+            continue
+        valid_blocks.update(
+            unicode(child) for child in children if child.block_type not in detached_categories
+        )
+    return frozenset(valid_blocks)
@@ -1,6 +1,6 @@
 from django.apps import AppConfig
 
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete, post_save
 
 
 class SitesConfig(AppConfig):
@@ -10,4 +10,5 @@ class SitesConfig(AppConfig):
     def ready(self):
         from .models import patched_clear_site_cache
 
-        pre_save.connect(patched_clear_site_cache, sender='site_configuration.SiteConfiguration')
+        post_save.connect(patched_clear_site_cache, sender='site_configuration.SiteConfiguration')
+        post_delete.connect(patched_clear_site_cache, sender='site_configuration.SiteConfiguration')
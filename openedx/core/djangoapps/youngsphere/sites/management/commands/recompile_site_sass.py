@@ -1,12 +1,60 @@
+from multiprocessing import Pool
+from optparse import make_option
+
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connections
 
 from openedx.core.djangoapps.site_configuration.models import SiteConfiguration
+from openedx.core.djangoapps.youngsphere.sites.tasks import task_compile_site_sass
+
+
+def _compile_site_sass(site_configuration_id):
+    """
+    Compiles the SASS of a site in a worker process
+    """
+    SiteConfiguration.objects.get(id=site_configuration_id).compile_microsite_sass()
 
 
 class Command(BaseCommand):
     help = "Recompiles SASS for all microsites"
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "-p",
+            "--parallel",
+            dest="parallel",
+            type="int",
+            default=1,
+            help="Number of processes compiling the sites at the same time",
+            metavar="4"
+        ),
+        make_option(
+            "--queue",
+            dest="queue",
+            action="store_true",
+            default=False,
+            help="Queue the compilation of every site to the celery workers instead",
+        ),
+    )
 
     def handle(self, *args, **options):
-        for site in SiteConfiguration.objects.exclude(site__id=settings.SITE_ID):
-            site.compile_microsite_sass()
+        parallel = options.get('parallel') or 1
+        site_configuration_ids = list(
+            SiteConfiguration.objects.exclude(site__id=settings.SITE_ID).values_list('id', flat=True)
+        )
+
+        if options.get('queue'):
+            for site_configuration_id in site_configuration_ids:
+                task_compile_site_sass.delay(site_configuration_id)
+        elif parallel > 1 and len(site_configuration_ids) > 1:
+            # child processes must not share the parent's database connections
+            connections.close_all()
+            pool = Pool(processes=min(parallel, len(site_configuration_ids)))
+            try:
+                pool.map(_compile_site_sass, site_configuration_ids)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for site_configuration_id in site_configuration_ids:
+                _compile_site_sass(site_configuration_id)
@@ -1,30 +1,150 @@
+from collections import defaultdict
+
 from django.conf import settings
-from django.core.cache import cache, caches
 from django.contrib.redirects.models import Redirect
 from django.shortcuts import redirect
 
-from .models import AlternativeDomain
+from .models import AlternativeDomain, cache, get_domain_routing_version
 
 import logging
 log = logging.getLogger(__name__)
 
 
+class PrefixTrie(object):
+    """
+    Character trie matching the paths which start with any of its prefixes.
+    """
+    END = ''
+
+    def __init__(self, prefixes=()):
+        self.root = {}
+        for prefix in prefixes:
+            node = self.root
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[self.END] = True
+
+    def matches(self, path):
+        node = self.root
+        for char in path:
+            if self.END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return self.END in node
+
+
+# Rows per cache entry of a routing table version, keeping each entry well below memcached's 1MB item limit
+DOMAIN_ROUTING_SHARD_SIZE = 1000
+
+
+def _get_routing_rows(version):
+    """
+    Returns the AlternativeDomain and Redirect rows of a routing table version.
+
+    The rows are shared between processes through the cache in shards of DOMAIN_ROUTING_SHARD_SIZE
+    rows, so that no cache entry grows with the number of domains. They are read from the database
+    when any shard is missing.
+    """
+    cache_key = '{prefix}-table-{version}'.format(prefix=settings.REDIRECT_CACHE_KEY_PREFIX, version=version)
+    kinds = ('domains', 'redirects')
+
+    def shard_keys(kind, count):
+        return ['{key}-{kind}-{index}'.format(key=cache_key, kind=kind, index=index) for index in range(count)]
+
+    shard_counts = cache.get(cache_key)
+    if shard_counts is not None:
+        keys = [shard_keys(kind, count) for kind, count in zip(kinds, shard_counts)]
+        shards = cache.get_many(keys[0] + keys[1])
+        if len(shards) == sum(shard_counts):
+            return tuple([row for key in kind_keys for row in shards[key]] for kind_keys in keys)
+
+    rows = (
+        list(AlternativeDomain.objects.values_list('domain', 'site__domain')),
+        list(Redirect.objects.values_list('site_id', 'old_path', 'new_path')),
+    )
+    shards = {}
+    shard_counts = []
+    for kind, kind_rows in zip(kinds, rows):
+        starts = range(0, len(kind_rows), DOMAIN_ROUTING_SHARD_SIZE)
+        for key, start in zip(shard_keys(kind, len(starts)), starts):
+            shards[key] = kind_rows[start:start + DOMAIN_ROUTING_SHARD_SIZE]
+        shard_counts.append(len(starts))
+    cache.set_many(shards, settings.REDIRECT_CACHE_TIMEOUT)
+    cache.set(cache_key, tuple(shard_counts), settings.REDIRECT_CACHE_TIMEOUT)
+    return rows
+
+
+class DomainRoutingTable(object):
+    """
+    Routing data of both redirect middlewares, compiled from the AlternativeDomain and Redirect
+    entries and the MAIN_SITE_REDIRECT_WHITELIST setting.
+    """
+
+    def __init__(self, version, custom_domains, redirects, main_site_whitelist):
+        self.version = version
+        # alternative domain: domain of its site
+        self.custom_domains = custom_domains
+        # site id: {old path: new path}
+        self.redirects = redirects
+        self.main_site_whitelist = main_site_whitelist
+
+    @classmethod
+    def compile(cls, version):
+        custom_domains, redirect_rows = _get_routing_rows(version)
+        redirects = defaultdict(dict)
+        for site_id, old_path, new_path in redirect_rows:
+            redirects[site_id][old_path] = new_path
+
+        whitelist = getattr(settings, 'MAIN_SITE_REDIRECT_WHITELIST', None)
+        return cls(
+            version,
+            dict(custom_domains),
+            dict(redirects),
+            PrefixTrie(whitelist) if whitelist is not None else None,
+        )
+
+    def get_custom_domain(self, hostname):
+        return self.custom_domains.get(hostname)
+
+    def get_redirect(self, site_id, path):
+        return self.redirects.get(site_id, {}).get(path)
+
+    def redirects_main_site(self, path):
+        """
+        The main site is only redirected when there is a whitelist, and the path is not in it.
+        """
+        return self.main_site_whitelist is not None and not self.main_site_whitelist.matches(path)
+
+
+_routing_table = DomainRoutingTable(None, {}, {}, None)
+
+
+def get_domain_routing_table(request):
+    """
+    Returns the routing table of the current version, checking the version once per request.
+
+    The table is compiled once per version by each process, from the rows the first process to
+    see the version shares with the others through the cache.
+    """
+    global _routing_table  # pylint: disable=global-statement
+
+    table = getattr(request, '_domain_routing_table', None)
+    if table is None:
+        version = get_domain_routing_version()
+        if _routing_table.version != version:
+            _routing_table = DomainRoutingTable.compile(version)
+        table = request._domain_routing_table = _routing_table  # pylint: disable=protected-access
+    return table
+
+
 class CustomDomainsRedirectMiddleware(object):
 
     def process_request(self, request):
-        cache_general = caches['general']
         hostname = request.get_host()
         if hostname.endswith(settings.SITE_NAME):
-            cache_key = '{prefix}-{site}'.format(prefix=settings.CUSTOM_DOMAINS_REDIRECT_CACHE_KEY_PREFIX, site=hostname)
-            custom_domain = cache_general.get(cache_key)
-            if custom_domain is None:
-                try:
-                    alternative_domain = AlternativeDomain.objects.select_related('site').get(domain=hostname)
-                    custom_domain = alternative_domain.site.domain
-                except AlternativeDomain.DoesNotExist:
-                    custom_domain = ""
-                cache_general.set(cache_key, custom_domain, settings.CUSTOM_DOMAINS_REDIRECT_CACHE_TIMEOUT)
-
+            custom_domain = get_domain_routing_table(request).get_custom_domain(hostname)
             if custom_domain:
                 return redirect("https://" + custom_domain)
 
@@ -42,21 +162,10 @@ class RedirectMiddleware(object):
         with the current request URL as the old_path field.
         """
         site = request.site
-        try:
-            in_whitelist = any(map(
-                lambda p: p in request.path,
-                settings.MAIN_SITE_REDIRECT_WHITELIST))
-            if (site.id == settings.SITE_ID) and not in_whitelist:
-                return redirect("https://youngsphere.com/admin/")
-        except Exception:
-            # I'm not entirely sure this middleware get's called only in LMS or in other apps as well.
-            # Soooo just in case
-            pass
-        cache_key = '{prefix}-{site}'.format(prefix=settings.REDIRECT_CACHE_KEY_PREFIX, site=site.domain)
-        redirects = cache.get(cache_key)
-        if redirects is None:
-            redirects = {redirect.old_path: redirect.new_path for redirect in Redirect.objects.filter(site=site)}
-            cache.set(cache_key, redirects, settings.REDIRECT_CACHE_TIMEOUT)
-        redirect_to = redirects.get(request.path)
+        table = get_domain_routing_table(request)
+        if site.id == settings.SITE_ID and table.redirects_main_site(request.path):
+            return redirect("https://youngsphere.com/admin/")
+
+        redirect_to = table.get_redirect(site.id, request.path)
         if redirect_to:
             return redirect(redirect_to, permanent=True)
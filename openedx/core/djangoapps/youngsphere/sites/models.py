@@ -1,4 +1,8 @@
 """ Django Sites framework models overrides """
+import threading
+import time
+from collections import OrderedDict
+
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import caches
@@ -6,6 +10,7 @@ from django.db import models
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.http.request import split_domain_port
+from django.contrib.redirects.models import Redirect
 from django.contrib.sites.models import Site, SiteManager, SITE_CACHE
 from django.core.exceptions import ImproperlyConfigured
 from jsonfield import JSONField
@@ -14,6 +19,63 @@ import django
 
 cache = caches['general']
 
+# Sites resolved by each process are kept for this many seconds, up to this many hosts and ids
+SITE_LOCAL_CACHE_TIMEOUT = 60
+SITE_LOCAL_CACHE_SIZE = 1000
+# Seconds between checks of the shared generation counter, which invalidates the sites cached by every process.
+# A site or site configuration saved by one process may still be served stale by the other processes for up to
+# this long.
+SITE_CACHE_GENERATION_CHECK_INTERVAL = 5
+SITE_CACHE_GENERATION_KEY = 'site:generation'
+# Marks unknown hosts in both caches, which are kept for this many seconds in the shared cache
+SITE_NOT_FOUND = 'site:not-found'
+SITE_NOT_FOUND_TIMEOUT = 60
+# Version of the routing table of AlternativeDomain and Redirect entries, see middleware.py
+DOMAIN_ROUTING_VERSION_KEY = 'site:domain-routing:version'
+
+
+class LocalSiteCache(object):
+    """
+    Bounded, per-process LRU cache of resolved sites whose entries expire after a timeout.
+    """
+
+    def __init__(self, size=SITE_LOCAL_CACHE_SIZE, timeout=SITE_LOCAL_CACHE_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.generation = None
+        self.generation_checked_at = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value of the key, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                return None
+            # re-insert the entry as the most recently used
+            self._entries[key] = entry
+            return entry[1]
+
+    def set(self, key, value):
+        """
+        Caches the value of the key, evicting the least recently used entry when full.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.size:
+                self._entries.popitem(last=False)
+            self._entries[key] = (time.time() + self.timeout, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_site_cache = LocalSiteCache()
+
 
 def _cache_key_for_site_id(site_id):
     return 'site:id:%s' % (site_id,)
@@ -23,60 +85,94 @@ def _cache_key_for_site_host(site_host):
     return 'site:host:%s' % (site_host,)
 
 
-def patched_get_site_by_id(self, site_id):
-    key = _cache_key_for_site_id(site_id)
-    site = cache.get(key)
+def _get_site_cache_generation():
+    """
+    Returns the current generation of the site caches, reading it from the shared cache at most once per
+    check interval. The sites cached by this process are dropped when another process bumped it.
+    """
+    now = time.time()
+    if now - local_site_cache.generation_checked_at >= SITE_CACHE_GENERATION_CHECK_INTERVAL:
+        generation = cache.get(SITE_CACHE_GENERATION_KEY)
+        if generation is None:
+            # starting from the current time, rather than 0, avoids reusing the keys of
+            # older generations if the counter is evicted
+            cache.add(SITE_CACHE_GENERATION_KEY, int(now), None)
+            generation = cache.get(SITE_CACHE_GENERATION_KEY) or int(now)
+        if generation != local_site_cache.generation:
+            local_site_cache.clear()
+            local_site_cache.generation = generation
+        local_site_cache.generation_checked_at = now
+    return local_site_cache.generation
+
+
+def bump_site_cache_generation():
+    """
+    Invalidates the sites cached by every process, and those in the shared cache.
+    """
+    try:
+        cache.incr(SITE_CACHE_GENERATION_KEY)
+    except ValueError:
+        cache.set(SITE_CACHE_GENERATION_KEY, int(time.time()), None)
+    local_site_cache.clear()
+    local_site_cache.generation_checked_at = 0
+
+
+def _get_cached_site(key, lookup):
+    """
+    Returns the site of the key from the per-process cache, then from the shared cache and
+    finally from `lookup`, caching it in both, along with unknown sites.
+    """
+    generation = _get_site_cache_generation()
+    site = local_site_cache.get(key)
     if site is None:
-        site = self.get(pk=site_id)
-        SITE_CACHE[site_id] = site
-    cache.add(key, site)
+        shared_key = '%s:%s' % (generation, key)
+        site = cache.get(shared_key)
+        if site is None:
+            try:
+                site = lookup()
+                cache.set(shared_key, site)
+            except Site.DoesNotExist:
+                site = SITE_NOT_FOUND
+                cache.set(shared_key, site, SITE_NOT_FOUND_TIMEOUT)
+        local_site_cache.set(key, site)
+
+    if site == SITE_NOT_FOUND:
+        raise Site.DoesNotExist('Site matching query does not exist.')
     return site
 
 
+def patched_get_site_by_id(self, site_id):
+    return _get_cached_site(_cache_key_for_site_id(site_id), lambda: self.get(pk=site_id))
+
+
 def patched_get_site_by_request(self, request):
 
     host = request.get_host()
-    key = _cache_key_for_site_host(host)
-    site = cache.get(key)
-    if site is None:
+
+    def get_site_by_host():
         try:
             # First attempt to look up the site by host with or without port.
-            site = self.get(domain__iexact=host)
+            return self.get(domain__iexact=host)
         except Site.DoesNotExist:
             # Fallback to looking up site after stripping port from the host.
             domain, port = split_domain_port(host)
             if not port:
                 raise
-            site = self.get(domain__iexact=domain)
-        SITE_CACHE[host] = site
-    cache.add(key, site)
-    return site
+            return self.get(domain__iexact=domain)
+
+    return _get_cached_site(_cache_key_for_site_host(host), get_site_by_host)
 
 
 def patched_clear_cache(self):
-    keys_id = [_cache_key_for_site_id(site_id) for site_id in SITE_CACHE]
-    keys_host = [_cache_key_for_site_host(site_host) for site_host in SITE_CACHE]
-    cache.delete_many(keys_id + keys_host)
+    bump_site_cache_generation()
     SITE_CACHE.clear()
 
 
 def patched_clear_site_cache(sender, **kwargs):
     """
-    Clears the cache (if primed) each time a site is saved or deleted
+    Clears the caches of every process each time a site or a site configuration is saved or deleted
     """
-    instance = kwargs['instance']
-    site = instance.site
-    key_id = _cache_key_for_site_id(site.pk)
-    key_host = _cache_key_for_site_host(site.domain)
-    cache.delete_many([key_id, key_host])
-    try:
-        del SITE_CACHE[site.pk]
-    except KeyError:
-        pass
-    try:
-        del SITE_CACHE[site.domain]
-    except KeyError:
-        pass
+    bump_site_cache_generation()
 
 
 class AlternativeDomain(models.Model):
@@ -193,20 +289,37 @@ class Device(models.Model):
 
 
 
+def get_domain_routing_version():
+    """
+    Returns the current version of the domain routing table compiled by the redirect middlewares.
+    """
+    version = cache.get(DOMAIN_ROUTING_VERSION_KEY)
+    if version is None:
+        # see _get_site_cache_generation for why it starts from the current time
+        cache.add(DOMAIN_ROUTING_VERSION_KEY, int(time.time()), None)
+        version = cache.get(DOMAIN_ROUTING_VERSION_KEY) or int(time.time())
+    return version
+
+
 @receiver(post_save, sender=AlternativeDomain)
-def delete_alternative_domain_cache(sender, instance, **kwargs):
-    if instance.site.domain.endswith(settings.SITE_NAME):
-        cache_key_site = instance.site.domain
-    else:
-        cache_key_site = instance.domain
-
-    cache_key = '{prefix}-{site}'.format(
-        prefix=settings.CUSTOM_DOMAINS_REDIRECT_CACHE_KEY_PREFIX,
-        site=cache_key_site
-    )
-    cache.delete(cache_key)
+@receiver(post_delete, sender=AlternativeDomain)
+@receiver(post_save, sender=Redirect)
+@receiver(post_delete, sender=Redirect)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def bump_domain_routing_version(sender=None, **kwargs):  # pylint: disable=unused-argument
+    """
+    Makes every process recompile its domain routing table.
+    """
+    try:
+        cache.incr(DOMAIN_ROUTING_VERSION_KEY)
+    except ValueError:
+        cache.set(DOMAIN_ROUTING_VERSION_KEY, int(time.time()), None)
+
 
 django.contrib.sites.models.clear_site_cache = patched_clear_site_cache
+post_save.connect(patched_clear_site_cache, sender=Site)
+post_delete.connect(patched_clear_site_cache, sender=Site)
 SiteManager.clear_cache = patched_clear_cache
 SiteManager._get_site_by_id = patched_get_site_by_id  # pylint: disable=protected-access
 SiteManager._get_site_by_request = patched_get_site_by_request  # pylint: disable=protected-access
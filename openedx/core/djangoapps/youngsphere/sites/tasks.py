@@ -17,6 +17,20 @@ LOGGER = get_task_logger(__name__)
 FULL_COURSE_REINDEX_THRESHOLD = 1
 
 
+@task(name=u'openedx.core.djangoapps.youngsphere.sites.tasks.task_compile_site_sass')
+def task_compile_site_sass(site_configuration_id):
+    """
+    Compiles the SASS of a site in the background.
+    """
+    from openedx.core.djangoapps.site_configuration.models import SiteConfiguration
+
+    try:
+        site_configuration = SiteConfiguration.objects.get(id=site_configuration_id)
+    except SiteConfiguration.DoesNotExist:
+        LOGGER.info(u'Site configuration %s was deleted before its SASS was compiled', site_configuration_id)
+        return
+    site_configuration.compile_microsite_sass()
+
 
 def clone_course(source_course_key_string, destination_course_key_string, user_id, fields=None):
     """
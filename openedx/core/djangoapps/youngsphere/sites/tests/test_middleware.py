@@ -0,0 +1,82 @@
+from unittest import TestCase
+
+from django.contrib.redirects.models import Redirect
+from django.test import RequestFactory, override_settings
+from mock import patch
+
+from openedx.core.djangoapps.site_configuration.tests.factories import SiteFactory
+from openedx.core.djangolib.testing.utils import CacheIsolationTestCase
+
+from .. import middleware
+from ..middleware import CustomDomainsRedirectMiddleware, DomainRoutingTable, PrefixTrie, RedirectMiddleware
+from ..models import AlternativeDomain, cache, get_domain_routing_version
+
+
+class PrefixTrieTestCase(TestCase):
+
+    def test_matches(self):
+        trie = PrefixTrie(['/admin', '/api/v1/'])
+        self.assertTrue(trie.matches('/admin'))
+        self.assertTrue(trie.matches('/admin/users'))
+        self.assertTrue(trie.matches('/api/v1/sites'))
+        self.assertFalse(trie.matches('/api/v2/sites'))
+        self.assertFalse(trie.matches('/adm'))
+        self.assertFalse(PrefixTrie().matches('/admin'))
+
+
+@override_settings(SITE_NAME='tahoe.dev')
+class DomainRoutingTestCase(CacheIsolationTestCase):
+    """
+    Verify both redirect middlewares route from the compiled table, which is refreshed on save.
+    """
+    ENABLED_CACHES = ['general']
+
+    def setUp(self):
+        super(DomainRoutingTestCase, self).setUp()
+        self.site = SiteFactory.create(domain='foo.dev', name='foo.dev')
+        self.factory = RequestFactory()
+
+    def _get_request(self, host, path='/'):
+        request = self.factory.get(path, HTTP_HOST=host)
+        request.site = self.site
+        return request
+
+    def test_custom_domain_redirect(self):
+        AlternativeDomain.objects.create(site=self.site, domain='foo.tahoe.dev')
+        response = CustomDomainsRedirectMiddleware().process_request(self._get_request('foo.tahoe.dev'))
+        self.assertEqual(response.url, 'https://foo.dev')
+        self.assertIsNone(CustomDomainsRedirectMiddleware().process_request(self._get_request('bar.tahoe.dev')))
+
+    def test_redirect_refreshed_on_save(self):
+        self.assertIsNone(RedirectMiddleware().process_request(self._get_request('foo.dev', '/old/')))
+
+        Redirect.objects.create(site=self.site, old_path='/old/', new_path='/new/')
+        request = self._get_request('foo.dev', '/old/')
+        with self.assertNumQueries(2):
+            response = RedirectMiddleware().process_request(request)
+        self.assertEqual(response.url, '/new/')
+
+        # the table is compiled once per version
+        with self.assertNumQueries(0):
+            RedirectMiddleware().process_request(self._get_request('foo.dev', '/old/'))
+
+    @patch.object(middleware, 'DOMAIN_ROUTING_SHARD_SIZE', 1)
+    def test_table_shared_in_shards(self):
+        AlternativeDomain.objects.create(site=self.site, domain='foo.tahoe.dev')
+        Redirect.objects.create(site=self.site, old_path='/old/', new_path='/new/')
+        Redirect.objects.create(site=self.site, old_path='/older/', new_path='/newer/')
+        RedirectMiddleware().process_request(self._get_request('foo.dev', '/old/'))
+
+        table_key = 'redirects-table-{}'.format(get_domain_routing_version())
+        self.assertEqual(cache.get(table_key), (1, 2))
+        self.assertEqual(cache.get(table_key + '-redirects-1'), [(self.site.id, '/older/', '/newer/')])
+
+        # another process compiles the table from the shards
+        with patch.object(middleware, '_routing_table', DomainRoutingTable(None, {}, {}, None)):
+            with self.assertNumQueries(0):
+                response = RedirectMiddleware().process_request(self._get_request('foo.dev', '/older/'))
+                custom_domain_response = CustomDomainsRedirectMiddleware().process_request(
+                    self._get_request('foo.tahoe.dev')
+                )
+        self.assertEqual(response.url, '/newer/')
+        self.assertEqual(custom_domain_response.url, 'https://foo.dev')
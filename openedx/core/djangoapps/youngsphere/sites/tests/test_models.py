@@ -0,0 +1,52 @@
+"""
+Tests for the site caches of the sites app models
+"""
+from django.contrib.sites.models import Site
+from django.test import RequestFactory
+
+from openedx.core.djangoapps.site_configuration.tests.factories import SiteFactory
+from openedx.core.djangolib.testing.utils import CacheIsolationTestCase
+
+from ..models import bump_site_cache_generation
+
+
+class SiteCacheTestCase(CacheIsolationTestCase):
+    """
+    Verify sites are resolved from the per-process and shared caches, and invalidated on save.
+    """
+    ENABLED_CACHES = ['general']
+
+    def setUp(self):
+        super(SiteCacheTestCase, self).setUp()
+        bump_site_cache_generation()
+        self.site = SiteFactory.create(domain='foo.dev', name='foo.dev')
+
+    def _get_site(self, host):
+        request = RequestFactory(HTTP_HOST=host).get('/')
+        return Site.objects._get_site_by_request(request)  # pylint: disable=protected-access
+
+    def test_site_by_request_is_cached(self):
+        self.assertEqual(self._get_site('foo.dev'), self.site)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get_site('foo.dev'), self.site)
+
+    def test_site_by_id_is_cached(self):
+        self.assertEqual(Site.objects._get_site_by_id(self.site.id), self.site)  # pylint: disable=protected-access
+        with self.assertNumQueries(0):
+            self.assertEqual(Site.objects._get_site_by_id(self.site.id), self.site)  # pylint: disable=protected-access
+
+    def test_unknown_host_is_cached(self):
+        with self.assertRaises(Site.DoesNotExist):
+            self._get_site('unknown.dev')
+        with self.assertNumQueries(0):
+            with self.assertRaises(Site.DoesNotExist):
+                self._get_site('unknown.dev')
+
+    def test_site_save_invalidates_cache(self):
+        self.assertEqual(self._get_site('foo.dev'), self.site)
+        self.site.domain = 'bar.dev'
+        self.site.save()
+
+        with self.assertRaises(Site.DoesNotExist):
+            self._get_site('foo.dev')
+        self.assertEqual(self._get_site('bar.dev').domain, 'bar.dev')
@@ -0,0 +1,137 @@
+"""
+Tests for the compilation of the SASS of the sites
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.management import call_command
+from django.test import TestCase
+from mock import Mock, patch
+
+from openedx.core.djangoapps.site_configuration.models import SiteConfiguration
+from openedx.core.djangoapps.site_configuration.tests.factories import SiteConfigurationFactory
+from openedx.core.djangolib.testing.utils import CacheIsolationTestCase
+
+from .. import utils
+from ..tasks import task_compile_site_sass
+
+
+@patch.object(utils, 'get_theme_fingerprint', Mock(return_value='fingerprint'))
+@patch.object(utils, '_get_default_theme', Mock())
+class CompileSassTestCase(CacheIsolationTestCase):
+    """
+    Verify the compiled CSS is cached by the theme, SASS file and branding it is compiled from.
+    """
+    ENABLED_CACHES = ['general']
+
+    @patch.object(utils, '_compile_theme_sass', return_value=u'body { color: red; }')
+    def test_compiled_once(self, mock_compile):
+        self.assertEqual(utils.compile_sass('main.scss', u'$brand: red;'), u'body { color: red; }')
+        self.assertEqual(utils.compile_sass('main.scss', u'$brand: red;'), u'body { color: red; }')
+        self.assertEqual(mock_compile.call_count, 1)
+
+        utils.compile_sass('main.scss', u'$brand: blue;')
+        utils.compile_sass('_brand.scss', u'$brand: red;')
+        self.assertEqual(mock_compile.call_count, 3)
+
+    @patch.object(utils, 'COMPILED_SASS_MAX_CACHED_SIZE', 10)
+    @patch.object(utils, '_compile_theme_sass', return_value=u'body { color: red; }')
+    def test_large_output_not_cached(self, mock_compile):
+        utils.compile_sass('main.scss')
+        utils.compile_sass('main.scss')
+        self.assertEqual(mock_compile.call_count, 2)
+
+
+class ThemeFingerprintTestCase(TestCase):
+    """
+    Verify the fingerprint of a theme follows the contents of its SASS files.
+    """
+
+    def setUp(self):
+        super(ThemeFingerprintTestCase, self).setUp()
+        self.themes_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.themes_dir)
+        patcher = patch.dict(utils._theme_fingerprints, clear=True)  # pylint: disable=protected-access
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_theme(self, name, files):
+        theme = Mock(
+            path=os.path.join(self.themes_dir, name),
+            customer_specific_path=os.path.join(self.themes_dir, name, 'customer_specific'),
+        )
+        for path, contents in files.items():
+            path = os.path.join(theme.path, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(contents)
+        return theme
+
+    def test_fingerprint(self):
+        files = {
+            'static/sass/main.scss': '@import "base/branding-basics";',
+            'customer_specific/static/sass/base/_branding-basics.scss': '$brand: red;',
+        }
+        theme = self._create_theme('theme', files)
+        fingerprint = utils.get_theme_fingerprint(theme)
+
+        other_theme = self._create_theme('other-theme', dict(files, **{
+            'customer_specific/static/sass/base/_branding-basics.scss': '$brand: blue;',
+        }))
+        self.assertNotEqual(utils.get_theme_fingerprint(other_theme), fingerprint)
+
+        # files other than SASS are left out
+        self._create_theme('theme', {'static/sass/README.txt': 'Not SASS'})
+        del utils._theme_fingerprints[theme.path]  # pylint: disable=protected-access
+        self.assertEqual(utils.get_theme_fingerprint(theme), fingerprint)
+
+    def test_fingerprint_computed_once(self):
+        theme = self._create_theme('theme', {'static/sass/main.scss': '$brand: red;'})
+        fingerprint = utils.get_theme_fingerprint(theme)
+
+        self._create_theme('theme', {'static/sass/main.scss': '$brand: blue;'})
+        self.assertEqual(utils.get_theme_fingerprint(theme), fingerprint)
+
+
+@patch.object(SiteConfiguration, 'compile_microsite_sass', autospec=True)
+class CompileSiteSassTestCase(TestCase):
+    """
+    Verify the task and the management command compiling the SASS of the sites.
+    """
+
+    def setUp(self):
+        super(CompileSiteSassTestCase, self).setUp()
+        self.site_configurations = [SiteConfigurationFactory.create() for __ in range(2)]
+        main_site, __ = Site.objects.get_or_create(
+            id=settings.SITE_ID, defaults={'domain': 'example.com', 'name': 'example.com'}
+        )
+        SiteConfigurationFactory.create(site=main_site)
+
+    def test_task(self, mock_compile):
+        task_compile_site_sass(self.site_configurations[0].id)
+        mock_compile.assert_called_once_with(self.site_configurations[0])
+
+    def test_task_deleted_site(self, mock_compile):
+        task_compile_site_sass(SiteConfiguration.objects.order_by('-id')[0].id + 1)
+        self.assertFalse(mock_compile.called)
+
+    def test_command(self, mock_compile):
+        call_command('recompile_site_sass')
+        self.assertItemsEqual(
+            [call[0][0] for call in mock_compile.call_args_list],
+            self.site_configurations,
+        )
+
+    @patch('openedx.core.djangoapps.youngsphere.sites.management.commands.recompile_site_sass.'
+           'task_compile_site_sass.delay')
+    def test_command_queue(self, mock_task, mock_compile):
+        call_command('recompile_site_sass', queue=True)
+        self.assertItemsEqual(
+            [call[0][0] for call in mock_task.call_args_list],
+            [site_configuration.id for site_configuration in self.site_configurations],
+        )
+        self.assertFalse(mock_compile.called)
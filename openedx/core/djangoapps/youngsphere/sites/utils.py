@@ -1,3 +1,4 @@
+import hashlib
 import json
 from itertools import izip
 
@@ -7,11 +8,23 @@ import sass
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
+from django.core.cache import caches
 from django.contrib.staticfiles.templatetags.staticfiles import static
 from organizations.api import add_organization
 from organizations.models import UserOrganizationMapping, Organization
 
-from openedx.core.djangoapps.theming.models import SiteTheme
+
+sass_cache = caches['general']
+
+# Compiled CSS is addressed by a hash of its inputs, so it never needs to be invalidated
+COMPILED_SASS_CACHE_KEY = u'sites.compiled_sass.{digest}'
+INITIAL_SASS_VARIABLES_CACHE_KEY = u'sites.initial_sass_variables.{fingerprint}'
+COMPILED_SASS_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+# Larger outputs are not cached, as memcached rejects items over 1MB
+COMPILED_SASS_MAX_CACHED_SIZE = 1000 * 1000
+
+# theme path: fingerprint of its SASS files
+_theme_fingerprints = {}
 
 
 def get_lms_link_from_course_key(base_lms_url, course_key):
@@ -32,22 +45,21 @@ def get_initial_sass_variables():
     """
     This method loads the SASS variables file from the currently active theme. It is used as a default value
     for the sass_variables field on new Microsite objects.
+
+    The result only depends on the theme files, so it is cached by their fingerprint.
     """
-    values = get_branding_values_from_file()
-    labels = get_branding_labels_from_file()
-    return [(val[0], (val[1], lab[1])) for val, lab in izip(values, labels)]
+    cache_key = INITIAL_SASS_VARIABLES_CACHE_KEY.format(fingerprint=get_theme_fingerprint(_get_default_theme()))
+    sass_variables = sass_cache.get(cache_key)
+    if sass_variables is None:
+        values = get_branding_values_from_file()
+        labels = get_branding_labels_from_file()
+        sass_variables = [(val[0], (val[1], lab[1])) for val, lab in izip(values, labels)]
+        sass_cache.set(cache_key, sass_variables, COMPILED_SASS_CACHE_TIMEOUT)
+    return sass_variables
 
 
 def get_branding_values_from_file():
-    from openedx.core.djangoapps.theming.helpers import get_theme_base_dir, Theme
-    site_theme = SiteTheme(site=Site.objects.get(id=settings.SITE_ID), theme_dir_name=settings.DEFAULT_SITE_THEME)
-    print("site_theme:", site_theme)
-    print("dir:",site_theme.theme_dir_name)
-    theme = Theme(
-        name=site_theme.theme_dir_name,
-        theme_dir_name=site_theme.theme_dir_name,
-        themes_base_dir=get_theme_base_dir(site_theme.theme_dir_name)
-    )
+    theme = _get_default_theme()
     if theme:
         sass_var_file = os.path.join(theme.customer_specific_path, 'static',
                                      'sass', 'base', '_branding-basics.scss')
@@ -74,18 +86,37 @@ def get_branding_labels_from_file(custom_branding=None):
 
 
 def compile_sass(sass_file, custom_branding=None):
-    from openedx.core.djangoapps.theming.helpers import get_theme_base_dir, Theme
-    site_theme = SiteTheme(site=Site.objects.get(id=settings.SITE_ID), theme_dir_name=settings.DEFAULT_SITE_THEME)
-    theme = Theme(
-        name=site_theme.theme_dir_name,
-        theme_dir_name=site_theme.theme_dir_name,
-        themes_base_dir=get_theme_base_dir(site_theme.theme_dir_name)
+    """
+    Compiles a SASS file of the default theme, with `custom_branding` as the contents of its
+    `_branding-basics.scss` when given.
+
+    The output is cached by a hash of the theme files, the SASS file and the branding variables,
+    so a theme and branding are only compiled once, unless the output is too large for the cache.
+    """
+    theme = _get_default_theme()
+    cache_key = COMPILED_SASS_CACHE_KEY.format(
+        digest=hashlib.sha1(
+            u'\n'.join([get_theme_fingerprint(theme), sass_file, custom_branding or u'']).encode('utf-8')
+        ).hexdigest()
     )
+    css_output = sass_cache.get(cache_key)
+    if css_output is None:
+        css_output = _compile_theme_sass(theme, sass_file, custom_branding)
+        if len(css_output.encode('utf-8')) <= COMPILED_SASS_MAX_CACHED_SIZE:
+            sass_cache.set(cache_key, css_output, COMPILED_SASS_CACHE_TIMEOUT)
+    return css_output
+
+
+def _compile_theme_sass(theme, sass_file, custom_branding=None):
     sass_var_file = os.path.join(theme.path, 'static', 'sass', sass_file)
     customer_specific_includes = os.path.join(theme.customer_specific_path, 'static', 'sass')
     importers = None
     if custom_branding:
-        importers = [(0, custom_branding)]
+        def override_branding(path):
+            if 'branding-basics' in path:
+                return [(path, custom_branding)]
+            return None
+        importers = [(0, override_branding)]
     css_output = sass.compile(
         filename=sass_var_file,
         include_paths=[customer_specific_includes],
@@ -94,6 +125,39 @@ def compile_sass(sass_file, custom_branding=None):
     return css_output
 
 
+def _get_default_theme():
+    from openedx.core.djangoapps.theming.helpers import get_theme_base_dir, Theme
+    return Theme(
+        name=settings.DEFAULT_SITE_THEME,
+        theme_dir_name=settings.DEFAULT_SITE_THEME,
+        themes_base_dir=get_theme_base_dir(settings.DEFAULT_SITE_THEME)
+    )
+
+
+def get_theme_fingerprint(theme):
+    """
+    Returns a hash of the SASS files of the theme, computed once per process as they only change on deploys.
+    """
+    fingerprint = _theme_fingerprints.get(theme.path)
+    if fingerprint is None:
+        digest = hashlib.sha1()
+        sass_dirs = [
+            os.path.join(theme.path, 'static', 'sass'),
+            os.path.join(theme.customer_specific_path, 'static', 'sass'),
+        ]
+        for sass_dir in sass_dirs:
+            for root, dirs, files in os.walk(sass_dir):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith('.scss'):
+                        path = os.path.join(root, name)
+                        digest.update(path)
+                        with open(path, 'rb') as f:
+                            digest.update(f.read())
+        fingerprint = _theme_fingerprints[theme.path] = digest.hexdigest()
+    return fingerprint
+
+
 def sass_to_dict(sass_input):
     sass_vars = []
     lines = (line for line in sass_input.splitlines() if line and not line.startswith('//'))
@@ -3,17 +3,24 @@ Business logic tier regarding social engagement scores
 """
 
 import sys
+import time
 from datetime import datetime
+from itertools import islice
 
 import lms.lib.comment_client as cc
 import logging
+import numpy
 import pytz
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from discussion_api.exceptions import CommentNotFoundError, ThreadNotFoundError
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.http import HttpRequest
+from django.utils import translation
 # from edx_notifications.data import NotificationMessage
 # from edx_notifications.lib.publisher import (
 #     publish_notification_to_user,
@@ -34,10 +41,25 @@ from .models import StudentSocialEngagementScore
 
 log = logging.getLogger(__name__)
 
+# Number of users whose social engagement scores are computed and saved together
+SOCIAL_ENGAGEMENT_BATCH_SIZE = 500
 
-def update_course_engagement(course_id, compute_if_closed_course=False, course_descriptor=None):
+THREAD_INDEX_CACHE_KEY = u'social_engagement.thread_index.{thread_id}'
+THREAD_INDEX_INVALID_CACHE_KEY = u'social_engagement.thread_index.{thread_id}.invalid'
+THREAD_INDEX_LOCK_CACHE_KEY = u'social_engagement.thread_index.{thread_id}.lock'
+THREAD_INDEX_TIMEOUT = 60 * 60 * 24 * 30
+THREAD_INDEX_LOCK_TIMEOUT = 10
+# Number of Forum API pages fetched at the same time when a thread is not indexed
+DELETION_FETCH_WORKERS = 8
+
+
+def update_course_engagement(course_id, compute_if_closed_course=False, course_descriptor=None,
+                             batch_size=SOCIAL_ENGAGEMENT_BATCH_SIZE):
     """
     Compute and save engagement scores and stats for whole course.
+
+    The stats of the course's users are streamed from the Forum API and scored and
+    saved in batches of `batch_size` users.
     """
 
     if not settings.FEATURES.get('ENABLE_SOCIAL_ENGAGEMENT', False):
@@ -63,25 +85,47 @@ def update_course_engagement(course_id, compute_if_closed_course=False, course_d
             return
 
     score_update_count = 0
+    start_time = time.time()
 
     try:
-        for user_id, social_stats in _get_course_social_stats(slash_course_id):
-            log.info('Updating social engagement score for user_id {}  in course_key {}'.format(user_id, course_key))
+        for batch in _get_batches(_get_course_social_stats(slash_course_id), batch_size):
+            user_ids = [user_id for user_id, __ in batch]
+            social_stats = [stats for __, stats in batch]
+            scores = _compute_social_engagement_scores(social_stats)
 
-            current_score = _compute_social_engagement_score(social_stats)
-
-            StudentSocialEngagementScore.save_user_engagement_score(
-                course_key, user_id, current_score, social_stats
+            StudentSocialEngagementScore.save_user_engagement_scores(
+                course_key, zip(user_ids, scores, social_stats)
             )
 
-            score_update_count += 1
+            score_update_count += len(batch)
+            log.debug('Updated social engagement scores of %d users in course_key %s', len(batch), course_key)
 
     except (CommentClientRequestError, ConnectionError), error:
         log.exception(error)
 
+    elapsed = time.time() - start_time
+    log.info(
+        'Social engagement scores updated for %d users in course_key %s in %.2fs (%.0f users/s)',
+        score_update_count,
+        course_key,
+        elapsed,
+        score_update_count / elapsed if elapsed else 0,
+    )
     return score_update_count
 
 
+def _get_batches(iterable, batch_size):
+    """
+    Yield successive lists of at most `batch_size` items of the iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
 def _get_course_social_stats(course_id):
     """"
     Yield user and user's stats for whole course from Forum API.
@@ -109,17 +153,19 @@ def get_social_metric_points():
     )
 
 
-def _compute_social_engagement_score(social_metrics):
+def _compute_social_engagement_scores(social_metrics_list):
     """
-    For a list of social_stats, compute the social score
+    For a list of social_stats of several users, compute their social scores at once
     """
     social_metric_points = get_social_metric_points()
+    metrics = social_metric_points.keys()
+    points = numpy.array([social_metric_points[metric] for metric in metrics], dtype=numpy.int64)
+    values = numpy.array(
+        [[social_metrics.get(metric, 0) for metric in metrics] for social_metrics in social_metrics_list],
+        dtype=numpy.int64,
+    ).reshape(len(social_metrics_list), len(metrics))
 
-    social_total = 0
-    for key, val in social_metric_points.iteritems():
-        social_total += social_metrics.get(key, 0) * val
-
-    return social_total
+    return [int(score) for score in values.dot(points)]
 
 
 #
@@ -208,6 +254,10 @@ def get_involved_users_in_thread(request, thread):
     """
     Compute all the users involved in the children of a specific thread.
     """
+    users = get_indexed_users_in_thread(thread)
+    if users is not None:
+        return users
+
     params = {"thread_id": thread.id, "page_size": 100}
     is_question = getattr(thread, "thread_type", None) == "question"
     author_id = getattr(thread, 'user_id', None)
@@ -242,6 +292,10 @@ def get_involved_users_in_comment(request, comment):
     Method used to extract the involved users in the comment.
     This method also returns the creator of the post.
     """
+    users = get_indexed_users_in_comment(comment)
+    if users is not None:
+        return users
+
     params = {"page_size": 100}
     comment_author_id = getattr(comment, 'user_id', None)
     thread_author_id = None
@@ -353,38 +407,62 @@ def _get_details_for_deletion(request, comment_id=None, results=None, nested=Fal
         results = _detail_results_factory()
 
     for page, response in enumerate(_get_paginated_results(request, comment_id, is_thread)):
-            if page == 0:
-                results['all_comments'] += response.data['pagination']['count']
+        if page == 0:
+            results['all_comments'] += response.data['pagination']['count']
 
-            if results['replies'] == 0:
-                results['replies'] = response.data['pagination']['count']
+        if results['replies'] == 0:
+            results['replies'] = response.data['pagination']['count']
 
-            for comment in response.data['results']:
-                _extract_stats_from_comment(request, comment, results, nested)
+        for comment in response.data['results']:
+            _extract_stats_from_comment(request, comment, results, nested)
 
     return results
 
 
 def _get_paginated_results(request, comment_id, is_thread):
     """
-    Yield paginated comments of comment or thread.
+    Return the paginated comments of comment or thread.
+
+    The first page tells the number of pages, and the remaining pages are then fetched
+    concurrently, by up to DELETION_FETCH_WORKERS threads.
     """
-    from lms.djangoapps.discussion_api.views import CommentViewSet
+    first_page = _get_page(_get_request(request, {"page": 1}), comment_id, is_thread)
+    if first_page is None:
+        return []
 
-    response_page = 1
-    has_next = True
-    while has_next:
+    num_pages = first_page.data["pagination"].get("num_pages", 1)
+    # The requests are built in this thread, which has the context of the incoming request
+    page_requests = [_get_request(request, {"page": page}) for page in xrange(2, num_pages + 1)]
+    if not page_requests:
+        return [first_page]
+
+    language = translation.get_language()
+
+    def get_page(page_request):
         try:
-            if is_thread:
-                response = CommentViewSet().list(_get_request(request, {"page": response_page}))
-            else:
-                response = CommentViewSet().retrieve(_get_request(request, {"page": response_page}), comment_id)
-        except (ThreadNotFoundError, CommentNotFoundError, InvalidKeyError):
-            raise StopIteration
+            with translation.override(language):
+                return _get_page(page_request, comment_id, is_thread)
+        finally:
+            # every thread opens its own database connection
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=min(DELETION_FETCH_WORKERS, len(page_requests))) as executor:
+        pages = list(executor.map(get_page, page_requests))
+    return [first_page] + [page for page in pages if page is not None]
 
-        has_next = response.data["pagination"]["next"]
-        response_page += 1
-        yield response
+
+def _get_page(page_request, comment_id, is_thread):
+    """
+    Return a page of comments of comment or thread, or None if it does not exist.
+    """
+    from lms.djangoapps.discussion_api.views import CommentViewSet
+
+    try:
+        if is_thread:
+            return CommentViewSet().list(page_request)
+        return CommentViewSet().retrieve(page_request, comment_id)
+    except (ThreadNotFoundError, CommentNotFoundError, InvalidKeyError):
+        return None
 
 
 def _extract_stats_from_comment(request, comment, results, nested):
@@ -403,3 +481,178 @@ def _extract_stats_from_comment(request, comment, results, nested):
 
     if comment['child_count'] > 0:
         _get_details_for_deletion(request, comment['id'], results, nested=True)
+
+
+#
+# Index of the participants of threads, maintained from the forum signals so that the
+# stats to remove when deleting a thread or a comment do not have to be fetched from the
+# Forum API. The index of a thread is only trusted when it was created along with the
+# thread; flags of nested comments are not signaled, so they are not part of it.
+#
+def index_thread_created(thread_id, author_id):
+    """
+    Start the participant index of a new thread.
+    """
+    cache.set(
+        THREAD_INDEX_CACHE_KEY.format(thread_id=thread_id),
+        {'author_id': int(author_id), 'followers': 0, 'comments': {}},
+        THREAD_INDEX_TIMEOUT
+    )
+
+
+def index_comment_created(thread_id, comment_id, user_id, parent_id=None):
+    """
+    Add a new comment or reply to the participant index of its thread.
+    """
+    def add_comment(index):
+        index['comments'][comment_id] = (int(user_id), parent_id, 0)
+    _update_thread_index(thread_id, add_comment)
+
+
+def index_comment_voted(comment):
+    """
+    Record the current vote count of a comment in the participant index of its thread.
+    """
+    comment_id = comment.id
+
+    def set_votes(index):
+        if comment_id in index['comments']:
+            user_id, parent_id, __ = index['comments'][comment_id]
+            index['comments'][comment_id] = (user_id, parent_id, comment.votes.get('count', 0))
+    _update_thread_index(comment.thread_id, set_votes)
+
+
+def index_thread_followed(thread_id, followed=True):
+    """
+    Count a follower of the thread, other than its author, in its participant index.
+    """
+    def change_followers(index):
+        index['followers'] += 1 if followed else -1
+    _update_thread_index(thread_id, change_followers)
+
+
+def index_comment_deleted(thread_id, comment_id):
+    """
+    Remove a comment and its replies from the participant index of its thread.
+    """
+    def remove_comment(index):
+        for removed_id in [comment_id] + _get_indexed_replies(index, comment_id):
+            index['comments'].pop(removed_id, None)
+    _update_thread_index(thread_id, remove_comment)
+
+
+def index_thread_deleted(thread_id):
+    """
+    Drop the participant index of a deleted thread.
+    """
+    cache.delete_many([
+        THREAD_INDEX_CACHE_KEY.format(thread_id=thread_id),
+        THREAD_INDEX_INVALID_CACHE_KEY.format(thread_id=thread_id),
+    ])
+
+
+def get_indexed_users_in_thread(thread):
+    """
+    Same as `get_involved_users_in_thread`, from the participant index of the thread.
+    Returns None if the thread is not indexed.
+    """
+    index = _get_thread_index(thread.id)
+    if index is None:
+        return None
+
+    users = defaultdict(lambda: defaultdict(int))
+    for user_id, parent_id, votes in index['comments'].values():
+        users[user_id]['num_replies' if parent_id else 'num_comments'] += 1
+        users[user_id]['num_upvotes'] += votes
+
+    author_id = index['author_id']
+    users[author_id]['num_upvotes'] += thread.votes.get('count', 0)
+    users[author_id]['num_threads'] += 1
+    users[author_id]['num_comments_generated'] += len(index['comments'])
+    users[author_id]['num_thread_followers'] += index['followers']
+    if thread.abuse_flaggers:
+        users[author_id]['num_flagged'] += 1
+
+    return users
+
+
+def get_indexed_users_in_comment(comment):
+    """
+    Same as `get_involved_users_in_comment`, from the participant index of the comment's thread.
+    Returns None if the comment is not indexed.
+    """
+    index = _get_thread_index(getattr(comment, 'thread_id', None))
+    if index is None or comment.id not in index['comments']:
+        return None
+
+    users = defaultdict(lambda: defaultdict(int))
+    replies = _get_indexed_replies(index, comment.id)
+    for reply_id in replies:
+        user_id, __, votes = index['comments'][reply_id]
+        users[user_id]['num_replies'] += 1
+        users[user_id]['num_upvotes'] += votes
+
+    comment_author_id, parent_id, __ = index['comments'][comment.id]
+    users[comment_author_id]['num_upvotes'] += comment.votes.get('count', 0)
+    users[comment_author_id]['num_replies' if parent_id else 'num_comments'] += 1
+    if comment.abuse_flaggers:
+        users[comment_author_id]['num_flagged'] += 1
+
+    users[index['author_id']]['num_comments_generated'] += len(replies) + 1
+
+    return users
+
+
+def _get_thread_index(thread_id):
+    """
+    Return the participant index of a thread, or None if it is missing or was invalidated.
+    """
+    if not thread_id:
+        return None
+    index_key = THREAD_INDEX_CACHE_KEY.format(thread_id=thread_id)
+    invalid_key = THREAD_INDEX_INVALID_CACHE_KEY.format(thread_id=thread_id)
+    cached = cache.get_many([index_key, invalid_key])
+    if invalid_key in cached:
+        return None
+    return cached.get(index_key)
+
+
+def _update_thread_index(thread_id, update):
+    """
+    Apply `update` to the participant index of a thread, if it is indexed.
+
+    A concurrent update would be lost, so the thread is left to the Forum API then.
+    """
+    if not thread_id:
+        return
+    index_key = THREAD_INDEX_CACHE_KEY.format(thread_id=thread_id)
+    lock_key = THREAD_INDEX_LOCK_CACHE_KEY.format(thread_id=thread_id)
+    if not cache.add(lock_key, True, THREAD_INDEX_LOCK_TIMEOUT):
+        cache.set(THREAD_INDEX_INVALID_CACHE_KEY.format(thread_id=thread_id), True, THREAD_INDEX_TIMEOUT)
+        return
+
+    try:
+        index = cache.get(index_key)
+        if index is not None:
+            update(index)
+            cache.set(index_key, index, THREAD_INDEX_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+
+
+def _get_indexed_replies(index, comment_id):
+    """
+    Return the ids of all the replies nested in a comment of a thread index.
+    """
+    children = defaultdict(list)
+    for reply_id, (__, parent_id, __) in index['comments'].items():
+        if parent_id:
+            children[parent_id].append(reply_id)
+
+    replies = []
+    pending = [comment_id]
+    while pending:
+        nested_replies = children[pending.pop()]
+        replies.extend(nested_replies)
+        pending.extend(nested_replies)
+    return replies
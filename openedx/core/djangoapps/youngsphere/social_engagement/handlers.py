@@ -13,13 +13,28 @@ from django_comment_common.signals import (
     thread_voted,
     thread_followed,
     thread_unfollowed,
+    comment_voted,
     #thread_or_comment_flagged,
 )
 import lms.lib.comment_client as cc
-from .tasks import task_update_user_engagement
+from .engagement import (
+    get_indexed_users_in_comment,
+    get_indexed_users_in_thread,
+    index_comment_created,
+    index_comment_deleted,
+    index_comment_voted,
+    index_thread_created,
+    index_thread_deleted,
+    index_thread_followed,
+)
+from .tasks import task_update_user_engagement, queue_user_engagement_change
 
 log = logging.getLogger(__name__)
 
+# Values of the SOCIAL_ENGAGEMENT_SCORE_UPDATES setting
+SCORE_UPDATES_SYNC = 'sync'
+SCORE_UPDATES_COALESCED = 'coalesced'
+
 
 @receiver(thread_deleted)
 @receiver(thread_voted)
@@ -32,16 +47,21 @@ def thread_signal_handler(sender, **kwargs):  # pylint: disable=unused-argument
     course_id = getattr(thread, 'course_id', None)
     user_id = getattr(thread, 'user_id', None)
 
-    # present if thread_deleted
-    if 'involved_users' in kwargs:
-        users = kwargs['involved_users']
-        for user, user_data in users.items():
+    # present if thread_deleted, otherwise look it up in the participant index
+    if 'involved_users' in kwargs or kwargs.get('signal') is thread_deleted:
+        users = kwargs.get('involved_users')
+        if users is None and _decrement_on_deletion():
+            users = get_indexed_users_in_thread(thread)
+        index_thread_deleted(thread.id)
+        for user, user_data in (users or {}).items():
             _decrement(user, course_id, user_data)
 
     # thread or comment voted
     else:
         change = _decrement if kwargs.get('undo') else _increment
         change(user_id, course_id, 'num_upvotes')
+        if getattr(thread, 'type', None) == 'comment':
+            index_comment_voted(thread)
 
 
 @receiver(thread_created)
@@ -57,6 +77,7 @@ def thread_created_signal_handler(sender, **kwargs):  # pylint: disable=unused-a
     if action_user:
         print("action_user found")
         _increment(action_user.id, course_id, 'num_threads')
+        index_thread_created(thread.id, action_user.id)
 
 
 @receiver(comment_deleted)
@@ -67,10 +88,20 @@ def comment_deleted_signal_handler(sender, **kwargs):  # pylint: disable=unused-
     post = kwargs['post']
     course_id = getattr(post, 'course_id', None)
 
-    if 'involved_users' in kwargs:
-        users = kwargs['involved_users']
-        for user, user_data in users.items():
-            _decrement(user, course_id, user_data)
+    users = kwargs.get('involved_users')
+    if users is None and _decrement_on_deletion():
+        users = get_indexed_users_in_comment(post)
+    index_comment_deleted(getattr(post, 'thread_id', None), post.id)
+    for user, user_data in (users or {}).items():
+        _decrement(user, course_id, user_data)
+
+
+@receiver(comment_voted)
+def comment_voted_signal_handler(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Updates the votes of the comment in the participant index of its thread.
+    """
+    index_comment_voted(kwargs['post'])
 
 
 @receiver(comment_created)
@@ -97,6 +128,7 @@ def comment_created_signal_handler(sender, **kwargs):  # pylint: disable=unused-
             _increment(action_user.id, course_id, 'num_replies')
 
         if thread_id:
+            index_comment_created(thread_id, comment.id, action_user.id, parent_id)
             thread = cc.Thread.find(thread_id)
 
             # IMPORTANT: we have to use getattr here as
@@ -142,6 +174,7 @@ def _thread_followed_or_unfollowed_handler(**kwargs):
                 _increment(user_id, course_id, 'num_thread_followers')
             else:
                 _decrement(user_id, course_id, 'num_thread_followers')
+            index_thread_followed(thread.id, kwargs.get('followed', False))
     except AttributeError as error:
         log.exception(error)
 
@@ -156,6 +189,14 @@ def _thread_followed_or_unfollowed_handler(**kwargs):
 #     change(user_id, course_id, 'num_flagged')
 
 
+def _decrement_on_deletion():
+    """
+    Whether the deletions whose involved users aren't sent along decrement the scores of
+    the users found in the participant index of the thread.
+    """
+    return getattr(settings, 'SOCIAL_ENGAGEMENT_DECREMENT_ON_DELETION', False)
+
+
 def _increment(*args, **kwargs):
     """
     A facade for handling incrementation.
@@ -179,4 +220,7 @@ def _handle_change_after_signal(user_id, course_id, param, increment=True, items
     """
     print("handling the change", user_id, course_id)
     if settings.FEATURES.get('ENABLE_SOCIAL_ENGAGEMENT') and user_id and course_id:
-        task_update_user_engagement(user_id, course_id, param, increment, items)
+        if getattr(settings, 'SOCIAL_ENGAGEMENT_SCORE_UPDATES', SCORE_UPDATES_SYNC) == SCORE_UPDATES_COALESCED:
+            queue_user_engagement_change(user_id, course_id, param, increment, items)
+        else:
+            task_update_user_engagement(user_id, course_id, param, increment, items)
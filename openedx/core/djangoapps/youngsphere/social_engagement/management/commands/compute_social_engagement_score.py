@@ -2,22 +2,34 @@
 Command to compute social engagement score of users in a single course or all open courses
 ./manage.py lms compute_social_engagement_score -c {course_id} --settings=aws
 ./manage.py lms compute_social_engagement_score -a true --settings=aws
+./manage.py lms compute_social_engagement_score -a true -p 4 --settings=aws
 """
 import logging
 import datetime
+from multiprocessing import Pool
 from pytz import UTC
 from optparse import make_option
 
 from django.core.management import BaseCommand
+from django.db import connections
 from django.db.models import Q
 
 from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
 from util.prompt import query_yes_no
-from social_engagement.tasks import task_compute_social_scores_in_course
+from social_engagement.engagement import SOCIAL_ENGAGEMENT_BATCH_SIZE
+from social_engagement.tasks import compute_social_scores_in_course, task_compute_social_scores_in_course
 
 log = logging.getLogger(__name__)
 
 
+def _compute_course_scores(args):
+    """
+    Computes the social engagement scores of a course in a worker process
+    """
+    course_id, batch_size = args
+    return compute_social_scores_in_course(course_id, batch_size)
+
+
 class Command(BaseCommand):
     """
     Computes social engagement score of users in a single course or all open courses
@@ -48,6 +60,23 @@ class Command(BaseCommand):
             help="Do not prompt the user for input of any kind",
             metavar="True"
         ),
+        make_option(
+            "-p",
+            "--processes",
+            dest="processes",
+            type="int",
+            default=0,
+            help="Compute the scores in this many local processes instead of queueing celery tasks",
+            metavar="4"
+        ),
+        make_option(
+            "--batch_size",
+            dest="batch_size",
+            type="int",
+            default=SOCIAL_ENGAGEMENT_BATCH_SIZE,
+            help="Number of users whose scores are computed and saved together",
+            metavar="500"
+        ),
     )
 
     def handle(self, *args, **options):
@@ -55,8 +84,11 @@ class Command(BaseCommand):
         compute_for_all_open_courses = options.get('compute_for_all_open_courses')
         interactive = options.get('interactive')
 
+        processes = options.get('processes')
+        batch_size = options.get('batch_size') or SOCIAL_ENGAGEMENT_BATCH_SIZE
+
         if course_id:
-            task_compute_social_scores_in_course.delay(course_id)
+            course_ids = [course_id]
         elif compute_for_all_open_courses:
             # prompt for user confirmation in interactive mode
             execute = query_yes_no(
@@ -64,12 +96,38 @@ class Command(BaseCommand):
                 , default="no"
             ) if interactive else True
 
-            if execute:
-                open_courses = CourseOverview.objects.filter(
-                    Q(end__gte=datetime.datetime.today().replace(tzinfo=UTC)) |
-                    Q(end__isnull=True)
-                )
-                for course in open_courses:
-                    course_id = unicode(course.id)
-                    task_compute_social_scores_in_course.delay(course_id)
-                    log.info("Task queued to compute social engagment score for course %s", course_id)
+            if not execute:
+                return
+            open_courses = CourseOverview.objects.filter(
+                Q(end__gte=datetime.datetime.today().replace(tzinfo=UTC)) |
+                Q(end__isnull=True)
+            )
+            course_ids = [unicode(course.id) for course in open_courses]
+        else:
+            return
+
+        if processes:
+            self._compute_locally(course_ids, processes, batch_size)
+        else:
+            for course_id in course_ids:
+                task_compute_social_scores_in_course.delay(course_id, batch_size)
+                log.info("Task queued to compute social engagment score for course %s", course_id)
+
+    @staticmethod
+    def _compute_locally(course_ids, processes, batch_size):
+        """
+        Computes the scores of the courses in a pool of local processes, one course at a time per process
+        """
+        args = [(course_id, batch_size) for course_id in course_ids]
+        if processes > 1 and len(course_ids) > 1:
+            # child processes must not share the parent's database connections
+            connections.close_all()
+            pool = Pool(processes=min(processes, len(course_ids)))
+            try:
+                results = pool.map(_compute_course_scores, args)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_compute_course_scores(arg) for arg in args]
+        log.info("Social engagement scores computed for %d users in %d courses", sum(results), len(course_ids))
@@ -51,6 +51,25 @@ class TestComputeSocialScoreCommand(SharedModuleStoreTestCase):
         users_count = StudentSocialEngagementScore.objects.filter(course_id=self.course.id).count()
         self.assertEqual(users_count, len(self.users))
 
+    def test_compute_social_engagement_score_locally(self):
+        """
+        Test to ensure scores are computed in batches without celery when processes are given
+        """
+        user_ids = [user.id for user in self.users]
+        with patch('social_engagement.engagement._get_course_social_stats') as mock_func:
+            mock_func.return_value = ((user_id, self.DEFAULT_STATS) for user_id in user_ids)
+            with patch('social_engagement.tasks.task_compute_social_scores_in_course.delay') as mock_delay:
+                call_command(
+                    'compute_social_engagement_score',
+                    course_id=unicode(self.course.id),
+                    processes=1,
+                    batch_size=3,
+                )
+        self.assertFalse(mock_delay.called)
+        scores = StudentSocialEngagementScore.objects.filter(course_id=self.course.id)
+        self.assertEqual(scores.count(), len(self.users))
+        self.assertEqual(len(set(score.score for score in scores)), 1)
+
     def test_compute_social_engagement_score_for_all_courses(self):
         """
         Test to ensure all users enrolled in all open courses have their social scores computed
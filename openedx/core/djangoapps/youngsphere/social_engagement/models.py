@@ -3,9 +3,10 @@ Django database models supporting the social_engagement app
 """
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q, Sum
 from django.dispatch import receiver
+from django.utils import timezone
 from django.db.models.signals import post_save
 
 from model_utils.models import TimeStampedModel
@@ -156,6 +157,43 @@ class StudentSocialEngagementScore(TimeStampedModel):
             defaults=dict(score=score, **stats)
         )
 
+    @classmethod
+    def save_user_engagement_scores(cls, course_key, entries):
+        """
+        Creates or updates the engagement scores of several users at once.
+        :param entries: iterable of `(user_id, score, stats)`
+
+        Only new or changed entries are written, with one insert for the new ones
+        and one for their history, all in a single transaction.
+        """
+        entries = {int(user_id): (score, stats or {}) for user_id, score, stats in entries}
+        known_user_ids = set(User.objects.filter(id__in=entries.keys()).values_list('id', flat=True))
+        existing = {
+            entry.user_id: entry
+            for entry in cls.objects.filter(course_id=course_key, user_id__in=known_user_ids)
+        }
+
+        with transaction.atomic():
+            new_entries = []
+            history = []
+            for user_id, (score, stats) in entries.items():
+                if user_id not in known_user_ids:
+                    continue
+                values = dict(score=score, **stats)
+                entry = existing.get(user_id)
+                if entry is None:
+                    new_entries.append(cls(course_id=course_key, user_id=user_id, **values))
+                elif any(getattr(entry, field) != value for field, value in values.items()):
+                    cls.objects.filter(pk=entry.pk).update(modified=timezone.now(), **values)
+                else:
+                    continue
+                history.append(
+                    StudentSocialEngagementScoreHistory(course_id=course_key, user_id=user_id, score=score)
+                )
+
+            cls.objects.bulk_create(new_entries)
+            StudentSocialEngagementScoreHistory.objects.bulk_create(history)
+
     @classmethod
     def get_user_leaderboard_position(cls, course_key, **kwargs):
         """
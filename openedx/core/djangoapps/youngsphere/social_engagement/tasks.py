@@ -2,43 +2,66 @@
 This module has implementation of celery tasks for discussion forum use cases
 """
 import logging
+import time
 import pytz
+from collections import defaultdict
 from datetime import datetime
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.db.models import F
+from django.utils import timezone
 from celery.task import task
 
-from xmodule.modulestore.django import modulestore
 from opaque_keys.edx.keys import CourseKey
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
 
-from .engagement import update_course_engagement, get_social_metric_points
-from .models import StudentSocialEngagementScore
+from .engagement import update_course_engagement, get_social_metric_points, SOCIAL_ENGAGEMENT_BATCH_SIZE
+from .models import StudentSocialEngagementScore, StudentSocialEngagementScoreHistory
 
 log = logging.getLogger('edx.celery.task')
 
+COURSE_END_CACHE_KEY = u'social_engagement.course_end.{course_key}'
+COURSE_END_CACHE_TIMEOUT = 60 * 5
+
+# Counters start from this offset, as the cache can only decrement them down to 0
+ENGAGEMENT_COUNTER_OFFSET = 1 << 30
+# Number of flush intervals the accumulated changes are kept in the cache
+ENGAGEMENT_CHANGES_TIMEOUT_INTERVALS = 10
+# Delay, in seconds, after the end of a window before its changes are flushed
+ENGAGEMENT_FLUSH_DELAY = 5
+
 
 @task(
     name=u'lms.djangoapps.social_engagement.tasks.task_compute_social_scores_in_course',
     routing_key=settings.RECALCULATE_SOCIAL_ENGAGEMENT_ROUTING_KEY,
 )
-def task_compute_social_scores_in_course(course_id):
+def task_compute_social_scores_in_course(course_id, batch_size=SOCIAL_ENGAGEMENT_BATCH_SIZE):
     """
     Task to compute social scores in course
     """
-    course_key = CourseKey.from_string(course_id)
-    course = modulestore().get_course(course_key, depth=None)
+    return compute_social_scores_in_course(course_id, batch_size)
 
-    if course:
-        score_update_count = update_course_engagement(
-            course_key, compute_if_closed_course=True, course_descriptor=course
-        )
-        log.info("Social scores updated for %d users in course %s", score_update_count or 0, course_id)
 
-    else:
+def compute_social_scores_in_course(course_id, batch_size=SOCIAL_ENGAGEMENT_BATCH_SIZE):
+    """
+    Compute social scores in course, returning the number of users updated.
+    Only the end date of the course is needed, so it is read from the course overview.
+    """
+    course_key = CourseKey.from_string(course_id)
+    try:
+        course = CourseOverview.get_from_id(course_key)
+    except CourseOverview.DoesNotExist:
         log.info("Course with course id %s does not exist", course_id)
+        return 0
 
+    score_update_count = update_course_engagement(
+        course_key, compute_if_closed_course=True, course_descriptor=course, batch_size=batch_size
+    )
+    log.info("Social scores updated for %d users in course %s", score_update_count or 0, course_id)
+    return score_update_count or 0
 
 
 def task_update_user_engagement(user_id, course_id, param, increment=True, items=1):
@@ -53,8 +76,7 @@ def task_update_user_engagement(user_id, course_id, param, increment=True, items
     course_key = CourseKey.from_string(course_id)
 
     # Do not calculate engagement after course ends.
-    course_descriptor = modulestore().get_course(course_key)
-    if course_descriptor and course_descriptor.end and course_descriptor.end < datetime.now(pytz.UTC):
+    if is_course_closed(course_key):
         return
 
     try:
@@ -77,3 +99,201 @@ def task_update_user_engagement(user_id, course_id, param, increment=True, items
             setattr(score, param, F(param) + factor)
 
         score.save()
+
+
+def queue_user_engagement_change(user_id, course_id, param, increment=True, items=1):
+    """
+    Accumulate changes in stats in the cache, to be saved in bulk by `task_flush_engagement_changes`.
+
+    Changes are grouped in windows of SOCIAL_ENGAGEMENT_FLUSH_INTERVAL seconds, and those of a
+    window are coalesced into one counter per user, course and stat.  The first change of a
+    window schedules the task flushing it.
+
+    :param param: `str` with stat that should be changed or
+                  `dict[str, int]` (`stat: number_of_occurrences`) with the stats that should be changed
+    """
+    factor = items if increment else -items
+    course_key = CourseKey.from_string(course_id)
+
+    # Do not calculate engagement after course ends.
+    if is_course_closed(course_key):
+        return
+
+    interval = _get_flush_interval()
+    window = int(time.time()) // interval
+    timeout = interval * ENGAGEMENT_CHANGES_TIMEOUT_INTERVALS
+    stats = param if isinstance(param, dict) else {param: 1}
+    for stat, value in stats.items():
+        change = value * factor
+        if not change:
+            continue
+        counter_key = _engagement_counter_key(window, int(user_id), unicode(course_key), stat)
+        if cache.add(counter_key, ENGAGEMENT_COUNTER_OFFSET, timeout):
+            # register the new counter so the flush can find it
+            cache.add(_engagement_slots_key(window), 0, timeout)
+            slot = cache.incr(_engagement_slots_key(window))
+            cache.set(_engagement_slot_key(window, slot), (int(user_id), unicode(course_key), stat), timeout)
+        if change > 0:
+            cache.incr(counter_key, change)
+        else:
+            cache.decr(counter_key, -change)
+
+    if cache.add(_engagement_flush_key(window), True, timeout):
+        task_flush_engagement_changes.apply_async(
+            args=[window],
+            countdown=(window + 1) * interval - time.time() + ENGAGEMENT_FLUSH_DELAY,
+        )
+
+
+@task(
+    name=u'lms.djangoapps.social_engagement.tasks.task_flush_engagement_changes',
+    routing_key=settings.RECALCULATE_SOCIAL_ENGAGEMENT_ROUTING_KEY,
+)
+def task_flush_engagement_changes(window):
+    """
+    Task to save in bulk the changes in stats accumulated during a window
+    """
+    num_slots = cache.get(_engagement_slots_key(window)) or 0
+    slot_keys = [_engagement_slot_key(window, slot) for slot in xrange(1, num_slots + 1)]
+    counters = {
+        _engagement_counter_key(window, *counter): counter
+        for counter in cache.get_many(slot_keys).values()
+    }
+
+    changes = defaultdict(dict)
+    for counter_key, value in cache.get_many(counters.keys()).items():
+        user_id, course_id, stat = counters[counter_key]
+        if value != ENGAGEMENT_COUNTER_OFFSET:
+            changes[(user_id, course_id)][stat] = value - ENGAGEMENT_COUNTER_OFFSET
+
+    try:
+        save_engagement_changes(changes)
+    except Exception:
+        # The counters are kept, so the window is flushed again later rather than lost.
+        log.exception("Couldn't save the social engagement changes of window %d, retrying", window)
+        task_flush_engagement_changes.apply_async(args=[window], countdown=_get_flush_interval())
+        raise
+    # Only deleted once the changes are committed
+    cache.delete_many(slot_keys + counters.keys() + [_engagement_slots_key(window)])
+    log.info("Social engagement changes saved for %d users from %d counters", len(changes), len(counters))
+
+
+@transaction.atomic
+def save_engagement_changes(changes):
+    """
+    Save in bulk `(user_id, course_id): {stat: change}` changes in stats and the resulting scores:
+    a single update per existing score entry, one insert for the new ones and one for the history.
+
+    The changes are saved in a single transaction.  The score entries created by another writer
+    since they were looked up are updated instead.
+    """
+    social_metric_points = get_social_metric_points()
+    existing_user_ids = set(
+        User.objects.filter(id__in=set(user_id for user_id, __ in changes)).values_list('id', flat=True)
+    )
+    changes_by_course = defaultdict(dict)
+    for (user_id, course_id), stats in changes.items():
+        if user_id in existing_user_ids:
+            changes_by_course[course_id][user_id] = stats
+        else:
+            log.error("User with id: '{}' does not exist.".format(user_id))
+
+    now = timezone.now()
+    for course_id, user_stats in changes_by_course.items():
+        course_key = CourseKey.from_string(course_id)
+        scored_user_ids = _get_scored_user_ids(course_key, user_stats.keys())
+        new_scores = []
+        for user_id, stats in user_stats.items():
+            score_difference = sum(social_metric_points.get(stat, 0) * change for stat, change in stats.items())
+            if user_id in scored_user_ids:
+                _update_score(course_key, user_id, stats, score_difference, now)
+            else:
+                new_scores.append((user_id, stats, score_difference))
+        _create_scores(course_key, new_scores, now)
+
+        StudentSocialEngagementScoreHistory.objects.bulk_create([
+            StudentSocialEngagementScoreHistory(user_id=user_id, course_id=course_key, score=score)
+            for user_id, score in StudentSocialEngagementScore.objects.filter(
+                course_id=course_key, user_id__in=user_stats.keys()
+            ).values_list('user_id', 'score')
+        ])
+
+
+def _get_scored_user_ids(course_key, user_ids):
+    """
+    Returns the ids of the given users who have a score entry in the course.
+    """
+    return set(
+        StudentSocialEngagementScore.objects.filter(course_id=course_key, user_id__in=user_ids)
+        .values_list('user_id', flat=True)
+    )
+
+
+def _update_score(course_key, user_id, stats, score_difference, now):
+    """
+    Adds the `{stat: change}` changes and the score difference to the score entry of the user.
+    """
+    updates = {stat: F(stat) + change for stat, change in stats.items()}
+    StudentSocialEngagementScore.objects.filter(course_id=course_key, user_id=user_id)\
+        .update(score=F('score') + score_difference, modified=now, **updates)
+
+
+def _create_scores(course_key, new_scores, now):
+    """
+    Inserts the `(user_id, stats, score)` new score entries, and updates the ones another writer
+    inserted in the meantime instead.
+    """
+    def _score(user_id, stats, score):
+        return StudentSocialEngagementScore(user_id=user_id, course_id=course_key, score=score, **stats)
+
+    try:
+        with transaction.atomic():
+            StudentSocialEngagementScore.objects.bulk_create([_score(*new_score) for new_score in new_scores])
+    except IntegrityError:
+        # Some of the entries were inserted by another writer, fall back to one at a time
+        for user_id, stats, score in new_scores:
+            try:
+                with transaction.atomic():
+                    StudentSocialEngagementScore.objects.bulk_create([_score(user_id, stats, score)])
+            except IntegrityError:
+                _update_score(course_key, user_id, stats, score, now)
+
+
+def is_course_closed(course_key):
+    """
+    Returns whether the course has ended, reading its end date from the course overview
+    and caching it to avoid a database query per forum activity.
+    """
+    cache_key = COURSE_END_CACHE_KEY.format(course_key=course_key)
+    course_end = cache.get(cache_key)
+    if course_end is None:
+        try:
+            # False marks a course without an end date, as None would be a cache miss
+            course_end = CourseOverview.get_from_id(course_key).end or False
+        except CourseOverview.DoesNotExist:
+            course_end = False
+        cache.set(cache_key, course_end, COURSE_END_CACHE_TIMEOUT)
+    return bool(course_end) and course_end < datetime.now(pytz.UTC)
+
+
+def _get_flush_interval():
+    """
+    Returns the length, in seconds, of the windows in which changes in stats are coalesced.
+    """
+    return max(int(getattr(settings, 'SOCIAL_ENGAGEMENT_FLUSH_INTERVAL', 60)), 1)
+
+
+def _engagement_counter_key(window, user_id, course_id, stat):
+    return u'social_engagement.changes.{}.{}.{}.{}'.format(window, user_id, course_id, stat)
+
+
+def _engagement_slots_key(window):
+    return u'social_engagement.changes.{}.slots'.format(window)
+
+
+def _engagement_slot_key(window, slot):
+    return u'social_engagement.changes.{}.slot.{}'.format(window, slot)
+
+
+def _engagement_flush_key(window):
+    return u'social_engagement.changes.{}.flush'.format(window)
@@ -6,11 +6,15 @@ paver test_system -s lms --test_id=lms/djangoapps/social_engagements/tests/test_
 
 from django.conf import settings
 from django.db import IntegrityError
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from django_comment_common.signals import comment_deleted
 
-from mock import patch
+from mock import ANY, patch
 from datetime import datetime, timedelta
 import pytz
 import ddt
+import threading
 
 from student.tests.factories import UserFactory
 from student.models import CourseEnrollment
@@ -19,7 +23,12 @@ from xmodule.modulestore.tests.factories import CourseFactory
 from social_engagement.models import StudentSocialEngagementScore, StudentSocialEngagementScoreHistory
 
 from social_engagement.engagement import update_course_engagement, _detail_results_factory, \
-    _get_details_for_deletion
+    _get_details_for_deletion, get_indexed_users_in_comment, get_indexed_users_in_thread, \
+    index_comment_created, index_comment_deleted, index_comment_voted, index_thread_created, \
+    index_thread_deleted, index_thread_followed
+from social_engagement.tasks import (
+    queue_user_engagement_change, save_engagement_changes, task_flush_engagement_changes
+)
 
 from edx_notifications.startup import initialize as initialize_notifications
 from edx_notifications.lib.consumer import get_notifications_count_for_user
@@ -281,6 +290,20 @@ class StudentEngagementTests(ModuleStoreTestCase):
         with self.assertRaises(IntegrityError):
             again.save()
 
+    def test_save_user_engagement_scores_atomically(self):
+        """
+        A failure while saving several scores leaves all of them unchanged
+        """
+        StudentSocialEngagementScore.save_user_engagement_score(self.course.id, self.user.id, 10)
+        with patch.object(StudentSocialEngagementScoreHistory.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                StudentSocialEngagementScore.save_user_engagement_scores(
+                    self.course.id, [(self.user.id, 20, None), (self.user2.id, 30, None)]
+                )
+
+        self.assertEqual(StudentSocialEngagementScore.get_user_engagement_score(self.course.id, self.user.id), 10)
+        self.assertIsNone(StudentSocialEngagementScore.get_user_engagement_score(self.course.id, self.user2.id))
+
     def test_update_user_engagement_score(self):
         """
         Run the engagement calculation for a user in a course
@@ -301,6 +324,68 @@ class StudentEngagementTests(ModuleStoreTestCase):
             self.assertEqual(leaderboard_position['position'], 1)
             self.assertEqual(get_notifications_count_for_user(self.user.id), 1)
 
+    def test_coalesced_engagement_changes(self):
+        """
+        Changes queued during a window are saved together when the window is flushed
+        """
+        course_id = unicode(self.course.id)
+        with patch('social_engagement.tasks.task_flush_engagement_changes.apply_async') as mock_flush, \
+                patch('social_engagement.tasks.time') as mock_time:
+            mock_time.time.return_value = 1500000000.0
+            queue_user_engagement_change(self.user.id, course_id, 'num_threads')
+            queue_user_engagement_change(self.user.id, course_id, 'num_threads')
+            queue_user_engagement_change(self.user.id, course_id, 'num_upvotes', increment=False)
+            queue_user_engagement_change(self.user2.id, course_id, {'num_comments': 2})
+            self.assertEqual(mock_flush.call_count, 1)
+
+        self.assertIsNone(StudentSocialEngagementScore.get_user_engagement_score(self.course.id, self.user.id))
+        task_flush_engagement_changes(*mock_flush.call_args[1]['args'])
+
+        stats = StudentSocialEngagementScore.get_user_engagements_stats(self.course.id, self.user.id)
+        self.assertEqual(stats['num_threads'], 2)
+        self.assertEqual(stats['num_upvotes'], -1)
+        self.assertEqual(StudentSocialEngagementScore.get_user_engagement_score(self.course.id, self.user.id), -5)
+        self.assertEqual(StudentSocialEngagementScore.get_user_engagement_score(self.course.id, self.user2.id), 30)
+        self.assertEqual(StudentSocialEngagementScoreHistory.objects.filter(course_id=self.course.id).count(), 2)
+
+    def test_save_engagement_changes_created_concurrently(self):
+        """
+        Score entries created by another writer after they were looked up are updated instead
+        """
+        course_id = unicode(self.course.id)
+        StudentSocialEngagementScore.objects.create(user=self.user, course_id=self.course.id, score=10, num_threads=1)
+        with patch('social_engagement.tasks._get_scored_user_ids', return_value=set()):
+            save_engagement_changes({
+                (self.user.id, course_id): {'num_threads': 1},
+                (self.user2.id, course_id): {'num_comments': 2},
+            })
+
+        stats = StudentSocialEngagementScore.get_user_engagements_stats(self.course.id, self.user.id)
+        self.assertEqual(stats['num_threads'], 2)
+        self.assertEqual(StudentSocialEngagementScore.get_user_engagement_score(self.course.id, self.user.id), 20)
+        self.assertEqual(StudentSocialEngagementScore.get_user_engagement_score(self.course.id, self.user2.id), 30)
+
+    def test_flush_engagement_changes_failure(self):
+        """
+        The changes of a window are kept and flushed again when saving them fails
+        """
+        course_id = unicode(self.course.id)
+        with patch('social_engagement.tasks.task_flush_engagement_changes.apply_async') as mock_flush, \
+                patch('social_engagement.tasks.time') as mock_time:
+            mock_time.time.return_value = 1500000000.0
+            queue_user_engagement_change(self.user.id, course_id, 'num_threads')
+        window = mock_flush.call_args[1]['args'][0]
+
+        with patch.object(StudentSocialEngagementScoreHistory.objects, 'bulk_create', side_effect=IntegrityError), \
+                patch('social_engagement.tasks.task_flush_engagement_changes.apply_async') as mock_retry:
+            with self.assertRaises(IntegrityError):
+                task_flush_engagement_changes(window)
+        mock_retry.assert_called_once_with(args=[window], countdown=ANY)
+        self.assertIsNone(StudentSocialEngagementScore.get_user_engagement_score(self.course.id, self.user.id))
+
+        task_flush_engagement_changes(window)
+        self.assertEqual(StudentSocialEngagementScore.get_user_engagement_score(self.course.id, self.user.id), 10)
+
     def test_multiple_users(self):
         """
         See if it works with more than one enrollee
@@ -600,3 +685,109 @@ class StudentEngagementTests(ModuleStoreTestCase):
 
                 results = _get_details_for_deletion(None, None)
                 self.assertEqual(results, expected)
+
+    def test_get_details_for_deletion_fetches_pages_concurrently(self):
+        """
+        Test the pages after the first one of a thread are fetched concurrently.
+        """
+        third_page_fetched = threading.Event()
+
+        def list_comments(request):
+            page = int(request.GET['page'])
+            if page == 2:
+                # only returns once the third page is being fetched at the same time
+                self.assertTrue(third_page_fetched.wait(5))
+            elif page == 3:
+                third_page_fetched.set()
+            response = self.MockResponse()
+            response.data = {
+                'pagination': {'count': 3, 'num_pages': 3, 'next': None if page == 3 else 'next'},
+                'results': [
+                    self.MockData(**{
+                        'vote_count': page,
+                        'child_count': 0,
+                        'serializer': self.MockSerializer(self.user.id, 0),
+                    }),
+                ],
+            }
+            return response
+
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with patch('lms.djangoapps.discussion_api.views.CommentViewSet.list', side_effect=list_comments):
+            results = _get_details_for_deletion(request, is_thread=True)
+
+        self.assertEqual(results['all_comments'], 3)
+        self.assertEqual(results['users'][self.user.id], {'num_comments': 3, 'num_upvotes': 6})
+
+    def test_thread_participant_index(self):
+        """
+        Test getting the stats to decrement on deletion from the participant index of a thread.
+        """
+        thread = self.MockData(id='thread', votes={'count': 2}, abuse_flaggers=[])
+        comment = self.MockData(id='comment1', thread_id='thread', votes={'count': 4}, abuse_flaggers=['1'])
+        self.assertIsNone(get_indexed_users_in_thread(thread))
+
+        index_thread_created('thread', self.user.id)
+        index_comment_created('thread', 'comment1', self.user2.id)
+        index_comment_created('thread', 'reply1', self.user.id, parent_id='comment1')
+        index_comment_created('thread', 'reply2', self.user2.id, parent_id='comment1')
+        index_comment_created('thread', 'comment2', self.user.id)
+        index_comment_voted(comment)
+        index_thread_followed('thread')
+
+        users = get_indexed_users_in_thread(thread)
+        self.assertEqual(users[self.user.id], {
+            'num_comments': 1,
+            'num_replies': 1,
+            'num_upvotes': 2,
+            'num_threads': 1,
+            'num_comments_generated': 4,
+            'num_thread_followers': 1,
+        })
+        self.assertEqual(users[self.user2.id], {'num_comments': 1, 'num_replies': 1, 'num_upvotes': 4})
+
+        users = get_indexed_users_in_comment(comment)
+        self.assertEqual(users[self.user.id], {'num_replies': 1, 'num_upvotes': 0, 'num_comments_generated': 3})
+        self.assertEqual(users[self.user2.id], {
+            'num_comments': 1,
+            'num_replies': 1,
+            'num_upvotes': 4,
+            'num_flagged': 1,
+        })
+
+        index_comment_deleted('thread', 'comment1')
+        self.assertIsNone(get_indexed_users_in_comment(comment))
+        self.assertEqual(get_indexed_users_in_thread(thread)[self.user.id]['num_comments_generated'], 1)
+
+        index_thread_deleted('thread')
+        self.assertIsNone(get_indexed_users_in_thread(thread))
+
+    @ddt.data(True, False)
+    def test_decrement_on_deletion(self, decrement_on_deletion):
+        """
+        Test deleting a comment decrements the scores of the users in the participant index only when enabled.
+        """
+        course_id = unicode(self.course.id)
+        comment = self.MockData(
+            id='comment1', thread_id='thread', course_id=course_id, votes={'count': 0}, abuse_flaggers=[]
+        )
+        index_thread_created('thread', self.user.id)
+        index_comment_created('thread', 'comment1', self.user2.id)
+
+        with override_settings(SOCIAL_ENGAGEMENT_DECREMENT_ON_DELETION=decrement_on_deletion), \
+                patch('openedx.core.djangoapps.youngsphere.social_engagement.handlers._decrement') as mock_decrement:
+            comment_deleted.send(sender=None, user=self.user2, post=comment)
+
+        if decrement_on_deletion:
+            self.assertEqual(
+                {call[0][0]: call[0][2] for call in mock_decrement.call_args_list},
+                {
+                    self.user.id: {'num_comments_generated': 1},
+                    self.user2.id: {'num_comments': 1, 'num_upvotes': 0},
+                }
+            )
+        else:
+            self.assertFalse(mock_decrement.called)
+        # the comment is removed from the index either way
+        self.assertIsNone(get_indexed_users_in_comment(comment))